@@ -0,0 +1,213 @@
+import heapq
+import re
+import threading
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Heavy hitters tracked per video for high-cardinality dimensions
+DEMOGRAPHIC_CAPACITY = 32
+
+# Entries shown per dimension before the rest is folded into "Other"
+TOP_SHOWN = 5
+
+# Headers a CDN or proxy in front of the API sets to the viewer's country
+LOCATION_HEADERS = ("cf-ipcountry", "cloudfront-viewer-country", "x-country-code")
+
+# Referrer hosts that count as our own site, i.e. direct traffic
+OWN_HOSTS = ("vidorafilms.com", "localhost")
+
+TV_AGENT = re.compile(r"smart-?tv|appletv|roku|tizen|web0s|webos|crkey|bravia|aftb|aftm|googletv", re.I)
+TABLET_AGENT = re.compile(r"ipad|tablet|kindle|silk|playbook|android(?!.*mobi)", re.I)
+MOBILE_AGENT = re.compile(r"mobi|iphone|ipod|android|blackberry|opera mini", re.I)
+
+
+def classify_device(user_agent: str) -> str:
+    """Bucket a User-Agent into TV, Tablet, Mobile or Desktop"""
+    if TV_AGENT.search(user_agent):
+        return "TV"
+    if TABLET_AGENT.search(user_agent):
+        return "Tablet"
+    if MOBILE_AGENT.search(user_agent):
+        return "Mobile"
+    return "Desktop"
+
+def referrer_host(referrer: str) -> str:
+    """Get the site a view came from, or "Direct" for none or our own pages"""
+    host = (urlsplit(referrer).hostname or "") if referrer else ""
+    if host.startswith("www."):
+        host = host[4:]
+    if not host or any(host == own or host.endswith("." + own) for own in OWN_HOSTS):
+        return "Direct"
+    return host
+
+def view_metadata(headers: Mapping[str, str]) -> dict:
+    """Pull the location, device and referrer of a view from its request headers"""
+    location = next((headers[name] for name in LOCATION_HEADERS if headers.get(name)), "")
+    return {
+        "location": location.upper() if location and location.upper() != "XX" else "Unknown",
+        "device": classify_device(headers.get("user-agent", "")),
+        "referrer": referrer_host(headers.get("referer", ""))
+    }
+
+
+class SpaceSaving:
+    """Approximate top-k counter in bounded memory (Metwally et al., 2005)
+
+    At most ``capacity`` items are monitored. A new item arriving when the
+    summary is full takes over the counter of the least counted item and
+    adds to it, so every count is an overestimate by at most the evicted
+    count (kept in ``errors``), any item seen more than ``total / capacity``
+    times is guaranteed to be monitored, and the counters always sum to
+    ``total``. The smallest counter is found through a lazily cleaned heap.
+    """
+
+    __slots__ = ("capacity", "total", "counts", "errors", "_heap")
+
+    def __init__(self, capacity: int = DEMOGRAPHIC_CAPACITY):
+        if capacity < 1:
+            raise ValueError("Capacity must be at least 1")
+        self.capacity = capacity
+        self.total = 0
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self._heap: List[Tuple[int, str]] = []
+
+    def add(self, item: str, count: int = 1):
+        self.total += count
+        counts = self.counts
+        if item in counts:
+            counts[item] += count
+        elif len(counts) < self.capacity:
+            counts[item] = count
+            self.errors[item] = 0
+        else:
+            floor, evicted = self._pop_min()
+            del counts[evicted]
+            del self.errors[evicted]
+            counts[item] = floor + count
+            self.errors[item] = floor
+
+        heapq.heappush(self._heap, (counts[item], item))
+        if len(self._heap) > 4 * self.capacity:
+            # Drop the stale entries left behind by increments
+            self._heap = [(value, key) for key, value in counts.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        """Get the ``n`` most counted items with their estimated counts"""
+        return heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+
+    def _pop_min(self) -> Tuple[int, str]:
+        while True:
+            count, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                return count, item
+
+
+def percentages(top: List[Tuple[str, int]], total: int) -> List[dict]:
+    """Turn the top entries into percentages, with everything else as "Other" """
+    if not total:
+        return []
+    shares = [{"name": name, "percentage": round(count / total * 100, 1)} for name, count in top]
+    other = total - sum(count for _, count in top)
+    if other > 0:
+        shares.append({"name": "Other", "percentage": round(other / total * 100, 1)})
+    return shares
+
+
+class VideoDemographics:
+    """One video's view counts by location, device and referrer"""
+
+    __slots__ = ("locations", "devices", "referrers", "rendered")
+
+    def __init__(self, capacity: int):
+        self.locations = SpaceSaving(capacity)
+        self.referrers = SpaceSaving(capacity)
+        self.devices = Counter()
+        self.rendered: Optional[dict] = None
+
+
+class DemographicStore:
+    """Per-video demographic breakdowns from view metadata
+
+    Devices fall into a handful of classes and are counted exactly. Location
+    and referrer can take any number of values, so each is a ``SpaceSaving``
+    summary of ``capacity`` heavy hitters per video and memory stays bounded
+    however many distinct countries or sites send views. The rendered
+    percentages are cached per video until its next view, so serving them
+    does not depend on how many views have been counted.
+    """
+
+    def __init__(self, capacity: int = DEMOGRAPHIC_CAPACITY, shown: int = TOP_SHOWN):
+        self.capacity = capacity
+        self.shown = shown
+        self._videos: Dict[str, VideoDemographics] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        with self._lock:
+            state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def record(self, video_id: str, location: str, device: str, referrer: str):
+        """Count one view"""
+        with self._lock:
+            counters = self._videos.get(video_id)
+            if counters is None:
+                counters = self._videos[video_id] = VideoDemographics(self.capacity)
+            counters.locations.add(location)
+            counters.referrers.add(referrer)
+            counters.devices[device] += 1
+            counters.rendered = None
+
+    def breakdown(self, video_id: str) -> dict:
+        """Get a video's locations, devices and referrers as percentages of its views"""
+        with self._lock:
+            counters = self._videos.get(video_id)
+            if counters is None:
+                return {"locations": [], "devices": [], "referrers": []}
+            if counters.rendered is None:
+                counters.rendered = {
+                    "locations": percentages(counters.locations.top(self.shown), counters.locations.total),
+                    "devices": percentages(counters.devices.most_common(), sum(counters.devices.values())),
+                    "referrers": percentages(counters.referrers.top(self.shown), counters.referrers.total)
+                }
+            return counters.rendered
+
+    def location_distribution(self, video_ids: Iterable[str]) -> List[dict]:
+        """Get the locations of every view across several videos as percentages
+
+        The videos' heavy hitters are summed, so a location counts towards
+        "Other" wherever a video's summary no longer monitors it.
+        """
+        locations = Counter()
+        total = 0
+        with self._lock:
+            for video_id in video_ids:
+                counters = self._videos.get(video_id)
+                if counters is not None:
+                    locations.update(counters.locations.counts)
+                    total += counters.locations.total
+        return percentages(locations.most_common(self.shown), total)
+
+
+_demographics: Optional[DemographicStore] = None
+
+def get_demographics() -> DemographicStore:
+    """Get the shared demographic store"""
+    global _demographics
+    if _demographics is None:
+        _demographics = DemographicStore()
+    return _demographics
+
+def set_demographics(store: Optional[DemographicStore]):
+    """Replace the shared demographic store, e.g. in tests"""
+    global _demographics
+    _demographics = store
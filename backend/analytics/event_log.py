@@ -0,0 +1,410 @@
+import fcntl
+import heapq
+import json
+import logging
+import os
+import pickle
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from settings import env_str
+
+logger = logging.getLogger(__name__)
+
+# Event log settings
+EVENT_LOG_DIR = env_str("EVENT_LOG_DIR")
+SEGMENT_BYTES = 64 * 1024 * 1024
+COMMIT_INTERVAL = 0.005  # seconds between group commits
+
+# Record header: payload length, CRC32 of sequence number and payload, sequence number
+HEADER = struct.Struct(">IIQ")
+SEGMENT_SUFFIX = ".log"
+
+# Each process appends to a log of its own in a directory with this prefix
+WORKER_PREFIX = "worker-"
+LOCK_NAME = "LOCK"
+
+# Replay checkpoint shared by all workers, and the lock taken while it is used
+CHECKPOINT_NAME = "CHECKPOINT"
+CHECKPOINT_LOCK_NAME = "CHECKPOINT.lock"
+
+# json.dumps builds a new encoder per call when given options, so share one
+_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+class CorruptLogError(ValueError):
+    """Raised when a record before the end of the log fails its checksum"""
+
+
+class EventLogLocked(RuntimeError):
+    """Raised when another process already has a log directory open"""
+
+
+def encode_payload(event: dict) -> bytes:
+    return _encoder.encode(event).encode()
+
+def encode_record(seq: int, payload: bytes) -> bytes:
+    crc = zlib.crc32(payload, zlib.crc32(seq.to_bytes(8, "big")))
+    return HEADER.pack(len(payload), crc, seq) + payload
+
+def read_segment(path: str) -> Iterator[Tuple[int, int, bytes]]:
+    """Yield (seq, end offset, payload) for each intact record in a segment
+
+    Stops at the first short or corrupt record and raises ``CorruptLogError``
+    with its offset, so callers can tell a torn tail from damage.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    offset = 0
+    while offset < len(data):
+        if offset + HEADER.size > len(data):
+            raise CorruptLogError(f"{path}: truncated header at offset {offset}")
+        length, crc, seq = HEADER.unpack_from(data, offset)
+        start = offset + HEADER.size
+        payload = data[start:start + length]
+        if len(payload) != length or zlib.crc32(payload, zlib.crc32(seq.to_bytes(8, "big"))) != crc:
+            raise CorruptLogError(f"{path}: bad record at offset {offset}")
+        offset = start + length
+        yield seq, offset, payload
+
+
+class EventLog:
+    """Append-only analytics event log split into rotating segment files
+
+    Each record is a header with its length, sequence number and a CRC32,
+    followed by the event as compact JSON. ``append`` only encodes the
+    record and queues it; a committer thread writes everything queued
+    with one write and one fsync every ``commit_interval`` seconds (group
+    commit), so durability costs one fsync per batch rather than per
+    event. ``wait_for`` blocks until a sequence number is on disk.
+
+    Segments are named after their first sequence number and a new one is
+    started once the current segment reaches ``segment_bytes``. On open
+    the last segment is checked and a torn final write from a crash is
+    truncated, so appends resume after the last intact record.
+
+    Only one log may have a directory open at a time: opening takes an
+    exclusive ``flock`` on its ``LOCK`` file, held until ``close``, and
+    raises ``EventLogLocked`` if another process holds it. Several worker
+    processes each open their own directory with ``open_worker_log``.
+    """
+
+    def __init__(
+        self,
+        root: str = EVENT_LOG_DIR,
+        segment_bytes: int = SEGMENT_BYTES,
+        commit_interval: float = COMMIT_INTERVAL,
+        fsync: bool = True
+    ):
+        self.root = os.path.abspath(root)
+        self.segment_bytes = segment_bytes
+        self.commit_interval = commit_interval
+        self.fsync = fsync
+        os.makedirs(self.root, exist_ok=True)
+
+        # Recovery truncates the last segment, so it must not race a live writer
+        self._lock_fd = os.open(os.path.join(self.root, LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(self._lock_fd)
+            raise EventLogLocked(f"Event log {self.root} is open in another process")
+
+        self._pending: List[bytes] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._durable = threading.Condition(threading.Lock())
+        self._closed = False
+        self._error: Optional[BaseException] = None
+
+        try:
+            self._next_seq = self._recover() + 1
+        except BaseException:
+            os.close(self._lock_fd)
+            raise
+        self.durable_seq = self._next_seq - 1
+        self._committer = threading.Thread(target=self._run, name="event-log-commit", daemon=True)
+        self._committer.start()
+
+    # Writing
+    def append(self, event: dict) -> int:
+        """Queue an event and return its sequence number
+
+        Raises RuntimeError once a commit has failed, since nothing queued
+        after that would ever be written.
+        """
+        payload = encode_payload(event)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Event log is closed")
+            if self._error is not None:
+                raise RuntimeError("Event log commit failed") from self._error
+            seq = self._next_seq
+            self._next_seq += 1
+            self._pending.append(encode_record(seq, payload))
+            return seq
+
+    def wait_for(self, seq: int, timeout: Optional[float] = None) -> bool:
+        """Block until ``seq`` has been written and synced"""
+        with self._durable:
+            self._durable.wait_for(lambda: self.durable_seq >= seq or self._error is not None, timeout)
+            if self._error is not None:
+                raise RuntimeError("Event log commit failed") from self._error
+            return self.durable_seq >= seq
+
+    def flush(self):
+        """Commit everything appended so far"""
+        with self._lock:
+            last = self._next_seq - 1
+            self._wake.notify()
+        self.wait_for(last)
+
+    def close(self):
+        """Commit what is queued and stop the committer"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wake.notify()
+        self._committer.join()
+        os.close(self._fd)
+        os.close(self._lock_fd)
+
+    # Reading
+    def replay(self, after: int = 0) -> Iterator[Tuple[int, dict]]:
+        """Yield (seq, event) for every committed event after ``after``"""
+        return replay_log(self.root, after)
+
+    # Internals
+    def _segments(self) -> List[str]:
+        return segment_paths(self.root)
+
+    def _recover(self) -> int:
+        segments = self._segments()
+        if not segments:
+            self._open_segment(1)
+            return 0
+
+        last_seq = int(os.path.basename(segments[-1])[:-len(SEGMENT_SUFFIX)]) - 1
+        end = 0
+        try:
+            for seq, end, _ in read_segment(segments[-1]):
+                last_seq = seq
+        except CorruptLogError as e:
+            logger.warning("Truncating torn write in event log: %s", e)
+
+        with open(segments[-1], "r+b") as f:
+            f.truncate(end)
+        self._fd = os.open(segments[-1], os.O_WRONLY | os.O_APPEND)
+        self._segment_size = end
+        return last_seq
+
+    def _open_segment(self, first_seq: int):
+        path = os.path.join(self.root, f"{first_seq:020d}{SEGMENT_SUFFIX}")
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._segment_size = 0
+        if self.fsync:
+            # Make the new file's directory entry durable too
+            dir_fd = os.open(self.root, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending and not self._closed:
+                    self._wake.wait(self.commit_interval)
+                batch, self._pending = self._pending, []
+                last = self._next_seq - 1
+                closing = self._closed
+
+            if batch:
+                try:
+                    self._commit(batch, last)
+                except BaseException as e:
+                    logger.exception("Event log commit failed")
+                    with self._durable:
+                        self._error = e
+                        self._durable.notify_all()
+                    return
+
+            if closing and not batch:
+                return
+
+    def _commit(self, batch: List[bytes], last: int):
+        data = b"".join(batch)
+        view = memoryview(data)
+        while view:
+            written = os.write(self._fd, view)
+            view = view[written:]
+        if self.fsync:
+            os.fsync(self._fd)
+        self._segment_size += len(data)
+
+        with self._durable:
+            self.durable_seq = last
+            self._durable.notify_all()
+
+        if self._segment_size >= self.segment_bytes:
+            os.close(self._fd)
+            self._open_segment(last + 1)
+
+
+def segment_paths(root: str) -> List[str]:
+    """Get a log directory's segment files in sequence order"""
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(root, name) for name in sorted(names) if name.endswith(SEGMENT_SUFFIX)]
+
+def replay_log(root: str, after: int = 0) -> Iterator[Tuple[int, dict]]:
+    """Yield (seq, event) for every intact event in a log directory after ``after``
+
+    A damaged record at the end of the last segment is a write torn by a
+    crash and ends the replay; damage anywhere else raises ``CorruptLogError``.
+    """
+    segments = segment_paths(root)
+    for index, path in enumerate(segments):
+        # Skip whole segments that end before ``after``
+        if index + 1 < len(segments):
+            next_first = int(os.path.basename(segments[index + 1])[:-len(SEGMENT_SUFFIX)])
+            if next_first <= after + 1:
+                continue
+        try:
+            for seq, _, payload in read_segment(path):
+                if seq > after:
+                    yield seq, json.loads(payload)
+        except CorruptLogError:
+            if index + 1 < len(segments):
+                raise
+            logger.warning("Event log replay stopped at a torn write in %s", path)
+            return
+
+
+def worker_log_dirs(root: str) -> List[str]:
+    """Get the log directories under ``root``, one per worker that has logged
+
+    ``root`` itself is included if it holds segments of its own.
+    """
+    try:
+        names = sorted(os.listdir(root))
+    except FileNotFoundError:
+        return []
+    dirs = [os.path.join(root, name) for name in names if name.startswith(WORKER_PREFIX)]
+    return ([root] if segment_paths(root) else []) + [path for path in dirs if os.path.isdir(path)]
+
+def open_worker_log(root: str = EVENT_LOG_DIR, **options) -> EventLog:
+    """Open the first worker log directory under ``root`` no other process has open"""
+    index = 0
+    while True:
+        try:
+            return EventLog(os.path.join(root, f"{WORKER_PREFIX}{index}"), **options)
+        except EventLogLocked:
+            index += 1
+
+def replay_worker_logs(root: str) -> Iterator[dict]:
+    """Yield every intact event from every worker log under ``root``, oldest first
+
+    Each worker's events are in order already, so they are merged on their
+    ``at`` timestamps.
+    """
+    return (event for _, _, event in replay_worker_logs_after(root, {}))
+
+def replay_worker_logs_after(root: str, positions: Dict[str, int]) -> Iterator[Tuple[str, int, dict]]:
+    """Yield (log name, seq, event) for the events after each worker log's position, oldest first
+
+    ``positions`` maps a log's name, its directory relative to ``root``, to
+    the last sequence number already applied from it; logs without one are
+    replayed from the start.
+    """
+    logs = []
+    for path in worker_log_dirs(root):
+        name = os.path.relpath(path, root)
+        logs.append((name, seq, event) for seq, event in replay_log(path, positions.get(name, 0)))
+    return heapq.merge(*logs, key=lambda record: record[2].get("at", ""))
+
+def prune_segments(root: str, through: int) -> int:
+    """Delete a log's segments holding only records up to ``through``, returning how many
+
+    The last segment is always kept, since the log's writer appends to it.
+    """
+    segments = segment_paths(root)
+    removed = 0
+    for path, following in zip(segments, segments[1:]):
+        if int(os.path.basename(following)[:-len(SEGMENT_SUFFIX)]) > through + 1:
+            break
+        os.remove(path)
+        removed += 1
+    return removed
+
+
+@contextmanager
+def checkpoint_lock(root: str):
+    """Hold the exclusive lock on the replay checkpoint under ``root``
+
+    Workers start together, so this keeps one from pruning segments that
+    another is about to write an older checkpoint for.
+    """
+    os.makedirs(root, exist_ok=True)
+    fd = os.open(os.path.join(root, CHECKPOINT_LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+def read_checkpoint(root: str) -> Tuple[Dict[str, int], Optional[Any]]:
+    """Get the saved log positions and state, or no positions and None if there is no checkpoint"""
+    try:
+        with open(os.path.join(root, CHECKPOINT_NAME), "rb") as f:
+            checkpoint = pickle.load(f)
+    except FileNotFoundError:
+        return {}, None
+    return checkpoint["positions"], checkpoint["state"]
+
+def write_checkpoint(root: str, positions: Dict[str, int], state: Any):
+    """Atomically replace the checkpoint with ``state`` as of the given log positions"""
+    path = os.path.join(root, CHECKPOINT_NAME)
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        pickle.dump({"positions": positions, "state": state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+    dir_fd = os.open(root, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+_event_log: Optional[EventLog] = None
+
+def get_event_log() -> Optional[EventLog]:
+    """Get this process's event log, or None when EVENT_LOG_DIR is not set"""
+    global _event_log
+    if _event_log is None and EVENT_LOG_DIR:
+        _event_log = open_worker_log()
+    return _event_log
+
+def set_event_log(log: Optional[EventLog]):
+    """Replace the shared event log, e.g. in tests"""
+    global _event_log
+    _event_log = log
+
+def log_event(event: dict) -> Optional[int]:
+    """Append an event to the shared log if there is one"""
+    log = get_event_log()
+    return log.append(event) if log is not None else None
+
+def close_event_log():
+    """Commit and close the shared log if it was ever opened"""
+    if _event_log is not None:
+        _event_log.close()
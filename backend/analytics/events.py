@@ -0,0 +1,243 @@
+import json
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Annotated, List, Literal, Optional, Tuple, Union
+
+from pydantic import BaseModel, Field, ValidationError, parse_obj_as
+
+from analytics.engagment import get_demographics, set_demographics
+from analytics.event_log import (
+    EventLog,
+    checkpoint_lock,
+    log_event,
+    prune_segments,
+    read_checkpoint,
+    replay_log,
+    replay_worker_logs_after,
+    write_checkpoint
+)
+from analytics.watch_time import get_watch_time_buffer
+from database import queries
+from database.models import parse_upload_date
+
+# Batch settings
+MAX_BATCH_EVENTS = 1000
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+# Event models
+class WatchTimeEvent(BaseModel):
+    type: Literal["watch-time"]
+    videoId: str
+    watchTimeSeconds: int = Field(..., ge=0)
+    percentageWatched: float = Field(..., ge=0, le=100)
+
+
+class ShareEvent(BaseModel):
+    type: Literal["share"]
+    videoId: str
+    platform: str
+    url: str = ""
+
+
+class HistoryEvent(BaseModel):
+    type: Literal["history"]
+    videoId: str
+    progress: float = Field(..., ge=0, le=100)
+
+
+AnalyticsEvent = Annotated[Union[WatchTimeEvent, ShareEvent, HistoryEvent], Field(discriminator="type")]
+
+
+class EventBatchTooLarge(ValueError):
+    """Raised when a batch holds more events than allowed"""
+
+
+# Parsing
+def decode_events(body: bytes, content_type: str = "application/json") -> list:
+    """Decode a JSON array, or one JSON object per line for NDJSON bodies
+
+    Raises ValueError if the body cannot be decoded at all.
+    """
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in NDJSON_TYPES:
+        items = []
+        for number, line in enumerate(body.splitlines(), start=1):
+            if line.strip():
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    raise ValueError(f"Line {number} is not valid JSON")
+    else:
+        try:
+            items = json.loads(body)
+        except ValueError:
+            raise ValueError("Body is not valid JSON")
+        if not isinstance(items, list):
+            raise ValueError("Body must be a JSON array of events")
+
+    if len(items) > MAX_BATCH_EVENTS:
+        raise EventBatchTooLarge(f"A batch may hold at most {MAX_BATCH_EVENTS} events")
+    return items
+
+def validate_events(items: list) -> Tuple[List[BaseModel], List[dict]]:
+    """Validate every item, returning the valid events and one error per invalid item
+
+    Events for videos that are not in the catalog are invalid too.
+    """
+    events = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            event = parse_obj_as(AnalyticsEvent, item)
+        except ValidationError as e:
+            errors.append({"index": index, "errors": e.errors()})
+            continue
+        if queries.get_video(event.videoId) is None:
+            errors.append({
+                "index": index,
+                "errors": [{"loc": ["videoId"], "msg": "Video not found", "type": "value_error.not_found"}]
+            })
+            continue
+        events.append(event)
+    return events, errors
+
+
+# Fan-out
+async def dispatch_events(events: List[BaseModel], viewer_id: str, user_id: str) -> dict:
+    """Send a validated batch to the watch time, share and history sinks
+
+    Watch time goes first: it is the only sink that can refuse events
+    (``WatchTimeBufferFull``), and heartbeats are safe to resend because
+    the furthest position wins. Shares are summed per video into one
+    catalog and one rollup update each, so the score is recomputed once
+    per video, and history rows are written as one batch.
+    """
+    buffer = get_watch_time_buffer()
+    shares = Counter()
+    history = {}
+    counts = Counter()
+
+    for event in events:
+        counts[event.type] += 1
+        if isinstance(event, WatchTimeEvent):
+            await buffer.record(event.videoId, viewer_id, event.watchTimeSeconds, event.percentageWatched)
+            log_activity(
+                "watch-time",
+                event.videoId,
+                viewerId=viewer_id,
+                watchTimeSeconds=event.watchTimeSeconds,
+                percentageWatched=event.percentageWatched
+            )
+        elif isinstance(event, ShareEvent):
+            shares[event.videoId] += 1
+        else:
+            # Later progress for the same video replaces earlier progress
+            history[event.videoId] = event.progress
+
+    for video_id, count in shares.items():
+        queries.add_shares(video_id, count)
+        queries.record_video_activity(video_id, shares=count)
+        for _ in range(count):
+            log_activity("share", video_id)
+
+    if history:
+        now = datetime.utcnow().isoformat() + "Z"
+        queries.save_watch_history([
+            {"userId": user_id, "videoId": video_id, "progress": progress, "updatedAt": now}
+            for video_id, progress in history.items()
+        ])
+        for video_id, progress in history.items():
+            log_activity("history", video_id, userId=user_id, progress=progress, at=now)
+
+    return dict(counts)
+
+
+# Durability
+def log_activity(event_type: str, video_id: str, at: Optional[str] = None, **fields) -> Optional[int]:
+    """Append a raw analytics event, stamped with the server time, to the event log"""
+    return log_event(dict(fields, type=event_type, videoId=video_id, at=at or datetime.utcnow().isoformat() + "Z"))
+
+def apply_logged_event(event: dict):
+    """Re-apply one logged event to the analytics tables and rollups"""
+    event_type = event["type"]
+    video_id = event["videoId"]
+    at = event["at"]
+    day = parse_upload_date(at).date()
+    if event_type == "view":
+        if "device" in event and queries.get_video(video_id) is not None:
+            get_demographics().record(video_id, event["location"], event["device"], event["referrer"])
+        queries.record_video_activity(video_id, event.get("viewerId"), day, views=1)
+    elif event_type == "rating":
+        queries.record_video_activity(video_id, day=day, ratings=1, ratingPoints=int(event.get("rating", 0) * 2))
+    elif event_type == "share":
+        queries.record_video_activity(video_id, day=day, shares=1)
+    elif event_type == "watch-time":
+        queries.save_watch_time([{
+            "videoId": video_id,
+            "viewerId": event["viewerId"],
+            "watchTimeSeconds": event["watchTimeSeconds"],
+            "percentageWatched": event["percentageWatched"],
+            "heartbeats": 1,
+            "lastSeen": at
+        }])
+    elif event_type == "history":
+        queries.save_watch_history([
+            {"userId": event["userId"], "videoId": video_id, "progress": event["progress"], "updatedAt": at}
+        ])
+
+def rebuild_from_log(log: Union[EventLog, str], after: int = 0) -> int:
+    """Replay a log into the analytics tables, returning the last sequence applied
+
+    Watch time rows take the furthest position, so replaying heartbeats that
+    were already flushed before a crash does not count them twice.
+    """
+    root = log.root if isinstance(log, EventLog) else log
+    last = after
+    for last, event in replay_log(root, after):
+        apply_logged_event(event)
+    return last
+
+def analytics_state() -> dict:
+    """Get everything replaying the log rebuilds, to save in a checkpoint"""
+    return {
+        "rollups": queries.video_rollups,
+        "demographics": get_demographics(),
+        "watchTime": queries.fake_watch_time_db,
+        "history": queries.fake_watch_history_db
+    }
+
+def restore_analytics_state(state: dict):
+    """Replace the rebuilt analytics tables and rollups with a checkpoint's"""
+    queries.video_rollups = state["rollups"]
+    set_demographics(state["demographics"])
+    queries.fake_watch_time_db.clear()
+    queries.fake_watch_time_db.update(state["watchTime"])
+    queries.fake_watch_history_db.clear()
+    queries.fake_watch_history_db.update(state["history"])
+
+def rebuild_from_worker_logs(root: str) -> int:
+    """Restore the checkpoint under ``root`` and replay every worker's log after it, returning how many events were applied
+
+    Events are applied in time order across workers. The result is saved as
+    the new checkpoint, and segments holding only events it covers are
+    deleted, so each start replays just what was logged since the last one.
+    """
+    with checkpoint_lock(root):
+        positions, state = read_checkpoint(root)
+        if state is not None:
+            restore_analytics_state(state)
+
+        applied = 0
+        for name, seq, event in replay_worker_logs_after(root, positions):
+            apply_logged_event(event)
+            positions[name] = seq
+            applied += 1
+
+        if applied or state is None:
+            write_checkpoint(root, positions, analytics_state())
+        for name, last in positions.items():
+            prune_segments(os.path.join(root, name), last)
+    return applied
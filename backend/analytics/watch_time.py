@@ -0,0 +1,195 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from database import queries
+from settings import env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+# Write-behind settings
+WATCH_TIME_BATCH_SIZE = env_int("WATCH_TIME_BATCH_SIZE", 500)
+WATCH_TIME_FLUSH_SECONDS = env_float("WATCH_TIME_FLUSH_SECONDS", 5)
+WATCH_TIME_MAX_PENDING = env_int("WATCH_TIME_MAX_PENDING", 50000)
+ENQUEUE_TIMEOUT = 2.0  # seconds a heartbeat may wait for buffer space
+
+
+class WatchTimeBufferFull(RuntimeError):
+    """Raised when the buffer stays full for longer than the enqueue timeout"""
+
+
+def merge_rows(existing: dict, row: dict) -> dict:
+    """Combine two aggregates for the same (video, viewer)
+
+    Heartbeats report how far into the video the viewer has got, so the
+    furthest watch time and percentage win and heartbeat counts add up.
+    """
+    existing["heartbeats"] += row["heartbeats"]
+    existing["watchTimeSeconds"] = max(existing["watchTimeSeconds"], row["watchTimeSeconds"])
+    existing["percentageWatched"] = max(existing["percentageWatched"], row["percentageWatched"])
+    existing["firstSeen"] = min(existing["firstSeen"], row["firstSeen"])
+    existing["lastSeen"] = max(existing["lastSeen"], row["lastSeen"])
+    return existing
+
+
+class WatchTimeBuffer:
+    """Write-behind buffer that coalesces player heartbeats before storing them
+
+    Heartbeats for the same (video, viewer) are merged in memory, so however
+    often a player reports, each viewer costs one row per flush. A background
+    task hands the pending rows to ``sink`` in batches of ``batch_size``
+    whenever that many viewers are pending or ``flush_seconds`` have passed.
+    The sink is blocking and runs in the threadpool.
+
+    At most ``max_pending`` viewers are buffered. Heartbeats for a viewer who
+    is already pending are always accepted; new viewers wait for a flush to
+    make room and get ``WatchTimeBufferFull`` after ``enqueue_timeout``.
+    Rows from a failed flush are merged back and retried on the next one.
+    """
+
+    def __init__(
+        self,
+        sink: Callable[[List[dict]], None] = queries.save_watch_time,
+        batch_size: int = WATCH_TIME_BATCH_SIZE,
+        flush_seconds: float = WATCH_TIME_FLUSH_SECONDS,
+        max_pending: int = WATCH_TIME_MAX_PENDING,
+        enqueue_timeout: float = ENQUEUE_TIMEOUT,
+        clock: Callable[[], datetime] = datetime.utcnow
+    ):
+        self.sink = sink
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.max_pending = max(self.batch_size, max_pending)
+        self.enqueue_timeout = enqueue_timeout
+        self.clock = clock
+        self._pending: Dict[Tuple[str, str], dict] = {}
+        self._flush_wanted: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Condition] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def pending(self) -> int:
+        """Number of (video, viewer) rows waiting to be flushed"""
+        return len(self._pending)
+
+    def start(self):
+        """Start the flusher task on the running event loop"""
+        if self._task is not None:
+            return
+
+        self._flush_wanted = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def record(self, video_id: str, viewer_id: str, watch_seconds: float, percentage_watched: float):
+        """Buffer one heartbeat"""
+        self.start()
+
+        key = (video_id, viewer_id)
+        if key not in self._pending and len(self._pending) >= self.max_pending:
+            self._flush_wanted.set()
+            try:
+                async with self._space:
+                    await asyncio.wait_for(
+                        self._space.wait_for(lambda: key in self._pending or len(self._pending) < self.max_pending),
+                        self.enqueue_timeout
+                    )
+            except asyncio.TimeoutError:
+                raise WatchTimeBufferFull("Watch time buffer is full, try again shortly")
+
+        now = self.clock().isoformat() + "Z"
+        row = {
+            "videoId": video_id,
+            "viewerId": viewer_id,
+            "heartbeats": 1,
+            "watchTimeSeconds": watch_seconds,
+            "percentageWatched": percentage_watched,
+            "firstSeen": now,
+            "lastSeen": now
+        }
+        if key in self._pending:
+            merge_rows(self._pending[key], row)
+        else:
+            self._pending[key] = row
+            if len(self._pending) >= self.batch_size:
+                self._flush_wanted.set()
+
+    async def flush(self) -> int:
+        """Write everything pending now and return how many rows were written"""
+        if self._flush_lock is None:
+            self.start()
+
+        async with self._flush_lock:
+            rows = list(self._pending.values())
+            self._pending = {}
+            await self._notify_space()
+
+            written = 0
+            try:
+                for start in range(0, len(rows), self.batch_size):
+                    batch = rows[start:start + self.batch_size]
+                    await run_in_threadpool(self.sink, batch)
+                    written += len(batch)
+            except Exception:
+                # Keep the unwritten rows, merged with anything that arrived since
+                for row in rows[written:]:
+                    key = (row["videoId"], row["viewerId"])
+                    if key in self._pending:
+                        row = merge_rows(row, self._pending[key])
+                    self._pending[key] = row
+                raise
+            return written
+
+    async def shutdown(self):
+        """Stop the flusher and write whatever is still pending"""
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_wanted.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wanted.clear()
+
+            if self._pending:
+                try:
+                    await self.flush()
+                except Exception:
+                    logger.exception("Watch time flush failed, %d rows kept for retry", len(self._pending))
+                    await asyncio.sleep(self.flush_seconds)
+
+    async def _notify_space(self):
+        async with self._space:
+            self._space.notify_all()
+
+
+_watch_time_buffer: Optional[WatchTimeBuffer] = None
+
+def get_watch_time_buffer() -> WatchTimeBuffer:
+    """Get the shared watch time buffer"""
+    global _watch_time_buffer
+    if _watch_time_buffer is None:
+        _watch_time_buffer = WatchTimeBuffer()
+    return _watch_time_buffer
+
+def set_watch_time_buffer(buffer: Optional[WatchTimeBuffer]):
+    """Replace the shared watch time buffer, e.g. in tests"""
+    global _watch_time_buffer
+    _watch_time_buffer = buffer
+
+async def shutdown_watch_time_buffer():
+    """Flush the shared buffer if it was ever started"""
+    if _watch_time_buffer is not None:
+        await _watch_time_buffer.shutdown()
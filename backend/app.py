@@ -1,11 +1,28 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+import logging
 import os
-from routes import auth, videos, users, awards, analytics
+from starlette.concurrency import run_in_threadpool
+from routes import auth, videos, users, awards, analytics, streaming
+from analytics.event_log import EVENT_LOG_DIR, close_event_log, get_event_log
+from analytics.events import rebuild_from_worker_logs
+from analytics.watch_time import shutdown_watch_time_buffer
+from awards.film_of_the_month import NoMonthlyActivity, run_monthly_awards
+from cache.responses import RESPONSE_CACHE_RULES, ResponseCacheMiddleware, get_response_cache
+from cache.shared import get_shared_cache
+from database import queries
+from database.store import close_catalog, open_catalog
+from media.processing import shutdown_media_jobs
+
+logger = logging.getLogger(__name__)
 
 # Create the FastAPI app
 app = FastAPI(title="Vidora API", description="Backend API for Vidora video streaming platform")
 
+# Cache encoded responses of the read-heavy endpoints.
+# Added before CORS so cached responses still get CORS headers.
+app.add_middleware(ResponseCacheMiddleware, rules=RESPONSE_CACHE_RULES)
+
 # Configure CORS
 origins = [
     "http://localhost:3000",  # Frontend development server
@@ -19,6 +36,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Accept-Ranges", "Content-Range", "Content-Length", "ETag"],
 )
 
 # Include routers
@@ -27,6 +45,37 @@ app.include_router(videos.router, prefix="/api/videos", tags=["Videos"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
 app.include_router(awards.router, prefix="/api/awards", tags=["Awards"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
+app.include_router(streaming.router, prefix="/videos", tags=["Streaming"])
+app.include_router(streaming.hls_router, prefix="/hls", tags=["Streaming"])
+
+@app.on_event("startup")
+async def startup():
+    """Load the catalog, then rebuild analytics rollups from the event log after a restart or crash"""
+    catalog = await open_catalog()
+    if catalog is not None:
+        await queries.load_catalog(catalog)
+    
+    # Drop cached records and responses when other workers invalidate them
+    get_shared_cache().listen(get_response_cache())
+    
+    # Every worker restores the shared checkpoint, then replays what all workers logged since it
+    if get_event_log() is not None:
+        await run_in_threadpool(rebuild_from_worker_logs, EVENT_LOG_DIR)
+    
+    # Award last month if the batch job has not run for it yet
+    try:
+        await run_in_threadpool(run_monthly_awards)
+    except NoMonthlyActivity as e:
+        logger.warning("Monthly awards not stored: %s", e)
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop background workers when the server shuts down"""
+    await shutdown_media_jobs()
+    await get_shared_cache().stop_listening()
+    await shutdown_watch_time_buffer()
+    await close_catalog()
+    close_event_log()
 
 @app.get("/api/health")
 def health_check():
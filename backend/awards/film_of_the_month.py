@@ -0,0 +1,163 @@
+"""Offline batch job that picks each month's winning films
+
+Run once a month has ended, e.g. from cron on the 1st:
+
+    python -m awards.film_of_the_month [--year 2024 --month 5]
+
+The job loads the catalog from the database and replays the analytics
+event logs, so it needs the same DB_* and EVENT_LOG_DIR settings as the
+server. Results are stored once per (year, month) and never recomputed,
+so the monthly winners endpoint only has to look them up.
+"""
+import argparse
+import asyncio
+import heapq
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from analytics.event_log import EVENT_LOG_DIR
+from analytics.events import rebuild_from_worker_logs
+from database import queries
+from database.scoring import composite_score
+from database.store import close_catalog, get_catalog_writer, open_catalog
+
+# Winners kept overall and per category
+WINNERS_PER_BOARD = 5
+
+
+class NoMonthlyActivity(ValueError):
+    """Raised when there is no recorded activity to award a month on"""
+
+
+def previous_month(today: date) -> Tuple[int, int]:
+    """Get the (year, month) of the last month that has ended"""
+    last_day = today.replace(day=1) - timedelta(days=1)
+    return last_day.year, last_day.month
+
+def winner_entry(video: dict, rank: int) -> dict:
+    """Project a scored video into a winner with filmmaker info"""
+    filmmaker = queries.get_user_by_id(video["userId"]) or {}
+    return {
+        "id": video["id"],
+        "title": video["title"],
+        "category": video["category"],
+        "thumbnailUrl": video["thumbnailUrl"],
+        "views": video["views"],
+        "averageRating": round(video["averageRating"], 2),
+        "score": video["score"],
+        "rank": rank,
+        "filmmaker": {
+            "id": video["userId"],
+            "name": filmmaker.get("name"),
+            "isVerified": filmmaker.get("isVerified", False),
+            "isStudent": filmmaker.get("isStudent", False)
+        }
+    }
+
+def rank_videos(videos: Iterable[dict], limit: int = WINNERS_PER_BOARD) -> Dict[str, List[dict]]:
+    """Rank videos overall ("all") and per category in one pass
+
+    Each board is a min-heap of at most ``limit`` (score, id, video)
+    entries, so memory stays bounded by the number of categories however
+    many videos stream through. Videos are scored on the counters they carry.
+    """
+    boards: Dict[str, List[Tuple[float, str, dict]]] = {}
+    for video in videos:
+        entry = (composite_score(video), video["id"], video)
+        for category in ("all", video["category"]):
+            board = boards.setdefault(category, [])
+            if len(board) < limit:
+                heapq.heappush(board, entry)
+            elif entry[:2] > board[0][:2]:
+                heapq.heapreplace(board, entry)
+
+    ranked = {}
+    for category, board in boards.items():
+        board.sort(key=lambda entry: (-entry[0], entry[1]))
+        ranked[category] = [
+            winner_entry(dict(video, score=score), rank)
+            for rank, (score, _, video) in enumerate(board, start=1)
+        ]
+    return ranked
+
+def compute_monthly_awards(year: int, month: int, limit: int = WINNERS_PER_BOARD) -> dict:
+    """Rank a month's videos on that month's views, ratings and shares"""
+    boards = rank_videos(queries.get_monthly_top_videos(year, month), limit)
+    winners = boards.pop("all", [])
+    return {
+        "year": year,
+        "month": month,
+        "computedAt": datetime.utcnow().isoformat() + "Z",
+        "winners": winners,
+        "categories": dict(sorted(boards.items()))
+    }
+
+def calculate_monthly_winners(year: Optional[int] = None, month: Optional[int] = None, limit: int = WINNERS_PER_BOARD) -> List[dict]:
+    """Get a month's overall winners, by default for the last month that has ended"""
+    if year is None or month is None:
+        year, month = previous_month(datetime.utcnow().date())
+    return compute_monthly_awards(year, month, limit)["winners"]
+
+def run_monthly_awards(
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    clock: Callable[[], datetime] = datetime.utcnow
+) -> str:
+    """Compute and store a month's awards, returning the stored JSON
+
+    Only months that have ended can be awarded. A month already stored is
+    returned as is, so rerunning the job never changes published winners,
+    and a month without any recorded activity raises ``NoMonthlyActivity``
+    rather than storing empty winners for good.
+    """
+    today = clock().date()
+    if year is None or month is None:
+        year, month = previous_month(today)
+    if not 1 <= month <= 12:
+        raise ValueError("Month must be between 1 and 12")
+    if date(year, month, 1) > today.replace(day=1) - timedelta(days=1):
+        raise ValueError(f"{year}-{month:02d} has not ended yet")
+
+    stored = queries.get_monthly_awards(year, month)
+    if stored is not None:
+        return stored
+    awards = compute_monthly_awards(year, month)
+    if not awards["winners"]:
+        raise NoMonthlyActivity(f"No activity recorded for {year}-{month:02d}, so no awards were stored")
+    return queries.save_monthly_awards(year, month, awards)
+
+async def award_month(year: Optional[int] = None, month: Optional[int] = None) -> str:
+    """Load the catalog and replay the event logs, then award a month and return its stored JSON
+
+    The awards are read back from the database once written, so if another
+    run stored the month first its winners are the ones returned.
+    """
+    if not EVENT_LOG_DIR:
+        raise RuntimeError("EVENT_LOG_DIR must be set to rank a month's activity")
+    if year is None or month is None:
+        year, month = previous_month(datetime.utcnow().date())
+
+    catalog = await open_catalog()
+    if catalog is None:
+        raise RuntimeError("DB_TYPE must be set to store monthly awards")
+    try:
+        await queries.load_catalog(catalog)
+        await run_in_threadpool(rebuild_from_worker_logs, EVENT_LOG_DIR)
+        run_monthly_awards(year, month)
+        await get_catalog_writer().flush()
+        return await catalog.get_monthly_awards(year, month)
+    finally:
+        await close_catalog()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute and store a month's winning films")
+    parser.add_argument("--year", type=int)
+    parser.add_argument("--month", type=int)
+    args = parser.parse_args()
+    print(asyncio.run(award_month(args.year, args.month)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Hall of fame served from immutable, pre-serialized snapshots
+
+The hall of fame only changes when an award does, so its JSON is encoded
+once per change and every request is handed the same bytes. A snapshot's
+version is a hash of its bytes, which makes it its own strong ETag and lets
+clients fetch a version by URL and cache it forever. Rebuilds are triggered
+by the student board's version number, so answering a request, including a
+conditional one, never queries the data layer.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+from settings import env_int
+
+# How long clients and CDNs may reuse the current hall of fame without revalidating
+HALL_OF_FAME_MAX_AGE = env_int("HALL_OF_FAME_MAX_AGE", 86400)
+
+# Versions are content hashes, so a versioned URL never changes
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Past versions kept for versioned URLs clients may still hold
+KEPT_VERSIONS = 16
+
+
+class HallOfFameSnapshot:
+    """One immutable version of the hall of fame, already encoded"""
+
+    __slots__ = ("version", "etag", "body")
+
+    def __init__(self, data: dict):
+        self.body = json.dumps(data, separators=(",", ":")).encode()
+        self.version = hashlib.blake2b(self.body, digest_size=8).hexdigest()
+        self.etag = f"\"{self.version}\""
+
+
+class HallOfFame:
+    """The current hall of fame snapshot plus a few recent versions
+
+    ``build`` assembles the hall of fame and is only called when
+    ``source_version`` returns something new. A rebuild that produces the
+    same bytes keeps the existing snapshot, so clients holding its ETag keep
+    getting 304s.
+    """
+
+    def __init__(
+        self,
+        build: Callable[[], dict],
+        source_version: Callable[[], Hashable],
+        kept: int = KEPT_VERSIONS
+    ):
+        self._build = build
+        self._source_version = source_version
+        self._kept = kept
+        self._built_from: Optional[Hashable] = None
+        self._current: Optional[HallOfFameSnapshot] = None
+        self._versions: "OrderedDict[str, HallOfFameSnapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def current(self) -> HallOfFameSnapshot:
+        """Get the latest snapshot, rebuilding it if its source changed"""
+        source = self._source_version()
+        current = self._current
+        if current is not None and self._built_from == source:
+            return current
+
+        with self._lock:
+            if self._current is None or self._built_from != source:
+                snapshot = HallOfFameSnapshot(self._build())
+                if self._current is None or snapshot.version != self._current.version:
+                    self._versions[snapshot.version] = snapshot
+                    self._versions.move_to_end(snapshot.version)
+                    while len(self._versions) > self._kept:
+                        self._versions.popitem(last=False)
+                    self._current = snapshot
+                self._built_from = source
+            return self._current
+
+    def get(self, version: str) -> Optional[HallOfFameSnapshot]:
+        """Get a kept snapshot by version"""
+        return self._versions.get(version)
@@ -0,0 +1,78 @@
+"""Student filmmaker award, served from a precomputed snapshot
+
+The catalog keeps a leaderboard of verified students' public videos in
+step with ratings, uploads and verification changes, so picking the winner
+never joins users against videos. The snapshot built from the top of that
+board is only rebuilt when the board has changed since.
+"""
+import threading
+from datetime import datetime
+from typing import Optional
+
+from database import queries
+
+# Student videos shown: the winner and its runners-up
+STUDENT_FINALISTS = 3
+
+
+def student_entry(video: dict) -> dict:
+    """Project a student video into an award entry with the filmmaker's school"""
+    filmmaker = queries.get_user_by_id(video["userId"]) or {}
+    return {
+        "id": video["id"],
+        "title": video["title"],
+        "thumbnailUrl": video["thumbnailUrl"],
+        "description": video.get("description", ""),
+        "averageRating": video["averageRating"],
+        "views": video["views"],
+        "score": video.get("score"),
+        "filmmaker": {
+            "id": video["userId"],
+            "name": filmmaker.get("name"),
+            "school": filmmaker.get("school"),
+            "isStudent": filmmaker.get("isStudent", False),
+            "isVerified": filmmaker.get("isVerified", False)
+        }
+    }
+
+def calculate_student_filmmaker_awards(limit: int = STUDENT_FINALISTS, timeframe: str = "all") -> dict:
+    """Pick the student filmmaker award winner and runners-up from the student board"""
+    entries = [student_entry(video) for video in queries.get_student_videos(limit, timeframe)]
+    return {
+        "winner": entries[0] if entries else None,
+        "runnerUps": entries[1:],
+        "computedAt": datetime.utcnow().isoformat() + "Z"
+    }
+
+
+class StudentAwardsSnapshot:
+    """The latest student awards, rebuilt only when their inputs may have changed"""
+
+    def __init__(self):
+        self._version: Optional[int] = None
+        self._awards: Optional[dict] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> dict:
+        """Get the current awards, recalculating them if the student board changed"""
+        version = queries.get_student_board_version()
+        with self._lock:
+            if self._version != version:
+                self._awards = calculate_student_filmmaker_awards()
+                self._version = version
+            return self._awards
+
+
+_snapshot: Optional[StudentAwardsSnapshot] = None
+
+def get_student_awards() -> dict:
+    """Get the shared student awards snapshot"""
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = StudentAwardsSnapshot()
+    return _snapshot.get()
+
+def set_student_awards_snapshot(snapshot: Optional[StudentAwardsSnapshot]):
+    """Replace the shared snapshot, e.g. in tests"""
+    global _snapshot
+    _snapshot = snapshot
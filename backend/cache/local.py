@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+
+class CacheEntry:
+    """A cached value with its tags and expiry"""
+
+    __slots__ = ("value", "tags", "expires")
+
+    def __init__(self, value: Any, tags: Set[str], expires: float):
+        self.value = value
+        self.tags = tags
+        self.expires = expires
+
+
+class LocalCache:
+    """Least recently used values in process memory, with a TTL and tag invalidation
+
+    Each tag maps to the keys of the values carrying it, so invalidating a
+    tag only touches those. ``generation`` goes up on every invalidation: a
+    value loaded while one happened may already be stale, so ``put`` with
+    the generation read before loading refuses it.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = 0
+        self._clock = clock
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a live cached value"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires <= self._clock():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def put(
+        self,
+        key: str,
+        value: Any,
+        tags: Iterable[str] = (),
+        generation: Optional[int] = None,
+        ttl: Optional[float] = None
+    ) -> bool:
+        """Cache a value, unless something was invalidated since ``generation``"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._remove(key)
+            entry = CacheEntry(value, set(tags), self._clock() + (self.ttl if ttl is None else ttl))
+            self._entries[key] = entry
+            for tag in entry.tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            return True
+
+    def invalidate(self, *tags: str) -> int:
+        """Drop every value carrying any of the tags, returning how many"""
+        with self._lock:
+            self.generation += 1
+            keys = set()
+            for tag in tags:
+                keys |= self._tags.get(tag, set())
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        """Drop every value"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
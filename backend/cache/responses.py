@@ -0,0 +1,167 @@
+"""Encoded JSON responses cached by route and query string
+
+Read endpoints are answered from already-encoded bytes, skipping routing,
+validation and JSON encoding. Entries expire after a TTL and carry tags
+such as ``video:{id}``, so the data layer drops every response that showed
+a record as soon as it changes. Each worker has its own cache; with a
+shared tier, the shared cache passes other workers' invalidations on to it.
+"""
+import re
+import time
+from operator import itemgetter
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from cache.local import LocalCache
+from settings import env_float
+
+# Response cache settings
+RESPONSE_CACHE_TTL = env_float("RESPONSE_CACHE_TTL", 30)
+RESPONSE_CACHE_ENTRIES = 10_000
+
+
+def cache_key(path: str, query_string: bytes) -> str:
+    """Build a key from a path and its query parameters in a canonical order"""
+    pairs = sorted(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True), key=itemgetter(0))
+    path = path.rstrip("/") or "/"
+    return f"{path}?{urlencode(pairs)}" if pairs else path
+
+def listed_ids(data, kind: str) -> List[str]:
+    """Tag a JSON list with ``{kind}:{id}`` for every object in it"""
+    if not isinstance(data, list):
+        return []
+    return [f"{kind}:{item['id']}" for item in data if isinstance(item, dict) and "id" in item]
+
+
+class CachedResponse:
+    """An encoded response"""
+
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class ResponseCache(LocalCache):
+    """Encoded responses by key, least recently used first out"""
+
+    def __init__(
+        self,
+        ttl: float = RESPONSE_CACHE_TTL,
+        max_entries: int = RESPONSE_CACHE_ENTRIES,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        super().__init__(ttl, max_entries, clock)
+
+
+class CacheRule:
+    """Paths to cache and how to tag their responses
+
+    ``tags`` gets the path match and the decoded response body.
+    """
+
+    def __init__(self, pattern: str, tags: Callable[[re.Match, object], Iterable[str]]):
+        self.pattern = re.compile(pattern)
+        self.tags = tags
+
+
+class ResponseCacheMiddleware:
+    """Serve GET requests on the ruled paths from the response cache
+
+    Misses run the app as usual and store a complete 200 JSON body. Responses
+    that set cookies, forbid storing or carry their own ETag are passed
+    through, since they are private or already versioned.
+    """
+
+    def __init__(self, app: ASGIApp, rules: Sequence[CacheRule], cache: Optional[ResponseCache] = None):
+        self.app = app
+        self.rules = rules
+        self.cache = cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"].rstrip("/") or "/"
+        for rule in self.rules:
+            match = rule.pattern.fullmatch(path)
+            if match:
+                break
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        cache = self.cache if self.cache is not None else get_response_cache()
+        key = cache_key(path, scope["query_string"])
+        entry = cache.get(key)
+        if entry is not None:
+            await send({"type": "http.response.start", "status": entry.status, "headers": entry.headers + [(b"x-cache", b"HIT")]})
+            await send({"type": "http.response.body", "body": entry.body})
+            return
+
+        generation = cache.generation
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+
+        async def send_and_capture(message: Message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"x-cache", b"MISS")])
+            elif message["type"] == "http.response.body" and start is not None:
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    self._store(cache, key, rule, match, start, b"".join(chunks), generation)
+            await send(message)
+
+        await self.app(scope, receive, send_and_capture)
+
+    @staticmethod
+    def _store(cache: ResponseCache, key: str, rule: CacheRule, match: re.Match, start: Message, body: bytes, generation: int):
+        headers = list(start.get("headers", []))
+        names = {name.lower(): value.lower() for name, value in headers}
+        if (
+            start["status"] != 200
+            or not names.get(b"content-type", b"").startswith(b"application/json")
+            or b"set-cookie" in names
+            or b"etag" in names
+            or any(word in names.get(b"cache-control", b"") for word in (b"no-store", b"private"))
+        ):
+            return
+        cache.put(key, CachedResponse(start["status"], headers, body), rule.tags(match, orjson.loads(body)), generation)
+
+
+# Read endpoints answered from the cache, tagged with the records they show.
+# The first matching rule applies.
+RESPONSE_CACHE_RULES = [
+    CacheRule(r"/api/videos(/featured|/popular)?", lambda match, data: ["videos", *listed_ids(data, "video")]),
+    CacheRule(r"/api/videos/(?P<id>[^/]+)", lambda match, data: [f"video:{match['id']}"]),
+    CacheRule(r"/api/awards/leaderboard/(?P<id>[^/]+)/rank", lambda match, data: ["awards", f"video:{match['id']}"]),
+    CacheRule(r"/api/awards/.+", lambda match, data: ["awards", *listed_ids(data, "video")]),
+    CacheRule(r"/api/users/profile/(?P<id>[^/]+)", lambda match, data: [f"user:{match['id']}"])
+]
+
+
+_response_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> ResponseCache:
+    """Get the shared response cache"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
+
+def set_response_cache(cache: Optional[ResponseCache]):
+    """Replace the shared response cache, e.g. in tests"""
+    global _response_cache
+    _response_cache = cache
+
+def invalidate_responses(*tags: str) -> int:
+    """Drop cached responses carrying any of the tags"""
+    return get_response_cache().invalidate(*tags)
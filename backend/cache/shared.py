@@ -0,0 +1,402 @@
+"""Two-tier cache for loaded records: process memory, then a shared server
+
+Values are cached as orjson bytes under a key, with tags such as
+``video:{id}`` that the data layer invalidates on writes. The local tier is
+a least recently used map in each worker. When REDIS_URL is set, a shared
+tier on a Redis server lets every worker reuse what one of them
+loaded. Invalidations are published on the server too, and each worker
+that ``listen``s drops the same tags from its local tier and from any
+other local caches it follows, such as the response cache. Local entries
+only live for LOCAL_CACHE_TTL as well, which bounds how long an
+invalidation lost with a dropped connection is missed.
+
+Concurrent misses for one key in a worker share a single load, and across
+workers a short lock on the shared tier lets one of them load while the
+others wait for its result. If the shared tier is unreachable the cache
+carries on with the local tier alone and retries the server later.
+
+Entries have a soft and a hard TTL. Past the soft TTL (CACHE_TTL) an entry
+is stale: it is still served until the hard TTL (CACHE_TTL plus
+CACHE_STALE_TTL) while a single background refresh reloads it, so an
+expiring hot key never sends its readers to the backend together. Refreshes
+also start early at random, more likely the closer the entry is to going
+stale and the longer it took to load, which spreads them out before
+expiry instead of at it.
+"""
+import asyncio
+import inspect
+import logging
+import math
+import random
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+import orjson
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.exceptions import RedisError
+
+from cache.local import LocalCache
+from settings import env_float, env_str
+
+logger = logging.getLogger(__name__)
+
+# Shared cache settings
+CACHE_TTL = env_float("CACHE_TTL", 60)
+CACHE_STALE_TTL = env_float("CACHE_STALE_TTL", 30)
+REDIS_URL = env_str("REDIS_URL")
+LOCAL_CACHE_TTL = env_float("LOCAL_CACHE_TTL", 5)
+LOCAL_CACHE_ENTRIES = 10_000
+EARLY_REFRESH_BETA = 1.0 # above 1 refreshes earlier, below 1 later
+LOAD_LOCK_SECONDS = 2.0 # how long other workers wait for one worker's load
+LOAD_POLL_SECONDS = 0.02
+SHARED_RETRY_SECONDS = 5.0 # how long to skip the shared tier after it fails
+SHARED_POOL_SIZE = 8
+SHARED_TIMEOUT = 0.5 # seconds
+INVALIDATION_CHANNEL = "cache:invalidations"
+LISTEN_POLL_SECONDS = 0.25 # shorter than SHARED_TIMEOUT, so an idle subscription is not timed out
+
+# Deletes a load lock only while it still holds the token of the worker releasing it
+RELEASE_LOCK_SCRIPT = """if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0"""
+
+Tags = Union[Iterable[str], Callable[[Any], Iterable[str]]]
+
+SHARED_ERRORS = (OSError, EOFError, asyncio.TimeoutError, RedisError)
+
+
+class CachedValue:
+    """An encoded value, when it goes stale and how long it took to load"""
+
+    __slots__ = ("body", "fresh_until", "load_seconds")
+
+    def __init__(self, body: bytes, fresh_until: float, load_seconds: float):
+        self.body = body
+        self.fresh_until = fresh_until
+        self.load_seconds = load_seconds
+
+    def encode(self) -> bytes:
+        """Encode for the shared tier, behind a one-line header"""
+        return b"%.6f %.6f\n" % (self.fresh_until, self.load_seconds) + self.body
+
+    @classmethod
+    def decode(cls, data: bytes) -> "CachedValue":
+        header, _, body = data.partition(b"\n")
+        fresh_until, load_seconds = header.split()
+        return cls(body, float(fresh_until), float(load_seconds))
+
+
+class TieredCache:
+    """Values by key in a local tier and an optional shared tier
+
+    The clock is wall time, since workers compare the soft expiry of shared
+    entries. ``loads`` counts the loader calls this cache made, e.g. for
+    tests.
+    """
+
+    def __init__(
+        self,
+        shared: Optional[Redis] = None,
+        ttl: float = CACHE_TTL,
+        stale_ttl: float = CACHE_STALE_TTL,
+        local_ttl: float = LOCAL_CACHE_TTL,
+        max_entries: int = LOCAL_CACHE_ENTRIES,
+        beta: float = EARLY_REFRESH_BETA,
+        clock: Callable[[], float] = time.time
+    ):
+        self.shared = shared
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.local_ttl = local_ttl
+        self.beta = beta
+        self.local = LocalCache(ttl + stale_ttl, max_entries, clock)
+        self.loads = 0
+        self._clock = clock
+        self._flights: Dict[str, asyncio.Task] = {}
+        self._pending_tags: List[str] = []
+        self._flushing: Optional[asyncio.Task] = None
+        self._shared_down_until = 0.0
+        # Identifies this cache's own invalidations on the channel
+        self._origin = uuid.uuid4().hex
+        self._listener: Optional[asyncio.Task] = None
+
+    async def get_or_load(
+        self,
+        key: str,
+        load: Callable[[], Any],
+        tags: Tags = (),
+        ttl: Optional[float] = None,
+        stale_ttl: Optional[float] = None
+    ) -> Any:
+        """Get the value for a key, loading and caching it on a miss
+
+        ``load`` may be a plain function or a coroutine function; a ``None``
+        result is returned but not cached. ``tags`` may be a function of the
+        loaded value. ``ttl`` and ``stale_ttl`` override the soft TTL and how
+        long past it the value may be served while it is refreshed. Every
+        caller gets its own decoded copy.
+        """
+        await self.flush_invalidations()
+        entry = self.local.get(key)
+        if entry is None:
+            entry = await asyncio.shield(self._flight(key, load, tags, ttl, stale_ttl))
+            if entry is None:
+                return None
+        if self._should_refresh(entry):
+            flight = self._flight(key, load, tags, ttl, stale_ttl, refresh=True)
+            flight.add_done_callback(self._log_refresh_error)
+        return orjson.loads(entry.body)
+
+    def invalidate(self, *tags: str) -> int:
+        """Drop values carrying any of the tags, returning how many were local
+
+        Invalidated values are dropped rather than served stale. The local
+        tier is cleared at once. The shared tier is cleared in the background
+        if an event loop is running, otherwise before the next lookup.
+        """
+        removed = self.local.invalidate(*tags)
+        if self.shared is not None:
+            self._pending_tags.extend(tags)
+            try:
+                self._flushing = asyncio.get_running_loop().create_task(self._flush())
+            except RuntimeError:
+                pass
+        return removed
+
+    async def flush_invalidations(self):
+        """Clear invalidated tags from the shared tier, including ones already being cleared"""
+        flushing = self._flushing
+        if flushing is not None and not flushing.done() and flushing.get_loop() is asyncio.get_running_loop():
+            await asyncio.shield(flushing)
+        await self._flush()
+
+    async def _flush(self):
+        if not self._pending_tags:
+            return
+        tags, self._pending_tags = list(dict.fromkeys(self._pending_tags)), []
+        members = await self._shared([("SMEMBERS", f"tag:{tag}") for tag in tags])
+        if members is None:
+            # Left to expire with the shared TTL
+            return
+        keys = {b"cache:" + key for reply in members if isinstance(reply, (list, set)) for key in reply}
+        await self._shared([
+            ("DEL", *keys, *(f"tag:{tag}" for tag in tags)),
+            ("PUBLISH", INVALIDATION_CHANNEL, orjson.dumps([self._origin, tags]))
+        ])
+
+    def listen(self, *followers: LocalCache):
+        """Apply the invalidations other workers publish here, until ``stop_listening``
+
+        ``followers`` are other local caches, such as the response cache,
+        that drop the same tags. Messages published while the subscription
+        is down are lost, so every local entry is dropped each time it is
+        established.
+        """
+        if self.shared is None or self._listener is not None:
+            return
+        self._listener = asyncio.get_running_loop().create_task(self._listen((self.local, *followers)))
+
+    async def stop_listening(self):
+        """Stop applying other workers' invalidations"""
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.cancel()
+            try:
+                await listener
+            except asyncio.CancelledError:
+                pass
+
+    async def _listen(self, caches: Sequence[LocalCache]):
+        while True:
+            pubsub = self.shared.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                for cache in caches:
+                    cache.clear()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=LISTEN_POLL_SECONDS)
+                    if message is None:
+                        continue
+                    origin, tags = orjson.loads(message["data"])
+                    if origin != self._origin:
+                        for cache in caches:
+                            cache.invalidate(*tags)
+            except SHARED_ERRORS as e:
+                logger.warning("Lost the shared cache invalidation channel, retrying: %r", e)
+            finally:
+                await pubsub.reset()
+            await asyncio.sleep(SHARED_RETRY_SECONDS)
+
+    def _should_refresh(self, entry: CachedValue) -> bool:
+        """Whether an entry is stale, or chosen at random for an early refresh
+
+        The chance grows towards the soft expiry and with the load time, so
+        slow loads start sooner.
+        """
+        headroom = -entry.load_seconds * self.beta * math.log(1.0 - random.random())
+        return self._clock() + headroom >= entry.fresh_until
+
+    def _flight(
+        self,
+        key: str,
+        load: Callable[[], Any],
+        tags: Tags,
+        ttl: Optional[float],
+        stale_ttl: Optional[float],
+        refresh: bool = False
+    ) -> asyncio.Task:
+        """Join the load in progress for a key in this worker, or start one"""
+        loop = asyncio.get_running_loop()
+        flight = self._flights.get(key)
+        if flight is None or flight.done() or flight.get_loop() is not loop:
+            flight = self._flights[key] = loop.create_task(self._fill(key, load, tags, ttl, stale_ttl, refresh))
+            flight.add_done_callback(lambda done: self._flights.pop(key, None) if self._flights.get(key) is done else None)
+        return flight
+
+    @staticmethod
+    def _log_refresh_error(flight: asyncio.Task):
+        if not flight.cancelled() and flight.exception() is not None:
+            logger.error("Background cache refresh failed, serving the stale value", exc_info=flight.exception())
+
+    async def _fill(
+        self,
+        key: str,
+        load: Callable[[], Any],
+        tags: Tags,
+        ttl: Optional[float],
+        stale_ttl: Optional[float],
+        refresh: bool
+    ) -> Optional[CachedValue]:
+        """Get a value from the shared tier or the loader and cache it locally
+
+        A miss takes any shared value, stale or not, and leaves refreshing it
+        to the caller; a refresh only takes a shared value another worker
+        already refreshed.
+        """
+        generation = self.local.generation
+        entry = await self._shared_get(key)
+        if entry is None or (refresh and entry.fresh_until <= self._clock()):
+            lock = await self._lock(key)
+            entry = await self._wait_for_load(key) if lock is None else None
+            if entry is None:
+                try:
+                    entry = await self._load(load, self.ttl if ttl is None else ttl)
+                    if entry is not None and generation == self.local.generation:
+                        await self._shared_set(key, entry, self._tags(tags, entry), stale_ttl)
+                finally:
+                    if lock:
+                        # The lock may have expired and been taken by another worker
+                        await self._shared([("EVAL", RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", lock)])
+                if entry is None:
+                    return None
+        self._store_local(key, entry, self._tags(tags, entry), generation, stale_ttl)
+        return entry
+
+    async def _load(self, load: Callable[[], Any], ttl: float) -> Optional[CachedValue]:
+        self.loads += 1
+        started = self._clock()
+        value = load()
+        if inspect.isawaitable(value):
+            value = await value
+        if value is None:
+            return None
+        finished = self._clock()
+        return CachedValue(orjson.dumps(value), finished + ttl, finished - started)
+
+    @staticmethod
+    def _tags(tags: Tags, entry: CachedValue) -> Iterable[str]:
+        return tags(orjson.loads(entry.body)) if callable(tags) else tags
+
+    def _hard_ttl(self, entry: CachedValue, stale_ttl: Optional[float]) -> float:
+        """Seconds until an entry may no longer be served, stale or not"""
+        return entry.fresh_until + (self.stale_ttl if stale_ttl is None else stale_ttl) - self._clock()
+
+    def _store_local(self, key: str, entry: CachedValue, tags: Iterable[str], generation: int, stale_ttl: Optional[float]):
+        ttl = self._hard_ttl(entry, stale_ttl)
+        if self.shared is not None:
+            ttl = min(ttl, self.local_ttl)
+        self.local.put(key, entry, tags, generation, ttl)
+
+    async def _lock(self, key: str) -> Optional[str]:
+        """Try to become the worker loading a key
+
+        Returns the lock token, ``""`` if there is no shared tier to
+        coordinate through, or ``None`` if another worker holds the lock.
+        """
+        token = uuid.uuid4().hex
+        replies = await self._shared([("SET", f"lock:{key}", token, "NX", "PX", int(LOAD_LOCK_SECONDS * 1000))])
+        if replies is None:
+            return ""
+        return token if replies[0] is True else None
+
+    async def _wait_for_load(self, key: str) -> Optional[CachedValue]:
+        """Wait for the worker holding the lock to store its load, giving up at the lock timeout"""
+        deadline = self._clock() + LOAD_LOCK_SECONDS
+        while self._clock() < deadline:
+            await asyncio.sleep(LOAD_POLL_SECONDS)
+            replies = await self._shared([("GET", f"cache:{key}"), ("EXISTS", f"lock:{key}")])
+            if replies is None:
+                return None
+            data, locked = replies
+            if not locked:
+                return CachedValue.decode(data) if isinstance(data, bytes) else None
+        return None
+
+    async def _shared_get(self, key: str) -> Optional[CachedValue]:
+        replies = await self._shared([("GET", f"cache:{key}")])
+        return CachedValue.decode(replies[0]) if replies and isinstance(replies[0], bytes) else None
+
+    async def _shared_set(self, key: str, entry: CachedValue, tags: Iterable[str], stale_ttl: Optional[float]):
+        ttl = max(1, math.ceil(self._hard_ttl(entry, stale_ttl)))
+        commands = [("SET", f"cache:{key}", entry.encode(), "EX", ttl)]
+        for tag in tags:
+            commands += [("SADD", f"tag:{tag}", key), ("EXPIRE", f"tag:{tag}", ttl)]
+        await self._shared(commands)
+
+    async def _shared(self, commands: Sequence[Sequence]) -> Optional[List[Any]]:
+        """Run commands on the shared tier, or return ``None`` if it is off or failing"""
+        if self.shared is None or self._clock() < self._shared_down_until:
+            return None
+        try:
+            pipeline = self.shared.pipeline(transaction=False)
+            for command in commands:
+                pipeline.execute_command(*command)
+            # Error replies are returned in place, so one failed command does not hide the others
+            return await pipeline.execute(raise_on_error=False)
+        except SHARED_ERRORS as e:
+            logger.warning("Shared cache unavailable, using the local tier only: %r", e)
+            self._shared_down_until = self._clock() + SHARED_RETRY_SECONDS
+            return None
+
+
+def connect_shared(url: str, pool_size: int = SHARED_POOL_SIZE, timeout: float = SHARED_TIMEOUT) -> Redis:
+    """Open a client for the shared tier with a bounded pool of connections
+
+    Commands wait up to ``timeout`` for a free connection, and for the
+    server, rather than opening more connections under load.
+    """
+    pool = BlockingConnectionPool.from_url(
+        url,
+        max_connections=pool_size,
+        timeout=timeout,
+        socket_timeout=timeout,
+        socket_connect_timeout=timeout
+    )
+    return Redis(connection_pool=pool)
+
+
+_shared_cache: Optional[TieredCache] = None
+
+def get_shared_cache() -> TieredCache:
+    """Get the cache configured by CACHE_TTL, CACHE_STALE_TTL and REDIS_URL"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = TieredCache(connect_shared(REDIS_URL) if REDIS_URL else None)
+    return _shared_cache
+
+def set_shared_cache(cache: Optional[TieredCache]):
+    """Replace the shared cache, e.g. in tests"""
+    global _shared_cache
+    _shared_cache = cache
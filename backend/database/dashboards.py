@@ -0,0 +1,231 @@
+import threading
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from database.rollups import METRICS, AnalyticsRollups
+
+# Days in the dashboard's current period; changes compare it with the period before
+DASHBOARD_DAYS = 30
+TOP_VIDEOS = 5
+
+# Catalog fields a summary keeps per video
+VIDEO_FIELDS = ("title", "views", "averageRating", "ratingCount", "shares")
+
+
+def percentage_change(current: int, previous: int) -> float:
+    """Change from the previous period as a percentage"""
+    if not previous:
+        return 100.0 if current else 0.0
+    return round((current - previous) / previous * 100, 1)
+
+def average_rating(points: int, ratings: int) -> float:
+    """Mean rating in stars from a sum of half stars"""
+    return points / 2 / ratings if ratings else 0.0
+
+
+class FilmmakerSummary:
+    """One filmmaker's dashboard, materialized from the catalog and rollups
+
+    ``daily`` holds the rollup counters for the current and previous period
+    as a (metrics, 2 * days) array ending on ``as_of``, and ``ranked`` keeps
+    ``(-views, id)`` keys sorted for the top videos. ``response`` is the
+    rendered dashboard, dropped whenever the summary changes.
+    """
+
+    __slots__ = (
+        "as_of", "source", "videos", "ranked", "views", "shares",
+        "rating_count", "rating_sum", "watch_time", "daily", "response"
+    )
+
+    def __init__(self, as_of: date, source: AnalyticsRollups, days: int):
+        self.as_of = as_of
+        self.source = source
+        self.videos: Dict[str, dict] = {}
+        self.ranked: List[Tuple[int, str]] = []
+        self.views = 0
+        self.shares = 0
+        self.rating_count = 0
+        self.rating_sum = 0.0
+        self.watch_time = 0
+        self.daily = np.zeros((len(METRICS), 2 * days), dtype=np.int64)
+        self.response: Optional[dict] = None
+
+    @property
+    def first_day(self) -> date:
+        return self.as_of - timedelta(days=self.daily.shape[1] - 1)
+
+    def set_video(self, video: dict):
+        """Add a video or replace its catalog fields"""
+        self.drop_video(video["id"])
+        fields = {field: video[field] for field in VIDEO_FIELDS}
+        self.videos[video["id"]] = fields
+        insort(self.ranked, (-fields["views"], video["id"]))
+        self.views += fields["views"]
+        self.shares += fields["shares"]
+        self.rating_count += fields["ratingCount"]
+        self.rating_sum += fields["averageRating"] * fields["ratingCount"]
+        self.response = None
+
+    def drop_video(self, video_id: str):
+        fields = self.videos.pop(video_id, None)
+        if fields is None:
+            return
+        key = (-fields["views"], video_id)
+        position = bisect_left(self.ranked, key)
+        if position < len(self.ranked) and self.ranked[position] == key:
+            del self.ranked[position]
+        self.views -= fields["views"]
+        self.shares -= fields["shares"]
+        self.rating_count -= fields["ratingCount"]
+        self.rating_sum -= fields["averageRating"] * fields["ratingCount"]
+        self.response = None
+
+
+class FilmmakerDashboards:
+    """Per-filmmaker dashboard summaries kept up to date as events arrive
+
+    A summary is built once from the filmmaker's catalog rows and rollups,
+    then every later view, rating, share or watch time increment for one of
+    their videos is added to it in place, and catalog changes replace that
+    video's fields. The rendered dashboard is cached on the summary until
+    the next change, so repeated loads cost a dict lookup however many
+    videos the filmmaker has.
+
+    A summary is rebuilt when the day rolls over (its periods would shift),
+    when the rollups it was built from are replaced, or after ``invalidate``.
+    Callers must not mutate the dashboards they are given.
+    """
+
+    def __init__(self, days: int = DASHBOARD_DAYS, clock: Callable[[], datetime] = datetime.utcnow):
+        self.days = days
+        self._clock = clock
+        self._rows = {metric: i for i, metric in enumerate(METRICS)}
+        self._summaries: Dict[str, FilmmakerSummary] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        user_id: str,
+        load_videos: Callable[[], Iterable[dict]],
+        rollups: AnalyticsRollups,
+        locations: Optional[Callable[[List[str]], List[dict]]] = None
+    ) -> dict:
+        """Get a filmmaker's dashboard, building it with ``load_videos`` if needed
+
+        ``locations`` gives the distribution of views by location across the
+        filmmaker's videos. Views carry their location, so it is rendered
+        along with the rest and refreshed by the same view events.
+        """
+        today = self._clock().date()
+        with self._lock:
+            summary = self._summaries.get(user_id)
+            if summary is None or summary.as_of != today or summary.source is not rollups:
+                summary = self._summaries[user_id] = self._build(today, load_videos(), rollups)
+            if summary.response is None:
+                summary.response = self._render(summary)
+                summary.response["geographicDistribution"] = [
+                    {"region": share["name"], "percentage": share["percentage"]}
+                    for share in (locations(list(summary.videos)) if locations else [])
+                ]
+            return summary.response
+
+    def record_activity(self, user_id: str, day: date, write: Callable[[], None], **increments):
+        """Write rollup increments for one of a filmmaker's videos and add them to their summary
+
+        ``write`` stores the increments in the rollups. It runs under the
+        same lock as summary builds, so a build sees each event exactly once.
+        """
+        with self._lock:
+            write()
+            summary = self._summaries.get(user_id)
+            if summary is None:
+                return
+            if day > summary.as_of:
+                # A new day has started, so both periods move
+                del self._summaries[user_id]
+                return
+
+            summary.watch_time += increments.get("watchTimeSeconds", 0)
+            column = (day - summary.first_day).days
+            if column >= 0:
+                for metric, amount in increments.items():
+                    summary.daily[self._rows[metric], column] += amount
+            summary.response = None
+
+    def update_video(self, video: dict):
+        """Refresh a video's catalog fields after it was added or changed"""
+        with self._lock:
+            summary = self._summaries.get(video["userId"])
+            if summary is not None:
+                summary.set_video(video)
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """Drop one filmmaker's summary, or every summary"""
+        with self._lock:
+            if user_id is None:
+                self._summaries.clear()
+            else:
+                self._summaries.pop(user_id, None)
+
+    def _build(self, today: date, videos: Iterable[dict], rollups: AnalyticsRollups) -> FilmmakerSummary:
+        summary = FilmmakerSummary(today, rollups, self.days)
+        for video in videos:
+            summary.set_video(video)
+
+        video_ids = list(summary.videos)
+        summary.daily = rollups.counters.series(video_ids, summary.first_day, today)
+        summary.watch_time = rollups.counters.totals_many(video_ids, date.min, today)["watchTimeSeconds"]
+        return summary
+
+    def _render(self, summary: FilmmakerSummary) -> dict:
+        previous = summary.daily[:, :self.days].sum(axis=1)
+        current = summary.daily[:, self.days:].sum(axis=1)
+        first = summary.as_of - timedelta(days=self.days - 1)
+
+        views_by_day = []
+        for offset, counters in enumerate(summary.daily[:, self.days:].T.tolist()):
+            day = dict(zip(METRICS, counters))
+            views = day["views"]
+            views_by_day.append({
+                "date": (first + timedelta(days=offset)).isoformat(),
+                "views": views,
+                "averageWatchTime": round(day["watchTimeSeconds"] / views, 1) if views else 0,
+                "completionRate": round(day["completions"] / views * 100, 1) if views else 0,
+                "shares": day["shares"],
+                "ratings": day["ratings"]
+            })
+
+        current = dict(zip(METRICS, current.tolist()))
+        previous = dict(zip(METRICS, previous.tolist()))
+        rating_change = 0.0
+        if current["ratings"] and previous["ratings"]:
+            rating_change = round(
+                average_rating(current["ratingPoints"], current["ratings"])
+                - average_rating(previous["ratingPoints"], previous["ratings"]),
+                2
+            )
+
+        return {
+            "totalViews": summary.views,
+            "totalVideos": len(summary.videos),
+            "totalWatchTime": summary.watch_time,
+            "averageRating": round(summary.rating_sum / summary.rating_count, 2) if summary.rating_count else 0,
+            "totalShares": summary.shares,
+            "totalRatings": summary.rating_count,
+            "viewsChange": percentage_change(current["views"], previous["views"]),
+            "sharesChange": percentage_change(current["shares"], previous["shares"]),
+            "ratingChange": rating_change,
+            "topVideos": [
+                {
+                    "id": video_id,
+                    "title": summary.videos[video_id]["title"],
+                    "views": summary.videos[video_id]["views"],
+                    "averageRating": summary.videos[video_id]["averageRating"]
+                }
+                for _, video_id in summary.ranked[:TOP_VIDEOS]
+            ],
+            "viewsByDay": views_by_day
+        }
@@ -0,0 +1,168 @@
+import hashlib
+import math
+from typing import Iterable, Optional
+
+import numpy as np
+
+# Register index bits. 2**12 registers give a relative standard error of
+# 1.04 / sqrt(4096) = 1.6%: about 68% of estimates are within 1.6% of the
+# true count, 95% within 3.3% and 99.7% within 4.9%, at any cardinality.
+DEFAULT_PRECISION = 12
+
+
+def hash_item(item: str) -> int:
+    """Hash a viewer ID to 64 well-mixed bits"""
+    return int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big")
+
+
+def _sigma(x: float) -> float:
+    if x == 1:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+def _tau(x: float) -> float:
+    if x == 0 or x == 1:
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+class HyperLogLog:
+    """Mergeable distinct counter in a fixed 2**precision bytes
+
+    Small sketches keep the exact set of item hashes and switch to the dense
+    register array once that set would take more room than the registers,
+    so the many buckets that only ever see a handful of viewers stay small
+    and exact. Dense sketches are counted with Ertl's improved estimator
+    ("New cardinality estimation algorithms for HyperLogLog sketches",
+    2017), which avoids the bias of the classic estimate around 2.5 times
+    the register count; with 64-bit hashes no large-range correction is
+    needed.
+
+    Sketches with the same precision merge by taking the larger register,
+    which is exactly the sketch of the union, so day sketches can be
+    combined into any longer period and sketches from several workers can
+    be combined via ``to_bytes``/``from_bytes``.
+    """
+
+    __slots__ = ("precision", "_registers", "_hashes")
+
+    def __init__(self, precision: int = DEFAULT_PRECISION):
+        if not 4 <= precision <= 18:
+            raise ValueError("Precision must be between 4 and 18")
+        self.precision = precision
+        self._registers: Optional[bytearray] = None
+        self._hashes: Optional[set] = set()
+
+    @property
+    def size(self) -> int:
+        """Number of registers"""
+        return 1 << self.precision
+
+    @property
+    def is_dense(self) -> bool:
+        return self._registers is not None
+
+    def add(self, item: str):
+        """Count one item"""
+        self.add_hash(hash_item(item))
+
+    def add_hash(self, hashed: int):
+        if self._hashes is not None:
+            self._hashes.add(hashed)
+            if len(self._hashes) > self._sparse_limit():
+                self._densify()
+            return
+
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def update(self, items: Iterable[str]):
+        for item in items:
+            self.add(item)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Fold another sketch into this one"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precisions")
+
+        if other._hashes is not None:
+            for hashed in other._hashes:
+                self.add_hash(hashed)
+            return self
+
+        if self._hashes is not None:
+            self._densify()
+        mine = np.frombuffer(self._registers, dtype=np.uint8)
+        np.maximum(mine, np.frombuffer(other._registers, dtype=np.uint8), out=mine)
+        return self
+
+    def copy(self) -> "HyperLogLog":
+        sketch = HyperLogLog(self.precision)
+        if self._hashes is not None:
+            sketch._hashes = set(self._hashes)
+        else:
+            sketch._hashes = None
+            sketch._registers = bytearray(self._registers)
+        return sketch
+
+    def count(self) -> int:
+        """Estimate how many distinct items were added"""
+        if self._hashes is not None:
+            return len(self._hashes)
+
+        # Ertl's improved raw estimator, unbiased from empty to huge without
+        # the empirical bias tables of HyperLogLog++
+        m = self.size
+        q = 64 - self.precision
+        histogram = np.bincount(np.frombuffer(self._registers, dtype=np.uint8), minlength=q + 2).tolist()
+
+        z = m * _tau(1 - histogram[q + 1] / m)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + histogram[k])
+        z += m * _sigma(histogram[0] / m)
+        return int(round(m * m / (2 * math.log(2)) / z))
+
+    def to_bytes(self) -> bytes:
+        """Serialize to the dense register form for sending to other workers"""
+        if self._hashes is not None:
+            dense = self.copy()
+            dense._densify()
+            return bytes([self.precision]) + bytes(dense._registers)
+        return bytes([self.precision]) + bytes(self._registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        sketch = cls(data[0])
+        if len(data) != 1 + sketch.size:
+            raise ValueError("Serialized sketch has the wrong number of registers")
+        sketch._hashes = None
+        sketch._registers = bytearray(data[1:])
+        return sketch
+
+    def _sparse_limit(self) -> int:
+        # A set entry costs roughly 64 bytes, a register one byte
+        return self.size // 64
+
+    def _densify(self):
+        hashes = self._hashes
+        self._hashes = None
+        self._registers = bytearray(self.size)
+        for hashed in hashes:
+            self.add_hash(hashed)
@@ -0,0 +1,312 @@
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from database.models import parse_upload_date
+
+
+def score_key(video: dict) -> tuple:
+    """Get the key a video is ranked by: highest stored score first"""
+    return (-video["score"], video["id"])
+
+
+class RankedIndex:
+    """Sorted keys with logarithmic insert, delete, rank and top-N
+
+    Keys are kept in sorted blocks of at most ``2 * LOAD`` keys, with the
+    last key of every block in ``_maxes`` to find a key's block by binary
+    search. A Fenwick tree over the block sizes gives the number of keys
+    before any block in O(log blocks), so the rank of a key and the key at a
+    position are both logarithmic, and an insert or delete only shifts keys
+    within one block. Blocks are split when they grow past ``2 * LOAD`` and
+    dropped when empty, the only times the tree is rebuilt.
+    """
+
+    LOAD = 512
+
+    def __init__(self, keys: Iterable[tuple] = ()):
+        keys = sorted(keys)
+        self._blocks: List[List[tuple]] = [keys[i:i + self.LOAD] for i in range(0, len(keys), self.LOAD)]
+        self._maxes: List[tuple] = [block[-1] for block in self._blocks]
+        self._length = len(keys)
+        self._rebuild_tree()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __contains__(self, key: tuple) -> bool:
+        return self.rank(key) is not None
+
+    def add(self, key: tuple):
+        """Insert a key"""
+        self._length += 1
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+            self._rebuild_tree()
+            return
+
+        index = bisect_left(self._maxes, key)
+        if index == len(self._blocks):
+            index -= 1
+        block = self._blocks[index]
+        insort(block, key)
+        self._maxes[index] = block[-1]
+
+        if len(block) > 2 * self.LOAD:
+            self._blocks[index:index + 1] = [block[:self.LOAD], block[self.LOAD:]]
+            self._maxes[index:index + 1] = [block[self.LOAD - 1], block[-1]]
+            self._rebuild_tree()
+        else:
+            self._tree_add(index, 1)
+
+    def discard(self, key: tuple) -> bool:
+        """Remove a key, returning whether it was present"""
+        index = bisect_left(self._maxes, key)
+        if index == len(self._blocks):
+            return False
+        block = self._blocks[index]
+        position = bisect_left(block, key)
+        if position == len(block) or block[position] != key:
+            return False
+
+        del block[position]
+        self._length -= 1
+        if block:
+            self._maxes[index] = block[-1]
+            self._tree_add(index, -1)
+        else:
+            del self._blocks[index]
+            del self._maxes[index]
+            self._rebuild_tree()
+        return True
+
+    def rank(self, key: tuple) -> Optional[int]:
+        """Get the zero-based position of a key, or None if it is not present"""
+        index = bisect_left(self._maxes, key)
+        if index == len(self._blocks):
+            return None
+        block = self._blocks[index]
+        position = bisect_left(block, key)
+        if position == len(block) or block[position] != key:
+            return None
+        return self._prefix(index) + position
+
+    def slice(self, start: int, stop: int) -> List[tuple]:
+        """Get the keys from position ``start`` up to ``stop``"""
+        start, stop = max(start, 0), min(stop, self._length)
+        if start >= stop:
+            return []
+
+        index, offset = self._locate(start)
+        keys = []
+        wanted = stop - start
+        while len(keys) < wanted:
+            keys.extend(self._blocks[index][offset:offset + wanted - len(keys)])
+            index, offset = index + 1, 0
+        return keys
+
+    def top(self, n: int) -> List[tuple]:
+        """Get the first ``n`` keys"""
+        return self.slice(0, n)
+
+    # Fenwick tree over block sizes
+    def _rebuild_tree(self):
+        tree = [0] + [len(block) for block in self._blocks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, index: int, delta: int):
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, index: int) -> int:
+        # Number of keys in the blocks before ``index``
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def _locate(self, position: int) -> Tuple[int, int]:
+        # Find the block holding ``position`` by descending the tree
+        index = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            following = index + step
+            if following < len(self._tree) and self._tree[following] <= position:
+                index = following
+                position -= self._tree[following]
+            step >>= 1
+        return index, position
+
+
+class LeaderboardIndex:
+    """Public videos ranked by score per (category, timeframe)
+
+    Every public video is on the "all" board and its category's board for
+    each timeframe it was uploaded within, like the windows of
+    ``TopViewsIndex``. Each board is a ``RankedIndex`` of ``score_key``
+    keys on the video's stored composite score, so a score change moves one
+    key per board, an update that leaves the score alone moves nothing, and
+    top-N and rank queries are logarithmic in the size of the board. Videos that have
+    aged out of a window are evicted from the front of its upload-ordered
+    list when the window is read.
+    """
+
+    WINDOWS = {
+        "week": timedelta(days=7),
+        "month": timedelta(days=30),
+        "year": timedelta(days=365)
+    }
+    TIMEFRAMES = tuple(WINDOWS) + ("all",)
+
+    def __init__(self, clock: Callable[[], datetime] = datetime.utcnow):
+        self._clock = clock
+        self._boards: Dict[Tuple[str, str], RankedIndex] = {}
+        # Key, category and upload date each ranked video is filed under
+        self._entries: Dict[str, Tuple[tuple, str, str]] = {}
+        self._members: Dict[str, Dict[str, None]] = {timeframe: {} for timeframe in self.TIMEFRAMES}
+        self._uploaded: Dict[str, List[Tuple[datetime, str]]] = {timeframe: [] for timeframe in self.WINDOWS}
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self._entries
+
+    def add(self, video: dict):
+        """Rank a public video on every board it belongs to"""
+        if not video.get("isPublic"):
+            return
+        key = score_key(video)
+        self._entries[video["id"]] = (key, video["category"], video["uploadDate"])
+        for timeframe, uploaded in self._timeframes(video):
+            self._members[timeframe][video["id"]] = None
+            for category in ("all", video["category"]):
+                self._board(category, timeframe).add(key)
+            if timeframe in self._uploaded:
+                insort(self._uploaded[timeframe], (uploaded, video["id"]))
+
+    def add_many(self, videos: Iterable[dict]):
+        """Rank a batch of videos, sorting each board once"""
+        keys: Dict[Tuple[str, str], List[tuple]] = {}
+        for video in videos:
+            if not video.get("isPublic"):
+                continue
+            key = score_key(video)
+            self._entries[video["id"]] = (key, video["category"], video["uploadDate"])
+            for timeframe, uploaded in self._timeframes(video):
+                self._members[timeframe][video["id"]] = None
+                for category in ("all", video["category"]):
+                    keys.setdefault((category, timeframe), []).append(key)
+                if timeframe in self._uploaded:
+                    self._uploaded[timeframe].append((uploaded, video["id"]))
+
+        for board, board_keys in keys.items():
+            existing = self._boards.get(board)
+            if existing:
+                board_keys += existing.slice(0, len(existing))
+            self._boards[board] = RankedIndex(board_keys)
+        for uploaded in self._uploaded.values():
+            uploaded.sort()
+
+    def remove(self, video_id: str):
+        """Drop a video from every board"""
+        entry = self._entries.pop(video_id, None)
+        if entry is None:
+            return
+        key, category, upload_date = entry
+        for timeframe, members in self._members.items():
+            if video_id not in members:
+                continue
+            del members[video_id]
+            self._discard(timeframe, category, key)
+            if timeframe in self._uploaded:
+                self._delete(self._uploaded[timeframe], (parse_upload_date(upload_date), video_id))
+
+    def update(self, video: dict):
+        """Re-rank a video after it changed
+
+        A new score moves its key on each board it is on; a change of
+        visibility, category or upload date re-files it.
+        """
+        video_id = video["id"]
+        entry = self._entries.get(video_id)
+        if entry is None or not video.get("isPublic") or entry[1:] != (video["category"], video["uploadDate"]):
+            self.remove(video_id)
+            self.add(video)
+            return
+
+        old_key, category, upload_date = entry
+        key = score_key(video)
+        if key == old_key:
+            return
+        self._entries[video_id] = (key, category, upload_date)
+        for timeframe, members in self._members.items():
+            if video_id in members:
+                self._discard(timeframe, category, old_key)
+                for board in ("all", category):
+                    self._board(board, timeframe).add(key)
+
+    def top(self, limit: int, category: str = "all", timeframe: str = "all") -> List[str]:
+        """Get the IDs of the highest ranked videos on a board"""
+        board = self._read(category, timeframe)
+        return [key[-1] for key in board.top(max(limit, 0))] if board else []
+
+    def rank(self, video_id: str, category: str = "all", timeframe: str = "all") -> Optional[int]:
+        """Get a video's one-based position on a board, or None if it is not on it"""
+        board = self._read(category, timeframe)
+        entry = self._entries.get(video_id)
+        if board is None or entry is None:
+            return None
+        position = board.rank(entry[0])
+        return position + 1 if position is not None else None
+
+    def size(self, category: str = "all", timeframe: str = "all") -> int:
+        """Count the videos on a board"""
+        board = self._read(category, timeframe)
+        return len(board) if board else 0
+
+    def _timeframes(self, video: dict) -> List[Tuple[str, datetime]]:
+        uploaded = parse_upload_date(video["uploadDate"])
+        now = self._clock()
+        return [
+            (timeframe, uploaded) for timeframe in self.TIMEFRAMES
+            if timeframe == "all" or uploaded >= now - self.WINDOWS[timeframe]
+        ]
+
+    def _board(self, category: str, timeframe: str) -> RankedIndex:
+        board = self._boards.get((category, timeframe))
+        if board is None:
+            board = self._boards[(category, timeframe)] = RankedIndex()
+        return board
+
+    def _read(self, category: str, timeframe: str) -> Optional[RankedIndex]:
+        if timeframe not in self.TIMEFRAMES:
+            raise ValueError(f"Unknown timeframe {timeframe}")
+        if timeframe in self.WINDOWS:
+            self._expire(timeframe)
+        return self._boards.get((category, timeframe))
+
+    def _discard(self, timeframe: str, category: str, key: tuple):
+        for board in ("all", category):
+            self._boards[(board, timeframe)].discard(key)
+
+    def _expire(self, timeframe: str):
+        cutoff = self._clock() - self.WINDOWS[timeframe]
+        uploaded = self._uploaded[timeframe]
+        expired = bisect_left(uploaded, (cutoff, ""))
+        for _, video_id in uploaded[:expired]:
+            del self._members[timeframe][video_id]
+            key, category, _ = self._entries[video_id]
+            self._discard(timeframe, category, key)
+        del uploaded[:expired]
+
+    @staticmethod
+    def _delete(keys: list, key: tuple):
+        position = bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            del keys[position]
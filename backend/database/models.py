@@ -0,0 +1,349 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def parse_upload_date(value: str) -> datetime:
+    """Parse an ISO upload date into a naive UTC datetime"""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class TopViewsIndex:
+    """Public videos ranked by view count, overall and per upload window
+
+    Each timeframe keeps a sorted list of ``(-views, id)`` keys, so the top K
+    videos are the first K entries and a view-count change only moves one key.
+    The week, month and year windows only hold videos uploaded within that
+    window. They also keep their members ordered by upload date, so videos
+    that have aged out are evicted from the front when the window is read.
+    """
+
+    WINDOWS = {
+        "week": timedelta(days=7),
+        "month": timedelta(days=30),
+        "year": timedelta(days=365)
+    }
+
+    def __init__(self, clock: Callable[[], datetime] = datetime.utcnow):
+        self._clock = clock
+        self._ranked: Dict[str, List[Tuple[int, str]]] = {"all": []}
+        self._uploaded: Dict[str, List[Tuple[datetime, str]]] = {}
+        self._members: Dict[str, Dict[str, Tuple[int, str]]] = {"all": {}}
+        for timeframe in self.WINDOWS:
+            self._ranked[timeframe] = []
+            self._uploaded[timeframe] = []
+            self._members[timeframe] = {}
+
+    def add(self, video: dict):
+        """Rank a video in every timeframe it was uploaded within"""
+        key = (-video["views"], video["id"])
+        uploaded = parse_upload_date(video["uploadDate"])
+        now = self._clock()
+
+        self._insert("all", key)
+        for timeframe, window in self.WINDOWS.items():
+            if uploaded >= now - window:
+                self._insert(timeframe, key)
+                insort(self._uploaded[timeframe], (uploaded, video["id"]))
+
+    def add_many(self, videos: Iterable[dict]):
+        """Rank a batch of videos, sorting each timeframe once at the end"""
+        now = self._clock()
+        for video in videos:
+            key = (-video["views"], video["id"])
+            uploaded = parse_upload_date(video["uploadDate"])
+
+            self._ranked["all"].append(key)
+            self._members["all"][video["id"]] = key
+            for timeframe, window in self.WINDOWS.items():
+                if uploaded >= now - window:
+                    self._ranked[timeframe].append(key)
+                    self._members[timeframe][video["id"]] = key
+                    self._uploaded[timeframe].append((uploaded, video["id"]))
+
+        for keys in self._ranked.values():
+            keys.sort()
+        for keys in self._uploaded.values():
+            keys.sort()
+
+    def remove(self, video: dict):
+        """Drop a video from every timeframe"""
+        video_id = video["id"]
+        for timeframe, members in self._members.items():
+            key = members.pop(video_id, None)
+            if key is None:
+                continue
+
+            self._delete(self._ranked[timeframe], key)
+            if timeframe in self._uploaded:
+                self._delete(self._uploaded[timeframe], (parse_upload_date(video["uploadDate"]), video_id))
+
+    def set_views(self, video_id: str, views: int):
+        """Move a video to its new rank after its view count changed"""
+        key = (-views, video_id)
+        for timeframe, members in self._members.items():
+            old_key = members.get(video_id)
+            if old_key is None or old_key == key:
+                continue
+
+            self._delete(self._ranked[timeframe], old_key)
+            insort(self._ranked[timeframe], key)
+            members[video_id] = key
+
+    def top(self, limit: int, timeframe: str = "all") -> List[str]:
+        """Get the IDs of the most viewed videos in a timeframe"""
+        if timeframe not in self._ranked:
+            raise ValueError(f"Unknown timeframe {timeframe}")
+
+        if timeframe in self.WINDOWS:
+            self._expire(timeframe)
+
+        return [video_id for _, video_id in self._ranked[timeframe][:max(limit, 0)]]
+
+    def _insert(self, timeframe: str, key: Tuple[int, str]):
+        insort(self._ranked[timeframe], key)
+        self._members[timeframe][key[1]] = key
+
+    def _expire(self, timeframe: str):
+        cutoff = self._clock() - self.WINDOWS[timeframe]
+        uploaded = self._uploaded[timeframe]
+        expired = bisect_left(uploaded, (cutoff, ""))
+        for _, video_id in uploaded[:expired]:
+            key = self._members[timeframe].pop(video_id)
+            self._delete(self._ranked[timeframe], key)
+        del uploaded[:expired]
+
+    @staticmethod
+    def _delete(keys: list, key: tuple):
+        position = bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            del keys[position]
+
+
+class VideoCatalog:
+    """In-memory video store with a primary-key index and secondary indexes
+
+    Videos are kept in a dict keyed by ``id`` so single-video lookups are O(1).
+    Each field in ``INDEXED_FIELDS`` has a secondary index mapping a field value
+    to the ids that carry it, so filtered listings only touch matching rows.
+    Index buckets are dicts used as insertion-ordered sets, which keeps listings
+    in upload order like the old list did.
+
+    For paginated listings every bucket also keeps a sorted list of
+    ``(uploadDate, id)`` keys, so a page can resume from a key with a binary
+    search instead of skipping over all of the earlier rows. Public videos are
+    also ranked by views in ``top_views`` for the featured and popular lists.
+    """
+
+    INDEXED_FIELDS = ("category", "userId", "isPublic")
+    ORDER_FIELDS = ("uploadDate", "id")
+
+    def __init__(
+        self,
+        videos: Optional[Iterable[dict]] = None,
+        clock: Callable[[], datetime] = datetime.utcnow
+    ):
+        self._videos: Dict[str, dict] = {}
+        self._indexes: Dict[str, Dict[object, Dict[str, None]]] = {
+            field: {} for field in self.INDEXED_FIELDS
+        }
+        self._ordered: Dict[Tuple[str, object], List[Tuple[str, str]]] = {}
+        self._ordered_all: List[Tuple[str, str]] = []
+        self.top_views = TopViewsIndex(clock)
+
+        if videos:
+            self._bulk_load(videos)
+
+    def __len__(self) -> int:
+        return len(self._videos)
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self._videos
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self._videos.values())
+
+    @staticmethod
+    def order_key(video: dict) -> Tuple[str, str]:
+        """Get the ``(uploadDate, id)`` key a video is ordered by"""
+        return (video["uploadDate"], video["id"])
+
+    def get(self, video_id: str) -> Optional[dict]:
+        """Get a video by ID, or None if it does not exist"""
+        return self._videos.get(video_id)
+
+    def add(self, video: dict) -> dict:
+        """Add a new video and index it"""
+        video_id = video["id"]
+        if video_id in self._videos:
+            raise ValueError(f"Video {video_id} already exists")
+
+        self._videos[video_id] = video
+        self._index_video(video)
+
+        return video
+
+    def update(self, video_id: str, **changes) -> Optional[dict]:
+        """Apply field changes to a video, re-indexing any indexed fields"""
+        video = self._videos.get(video_id)
+        if video is None:
+            return None
+
+        reindex = any(
+            (field in self._indexes or field in self.ORDER_FIELDS) and video.get(field) != value
+            for field, value in changes.items()
+        )
+        if reindex:
+            self._unindex_video(video)
+
+        video.update(changes)
+
+        if reindex:
+            self._index_video(video)
+        elif "views" in changes:
+            self.top_views.set_views(video_id, video["views"])
+
+        return video
+
+    def remove(self, video_id: str) -> Optional[dict]:
+        """Remove a video and drop it from every index"""
+        video = self._videos.pop(video_id, None)
+        if video is None:
+            return None
+
+        self._unindex_video(video)
+
+        return video
+
+    def find(self, **criteria) -> List[dict]:
+        """Get videos matching all of the given indexed field values
+
+        Fields left as None are ignored. The smallest matching index bucket is
+        scanned and checked against the remaining criteria, so the cost depends
+        on the number of matches rather than the size of the catalog.
+        """
+        criteria = self._criteria(criteria)
+        if not criteria:
+            return list(self._videos.values())
+
+        buckets = [self._indexes[field].get(value, {}) for field, value in criteria.items()]
+        smallest = min(buckets, key=len)
+
+        return [
+            self._videos[video_id]
+            for video_id in smallest
+            if all(video_id in bucket for bucket in buckets if bucket is not smallest)
+        ]
+
+    def iter_ordered(
+        self,
+        after: Optional[Tuple[str, str]] = None,
+        descending: bool = True,
+        **criteria
+    ) -> Iterator[dict]:
+        """Iterate videos matching the criteria in ``(uploadDate, id)`` order
+
+        Iteration starts just past the ``after`` key, found by binary search in
+        the smallest matching ordered bucket. Newest videos come first unless
+        ``descending`` is False. The catalog must not be modified while the
+        iterator is in use.
+        """
+        criteria = self._criteria(criteria)
+        buckets = [self._indexes[field].get(value, {}) for field, value in criteria.items()]
+        if criteria:
+            keys = min(
+                (self._ordered.get(item, []) for item in criteria.items()),
+                key=len
+            )
+        else:
+            keys = self._ordered_all
+
+        if descending:
+            start = bisect_left(keys, after) if after is not None else len(keys)
+            positions = range(start - 1, -1, -1)
+        else:
+            start = bisect_right(keys, after) if after is not None else 0
+            positions = range(start, len(keys))
+
+        for position in positions:
+            video_id = keys[position][1]
+            if all(video_id in bucket for bucket in buckets):
+                yield self._videos[video_id]
+
+    def count(self, field: str, value) -> int:
+        """Count the videos with an indexed field value"""
+        return len(self._indexes[field].get(value, {}))
+
+    # Index maintenance
+    def _bulk_load(self, videos: Iterable[dict]):
+        # Append every key and sort each ordered list once, rather than paying
+        # for an insort per row
+        for video in videos:
+            video_id = video["id"]
+            if video_id in self._videos:
+                raise ValueError(f"Video {video_id} already exists")
+
+            self._videos[video_id] = video
+            key = self.order_key(video)
+            self._ordered_all.append(key)
+            for field in self.INDEXED_FIELDS:
+                value = video.get(field)
+                self._index_add(field, value, video_id)
+                self._ordered.setdefault((field, value), []).append(key)
+
+        self._ordered_all.sort()
+        for keys in self._ordered.values():
+            keys.sort()
+
+        self.top_views.add_many(video for video in self._videos.values() if video.get("isPublic"))
+
+    def _criteria(self, criteria: dict) -> dict:
+        criteria = {field: value for field, value in criteria.items() if value is not None}
+        for field in criteria:
+            if field not in self._indexes:
+                raise ValueError(f"Field {field} is not indexed")
+        return criteria
+
+    def _index_video(self, video: dict):
+        if video.get("isPublic"):
+            self.top_views.add(video)
+        key = self.order_key(video)
+        insort(self._ordered_all, key)
+        for field in self.INDEXED_FIELDS:
+            value = video.get(field)
+            self._index_add(field, value, video["id"])
+            insort(self._ordered.setdefault((field, value), []), key)
+
+    def _unindex_video(self, video: dict):
+        self.top_views.remove(video)
+        key = self.order_key(video)
+        self._ordered_remove(self._ordered_all, key)
+        for field in self.INDEXED_FIELDS:
+            value = video.get(field)
+            self._index_remove(field, value, video["id"])
+            keys = self._ordered.get((field, value))
+            if keys is not None:
+                self._ordered_remove(keys, key)
+                if not keys:
+                    del self._ordered[(field, value)]
+
+    @staticmethod
+    def _ordered_remove(keys: List[Tuple[str, str]], key: Tuple[str, str]):
+        position = bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            del keys[position]
+
+    def _index_add(self, field: str, value, video_id: str):
+        self._indexes[field].setdefault(value, {})[video_id] = None
+
+    def _index_remove(self, field: str, value, video_id: str):
+        bucket = self._indexes[field].get(value)
+        if bucket is None:
+            return
+
+        bucket.pop(video_id, None)
+        if not bucket:
+            del self._indexes[field][value]
@@ -0,0 +1,258 @@
+"""Async database connections: SQLite locally, PostgreSQL in production
+
+Both kinds of database take SQL with ``$1``-style parameters and give rows
+back as dicts. Each keeps a bounded pool of connections, reuses prepared
+statements per connection, and cancels queries that run past a timeout.
+SQLite is blocking, so its queries run on a small thread pool of their own
+instead of the event loop.
+"""
+import asyncio
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+from settings import env_float, env_int, env_str
+
+# Database settings
+DB_TYPE = env_str("DB_TYPE")
+DB_PATH = env_str("DB_PATH", "./vidora.db")
+DB_HOST = env_str("DB_HOST", "localhost")
+DB_PORT = env_int("DB_PORT", 5432)
+DB_USER = env_str("DB_USER")
+DB_PASSWORD = env_str("DB_PASSWORD")
+DB_NAME = env_str("DB_NAME", "vidora")
+DB_POOL_SIZE = env_int("DB_POOL_SIZE", 10)
+DB_QUERY_TIMEOUT = env_float("DB_QUERY_TIMEOUT", 5)
+DB_STATEMENT_CACHE_SIZE = env_int("DB_STATEMENT_CACHE_SIZE", 256)
+
+# A batch of statements: each SQL string with the parameter rows to run it for
+Batch = Sequence[Tuple[str, Sequence[Sequence[Any]]]]
+
+
+class QueryTimeout(RuntimeError):
+    """Raised when a query runs longer than the database's timeout"""
+
+
+@lru_cache(maxsize=1024)
+def sqlite_sql(sql: str) -> str:
+    """Rewrite ``$1``-style parameters as SQLite's ``?1``"""
+    return re.sub(r"\$(\d+)", r"?\1", sql)
+
+
+class Database:
+    """A pool of connections to one database"""
+
+    async def fetch_one(self, sql: str, *args) -> Optional[Dict[str, Any]]:
+        """Run a query and return its first row"""
+        rows = await self.fetch_all(sql, *args)
+        return rows[0] if rows else None
+
+    async def fetch_all(self, sql: str, *args) -> List[Dict[str, Any]]:
+        """Run a query and return every row"""
+        raise NotImplementedError
+
+    async def execute(self, sql: str, *args):
+        """Run a statement"""
+        await self.execute_batch([(sql, [args])])
+
+    async def execute_batch(self, batch: Batch):
+        """Run statements for many parameter rows in one transaction"""
+        raise NotImplementedError
+
+    async def close(self):
+        """Close every connection"""
+        raise NotImplementedError
+
+
+class SQLiteDatabase(Database):
+    """SQLite file behind a pool of connections on worker threads
+
+    Each query runs on one of ``pool_size`` threads, which also bounds how
+    many connections are open. A query that runs past ``timeout`` is
+    interrupted, and its connection goes back to the pool once its thread
+    has let go of it. ``:memory:`` databases get a single connection, since
+    every connection to one would be a separate, empty database.
+    """
+
+    def __init__(
+        self,
+        path: str = DB_PATH,
+        pool_size: int = DB_POOL_SIZE,
+        timeout: float = DB_QUERY_TIMEOUT,
+        statement_cache_size: int = DB_STATEMENT_CACHE_SIZE
+    ):
+        self.path = path
+        self.pool_size = 1 if path == ":memory:" else max(1, pool_size)
+        self.timeout = timeout
+        self.statement_cache_size = statement_cache_size
+        self._executor = ThreadPoolExecutor(self.pool_size, thread_name_prefix="sqlite")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: List[sqlite3.Connection] = []
+
+    async def fetch_all(self, sql: str, *args) -> List[Dict[str, Any]]:
+        sql = sqlite_sql(sql)
+        return await self._run(lambda connection: [dict(row) for row in connection.execute(sql, args).fetchall()])
+
+    async def execute_batch(self, batch: Batch):
+        batch = [(sqlite_sql(sql), rows) for sql, rows in batch]
+
+        def run(connection: sqlite3.Connection):
+            connection.execute("BEGIN")
+            try:
+                for sql, rows in batch:
+                    connection.executemany(sql, rows)
+            except BaseException:
+                connection.rollback()
+                raise
+            connection.commit()
+
+        await self._run(run)
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+        # Waiting for queries still running blocks, so it is done off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown, True)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size
+        )
+        connection.row_factory = sqlite3.Row
+        if self.path != ":memory:":
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    async def _run(self, work: Callable[[sqlite3.Connection], Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.pool_size)
+
+        await self._slots.acquire()
+        connection = self._idle.pop() if self._idle else None
+
+        def run():
+            nonlocal connection
+            if connection is None:
+                connection = self._connect()
+            return work(connection)
+
+        future = loop.run_in_executor(self._executor, run)
+        future.add_done_callback(lambda done: self._release(done, connection))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            if connection is not None:
+                connection.interrupt()
+            raise QueryTimeout(f"Query took longer than {self.timeout:g}s")
+
+    def _release(self, future: asyncio.Future, connection: Optional[sqlite3.Connection]):
+        # Read the outcome so a query abandoned at its timeout is not reported as unhandled
+        if not future.cancelled():
+            future.exception()
+        if connection is not None:
+            self._idle.append(connection)
+        self._slots.release()
+
+
+class PostgresDatabase(Database):
+    """PostgreSQL through an asyncpg connection pool
+
+    asyncpg prepares each statement once per connection and keeps up to
+    ``statement_cache_size`` of them, and cancels a query on the server when
+    it runs past ``timeout``. The pool belongs to the event loop that opened
+    it, so it is reopened if used from a different loop.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        pool_size: int = DB_POOL_SIZE,
+        timeout: float = DB_QUERY_TIMEOUT,
+        statement_cache_size: int = DB_STATEMENT_CACHE_SIZE
+    ):
+        self.dsn = dsn
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self.statement_cache_size = statement_cache_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pool = None
+        self._opening: Optional[asyncio.Lock] = None
+
+    async def fetch_all(self, sql: str, *args) -> List[Dict[str, Any]]:
+        pool = await self._get_pool()
+        try:
+            async with pool.acquire(timeout=self.timeout) as connection:
+                return [dict(row) for row in await connection.fetch(sql, *args, timeout=self.timeout)]
+        except asyncio.TimeoutError:
+            raise QueryTimeout(f"Query took longer than {self.timeout:g}s")
+
+    async def execute_batch(self, batch: Batch):
+        pool = await self._get_pool()
+        try:
+            async with pool.acquire(timeout=self.timeout) as connection:
+                async with connection.transaction():
+                    for sql, rows in batch:
+                        if all(not row for row in rows):
+                            # Statements without parameters, e.g. schema changes, are not prepared
+                            for _ in rows:
+                                await connection.execute(sql, timeout=self.timeout)
+                        else:
+                            await connection.executemany(sql, rows, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise QueryTimeout(f"Statements took longer than {self.timeout:g}s")
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def _get_pool(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._pool = None
+            self._opening = asyncio.Lock()
+
+        async with self._opening:
+            if self._pool is None:
+                import asyncpg
+                self._pool = await asyncpg.create_pool(
+                    self.dsn,
+                    min_size=1,
+                    max_size=self.pool_size,
+                    statement_cache_size=self.statement_cache_size,
+                    command_timeout=self.timeout
+                )
+        return self._pool
+
+
+_database: Optional[Database] = None
+
+def get_database() -> Optional[Database]:
+    """Get the database configured by DB_TYPE, or None when it is not set"""
+    global _database
+    if _database is None and DB_TYPE:
+        if DB_TYPE == "sqlite":
+            _database = SQLiteDatabase()
+        elif DB_TYPE == "postgres":
+            _database = PostgresDatabase(f"postgresql://{quote(DB_USER)}:{quote(DB_PASSWORD)}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+        else:
+            raise ValueError(f"Unknown database type {DB_TYPE}")
+    return _database
+
+def set_database(database: Optional[Database]):
+    """Replace the shared database, e.g. in tests"""
+    global _database
+    _database = database
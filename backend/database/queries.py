@@ -0,0 +1,544 @@
+import json
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+
+from analytics.engagment import get_demographics
+from cache.responses import invalidate_responses
+from cache.shared import get_shared_cache
+from database.dashboards import FilmmakerDashboards
+from database.leaderboard import LeaderboardIndex
+from database.models import VideoCatalog, parse_upload_date
+from database.rollups import COMPLETION_PERCENTAGE, AnalyticsRollups
+from database.scoring import composite_score, score_changed
+from database.store import CatalogStore, get_catalog_writer
+
+# Mock video database - replace with real database in production
+fake_videos_db = [
+    {
+        "id": "video1",
+        "title": "Amazing Short Film",
+        "description": "A beautiful short film about nature",
+        "category": "short-film",
+        "userId": "user123",
+        "uploadDate": "2023-06-01T12:00:00Z",
+        "duration": 480,  # 8 minutes
+        "views": 5000,
+        "averageRating": 4.8,
+        "ratingCount": 120,
+        "shares": 300,
+        "thumbnailUrl": "/previews/video1.jpg",
+        "videoUrl": "/videos/video1.mp4",
+        "isPublic": True,
+        "tags": ["nature", "cinematic", "4k"]
+    },
+    {
+        "id": "video2",
+        "title": "Commercial Demo",
+        "description": "A sample commercial for a fictional product",
+        "category": "commercial",
+        "userId": "user123",
+        "uploadDate": "2023-05-15T10:00:00Z",
+        "duration": 60,  # 1 minute
+        "views": 3000,
+        "averageRating": 4.5,
+        "ratingCount": 80,
+        "shares": 150,
+        "thumbnailUrl": "/previews/video2.jpg",
+        "videoUrl": "/videos/video2.mp4",
+        "isPublic": True,
+        "tags": ["commercial", "product", "advertisement"]
+    },
+    {
+        "id": "video3",
+        "title": "Student Project",
+        "description": "An impressive student film project",
+        "category": "short-film",
+        "userId": "student1",
+        "uploadDate": "2023-04-20T09:00:00Z",
+        "duration": 300,  # 5 minutes
+        "views": 2000,
+        "averageRating": 4.9,
+        "ratingCount": 40,
+        "shares": 90,
+        "thumbnailUrl": "/previews/video3.jpg",
+        "videoUrl": "/videos/video3.mp4",
+        "isPublic": True,
+        "tags": ["student", "drama"]
+    }
+]
+
+# Mock user database - replace with real database in production
+fake_users_db = {
+    "user123": {
+        "id": "user123",
+        "email": "filmmaker@example.com",
+        "name": "Test Filmmaker",
+        "bio": "Award-winning filmmaker with a passion for storytelling",
+        "location": "Los Angeles, CA",
+        "profilePicture": "/profiles/user123.jpg",
+        "isStudent": False,
+        "isVerified": True,
+        "subscription": "Pro",
+        "joinDate": "2023-01-15T00:00:00Z",
+        "socialLinks": {
+            "instagram": "https://instagram.com/testfilmmaker",
+            "twitter": "https://twitter.com/testfilmmaker",
+            "vimeo": "https://vimeo.com/testfilmmaker"
+        }
+    },
+    "student1": {
+        "id": "student1",
+        "email": "student@example.com",
+        "name": "Film Student",
+        "bio": "Film student at NYU",
+        "location": "New York, NY",
+        "profilePicture": "/profiles/student1.jpg",
+        "isStudent": True,
+        "isVerified": True,
+        "subscription": "Student",
+        "joinDate": "2023-03-10T00:00:00Z",
+        "school": "NYU Tisch School of the Arts",
+        "socialLinks": {
+            "instagram": "https://instagram.com/filmstudent"
+        }
+    }
+}
+
+# Ranking scores are stored on each video and only recomputed when their inputs change
+for _video in fake_videos_db:
+    _video["score"] = composite_score(_video)
+
+# Indexed catalog over the video records
+video_catalog = VideoCatalog(fake_videos_db)
+
+# Public videos ranked per (category, timeframe) for the awards leaderboards
+video_leaderboard = LeaderboardIndex()
+video_leaderboard.add_many(fake_videos_db)
+
+def is_verified_student(user_id: str) -> bool:
+    """Whether a user is a student whose enrollment has been verified"""
+    user = fake_users_db.get(user_id) or {}
+    return bool(user.get("isStudent") and user.get("isVerified"))
+
+# Only verified students' public videos, ranked for the student filmmaker award.
+# The version goes up whenever the board may have changed.
+student_leaderboard = LeaderboardIndex()
+student_leaderboard.add_many(video for video in fake_videos_db if is_verified_student(video["userId"]))
+student_board_version = 0
+
+# Counters that move on every view. Cached responses and records show them up
+# to their cache TTL out of date instead of being dropped on every view.
+VOLATILE_FIELDS = ("views", "score")
+
+def invalidate_cached(*tags: str):
+    """Drop cached responses and cached records carrying any of the tags"""
+    invalidate_responses(*tags)
+    get_shared_cache().invalidate(*tags)
+
+# Fields the database stores as counts, and the score derived from them
+COUNTED_FIELDS = ("views", "shares", "ratingCount", "averageRating", "score")
+
+def _count_changes(video: dict, changes: dict) -> Counter:
+    """Turn new view, share and rating totals into increments of the stored counts"""
+    counted = Counter({field: changes[field] - video[field] for field in ("views", "shares", "ratingCount") if field in changes})
+    if "averageRating" in changes or "ratingCount" in changes:
+        ratings = changes.get("ratingCount", video["ratingCount"])
+        rating_total = changes.get("averageRating", video["averageRating"]) * ratings
+        counted["ratingTotal"] = rating_total - video["averageRating"] * video["ratingCount"]
+    return counted
+
+def _video_changed(video_id: str, video: Optional[dict]):
+    # Written back to the database by the catalog writer, if there is one
+    writer = get_catalog_writer()
+    if writer is not None:
+        writer.video_changed(video_id, video)
+
+def _user_changed(user: dict):
+    writer = get_catalog_writer()
+    if writer is not None:
+        writer.user_changed(user)
+
+# Mock watch time table, one row per (videoId, viewerId)
+fake_watch_time_db = {}
+
+# Mock watch history table, one row per (userId, videoId)
+fake_watch_history_db = {}
+
+# Daily, weekly and monthly analytics rollups per video
+video_rollups = AnalyticsRollups()
+
+# Materialized per-filmmaker dashboards, kept in step with the catalog and rollups
+filmmaker_dashboards = FilmmakerDashboards()
+
+# Mock monthly awards table, one JSON document per (year, month), never overwritten
+fake_monthly_awards_db = {}
+
+# Video queries
+def get_video(video_id: str) -> Optional[dict]:
+    """Get a video by ID"""
+    return video_catalog.get(video_id)
+
+def get_videos_by_criteria(
+    category: Optional[str] = None,
+    userId: Optional[str] = None,
+    isPublic: Optional[bool] = None
+) -> List[dict]:
+    """Get videos matching the given indexed fields"""
+    return video_catalog.find(category=category, userId=userId, isPublic=isPublic)
+
+def iter_videos(
+    after: Optional[Tuple[str, str]] = None,
+    category: Optional[str] = None,
+    isPublic: Optional[bool] = None
+) -> Iterator[dict]:
+    """Iterate videos newest first, resuming after an ``(uploadDate, id)`` key"""
+    return video_catalog.iter_ordered(after=after, category=category, isPublic=isPublic)
+
+def get_top_videos(limit: int, timeframe: str = "all") -> List[dict]:
+    """Get the most viewed public videos, overall or uploaded within a timeframe"""
+    return [video_catalog.get(video_id) for video_id in video_catalog.top_views.top(limit, timeframe)]
+
+def add_views(video_id: str, count: int = 1) -> Optional[dict]:
+    """Add to a video's view count"""
+    video = video_catalog.get(video_id)
+    if video is None:
+        return None
+    return update_video(video_id, views=video["views"] + count)
+
+def add_shares(video_id: str, count: int = 1) -> Optional[dict]:
+    """Add to a video's share count"""
+    video = video_catalog.get(video_id)
+    if video is None:
+        return None
+    return update_video(video_id, shares=video["shares"] + count)
+
+def next_video_id() -> str:
+    """Get a new, random ID for an uploaded video
+
+    IDs are random rather than sequential so that several worker processes
+    can hand them out without coordinating.
+    """
+    return uuid.uuid4().hex
+
+def create_video(video: dict) -> dict:
+    """Add a new video to the catalog"""
+    video["score"] = composite_score(video)
+    video = video_catalog.add(video)
+    video_leaderboard.add(video)
+    _file_student_video(video)
+    filmmaker_dashboards.update_video(video)
+    writer = get_catalog_writer()
+    if writer is not None:
+        writer.video_created(video)
+    invalidate_cached("videos", "awards")
+    return video
+
+def update_video(video_id: str, **changes) -> Optional[dict]:
+    """Update fields on a video"""
+    video = video_catalog.get(video_id)
+    if video is None:
+        return None
+
+    owner = video["userId"]
+    counted = _count_changes(video, changes)
+    if score_changed(changes):
+        changes["score"] = composite_score({**video, **changes})
+    video_catalog.update(video_id, **changes)
+    video_leaderboard.update(video)
+    _file_student_video(video)
+    if video["userId"] != owner:
+        filmmaker_dashboards.invalidate(owner)
+    filmmaker_dashboards.update_video(video)
+
+    # Counts are written as increments, so other workers' counts are not overwritten
+    writer = get_catalog_writer()
+    if writer is not None:
+        if counted:
+            writer.video_counted(video_id, counted)
+        if any(field not in COUNTED_FIELDS for field in changes):
+            writer.video_changed(video_id, video)
+
+    if any(field not in VOLATILE_FIELDS for field in changes):
+        # Lists are re-cached when a video joins or leaves them
+        tags = ("videos", "awards") if "isPublic" in changes or "category" in changes else ()
+        invalidate_cached(f"video:{video_id}", *tags)
+    return video
+
+def delete_video_from_db(video_id: str) -> bool:
+    """Remove a video from the catalog"""
+    video = video_catalog.remove(video_id)
+    if video is None:
+        return False
+    video_leaderboard.remove(video_id)
+    if video_id in student_leaderboard:
+        student_leaderboard.remove(video_id)
+        _student_board_changed()
+    filmmaker_dashboards.invalidate(video["userId"])
+    _video_changed(video_id, None)
+    invalidate_cached(f"video:{video_id}", "videos", "awards")
+    return True
+
+def _file_student_video(video: dict):
+    # Keep a video on the student board exactly while its owner is a verified student
+    if is_verified_student(video["userId"]):
+        student_leaderboard.update(video)
+    elif video["id"] in student_leaderboard:
+        student_leaderboard.remove(video["id"])
+    else:
+        return
+    _student_board_changed()
+
+def _student_board_changed():
+    global student_board_version
+    student_board_version += 1
+
+# Leaderboard queries
+def get_leaderboard_videos(category: str = "all", timeframe: str = "all", limit: int = 5) -> List[dict]:
+    """Get the highest ranked public videos in a category and upload timeframe"""
+    return [video_catalog.get(video_id) for video_id in video_leaderboard.top(limit, category, timeframe)]
+
+def get_leaderboard_rank(video_id: str, category: str = "all", timeframe: str = "all") -> Optional[int]:
+    """Get a video's one-based leaderboard position, or None if it is not ranked there"""
+    return video_leaderboard.rank(video_id, category, timeframe)
+
+def get_leaderboard_size(category: str = "all", timeframe: str = "all") -> int:
+    """Count the videos ranked on a leaderboard"""
+    return video_leaderboard.size(category, timeframe)
+
+# Monthly awards queries
+def get_monthly_top_videos(year: int, month: int) -> Iterator[dict]:
+    """Iterate public videos with activity in a month, carrying that month's counters
+
+    Only videos with rollups in the month are visited. Each is a copy whose
+    views, shares and ratings only count the month's events, so the
+    catalog's all-time counts and records are never touched.
+    """
+    start = date(year, month, 1)
+    end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    for video_id, totals in video_rollups.counters.active_totals(start, end):
+        video = video_catalog.get(video_id)
+        if video is None or not video.get("isPublic"):
+            continue
+        if not (totals["views"] or totals["ratings"] or totals["shares"]):
+            continue
+        yield dict(
+            video,
+            views=totals["views"],
+            shares=totals["shares"],
+            ratingCount=totals["ratings"],
+            averageRating=totals["ratingPoints"] / 2 / totals["ratings"] if totals["ratings"] else 0.0
+        )
+
+def save_monthly_awards(year: int, month: int, awards: dict) -> str:
+    """Store a month's awards unless they were already stored, returning the stored JSON"""
+    stored = fake_monthly_awards_db.setdefault((year, month), json.dumps(awards, separators=(",", ":")))
+    writer = get_catalog_writer()
+    if writer is not None:
+        writer.awards_saved(year, month, stored)
+    invalidate_cached("awards")
+    return stored
+
+def get_monthly_awards(year: int, month: int) -> Optional[str]:
+    """Get a month's stored awards as JSON"""
+    return fake_monthly_awards_db.get((year, month))
+
+def get_latest_awards_month() -> Optional[Tuple[int, int]]:
+    """Get the most recent (year, month) with stored awards"""
+    return max(fake_monthly_awards_db, default=None)
+
+# Student award queries
+def get_student_videos(limit: int = 5, timeframe: str = "all") -> List[dict]:
+    """Get verified students' highest ranked public videos uploaded within a timeframe"""
+    return [video_catalog.get(video_id) for video_id in student_leaderboard.top(limit, "all", timeframe)]
+
+def get_student_board_version() -> int:
+    """Get a number that changes whenever the student board may have changed"""
+    return student_board_version
+
+# Analytics queries
+def record_video_activity(
+    video_id: str,
+    viewer_id: Optional[str] = None,
+    day: Optional[date] = None,
+    **increments
+):
+    """Add views, shares, ratings etc. to a video's analytics rollups
+
+    Activity for videos that are not in the catalog is ignored, so unknown
+    IDs never get rollup buckets or viewer sketches.
+    """
+    day = day or datetime.utcnow().date()
+    rollups = video_rollups
+    video = video_catalog.get(video_id)
+    if video is None:
+        return
+
+    filmmaker_dashboards.record_activity(
+        video["userId"],
+        day,
+        lambda: rollups.record(video_id, day, viewer_id, **increments),
+        **increments
+    )
+
+def get_filmmaker_dashboard(user_id: str) -> dict:
+    """Get a filmmaker's dashboard summary across all of their videos"""
+    return filmmaker_dashboards.get(
+        user_id,
+        lambda: get_videos_by_criteria(userId=user_id),
+        video_rollups,
+        get_demographics().location_distribution
+    )
+
+def get_video_activity_totals(video_id: str, start: date, end: date) -> dict:
+    """Get a video's summed analytics counters for an inclusive date range"""
+    return video_rollups.totals(video_id, start, end)
+
+def get_video_activity_series(video_id: str, start: date, end: date, interval: str = "day") -> List[dict]:
+    """Get a video's analytics counters per day, week or month"""
+    return video_rollups.series(video_id, start, end, interval)
+
+def get_videos_activity_totals(video_ids: List[str], start: date, end: date) -> dict:
+    """Get analytics counters summed across several videos"""
+    return video_rollups.counters.totals_many(video_ids, start, end)
+
+def get_videos_activity_series(video_ids: List[str], start: date, end: date) -> List[dict]:
+    """Get analytics counters per day summed across several videos"""
+    counters = video_rollups.counters
+    daily = counters.series(video_ids, start, end).T.tolist()
+    return [
+        dict(zip(counters.metrics, values), date=(start + timedelta(days=i)).isoformat())
+        for i, values in enumerate(daily)
+    ]
+
+def save_watch_time(rows: List[dict]):
+    """Upsert a batch of aggregated watch time rows
+
+    The growth in each viewer's watch time, and whether they have now
+    completed the video, is added to the analytics rollups.
+    """
+    for row in rows:
+        key = (row["videoId"], row["viewerId"])
+        existing = fake_watch_time_db.get(key)
+        previous_time = existing["watchTimeSeconds"] if existing else 0
+        previous_percentage = existing["percentageWatched"] if existing else 0
+        record_video_activity(
+            row["videoId"],
+            row["viewerId"],
+            parse_upload_date(row["lastSeen"]).date(),
+            watchTimeSeconds=max(0, row["watchTimeSeconds"] - previous_time),
+            completions=int(previous_percentage < COMPLETION_PERCENTAGE <= row["percentageWatched"])
+        )
+
+        if existing is None:
+            fake_watch_time_db[key] = dict(row)
+            continue
+        existing["heartbeats"] += row["heartbeats"]
+        existing["watchTimeSeconds"] = max(existing["watchTimeSeconds"], row["watchTimeSeconds"])
+        existing["percentageWatched"] = max(existing["percentageWatched"], row["percentageWatched"])
+        existing["lastSeen"] = max(existing["lastSeen"], row["lastSeen"])
+
+def get_watch_time(video_id: str, viewer_id: str) -> Optional[dict]:
+    """Get the stored watch time for one viewer of a video"""
+    return fake_watch_time_db.get((video_id, viewer_id))
+
+# Watch history queries
+def save_watch_history(rows: List[dict]):
+    """Upsert a batch of watch history rows"""
+    for row in rows:
+        fake_watch_history_db[(row["userId"], row["videoId"])] = dict(row)
+
+def get_watch_history(user_id: str) -> List[dict]:
+    """Get a user's watch history, most recently updated first"""
+    rows = [row for (row_user, _), row in fake_watch_history_db.items() if row_user == user_id]
+    return sorted(rows, key=lambda row: row["updatedAt"], reverse=True)
+
+async def load_video(video_id: str) -> Optional[dict]:
+    """Get a video by ID from the database, with every worker's counts
+
+    Counts this process has not written yet are added on top. Without a
+    database, or while this process has a change to the video that is not
+    written yet, the video comes from the catalog instead.
+    """
+    writer = get_catalog_writer()
+    if writer is None or writer.video_unwritten(video_id):
+        return get_video(video_id)
+
+    video = await writer.store.get_video(video_id)
+    if video is None:
+        return None
+    unwritten = writer.unwritten_counts(video_id)
+    if unwritten:
+        rating_total = video["averageRating"] * video["ratingCount"] + unwritten["ratingTotal"]
+        video["views"] += unwritten["views"]
+        video["shares"] += unwritten["shares"]
+        video["ratingCount"] += unwritten["ratingCount"]
+        video["averageRating"] = rating_total / video["ratingCount"] if video["ratingCount"] else 0.0
+    video["score"] = composite_score(video)
+    return video
+
+# User queries
+def get_user_by_id(user_id: str) -> Optional[dict]:
+    """Get a user by ID"""
+    return fake_users_db.get(user_id)
+
+async def load_user(user_id: str) -> Optional[dict]:
+    """Get a user by ID from the database, or from memory while a change to them is not written yet"""
+    writer = get_catalog_writer()
+    if writer is None or writer.user_unwritten(user_id):
+        return get_user_by_id(user_id)
+    return await writer.store.get_user_by_id(user_id)
+
+def update_user(user_id: str, **changes) -> Optional[dict]:
+    """Update fields on a user, re-filing their videos if their student status changed"""
+    user = fake_users_db.get(user_id)
+    if user is None:
+        return None
+
+    was_student = is_verified_student(user_id)
+    user.update(changes)
+    _user_changed(user)
+    videos = get_videos_by_criteria(userId=user_id)
+    # Videos and awards show their filmmaker's name
+    invalidate_cached(f"user:{user_id}", *(f"video:{video['id']}" for video in videos))
+    if is_verified_student(user_id) != was_student:
+        for video in videos:
+            _file_student_video(video)
+    elif any(video["id"] in student_leaderboard for video in videos):
+        # Student award snapshots show the filmmaker's profile
+        _student_board_changed()
+    return user
+
+# Startup
+async def load_catalog(store: CatalogStore):
+    """Replace the in-memory catalog with the stored one
+
+    An empty database is seeded with the records already in memory instead.
+    """
+    global fake_videos_db, video_catalog, video_leaderboard, student_leaderboard, filmmaker_dashboards
+    videos, users, awards = await store.load()
+    if not videos and not users:
+        await store.write(
+            created={video["id"]: video for video in video_catalog},
+            users=dict(fake_users_db),
+            awards=dict(fake_monthly_awards_db)
+        )
+        return
+
+    fake_users_db.clear()
+    fake_users_db.update(users)
+    fake_monthly_awards_db.clear()
+    fake_monthly_awards_db.update(awards)
+
+    # Scores are recomputed in case the scoring settings changed
+    for video in videos:
+        video["score"] = composite_score(video)
+    fake_videos_db = videos
+    video_catalog = VideoCatalog(videos)
+    video_leaderboard = LeaderboardIndex()
+    video_leaderboard.add_many(videos)
+    student_leaderboard = LeaderboardIndex()
+    student_leaderboard.add_many(video for video in videos if is_verified_student(video["userId"]))
+    _student_board_changed()
+    filmmaker_dashboards = FilmmakerDashboards()
@@ -0,0 +1,160 @@
+import threading
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from database.hyperloglog import DEFAULT_PRECISION, HyperLogLog, hash_item
+from database.timeseries import TimeSeriesStore
+
+# Rollup granularities, coarsest last
+LEVELS = ("day", "week", "month")
+
+# Counters that add up across buckets. Ratings are summed in half stars so
+# the average rating of any period stays exact in integer columns.
+METRICS = ("views", "watchTimeSeconds", "completions", "shares", "ratings", "ratingPoints")
+
+# Share of a video a viewer must reach for it to count as completed
+COMPLETION_PERCENTAGE = 90
+
+
+def bucket_start(day: date, level: str) -> date:
+    """Get the first day of the day, week (Monday) or month bucket holding ``day``"""
+    if level == "day":
+        return day
+    if level == "week":
+        return day - timedelta(days=day.weekday())
+    if level == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown rollup level {level}")
+
+def bucket_end(start: date, level: str) -> date:
+    """Get the last day of the bucket starting on ``start``"""
+    if level == "day":
+        return start
+    if level == "week":
+        return start + timedelta(days=6)
+    next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+@lru_cache(maxsize=1024)
+def cover(start: date, end: date) -> Tuple[Tuple[str, date], ...]:
+    """Split an inclusive date range into few whole day, week and month buckets
+
+    The whole months inside the range are one bucket each, and the partial
+    months at either end are made of whole weeks plus days, so a year is a
+    dozen month buckets plus a few weeks and days at the ends. Endpoints ask
+    for the same few ranges all day, so splits are cached.
+    """
+    first_month = bucket_start(start, "month")
+    if first_month < start:
+        first_month = bucket_end(first_month, "month") + timedelta(days=1)
+    months = []
+    day = first_month
+    while bucket_end(day, "month") <= end:
+        months.append(("month", day))
+        day = bucket_end(day, "month") + timedelta(days=1)
+
+    if not months:
+        return tuple(_cover_weeks(start, end))
+    return tuple(_cover_weeks(start, first_month - timedelta(days=1)) + months + _cover_weeks(day, end))
+
+def _cover_weeks(start: date, end: date) -> List[Tuple[str, date]]:
+    buckets = []
+    day = start
+    while day <= end:
+        level = "week" if bucket_start(day, "week") == day and day + timedelta(days=6) <= end else "day"
+        buckets.append((level, day))
+        day = bucket_end(day, level) + timedelta(days=1)
+    return buckets
+
+
+class AnalyticsRollups:
+    """Per-video analytics counters by day, with unique viewers by day, week and month
+
+    The additive ``METRICS`` live in a columnar ``TimeSeriesStore``, so any
+    date range is summed with one vectorized reduction and series for any
+    interval come from the same slice. Unique viewers do not add up across
+    days, so each event's viewer is added to a HyperLogLog sketch for its
+    day, week and month bucket, and a date range merges the few sketches
+    from ``cover``. Each sketch is at most 2**precision bytes however many
+    viewers it has seen. Events may arrive from request handlers and from
+    batch writers in the threadpool, so updates take a lock.
+    """
+
+    def __init__(self, precision: int = DEFAULT_PRECISION):
+        self.counters = TimeSeriesStore(METRICS)
+        self.precision = precision
+        self._viewers: Dict[str, Dict[str, Dict[date, HyperLogLog]]] = {level: {} for level in LEVELS}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        with self._lock:
+            state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def record(self, video_id: str, day: date, viewer_id: Optional[str] = None, **increments):
+        """Add an event's counters to ``day`` and its viewer to every bucket holding it"""
+        unknown = set(increments) - set(METRICS)
+        if unknown:
+            raise ValueError(f"Unknown rollup metrics {', '.join(sorted(unknown))}")
+
+        with self._lock:
+            self.counters.add(video_id, day, **increments)
+            if viewer_id is not None:
+                hashed = hash_item(viewer_id)
+                for level in LEVELS:
+                    sketches = self._viewers[level].setdefault(video_id, {})
+                    start = bucket_start(day, level)
+                    sketch = sketches.get(start)
+                    if sketch is None:
+                        sketch = sketches[start] = HyperLogLog(self.precision)
+                    sketch.add_hash(hashed)
+
+    def totals(self, video_id: str, start: date, end: date) -> dict:
+        """Sum the counters for an inclusive date range"""
+        totals = self.counters.totals(video_id, start, end)
+        totals["uniqueViewers"] = self.unique_viewers(video_id, start, end)
+        return totals
+
+    def unique_viewers(self, video_id: str, start: date, end: date) -> int:
+        """Estimate distinct viewers over an inclusive date range"""
+        return self.viewer_sketch(video_id, start, end).count()
+
+    def viewer_sketch(self, video_id: str, start: date, end: date) -> HyperLogLog:
+        """Merge the viewer sketches covering an inclusive date range
+
+        The result can be merged with sketches from other workers before
+        counting.
+        """
+        merged = HyperLogLog(self.precision)
+        with self._lock:
+            for level, bucket in cover(start, end):
+                sketch = self._viewers[level].get(video_id, {}).get(bucket)
+                if sketch is not None:
+                    merged.merge(sketch)
+        return merged
+
+    def series(self, video_id: str, start: date, end: date, level: str = "day") -> List[dict]:
+        """Get one row per ``level`` bucket overlapping the date range, oldest first
+
+        Buckets at either end only count the days inside the range.
+        """
+        starts = []
+        day = bucket_start(start, level)
+        while day <= end:
+            starts.append(day)
+            day = bucket_end(day, level) + timedelta(days=1)
+
+        counters = self.counters.series([video_id], start, end, starts).tolist()
+        rows = []
+        for i, day in enumerate(starts):
+            row = {"date": day.isoformat()}
+            row.update((metric, counters[m][i]) for m, metric in enumerate(METRICS))
+            row["uniqueViewers"] = self.unique_viewers(video_id, max(day, start), min(bucket_end(day, level), end))
+            rows.append(row)
+        return rows
@@ -0,0 +1,48 @@
+import math
+
+from settings import env_float
+
+# Ranking score settings
+SCORE_PRIOR_VOTES = env_float("SCORE_PRIOR_VOTES", 20)
+SCORE_PRIOR_RATING = env_float("SCORE_PRIOR_RATING", 3.5)
+SCORE_VIEW_WEIGHT = env_float("SCORE_VIEW_WEIGHT", 0.1)
+SCORE_SHARE_WEIGHT = env_float("SCORE_SHARE_WEIGHT", 0.2)
+if SCORE_PRIOR_VOTES < 0:
+    raise ValueError("SCORE_PRIOR_VOTES must not be negative")
+
+# Decimal places kept, so changes too small to matter leave rankings alone
+SCORE_PRECISION = 4
+
+# Video fields the score depends on
+SCORE_FIELDS = ("averageRating", "ratingCount", "views", "shares")
+
+
+def composite_score(
+    video: dict,
+    prior_votes: float = SCORE_PRIOR_VOTES,
+    prior_rating: float = SCORE_PRIOR_RATING,
+    view_weight: float = SCORE_VIEW_WEIGHT,
+    share_weight: float = SCORE_SHARE_WEIGHT
+) -> float:
+    """Score a video for rankings from its ratings, views and shares
+
+    The rating part is a Bayesian average: ``prior_votes`` imaginary ratings
+    of ``prior_rating`` are mixed in, so a video with one 5-star vote sits
+    near the prior while one with hundreds of ratings keeps its own average,
+    and each new rating moves the score less the more ratings there are.
+    With no prior and no ratings yet, the rating part is ``prior_rating``.
+    Views and shares add ``weight * log10(1 + count)``, so reach counts but
+    cannot outweigh a large difference in quality.
+    """
+    ratings = video.get("ratingCount", 0)
+    votes = prior_votes + ratings
+    rating = (prior_votes * prior_rating + ratings * video.get("averageRating", 0)) / votes if votes > 0 else prior_rating
+    reach = (
+        view_weight * math.log10(1 + video.get("views", 0))
+        + share_weight * math.log10(1 + video.get("shares", 0))
+    )
+    return round(rating + reach, SCORE_PRECISION)
+
+def score_changed(changes: dict) -> bool:
+    """Whether an update touches a field the score depends on"""
+    return any(field in changes for field in SCORE_FIELDS)
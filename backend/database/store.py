@@ -0,0 +1,349 @@
+"""Videos, users and monthly awards kept in the database
+
+The database is the system of record; the catalog in ``queries`` is loaded
+from it at startup. Changes are made to the catalog first and written back
+by a ``CatalogWriter`` in the background, so route handlers never wait on
+database writes.
+
+Several worker processes may share one database. New videos get random IDs
+and are inserted, never upserted, and view, share and rating counts are
+written as increments, so no worker overwrites another's changes. Single
+videos and users are read back from the database, while listings and
+rankings come from each process's own catalog and only pick up other
+workers' changes when it is next loaded.
+"""
+import asyncio
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+import orjson
+
+from database.pool import Database, get_database
+from settings import env_float
+
+logger = logging.getLogger(__name__)
+
+# Write-behind settings
+DB_FLUSH_SECONDS = env_float("DB_FLUSH_SECONDS", 1)
+
+# Records are JSON documents, with the fields queries filter on as columns
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS videos (
+        id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        category TEXT,
+        is_public INTEGER NOT NULL,
+        upload_date TEXT NOT NULL,
+        views INTEGER NOT NULL DEFAULT 0,
+        shares INTEGER NOT NULL DEFAULT 0,
+        rating_count INTEGER NOT NULL DEFAULT 0,
+        rating_total DOUBLE PRECISION NOT NULL DEFAULT 0,
+        data TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS videos_user_id ON videos (user_id)",
+    "CREATE INDEX IF NOT EXISTS videos_upload_date ON videos (upload_date, id)",
+    """CREATE TABLE IF NOT EXISTS users (
+        id TEXT PRIMARY KEY,
+        data TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS monthly_awards (
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (year, month)
+    )"""
+]
+
+# Counts live in their own columns, which win over the copies in ``data``
+VIDEO_COLUMNS = "data, views, shares, rating_count, rating_total"
+INSERT_VIDEO = """INSERT INTO videos (id, user_id, category, is_public, upload_date, views, shares, rating_count, rating_total, data)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)"""
+UPDATE_VIDEO = "UPDATE videos SET user_id = $2, category = $3, is_public = $4, upload_date = $5, data = $6 WHERE id = $1"
+COUNT_VIDEO = """UPDATE videos SET
+        views = views + $2,
+        shares = shares + $3,
+        rating_count = rating_count + $4,
+        rating_total = rating_total + $5
+    WHERE id = $1"""
+DELETE_VIDEO = "DELETE FROM videos WHERE id = $1"
+SAVE_USER = "INSERT INTO users (id, data) VALUES ($1, $2) ON CONFLICT (id) DO UPDATE SET data = excluded.data"
+# Monthly awards are never overwritten once stored
+SAVE_MONTHLY_AWARDS = "INSERT INTO monthly_awards (year, month, data) VALUES ($1, $2, $3) ON CONFLICT (year, month) DO NOTHING"
+
+
+# Catalog fields counted by increments, as column order in COUNT_VIDEO
+COUNTERS = ("views", "shares", "ratingCount", "ratingTotal")
+
+
+def video_row(video: dict) -> tuple:
+    return (
+        video["id"],
+        video["userId"],
+        video.get("category"),
+        int(bool(video.get("isPublic"))),
+        video["uploadDate"],
+        orjson.dumps(video).decode()
+    )
+
+def inserted_video_row(video: dict) -> tuple:
+    row = video_row(video)
+    counts = (video["views"], video["shares"], video["ratingCount"], video["averageRating"] * video["ratingCount"])
+    return row[:5] + counts + row[5:]
+
+def stored_video(row: dict) -> dict:
+    """Decode a video row, taking its counts from their columns"""
+    video = orjson.loads(row["data"])
+    video["views"] = row["views"]
+    video["shares"] = row["shares"]
+    video["ratingCount"] = row["rating_count"]
+    video["averageRating"] = row["rating_total"] / row["rating_count"] if row["rating_count"] else 0.0
+    return video
+
+
+class CatalogStore:
+    """Async access to the stored videos, users and monthly awards"""
+
+    def __init__(self, database: Database):
+        self.database = database
+
+    async def create_schema(self):
+        """Create any missing tables"""
+        await self.database.execute_batch([(statement, [()]) for statement in SCHEMA])
+
+    async def get_video(self, video_id: str) -> Optional[dict]:
+        """Get a stored video by ID"""
+        row = await self.database.fetch_one(f"SELECT {VIDEO_COLUMNS} FROM videos WHERE id = $1", video_id)
+        return stored_video(row) if row else None
+
+    async def get_user_by_id(self, user_id: str) -> Optional[dict]:
+        """Get a stored user by ID"""
+        row = await self.database.fetch_one("SELECT data FROM users WHERE id = $1", user_id)
+        return orjson.loads(row["data"]) if row else None
+
+    async def get_monthly_awards(self, year: int, month: int) -> Optional[str]:
+        """Get a month's stored awards JSON"""
+        row = await self.database.fetch_one("SELECT data FROM monthly_awards WHERE year = $1 AND month = $2", year, month)
+        return row["data"] if row else None
+
+    async def load(self) -> Tuple[list, Dict[str, dict], Dict[Tuple[int, int], str]]:
+        """Read every video, user and month of awards"""
+        videos = await self.database.fetch_all(f"SELECT {VIDEO_COLUMNS} FROM videos ORDER BY upload_date, id")
+        users = await self.database.fetch_all("SELECT data FROM users")
+        awards = await self.database.fetch_all("SELECT year, month, data FROM monthly_awards")
+        return (
+            [stored_video(row) for row in videos],
+            {user["id"]: user for user in (orjson.loads(row["data"]) for row in users)},
+            {(row["year"], row["month"]): row["data"] for row in awards}
+        )
+
+    async def write(
+        self,
+        created: Optional[Dict[str, dict]] = None,
+        videos: Optional[Dict[str, Optional[dict]]] = None,
+        counts: Optional[Dict[str, Counter]] = None,
+        users: Optional[Dict[str, dict]] = None,
+        awards: Optional[Dict[Tuple[int, int], str]] = None
+    ):
+        """Save changes in one transaction
+
+        ``created`` videos are inserted, ``videos`` replace their stored
+        fields other than the counts, or are deleted if ``None``, and
+        ``counts`` are added to the stored counts.
+        """
+        # Encoded before the first await, so records are not read while being changed
+        videos = videos or {}
+        batch = [
+            (INSERT_VIDEO, [inserted_video_row(video) for video in (created or {}).values()]),
+            (UPDATE_VIDEO, [video_row(video) for video in videos.values() if video is not None]),
+            (COUNT_VIDEO, [
+                (video_id, *(counted.get(counter, 0) for counter in COUNTERS))
+                for video_id, counted in (counts or {}).items()
+            ]),
+            (DELETE_VIDEO, [(video_id,) for video_id, video in videos.items() if video is None]),
+            (SAVE_USER, [(user_id, orjson.dumps(user).decode()) for user_id, user in (users or {}).items()]),
+            (SAVE_MONTHLY_AWARDS, [(year, month, data) for (year, month), data in (awards or {}).items()])
+        ]
+        await self.database.execute_batch([(sql, rows) for sql, rows in batch if rows])
+
+
+class CatalogWriter:
+    """Write-behind queue of changed catalog records
+
+    Changes are keyed by record, so a video edited several times between
+    flushes is written once, as it is at flush time. Count changes are
+    summed into one increment per video instead, and a video created since
+    the last flush is inserted with whatever counts it has by then. A
+    background task writes whatever is pending every ``flush_seconds``.
+    Changes can be queued from any thread; the batch is encoded on the event
+    loop. Changes from a failed write are kept for the next flush unless
+    they were superseded in the meantime.
+    """
+
+    def __init__(self, store: CatalogStore, flush_seconds: float = DB_FLUSH_SECONDS):
+        self.store = store
+        self.flush_seconds = flush_seconds
+        self._created: Dict[str, dict] = {}
+        self._videos: Dict[str, Optional[dict]] = {}
+        self._counts: Dict[str, Counter] = {}
+        self._users: Dict[str, dict] = {}
+        self._awards: Dict[Tuple[int, int], str] = {}
+        # The batch being written, which is not in the database yet either
+        self._writing: Tuple[dict, ...] = ({}, {}, {}, {})
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def pending(self) -> int:
+        """Number of records waiting to be written"""
+        return len(self._created) + len(self._videos) + len(self._counts) + len(self._users) + len(self._awards)
+
+    def video_created(self, video: dict):
+        """Queue a new video to be inserted"""
+        with self._lock:
+            self._created[video["id"]] = video
+
+    def video_changed(self, video_id: str, video: Optional[dict]):
+        """Queue a video's fields other than its counts to be saved, or the video deleted if it is ``None``"""
+        with self._lock:
+            if video is None:
+                self._counts.pop(video_id, None)
+                if self._created.pop(video_id, None) is not None:
+                    return
+            elif video_id in self._created:
+                return
+            self._videos[video_id] = video
+
+    def video_counted(self, video_id: str, counts: Dict[str, float]):
+        """Queue increments of a video's ``COUNTERS``"""
+        with self._lock:
+            if video_id not in self._created:
+                self._counts.setdefault(video_id, Counter()).update(counts)
+
+    def user_changed(self, user: dict):
+        """Queue a user to be saved"""
+        with self._lock:
+            self._users[user["id"]] = user
+
+    def awards_saved(self, year: int, month: int, awards: str):
+        """Queue a month's awards JSON to be saved"""
+        with self._lock:
+            self._awards.setdefault((year, month), awards)
+
+    def video_unwritten(self, video_id: str) -> bool:
+        """Whether a video was created, changed or deleted here and is not in the database yet"""
+        with self._lock:
+            created, videos, _, _ = self._writing
+            return any(video_id in changes for changes in (self._created, self._videos, created, videos))
+
+    def unwritten_counts(self, video_id: str) -> Counter:
+        """Increments of a video's counts made here that are not in the database yet"""
+        with self._lock:
+            _, _, counts, _ = self._writing
+            # Counter addition would drop negative increments, so update a copy instead
+            unwritten = Counter(counts.get(video_id, {}))
+            unwritten.update(self._counts.get(video_id, {}))
+            return unwritten
+
+    def user_unwritten(self, user_id: str) -> bool:
+        """Whether a user was changed here and is not in the database yet"""
+        with self._lock:
+            return user_id in self._users or user_id in self._writing[3]
+
+    def start(self):
+        """Start the flusher task on the running event loop"""
+        if self._task is not None:
+            return
+
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def flush(self) -> int:
+        """Write everything pending now and return how many changes were written"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            with self._lock:
+                created, videos, counts = self._created, self._videos, self._counts
+                users, awards = self._users, self._awards
+                self._created, self._videos, self._counts, self._users, self._awards = {}, {}, {}, {}, {}
+                self._writing = (created, videos, counts, users)
+
+            try:
+                await self.store.write(created, videos, counts, users, awards)
+            except BaseException:
+                with self._lock:
+                    self._writing = ({}, {}, {}, {})
+                    self._requeue(created, videos, counts, users, awards)
+                raise
+            with self._lock:
+                self._writing = ({}, {}, {}, {})
+            return len(created) + len(videos) + len(counts) + len(users) + len(awards)
+
+    async def shutdown(self):
+        """Stop the flusher and write whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def _requeue(self, created, videos, counts, users, awards):
+        # Anything queued since is newer than what failed
+        for video_id, video in created.items():
+            if self._videos.pop(video_id, video) is not None:
+                # Still to be inserted, with the counts and fields it has now
+                self._created[video_id] = video
+                self._counts.pop(video_id, None)
+        for video_id, counted in counts.items():
+            if video_id not in self._videos or self._videos[video_id] is not None:
+                self._counts.setdefault(video_id, Counter()).update(counted)
+        self._videos = {**videos, **self._videos}
+        self._users = {**users, **self._users}
+        self._awards = {**awards, **self._awards}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            if self.pending:
+                try:
+                    await self.flush()
+                except Exception:
+                    logger.exception("Catalog write failed, %d changes kept for retry", self.pending)
+
+
+_catalog_writer: Optional[CatalogWriter] = None
+
+def get_catalog_writer() -> Optional[CatalogWriter]:
+    """Get the shared catalog writer, or None when there is no database"""
+    return _catalog_writer
+
+def set_catalog_writer(writer: Optional[CatalogWriter]):
+    """Replace the shared catalog writer, e.g. in tests"""
+    global _catalog_writer
+    _catalog_writer = writer
+
+async def open_catalog(database: Optional[Database] = None) -> Optional[CatalogStore]:
+    """Create the schema and start writing catalog changes, if there is a database"""
+    database = database or get_database()
+    if database is None:
+        return None
+
+    store = CatalogStore(database)
+    await store.create_schema()
+    writer = CatalogWriter(store)
+    writer.start()
+    set_catalog_writer(writer)
+    return store
+
+async def close_catalog():
+    """Write pending changes and close the database"""
+    writer = get_catalog_writer()
+    if writer is None:
+        return
+    set_catalog_writer(None)
+    await writer.shutdown()
+    await writer.store.database.close()
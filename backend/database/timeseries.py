@@ -0,0 +1,138 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Days of room added whenever a series has to grow
+GROWTH_DAYS = 64
+
+
+class DailySeries:
+    """One video's daily counters as a (metrics, days) int64 array
+
+    Column ``i`` holds day ``start + i``. Only ``length`` columns are in use;
+    the rest is spare room so appending a day rarely reallocates.
+    """
+
+    __slots__ = ("start", "values", "length")
+
+    def __init__(self, start: date, metrics: int, capacity: int = GROWTH_DAYS):
+        self.start = start
+        self.values = np.zeros((metrics, capacity), dtype=np.int64)
+        self.length = 0
+
+    def window(self, start: date, end: date) -> Tuple[np.ndarray, int]:
+        """Get a view of the stored columns inside [start, end] and where it begins
+
+        The second value is the offset of the first returned column from
+        ``start``. Days outside the stored range are zero, so they are left
+        out rather than copied in.
+        """
+        first = max(0, (start - self.start).days)
+        last = min(self.length, (end - self.start).days + 1)
+        if last <= first:
+            return self.values[:, :0], 0
+        return self.values[:, first:last], (self.start - start).days + first
+
+    def ensure(self, day: date) -> int:
+        """Make room for ``day`` and return its column"""
+        index = (day - self.start).days
+        if index < 0:
+            # Shift everything right to make room before the first day
+            shift = -index + GROWTH_DAYS
+            grown = np.zeros((self.values.shape[0], self.values.shape[1] + shift), dtype=np.int64)
+            grown[:, shift:shift + self.length] = self.values[:, :self.length]
+            self.values = grown
+            self.start -= timedelta(days=shift)
+            self.length += shift
+            index += shift
+        elif index >= self.values.shape[1]:
+            grown = np.zeros((self.values.shape[0], index + GROWTH_DAYS), dtype=np.int64)
+            grown[:, :self.length] = self.values[:, :self.length]
+            self.values = grown
+
+        self.length = max(self.length, index + 1)
+        return index
+
+
+class TimeSeriesStore:
+    """Per-video daily counters kept in columnar NumPy arrays
+
+    Each video has one ``DailySeries`` whose rows are ``metrics``. A date
+    range is a slice of that array, so totals are one vectorized sum over a
+    view and series for any interval come from ``np.add.reduceat`` on it,
+    with no per-day Python objects anywhere.
+    """
+
+    def __init__(self, metrics: Sequence[str]):
+        self.metrics = tuple(metrics)
+        self._rows = {metric: i for i, metric in enumerate(self.metrics)}
+        self._series: Dict[str, DailySeries] = {}
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self._series
+
+    def add(self, video_id: str, day: date, **increments):
+        """Add to one day's counters"""
+        series = self._series.get(video_id)
+        if series is None:
+            series = self._series[video_id] = DailySeries(day, len(self.metrics))
+
+        column = series.ensure(day)
+        for metric, amount in increments.items():
+            series.values[self._rows[metric], column] += amount
+
+    def load(self, video_id: str, start: date, columns: Dict[str, Sequence[int]]):
+        """Replace a video's series with whole columns of daily counters from ``start``"""
+        days = max((len(column) for column in columns.values()), default=0)
+        series = DailySeries(start, len(self.metrics), max(days, 1))
+        for metric, column in columns.items():
+            series.values[self._rows[metric], :len(column)] = column
+        series.length = days
+        self._series[video_id] = series
+
+    def totals(self, video_id: str, start: date, end: date) -> Dict[str, int]:
+        """Sum every metric over an inclusive date range"""
+        series = self._series.get(video_id)
+        if series is None:
+            return {metric: 0 for metric in self.metrics}
+
+        window, _ = series.window(start, end)
+        return dict(zip(self.metrics, window.sum(axis=1).tolist()))
+
+    def active_totals(self, start: date, end: date) -> Iterator[Tuple[str, Dict[str, int]]]:
+        """Yield (video ID, totals) for each video with counters in an inclusive date range"""
+        for video_id, series in list(self._series.items()):
+            window, _ = series.window(start, end)
+            if window.any():
+                yield video_id, dict(zip(self.metrics, window.sum(axis=1).tolist()))
+
+    def totals_many(self, video_ids: Iterable[str], start: date, end: date) -> Dict[str, int]:
+        """Sum every metric over a date range across several videos"""
+        totals = np.zeros(len(self.metrics), dtype=np.int64)
+        for video_id in video_ids:
+            series = self._series.get(video_id)
+            if series is not None:
+                totals += series.window(start, end)[0].sum(axis=1)
+        return dict(zip(self.metrics, totals.tolist()))
+
+    def series(self, video_ids: Iterable[str], start: date, end: date, bucket_starts: Optional[List[date]] = None) -> np.ndarray:
+        """Get a (metrics, buckets) array of counters summed across videos
+
+        Buckets are single days from ``start`` to ``end`` unless
+        ``bucket_starts`` gives the first day of each bucket, in which case
+        each bucket runs until the next one and the last until ``end``.
+        """
+        days = (end - start).days + 1
+        daily = np.zeros((len(self.metrics), days), dtype=np.int64)
+        for video_id in video_ids:
+            series = self._series.get(video_id)
+            if series is None:
+                continue
+            window, offset = series.window(start, end)
+            daily[:, offset:offset + window.shape[1]] += window
+
+        if bucket_starts is None:
+            return daily
+        indexes = [max(0, (bucket - start).days) for bucket in bucket_starts]
+        return np.add.reduceat(daily, indexes, axis=1)
@@ -0,0 +1,215 @@
+import json
+import os
+import shutil
+import subprocess
+import uuid
+from typing import Callable, List, Optional
+
+from settings import env_int
+
+# HLS settings
+HLS_SEGMENT_SECONDS = env_int("HLS_SEGMENT_SECONDS", 6)
+TRANSCODE_TIMEOUT = 6 * 60 * 60  # seconds
+
+# Rendition ladder, highest first. Bitrates are in kbps.
+RENDITION_LADDER = [
+    {"name": "1080p", "height": 1080, "videoBitrate": 5000, "audioBitrate": 192, "codecs": "avc1.640028,mp4a.40.2", "profile": "high", "level": "4.0"},
+    {"name": "720p", "height": 720, "videoBitrate": 2800, "audioBitrate": 128, "codecs": "avc1.4d401f,mp4a.40.2", "profile": "main", "level": "3.1"},
+    {"name": "480p", "height": 480, "videoBitrate": 1400, "audioBitrate": 128, "codecs": "avc1.4d401e,mp4a.40.2", "profile": "main", "level": "3.0"},
+    {"name": "360p", "height": 360, "videoBitrate": 800, "audioBitrate": 96, "codecs": "avc1.42e01e,mp4a.40.2", "profile": "baseline", "level": "3.0"},
+    {"name": "240p", "height": 240, "videoBitrate": 400, "audioBitrate": 64, "codecs": "avc1.42e015,mp4a.40.2", "profile": "baseline", "level": "2.1"}
+]
+
+
+def select_ladder(source_height: Optional[int]) -> List[dict]:
+    """Get the renditions worth producing for a source, never upscaling"""
+    if not source_height:
+        return list(RENDITION_LADDER)
+
+    ladder = [r for r in RENDITION_LADDER if r["height"] <= source_height]
+    return ladder or [RENDITION_LADDER[-1]]
+
+def get_rendition(name: str) -> dict:
+    """Look up a rendition in the ladder by name"""
+    for rendition in RENDITION_LADDER:
+        if rendition["name"] == name:
+            return rendition
+    raise ValueError(f"Unknown rendition {name}")
+
+def transcode_rendition(source: str, rendition: dict, output_dir: str, segment_seconds: int = HLS_SEGMENT_SECONDS):
+    """Encode one rendition into ``output_dir/index.m3u8`` plus its segments
+
+    Keyframes are forced on segment boundaries so every rendition splits at
+    the same timestamps and players can switch between them cleanly.
+    """
+    video_kbps = rendition["videoBitrate"]
+    subprocess.run(
+        [
+            "ffmpeg", "-v", "error", "-y", "-i", source,
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-vf", f"scale=-2:{rendition['height']}",
+            "-c:v", "libx264", "-preset", "veryfast",
+            "-profile:v", rendition["profile"], "-level", rendition["level"],
+            "-b:v", f"{video_kbps}k", "-maxrate", f"{int(video_kbps * 1.07)}k", "-bufsize", f"{video_kbps * 2}k",
+            "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})", "-sc_threshold", "0",
+            "-c:a", "aac", "-b:a", f"{rendition['audioBitrate']}k", "-ac", "2",
+            "-f", "hls", "-hls_time", str(segment_seconds), "-hls_playlist_type", "vod",
+            "-hls_segment_filename", os.path.join(output_dir, "seg_%05d.ts"),
+            os.path.join(output_dir, "index.m3u8")
+        ],
+        capture_output=True, check=True, timeout=TRANSCODE_TIMEOUT
+    )
+
+def measure_bandwidth(playlist_path: str) -> dict:
+    """Work out peak and average bits per second from a media playlist's segments"""
+    directory = os.path.dirname(playlist_path)
+    peak = 0
+    total_bits = 0
+    total_seconds = 0.0
+    duration = None
+
+    with open(playlist_path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:"):].split(",")[0])
+            elif line and not line.startswith("#") and duration:
+                bits = os.path.getsize(os.path.join(directory, line)) * 8
+                peak = max(peak, bits / duration)
+                total_bits += bits
+                total_seconds += duration
+                duration = None
+
+    if not total_seconds:
+        raise ValueError(f"No segments in {playlist_path}")
+
+    return {"bandwidth": int(peak), "averageBandwidth": int(total_bits / total_seconds)}
+
+def build_master_playlist(renditions: List[dict], uri_for: Callable[[dict], str] = lambda r: r["playlist"]) -> str:
+    """Build the master playlist that lists every packaged rendition"""
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-INDEPENDENT-SEGMENTS"]
+    for rendition in sorted(renditions, key=lambda r: r["bandwidth"], reverse=True):
+        attributes = [
+            f"BANDWIDTH={rendition['bandwidth']}",
+            f"AVERAGE-BANDWIDTH={rendition['averageBandwidth']}",
+            f"RESOLUTION={rendition['width']}x{rendition['height']}",
+            f"CODECS=\"{rendition['codecs']}\""
+        ]
+        lines.append("#EXT-X-STREAM-INF:" + ",".join(attributes))
+        lines.append(uri_for(rendition))
+    return "\n".join(lines) + "\n"
+
+
+class HlsPackager:
+    """Packages videos into per-rendition HLS playlists under one directory
+
+    Each video gets ``{root}/{video_id}/`` holding one directory per rendition,
+    a ``renditions.json`` record of what has been packaged and a relative
+    ``master.m3u8``. Renditions are encoded into a temporary directory and
+    renamed into place, and the record is rewritten after each one. Packaging
+    therefore picks up where it left off, and adding a rendition later only
+    encodes that rendition.
+    """
+
+    def __init__(self, root: str, transcode: Callable = transcode_rendition):
+        self.root = os.path.abspath(root)
+        self.transcode = transcode
+
+    def video_dir(self, video_id: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, video_id))
+        if os.path.dirname(path) != self.root:
+            raise ValueError(f"Invalid video ID {video_id}")
+        return path
+
+    def renditions(self, video_id: str) -> List[dict]:
+        """Get the renditions packaged so far for a video"""
+        try:
+            with open(os.path.join(self.video_dir(video_id), "renditions.json")) as f:
+                return json.load(f)["renditions"]
+        except FileNotFoundError:
+            return []
+
+    def package(
+        self,
+        video_id: str,
+        source: str,
+        source_width: Optional[int],
+        source_height: Optional[int],
+        ladder: Optional[List[dict]] = None
+    ) -> List[dict]:
+        """Encode every rendition in the ladder that is not packaged yet"""
+        if ladder is None:
+            ladder = select_ladder(source_height)
+
+        renditions = self.renditions(video_id)
+        done = {r["name"] for r in renditions}
+        for rendition in ladder:
+            if rendition["name"] in done:
+                continue
+            renditions.append(self._encode(video_id, source, source_width, source_height, rendition))
+            self._save(video_id, renditions)
+
+        return renditions
+
+    def add_rendition(
+        self,
+        video_id: str,
+        source: str,
+        source_width: Optional[int],
+        source_height: Optional[int],
+        name: str
+    ) -> List[dict]:
+        """Encode one more rendition without touching the existing ones"""
+        return self.package(video_id, source, source_width, source_height, ladder=[get_rendition(name)])
+
+    def master_playlist(self, video_id: str, uri_for: Optional[Callable[[dict], str]] = None) -> Optional[str]:
+        """Build the master playlist for a video, or None if nothing is packaged"""
+        renditions = self.renditions(video_id)
+        if not renditions:
+            return None
+        if uri_for is None:
+            return build_master_playlist(renditions)
+        return build_master_playlist(renditions, uri_for)
+
+    def _encode(self, video_id, source, source_width, source_height, rendition) -> dict:
+        video_dir = self.video_dir(video_id)
+        final_dir = os.path.join(video_dir, rendition["name"])
+        temp_dir = os.path.join(video_dir, f".{rendition['name']}.{uuid.uuid4().hex}")
+        os.makedirs(temp_dir)
+
+        try:
+            self.transcode(source, rendition, temp_dir)
+            measured = measure_bandwidth(os.path.join(temp_dir, "index.m3u8"))
+            if os.path.isdir(final_dir):
+                shutil.rmtree(final_dir)
+            os.replace(temp_dir, final_dir)
+        except BaseException:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+        height = rendition["height"]
+        if source_width and source_height:
+            width = round(source_width * height / source_height / 2) * 2
+        else:
+            width = round(height * 16 / 9 / 2) * 2
+
+        return {
+            "name": rendition["name"],
+            "width": width,
+            "height": height,
+            "codecs": rendition["codecs"],
+            "bandwidth": measured["bandwidth"],
+            "averageBandwidth": measured["averageBandwidth"],
+            "playlist": f"{rendition['name']}/index.m3u8"
+        }
+
+    def _save(self, video_id: str, renditions: List[dict]):
+        video_dir = self.video_dir(video_id)
+        for name, content in (
+            ("renditions.json", json.dumps({"renditions": renditions}, indent=2)),
+            ("master.m3u8", build_master_playlist(renditions))
+        ):
+            temp_path = os.path.join(video_dir, f"{name}.part")
+            with open(temp_path, "w") as f:
+                f.write(content)
+            os.replace(temp_path, os.path.join(video_dir, name))
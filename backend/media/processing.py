@@ -0,0 +1,273 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import struct
+import subprocess
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from media.hls import HlsPackager
+from settings import env_bool, env_int
+
+logger = logging.getLogger(__name__)
+
+# Processing settings
+MEDIA_WORKERS = env_int("MEDIA_WORKERS", os.cpu_count() or 1)
+PROBE_TIMEOUT = 60  # seconds
+MAX_FINISHED_JOBS = 10000
+HLS_ENABLED = env_bool("HLS_ENABLED", True)
+
+# MP4/QuickTime boxes that only contain other boxes
+CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"udta"}
+
+
+# Probing
+def iter_boxes(f, start: int, end: int):
+    """Yield (type, body_start, body_end) for the boxes between two offsets"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            break
+
+        yield box_type, offset + header, min(offset + size, end)
+        offset += size
+
+def probe_mp4(path: str) -> dict:
+    """Read duration, brand and frame size from an MP4/QuickTime file's boxes
+
+    Only box headers and the small mvhd/tkhd boxes are read, so probing a
+    multi-GB file costs a handful of seeks.
+    """
+    metadata = {"container": None, "duration": None, "width": None, "height": None}
+    file_size = os.path.getsize(path)
+
+    with open(path, "rb") as f:
+        def walk(start, end):
+            for box_type, body, box_end in iter_boxes(f, start, end):
+                if box_type == b"ftyp":
+                    f.seek(body)
+                    metadata["container"] = f.read(4).decode("ascii", "replace").strip()
+                elif box_type == b"mvhd":
+                    f.seek(body)
+                    version = f.read(4)[0]
+                    if version == 1:
+                        _, _, timescale, duration = struct.unpack(">QQIQ", f.read(28))
+                    else:
+                        _, _, timescale, duration = struct.unpack(">IIII", f.read(16))
+                    if timescale:
+                        metadata["duration"] = round(duration / timescale, 3)
+                elif box_type == b"tkhd" and metadata["width"] is None:
+                    f.seek(body)
+                    version = f.read(4)[0]
+                    f.seek(body + (88 if version == 1 else 76))
+                    width, height = struct.unpack(">II", f.read(8))
+                    if width and height:
+                        metadata["width"] = width >> 16
+                        metadata["height"] = height >> 16
+                elif box_type in CONTAINER_BOXES:
+                    walk(body, box_end)
+
+        walk(0, file_size)
+
+    if metadata["duration"] is None:
+        raise ValueError("No movie header found, not an MP4/QuickTime file")
+    return metadata
+
+def probe_ffprobe(path: str) -> dict:
+    """Read container metadata with ffprobe"""
+    output = subprocess.run(
+        ["ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+        capture_output=True, check=True, timeout=PROBE_TIMEOUT
+    ).stdout
+    info = json.loads(output)
+    video = next((s for s in info.get("streams", []) if s.get("codec_type") == "video"), {})
+    audio = next((s for s in info.get("streams", []) if s.get("codec_type") == "audio"), {})
+    fmt = info.get("format", {})
+
+    return {
+        "container": fmt.get("format_name"),
+        "duration": round(float(fmt["duration"]), 3) if "duration" in fmt else None,
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "videoCodec": video.get("codec_name"),
+        "audioCodec": audio.get("codec_name"),
+        "bitrate": int(fmt["bit_rate"]) if "bit_rate" in fmt else None
+    }
+
+def generate_thumbnail(path: str, thumbnail_path: str, duration: Optional[float]) -> bool:
+    """Grab a frame for the thumbnail with ffmpeg, if it is installed"""
+    if shutil.which("ffmpeg") is None:
+        return False
+
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    seek = min(1.0, (duration or 0) / 2)
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-y", "-ss", str(seek), "-i", path,
+         "-frames:v", "1", "-vf", "scale=640:-2", thumbnail_path],
+        capture_output=True, check=True, timeout=PROBE_TIMEOUT
+    )
+    return True
+
+def process_video(
+    path: str,
+    thumbnail_path: Optional[str] = None,
+    hls_root: Optional[str] = None,
+    video_id: Optional[str] = None
+) -> dict:
+    """Probe an uploaded video, generate its thumbnail and package it for HLS
+
+    Runs in a worker process: everything here is blocking and CPU or disk
+    heavy, and must stay off the event loop. HLS packaging is skipped when
+    no ``hls_root`` is given or ffmpeg is not installed.
+    """
+    if shutil.which("ffprobe") is not None:
+        metadata = probe_ffprobe(path)
+    else:
+        metadata = probe_mp4(path)
+
+    metadata["thumbnailGenerated"] = bool(
+        thumbnail_path and generate_thumbnail(path, thumbnail_path, metadata["duration"])
+    )
+
+    metadata["renditions"] = []
+    if hls_root and video_id and shutil.which("ffmpeg") is not None:
+        renditions = HlsPackager(hls_root).package(video_id, path, metadata["width"], metadata["height"])
+        metadata["renditions"] = [rendition["name"] for rendition in renditions]
+
+    return metadata
+
+
+# Job queue
+class MediaJobQueue:
+    """Asynchronous queue of processing jobs run on a process pool
+
+    Jobs are queued in the event loop and ``workers`` dispatcher tasks hand
+    them to the executor one at a time, so at most ``workers`` files are
+    processed at once and the event loop only ever awaits futures. Job state
+    stays queryable by ID after the job finishes.
+    """
+
+    def __init__(self, workers: int = MEDIA_WORKERS, executor: Optional[Executor] = None):
+        self.workers = max(1, workers)
+        self._executor = executor
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    def start(self):
+        """Start the dispatcher tasks on the running event loop"""
+        if self._queue is not None:
+            return
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    async def submit(
+        self,
+        video_id: str,
+        path: str,
+        thumbnail_path: Optional[str] = None,
+        on_complete: Optional[Callable[[dict], Awaitable[None]]] = None,
+        hls_root: Optional[str] = None
+    ) -> dict:
+        """Queue a video for processing and return its job"""
+        self.start()
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "videoId": video_id,
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "createdAt": datetime.utcnow().isoformat() + "Z",
+            "finishedAt": None
+        }
+        self._jobs[job["id"]] = job
+        await self._queue.put((job, (path, thumbnail_path, hls_root, video_id), on_complete))
+        return job
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """Get a job's current state"""
+        return self._jobs.get(job_id)
+
+    async def join(self):
+        """Wait until every queued job has finished"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def shutdown(self):
+        """Stop the dispatchers and the process pool"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+        if self._executor is not None:
+            # Waiting for running jobs blocks, so it is done off the event loop
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown, True)
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job, args, on_complete = await self._queue.get()
+            job["status"] = "processing"
+            try:
+                job["result"] = await loop.run_in_executor(self._executor, process_video, *args)
+                job["status"] = "ready"
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = str(e)
+            job["finishedAt"] = datetime.utcnow().isoformat() + "Z"
+
+            try:
+                if on_complete is not None:
+                    await on_complete(job)
+            except Exception:
+                logger.exception("Media job %s completion handler failed", job["id"])
+            finally:
+                self._forget_old_jobs()
+                self._queue.task_done()
+
+    def _forget_old_jobs(self):
+        while len(self._jobs) > MAX_FINISHED_JOBS:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest["finishedAt"] is None:
+                break
+            del self._jobs[oldest_id]
+
+
+_media_jobs: Optional[MediaJobQueue] = None
+
+def get_media_jobs() -> MediaJobQueue:
+    """Get the shared media processing queue"""
+    global _media_jobs
+    if _media_jobs is None:
+        _media_jobs = MediaJobQueue()
+    return _media_jobs
+
+def set_media_jobs(queue: Optional[MediaJobQueue]):
+    """Replace the shared media processing queue, e.g. in tests"""
+    global _media_jobs
+    _media_jobs = queue
+
+async def shutdown_media_jobs():
+    """Stop the shared queue if it was ever started"""
+    if _media_jobs is not None:
+        await _media_jobs.shutdown()
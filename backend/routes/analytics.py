@@ -1,145 +1,122 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta
 import random
 
+from analytics.engagment import get_demographics
+from analytics.events import EventBatchTooLarge, decode_events, dispatch_events, log_activity, validate_events
+from analytics.watch_time import WatchTimeBufferFull, get_watch_time_buffer
+from database import queries
+
 # Create router
 router = APIRouter()
 
-# Mock video performance data
-def generate_mock_data(days=30, base_views=100):
-    """Generate mock analytics data for testing"""
-    today = datetime.now()
-    data = []
-    
-    for i in range(days):
-        date = today - timedelta(days=i)
-        # Generate some random data with an overall upward trend
-        views = max(0, base_views - i + random.randint(-20, 20))
-        
-        data.append({
-            "date": date.strftime("%Y-%m-%d"),
-            "views": views,
-            "uniqueViewers": int(views * 0.7),
-            "averageWatchTime": random.randint(40, 90),
-            "completionRate": random.randint(30, 80),
-            "shares": int(views * 0.05),
-            "ratings": int(views * 0.02)
-        })
-    
-    return sorted(data, key=lambda x: x["date"])
+# Rollup helpers
+TIMEFRAME_DAYS = {"week": 7, "month": 30, "year": 365}
+SERIES_KEYS = {"day": "dailyData", "week": "weeklyData", "month": "monthlyData"}
+
+def average_watch_time(counters: dict) -> float:
+    """Seconds watched per view"""
+    return round(counters["watchTimeSeconds"] / counters["views"], 1) if counters["views"] else 0
+
+def completion_rate(counters: dict) -> float:
+    """Percentage of views that reached the end of the video"""
+    return round(counters["completions"] / counters["views"] * 100, 1) if counters["views"] else 0
 
 # Routes
 @router.get("/video/{video_id}")
 async def get_video_analytics(
     video_id: str,
-    timeframe: str = "month"
+    timeframe: str = "month",
+    interval: Optional[str] = None
 ):
-    """Get analytics for a specific video"""
-    # In a real app, fetch from database
+    """Get analytics for a specific video
     
-    # Determine days based on timeframe
-    if timeframe == "week":
-        days = 7
-    elif timeframe == "month":
-        days = 30
-    elif timeframe == "year":
-        days = 365
-    else:
-        days = 30  # Default to month
+    The series is daily, as ``dailyData``, unless a coarser ``interval`` is
+    asked for, which returns ``weeklyData`` or ``monthlyData`` instead.
+    """
+    if queries.get_video(video_id) is None:
+        raise HTTPException(status_code=404, detail="Video not found")
     
-    # Generate mock data
-    daily_data = generate_mock_data(days=days, base_views=300)
+    # Determine days based on timeframe
+    if timeframe not in TIMEFRAME_DAYS:
+        raise HTTPException(status_code=400, detail="Timeframe must be week, month or year")
+    days = TIMEFRAME_DAYS[timeframe]
+    interval = interval or "day"
+    if interval not in SERIES_KEYS:
+        raise HTTPException(status_code=400, detail="Interval must be day, week or month")
     
-    # Calculate totals and averages
-    total_views = sum(day["views"] for day in daily_data)
-    total_shares = sum(day["shares"] for day in daily_data)
-    avg_watch_time = sum(day["averageWatchTime"] for day in daily_data) / len(daily_data)
+    # Totals and series come from pre-aggregated rollups, never per-day scans
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+    totals = queries.get_video_activity_totals(video_id, start, end)
+    series = queries.get_video_activity_series(video_id, start, end, interval)
     
     return {
         "videoId": video_id,
         "timeframe": timeframe,
+        "interval": interval,
         "totals": {
-            "views": total_views,
-            "uniqueViewers": int(total_views * 0.7),
-            "shares": total_shares,
-            "ratings": int(total_views * 0.02),
-            "averageWatchTime": avg_watch_time,
-            "averageCompletionRate": sum(day["completionRate"] for day in daily_data) / len(daily_data)
+            "views": totals["views"],
+            "uniqueViewers": totals["uniqueViewers"],
+            "shares": totals["shares"],
+            "ratings": totals["ratings"],
+            "averageWatchTime": average_watch_time(totals),
+            "averageCompletionRate": completion_rate(totals)
         },
-        "dailyData": daily_data,
-        "demographics": {
-            "locations": [
-                {"name": "United States", "percentage": 45},
-                {"name": "United Kingdom", "percentage": 15},
-                {"name": "Canada", "percentage": 10},
-                {"name": "Germany", "percentage": 8},
-                {"name": "France", "percentage": 7},
-                {"name": "Other", "percentage": 15}
-            ],
-            "devices": [
-                {"name": "Mobile", "percentage": 55},
-                {"name": "Desktop", "percentage": 35},
-                {"name": "Tablet", "percentage": 8},
-                {"name": "TV", "percentage": 2}
-            ],
-            "referrers": [
-                {"name": "Direct", "percentage": 40},
-                {"name": "Social Media", "percentage": 30},
-                {"name": "External Websites", "percentage": 20},
-                {"name": "Search", "percentage": 10}
-            ]
-        }
+        SERIES_KEYS[interval]: [
+            {
+                "date": row["date"],
+                "views": row["views"],
+                "uniqueViewers": row["uniqueViewers"],
+                "averageWatchTime": average_watch_time(row),
+                "completionRate": completion_rate(row),
+                "shares": row["shares"],
+                "ratings": row["ratings"]
+            }
+            for row in series
+        ],
+        "demographics": get_demographics().breakdown(video_id)
     }
 
 @router.get("/filmmaker")
 async def get_filmmaker_analytics():
     """Get overall analytics for the current filmmaker"""
     # In a real app, get the filmmaker ID from auth token
+    user_id = "user123"
     
-    # Generate some mock data
-    return {
-        "totalViews": 12500,
-        "totalVideos": 5,
-        "totalWatchTime": 52000,  # in seconds
-        "averageRating": 4.6,
-        "totalShares": 320,
-        "totalRatings": 230,
-        "viewsChange": 12.5,  # percentage change from previous period
-        "sharesChange": 8.3,
-        "ratingChange": 0.2,
-        "topVideos": [
-            {
-                "id": "video1",
-                "title": "Amazing Short Film",
-                "views": 5000,
-                "averageRating": 4.8
-            },
-            {
-                "id": "video2",
-                "title": "Commercial Demo",
-                "views": 3000,
-                "averageRating": 4.5
-            }
-        ],
-        "viewsByDay": generate_mock_data(days=30, base_views=500),
-        "geographicDistribution": [
-            {"region": "North America", "percentage": 55},
-            {"region": "Europe", "percentage": 25},
-            {"region": "Asia", "percentage": 12},
-            {"region": "Other", "percentage": 8}
-        ]
-    }
+    # The summary is materialized and kept current as events arrive
+    return queries.get_filmmaker_dashboard(user_id)
 
 @router.post("/watch-time")
 async def record_watch_time(
     videoId: str,
     watchTimeSeconds: int,
-    percentageWatched: float
+    percentageWatched: float,
+    request: Request,
+    viewerId: Optional[str] = None
 ):
     """Record video watch time for analytics"""
-    # In a real app, store this in a database
+    if watchTimeSeconds < 0 or not 0 <= percentageWatched <= 100:
+        raise HTTPException(status_code=400, detail="Watch time must be positive and percentage between 0 and 100")
+    if queries.get_video(videoId) is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    # Heartbeats are coalesced in memory and written in batches
+    viewer_id = viewerId or (request.client.host if request.client else "anonymous")
+    try:
+        await get_watch_time_buffer().record(videoId, viewer_id, watchTimeSeconds, percentageWatched)
+    except WatchTimeBufferFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    log_activity(
+        "watch-time",
+        videoId,
+        viewerId=viewer_id,
+        watchTimeSeconds=watchTimeSeconds,
+        percentageWatched=percentageWatched
+    )
+    
     return {
         "success": True,
         "videoId": videoId,
@@ -149,6 +126,42 @@ async def record_watch_time(
         }
     }
 
+@router.post("/events")
+async def record_events(request: Request, viewerId: Optional[str] = None):
+    """Record a batch of watch time, share and history events
+    
+    The body is a JSON array of events, or one event per line when sent as
+    application/x-ndjson. Valid events are recorded and invalid ones are
+    reported back by index.
+    """
+    body = await request.body()
+    try:
+        items = decode_events(body, request.headers.get("content-type", "application/json"))
+    except EventBatchTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    events, errors = validate_events(items)
+    if errors and not events:
+        raise HTTPException(status_code=422, detail=errors)
+    
+    # In a real app, get the user ID from auth token
+    user_id = "user123"
+    viewer_id = viewerId or (request.client.host if request.client else "anonymous")
+    try:
+        counts = await dispatch_events(events, viewer_id, user_id)
+    except WatchTimeBufferFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    
+    return {
+        "success": True,
+        "accepted": len(events),
+        "rejected": len(errors),
+        "counts": counts,
+        "errors": errors
+    }
+
 @router.post("/shares")
 async def record_share(
     videoId: str,
@@ -156,7 +169,11 @@ async def record_share(
     url: str
 ):
     """Record when a video is shared"""
-    # In a real app, store this in a database
+    if queries.add_shares(videoId) is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    queries.record_video_activity(videoId, shares=1)
+    log_activity("share", videoId)
     return {
         "success": True,
         "videoId": videoId,
@@ -6,6 +6,8 @@ from datetime import datetime, timedelta
 import os
 from typing import Dict, Optional
 
+from database import queries
+
 # Create router
 router = APIRouter()
 
@@ -141,6 +143,8 @@ async def verify_student(email: str, code: str):
     if code == "123456" and email in fake_users_db:
         user = fake_users_db[email]
         user["is_verified"] = True
+        # Verified students compete for the student filmmaker award
+        queries.update_user(user["id"], isVerified=True)
         return {"success": True, "message": "Student account verified successfully"}
     
     raise HTTPException(
@@ -1,54 +1,59 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta
 
-# Create router
-router = APIRouter()
+from awards.film_of_the_month import previous_month
+from awards.hall_of_fame import HALL_OF_FAME_MAX_AGE, IMMUTABLE_CACHE_CONTROL, HallOfFame, HallOfFameSnapshot
+from awards.student_awards import get_student_awards
+from cache.responses import listed_ids
+from cache.shared import get_shared_cache
+from database.leaderboard import LeaderboardIndex
+from storage.serving import etag_matches
+from database.queries import (
+    get_latest_awards_month,
+    get_leaderboard_rank,
+    get_leaderboard_size,
+    get_leaderboard_videos,
+    get_monthly_awards,
+    get_student_board_version,
+    get_user_by_id,
+    get_video
+)
 
-# Mock leaderboard data
-mock_leaderboard = [
-    {
-        "id": "video1",
-        "title": "Amazing Short Film",
-        "category": "short-film",
-        "thumbnailUrl": "/previews/video1.jpg",
-        "views": 5000,
-        "averageRating": 4.8,
-        "filmmaker": {
-            "id": "user123",
-            "name": "Test Filmmaker",
-            "isVerified": True
-        }
-    },
-    {
-        "id": "video2",
-        "title": "Commercial Demo",
-        "category": "commercial",
-        "thumbnailUrl": "/previews/video2.jpg",
-        "views": 3000,
-        "averageRating": 4.5,
-        "filmmaker": {
-            "id": "user123",
-            "name": "Test Filmmaker",
-            "isVerified": True
-        }
-    },
-    {
-        "id": "video3",
-        "title": "Student Project",
-        "category": "short-film",
-        "thumbnailUrl": "/previews/video3.jpg",
-        "views": 2000,
-        "averageRating": 4.9,
+# Create router, encoding responses with orjson
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# Timeframe names the frontend uses
+TIMEFRAME_ALIASES = {"weekly": "week", "monthly": "month", "yearly": "year"}
+
+# Helpers
+def leaderboard_timeframe(timeframe: str) -> str:
+    """Normalize a timeframe, rejecting unknown ones"""
+    timeframe = TIMEFRAME_ALIASES.get(timeframe, timeframe)
+    if timeframe not in LeaderboardIndex.TIMEFRAMES:
+        raise HTTPException(status_code=400, detail="Timeframe must be week, month, year or all")
+    return timeframe
+
+def leaderboard_entry(video: dict) -> dict:
+    """Project a catalog video into a leaderboard entry with filmmaker info"""
+    filmmaker = get_user_by_id(video["userId"]) or {}
+    return {
+        "id": video["id"],
+        "title": video["title"],
+        "category": video["category"],
+        "thumbnailUrl": video["thumbnailUrl"],
+        "views": video["views"],
+        "averageRating": video["averageRating"],
+        "score": video["score"],
         "filmmaker": {
-            "id": "student1",
-            "name": "Film Student",
-            "isVerified": True,
-            "isStudent": True
+            "id": video["userId"],
+            "name": filmmaker.get("name"),
+            "isVerified": filmmaker.get("isVerified", False),
+            "isStudent": filmmaker.get("isStudent", False)
         }
     }
-]
 
 # Mock hall of fame data
 mock_hall_of_fame = {
@@ -112,48 +117,92 @@ mock_hall_of_fame = {
     ]
 }
 
+def build_hall_of_fame() -> dict:
+    """Assemble the hall of fame with the current student award winner"""
+    current_year = {**mock_hall_of_fame["currentYear"], "studentFilmmaker": get_student_awards()["winner"]}
+    return {**mock_hall_of_fame, "currentYear": current_year}
+
+# Pre-serialized hall of fame, rebuilt when the student board changes
+hall_of_fame = HallOfFame(build_hall_of_fame, get_student_board_version)
+
+def hall_of_fame_response(request: Request, snapshot: HallOfFameSnapshot, cache_control: str) -> Response:
+    """Send a snapshot's bytes, or 304 if the client already has them"""
+    headers = {"etag": snapshot.etag, "cache-control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
 @router.get("/leaderboard")
 async def get_leaderboard(
     category: str = "all",
     timeframe: str = "month",
     limit: int = 5
 ):
-    """Get the current leaderboard"""
-    # Filter by category if needed
-    if category != "all":
-        filtered = [v for v in mock_leaderboard if v["category"] == category]
-    else:
-        filtered = mock_leaderboard
+    """Get the current leaderboard of videos uploaded within a timeframe"""
+    timeframe = leaderboard_timeframe(timeframe)
+    
+    # Read the top of the ranked index instead of sorting every video
+    return await get_shared_cache().get_or_load(
+        f"awards:leaderboard:{category}:{timeframe}:{limit}",
+        lambda: [leaderboard_entry(video) for video in get_leaderboard_videos(category, timeframe, limit)],
+        lambda entries: ["awards", *listed_ids(entries, "video")]
+    )
+
+@router.get("/leaderboard/{video_id}/rank")
+async def get_leaderboard_position(
+    video_id: str,
+    category: str = "all",
+    timeframe: str = "month"
+):
+    """Get a video's position on a leaderboard"""
+    timeframe = leaderboard_timeframe(timeframe)
+    if get_video(video_id) is None:
+        raise HTTPException(status_code=404, detail="Video not found")
     
-    # Sort by rating (in a real app, would use different criteria based on timeframe)
-    sorted_videos = sorted(filtered, key=lambda v: v["averageRating"], reverse=True)
+    rank = get_leaderboard_rank(video_id, category, timeframe)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="Video is not on this leaderboard")
     
-    # Return top videos up to limit
-    return sorted_videos[:limit]
+    return {
+        "videoId": video_id,
+        "category": category,
+        "timeframe": timeframe,
+        "rank": rank,
+        "total": get_leaderboard_size(category, timeframe)
+    }
 
 @router.get("/hall-of-fame")
-async def get_hall_of_fame():
-    """Get Hall of Fame data with Film of the Year and Student Filmmaker awards"""
-    return mock_hall_of_fame
+async def get_hall_of_fame(request: Request):
+    """Get Hall of Fame data with Film of the Year and Student Filmmaker awards
+    
+    The ETag is the snapshot's version, which can be fetched from
+    /hall-of-fame/{version} and cached for good.
+    """
+    return hall_of_fame_response(request, hall_of_fame.current(), f"public, max-age={HALL_OF_FAME_MAX_AGE}")
+
+@router.get("/hall-of-fame/{version}")
+async def get_hall_of_fame_version(version: str, request: Request):
+    """Get one immutable version of the Hall of Fame"""
+    snapshot = hall_of_fame.get(version)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Hall of Fame version not found")
+    return hall_of_fame_response(request, snapshot, IMMUTABLE_CACHE_CONTROL)
 
 @router.get("/monthly-winners")
 async def get_monthly_winners(
-    month: Optional[int] = None,
+    month: Optional[int] = Query(None, ge=1, le=12),
     year: Optional[int] = None
 ):
-    """Get winners for a specific month"""
-    # In a real app, would filter by month and year
-    # Default to current month if none specified
-    
-    # Sort by rating for simplicity
-    sorted_videos = sorted(mock_leaderboard, key=lambda v: v["averageRating"], reverse=True)
+    """Get the stored winners for a month, by default the latest month awarded"""
+    if month is None and year is None:
+        key = get_latest_awards_month()
+    else:
+        default_year, default_month = previous_month(datetime.utcnow().date())
+        key = (year or default_year, month or default_month)
     
-    # Add ranking
-    for i, video in enumerate(sorted_videos):
-        video["rank"] = i + 1
+    # Winners are computed once by the monthly batch job and stored as JSON
+    awards = get_monthly_awards(*key) if key else None
+    if awards is None:
+        raise HTTPException(status_code=404, detail="No winners have been awarded for that month")
     
-    return {
-        "month": month or datetime.now().month,
-        "year": year or datetime.now().year,
-        "winners": sorted_videos[:5]
-    }
\ No newline at end of file
+    return Response(content=awards, media_type="application/json")
@@ -0,0 +1,61 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import RedirectResponse
+import os
+
+from database import queries
+from storage.backends import get_storage_backend
+from storage.serving import serve_file
+
+# Create routers
+router = APIRouter()
+hls_router = APIRouter()
+
+# HLS playlists and segments, by extension
+HLS_MEDIA_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t"}
+
+# Routes
+@router.api_route("/{filename}", methods=["GET", "HEAD"])
+async def get_video_file(filename: str, request: Request):
+    """Serve a video file, with Range support so players can seek"""
+    video_id, _ = os.path.splitext(filename)
+    video = queries.get_video(video_id)
+    if video is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    key = video.get("storageKey", f"videos/{filename}")
+    if os.path.basename(key) != filename:
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    backend = get_storage_backend()
+    try:
+        path = backend.local_path(key)
+    except NotImplementedError:
+        # Object stores serve ranges themselves
+        return RedirectResponse(backend.url_for(key), status_code=307)
+
+    try:
+        return await serve_file(path, request.headers, method=request.method)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Video file not found")
+
+@hls_router.api_route("/{video_id}/{rendition}/{filename}", methods=["GET", "HEAD"])
+async def get_hls_file(video_id: str, rendition: str, filename: str, request: Request):
+    """Serve a rendition's media playlist or one of its segments"""
+    media_type = HLS_MEDIA_TYPES.get(os.path.splitext(filename)[1])
+    # Renditions being encoded live in hidden directories until they are complete
+    if media_type is None or rendition.startswith(".") or queries.get_video(video_id) is None:
+        raise HTTPException(status_code=404, detail="HLS file not found")
+
+    key = f"hls/{video_id}/{rendition}/{filename}"
+    backend = get_storage_backend()
+    try:
+        path = backend.local_path(key)
+    except NotImplementedError:
+        return RedirectResponse(backend.url_for(key), status_code=307)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="HLS file not found")
+
+    try:
+        return await serve_file(path, request.headers, method=request.method, media_type=media_type)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="HLS file not found")
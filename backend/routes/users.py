@@ -1,48 +1,17 @@
 from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import uuid
 from datetime import datetime
 
-# Create router
-router = APIRouter()
+from analytics.events import log_activity
+from cache.shared import get_shared_cache
+from database import queries
+from database.queries import fake_users_db
 
-# Mock user database - replace with real database in production
-fake_users_db = {
-    "user123": {
-        "id": "user123",
-        "email": "filmmaker@example.com",
-        "name": "Test Filmmaker",
-        "bio": "Award-winning filmmaker with a passion for storytelling",
-        "location": "Los Angeles, CA",
-        "profilePicture": "/profiles/user123.jpg",
-        "isStudent": False,
-        "isVerified": True,
-        "subscription": "Pro",
-        "joinDate": "2023-01-15T00:00:00Z",
-        "socialLinks": {
-            "instagram": "https://instagram.com/testfilmmaker",
-            "twitter": "https://twitter.com/testfilmmaker",
-            "vimeo": "https://vimeo.com/testfilmmaker"
-        }
-    },
-    "student1": {
-        "id": "student1",
-        "email": "student@example.com",
-        "name": "Film Student",
-        "bio": "Film student at NYU",
-        "location": "New York, NY",
-        "profilePicture": "/profiles/student1.jpg",
-        "isStudent": True,
-        "isVerified": True,
-        "subscription": "Student",
-        "joinDate": "2023-03-10T00:00:00Z",
-        "school": "NYU Tisch School of the Arts",
-        "socialLinks": {
-            "instagram": "https://instagram.com/filmstudent"
-        }
-    }
-}
+# Create router, encoding responses with orjson
+router = APIRouter(default_response_class=ORJSONResponse)
 
 # Routes
 @router.get("/profile")
@@ -59,8 +28,9 @@ async def get_user_profile():
 @router.get("/profile/{user_id}")
 async def get_user_by_id(user_id: str):
     """Get a user's profile by ID"""
-    if user_id in fake_users_db:
-        return fake_users_db[user_id]
+    user = await get_shared_cache().get_or_load(f"user:{user_id}", lambda: queries.load_user(user_id), [f"user:{user_id}"])
+    if user is not None:
+        return user
     
     raise HTTPException(status_code=404, detail="User not found")
 
@@ -79,24 +49,33 @@ async def update_profile(
         raise HTTPException(status_code=404, detail="User not found")
     
     # Update user fields
-    user = fake_users_db[user_id]
+    changes = {}
     
     if name is not None:
-        user["name"] = name
+        changes["name"] = name
     
     if bio is not None:
-        user["bio"] = bio
+        changes["bio"] = bio
     
     if location is not None:
-        user["location"] = location
+        changes["location"] = location
     
     if social_links is not None:
-        user["socialLinks"] = social_links
+        changes["socialLinks"] = social_links
     
-    return user
+    return queries.update_user(user_id, **changes)
 
 @router.post("/history")
 async def update_watch_history(video_id: str, progress: float):
     """Add or update a video in the user's watch history"""
-    # In a real app, get the user ID from auth token and store in a database
+    # In a real app, get the user ID from auth token
+    user_id = "user123"
+    now = datetime.utcnow().isoformat() + "Z"
+    queries.save_watch_history([{
+        "userId": user_id,
+        "videoId": video_id,
+        "progress": progress,
+        "updatedAt": now
+    }])
+    log_activity("history", video_id, userId=user_id, progress=progress, at=now)
     return {"success": True, "videoId": video_id, "progress": progress}
\ No newline at end of file
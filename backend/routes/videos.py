@@ -1,65 +1,197 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Request, Response
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Tuple
+import os
 import uuid
 import json
+import base64
+import binascii
 from datetime import datetime
+from itertools import islice
+from starlette.concurrency import run_in_threadpool
 
-# Create router
-router = APIRouter()
-
-# Mock video database - replace with real database in production
-fake_videos_db = [
-    {
-        "id": "video1",
-        "title": "Amazing Short Film",
-        "description": "A beautiful short film about nature",
-        "category": "short-film",
-        "userId": "user123",
-        "uploadDate": "2023-06-01T12:00:00Z",
-        "duration": 480,  # 8 minutes
-        "views": 5000,
-        "averageRating": 4.8,
-        "ratingCount": 120,
-        "shares": 300,
-        "thumbnailUrl": "/previews/video1.jpg",
-        "videoUrl": "/videos/video1.mp4",
-        "isPublic": True,
-        "tags": ["nature", "cinematic", "4k"]
-    },
-    {
-        "id": "video2",
-        "title": "Commercial Demo",
-        "description": "A sample commercial for a fictional product",
-        "category": "commercial",
-        "userId": "user123",
-        "uploadDate": "2023-05-15T10:00:00Z",
-        "duration": 60,  # 1 minute
-        "views": 3000,
-        "averageRating": 4.5,
-        "ratingCount": 80,
-        "shares": 150,
-        "thumbnailUrl": "/previews/video2.jpg",
-        "videoUrl": "/videos/video2.mp4",
-        "isPublic": True,
-        "tags": ["commercial", "product", "advertisement"]
+from analytics.engagment import get_demographics, view_metadata
+from analytics.events import log_activity
+from cache.responses import listed_ids
+from cache.shared import get_shared_cache
+from database import queries
+from media.hls import HlsPackager
+from media.processing import HLS_ENABLED, get_media_jobs
+from storage.backends import get_storage_backend
+from storage.ingest import upload_to_storage, UploadTooLargeError
+from storage.resumable import (
+    DEFAULT_CHUNK_SIZE,
+    UploadSessionConflict,
+    UploadSessionNotFound,
+    get_upload_store
+)
+
+# Create router, encoding responses with orjson
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# Models
+class UploadSessionCreate(BaseModel):
+    title: str
+    description: str
+    category: str
+    isPublic: bool = True
+    tags: str = ""
+    filename: str = ""
+    totalSize: int
+    chunkSize: int = DEFAULT_CHUNK_SIZE
+    sha256: Optional[str] = None
+
+# Pagination cursors
+def encode_cursor(video: dict) -> str:
+    """Encode a video's (uploadDate, id) position as an opaque cursor"""
+    position = json.dumps([video["uploadDate"], video["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Decode a cursor back into an (uploadDate, id) position"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        upload_date, video_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    
+    if not isinstance(upload_date, str) or not isinstance(video_id, str):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    
+    return upload_date, video_id
+
+# Uploads
+def video_extension(filename: Optional[str]) -> str:
+    """Get the file extension to store an uploaded video under"""
+    return os.path.splitext(filename or "")[1].lower() or ".mp4"
+
+async def load_video_detail(video_id: str) -> Optional[dict]:
+    """Get a video with its filmmaker's info, or None"""
+    video = await queries.load_video(video_id)
+    if video is None:
+        return None
+    
+    filmmaker = await queries.load_user(video["userId"]) or {}
+    video_with_filmmaker = video.copy()
+    video_with_filmmaker["filmmaker"] = {
+        "id": video["userId"],
+        "name": filmmaker.get("name"),
+        "isVerified": filmmaker.get("isVerified", False)
+    }
+    return video_with_filmmaker
+
+def create_video_record(
+    video_id: str,
+    title: str,
+    description: str,
+    category: str,
+    isPublic: bool,
+    tags: str,
+    stored_video: dict,
+    thumbnail_url: str
+) -> dict:
+    """Add the catalog record for a video whose file has been stored"""
+    new_video = {
+        "id": video_id,
+        "title": title,
+        "description": description,
+        "category": category,
+        "userId": "user123",  # Would come from auth in a real app
+        "uploadDate": datetime.utcnow().isoformat() + "Z",
+        "duration": 0,  # Filled in once the file has been probed
+        "views": 0,
+        "averageRating": 0,
+        "ratingCount": 0,
+        "shares": 0,
+        "thumbnailUrl": thumbnail_url,
+        "videoUrl": stored_video["url"],
+        "storageKey": stored_video["key"],
+        "fileSize": stored_video["size"],
+        "checksum": stored_video["sha256"],
+        "isPublic": isPublic,
+        "tags": tags.split(",") if tags else [],
+        "status": "processing",
+        "processingJobId": None
     }
-]
+    
+    # Add to database
+    return queries.create_video(new_video)
+
+async def start_processing(video: dict, generate_thumbnail: bool) -> dict:
+    """Queue a stored video for probing and thumbnail generation
+    
+    The upload request returns straight away; the job fills in duration,
+    container metadata and the thumbnail when it finishes.
+    """
+    backend = get_storage_backend()
+    thumbnail_key = f"previews/{video['id']}.jpg"
+    try:
+        path = backend.local_path(video["storageKey"])
+        thumbnail_path = backend.local_path(thumbnail_key) if generate_thumbnail else None
+        hls_root = backend.local_path("hls") if HLS_ENABLED else None
+    except NotImplementedError as e:
+        return queries.update_video(video["id"], status="failed", processingError=str(e))
+    
+    async def apply_result(job: dict):
+        if job["status"] != "ready":
+            queries.update_video(job["videoId"], status="failed", processingError=job["error"])
+            return
+        
+        result = job["result"]
+        changes = {
+            "status": "ready",
+            "duration": round(result["duration"] or 0),
+            "media": {
+                field: value for field, value in result.items()
+                if field not in ("thumbnailGenerated", "renditions")
+            },
+            "renditions": result["renditions"]
+        }
+        if result["thumbnailGenerated"]:
+            changes["thumbnailUrl"] = backend.url_for(thumbnail_key)
+        if result["renditions"]:
+            changes["hlsUrl"] = f"/api/videos/{job['videoId']}/master.m3u8"
+        queries.update_video(job["videoId"], **changes)
+    
+    job = await get_media_jobs().submit(
+        video["id"], path, thumbnail_path, on_complete=apply_result, hls_root=hls_root
+    )
+    return queries.update_video(video["id"], processingJobId=job["id"])
 
 # Routes
 @router.get("/")
-async def get_videos(category: Optional[str] = None, limit: int = 50, page: int = 1):
-    """Get a list of videos, optionally filtered by category"""
-    skip = (page - 1) * limit
+async def get_videos(
+    response: Response,
+    category: Optional[str] = None,
+    limit: int = 50,
+    page: int = 1,
+    after: Optional[str] = None
+):
+    """Get a list of videos, newest first, optionally filtered by category
+    
+    Pass the X-Next-Cursor header from a previous response as ``after`` to
+    fetch the next page without the server skipping over earlier rows.
+    """
+    if limit < 1 or page < 1:
+        raise HTTPException(status_code=400, detail="Page and limit must be positive")
     
     # Filter by category if provided
-    if category and category != "all":
-        filtered_videos = [v for v in fake_videos_db if v["category"] == category and v["isPublic"]]
-    else:
-        filtered_videos = [v for v in fake_videos_db if v["isPublic"]]
+    videos = queries.iter_videos(
+        after=decode_cursor(after) if after else None,
+        category=category if category and category != "all" else None,
+        isPublic=True
+    )
     
-    # Paginate results
-    paginated_videos = filtered_videos[skip:skip + limit]
+    # Offset pagination for older clients that still send page numbers
+    if not after:
+        videos = islice(videos, (page - 1) * limit, None)
+    
+    # Fetch one extra row to know whether there is another page
+    paginated_videos = list(islice(videos, limit + 1))
+    if len(paginated_videos) > limit:
+        paginated_videos = paginated_videos[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(paginated_videos[-1])
     
     return paginated_videos
 
@@ -67,29 +199,53 @@ async def get_videos(category: Optional[str] = None, limit: int = 50, page: int
 async def get_featured_videos(limit: int = 6):
     """Get featured videos for the homepage"""
     # In a real app, this would use criteria to select featured videos
-    return sorted(fake_videos_db, key=lambda v: v["views"], reverse=True)[:limit]
+    return await get_shared_cache().get_or_load(
+        f"videos:featured:{limit}",
+        lambda: queries.get_top_videos(limit),
+        lambda videos: ["videos", *listed_ids(videos, "video")]
+    )
 
 @router.get("/popular")
 async def get_popular_videos(timeframe: str = "week", limit: int = 10):
-    """Get popular videos for a given timeframe"""
-    # In a real app, this would filter by upload date based on timeframe
-    return sorted(fake_videos_db, key=lambda v: v["views"], reverse=True)[:limit]
+    """Get the most viewed videos uploaded within a timeframe"""
+    if timeframe not in ("week", "month", "year", "all"):
+        raise HTTPException(status_code=400, detail="Timeframe must be week, month, year or all")
+    
+    return await get_shared_cache().get_or_load(
+        f"videos:popular:{timeframe}:{limit}",
+        lambda: queries.get_top_videos(limit, timeframe),
+        lambda videos: ["videos", *listed_ids(videos, "video")]
+    )
 
 @router.get("/{video_id}")
 async def get_video(video_id: str):
     """Get a single video by ID"""
-    for video in fake_videos_db:
-        if video["id"] == video_id:
-            # Add filmmaker info
-            video_with_filmmaker = video.copy()
-            video_with_filmmaker["filmmaker"] = {
-                "id": "user123",
-                "name": "Test Filmmaker",
-                "isVerified": True
-            }
-            return video_with_filmmaker
-    
-    raise HTTPException(status_code=404, detail="Video not found")
+    video = await get_shared_cache().get_or_load(f"video:{video_id}", lambda: load_video_detail(video_id), [f"video:{video_id}"])
+    if video is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    return video
+
+@router.get("/{video_id}/master.m3u8")
+async def get_master_playlist(video_id: str):
+    """Get the HLS master playlist listing a video's renditions"""
+    if queries.get_video(video_id) is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    backend = get_storage_backend()
+    try:
+        packager = HlsPackager(backend.local_path("hls"))
+    except NotImplementedError:
+        raise HTTPException(status_code=404, detail="No HLS renditions for this video")
+    
+    playlist = await run_in_threadpool(
+        packager.master_playlist,
+        video_id,
+        lambda rendition: backend.url_for(f"hls/{video_id}/{rendition['playlist']}")
+    )
+    if playlist is None:
+        raise HTTPException(status_code=404, detail="No HLS renditions for this video")
+    
+    return Response(content=playlist, media_type="application/vnd.apple.mpegurl")
 
 @router.post("/upload")
 async def upload_video(
@@ -101,35 +257,130 @@ async def upload_video(
     videoFile: UploadFile = File(...),
     thumbnailFile: Optional[UploadFile] = File(None)
 ):
-    """Upload a new video"""
-    # In a real app, save files to storage and process video
-    
+    """Upload a new video, streaming the files to storage"""
     # Generate a video ID
-    video_id = f"video{len(fake_videos_db) + 1}"
+    video_id = queries.next_video_id()
     
-    # Create new video entry
-    new_video = {
-        "id": video_id,
-        "title": title,
-        "description": description,
-        "category": category,
-        "userId": "user123",  # Would come from auth in a real app
-        "uploadDate": datetime.now().isoformat(),
-        "duration": 300,  # Would be extracted from the actual video
-        "views": 0,
-        "averageRating": 0,
-        "ratingCount": 0,
-        "shares": 0,
-        "thumbnailUrl": f"/previews/{video_id}.jpg",
-        "videoUrl": f"/videos/{video_id}.mp4",
-        "isPublic": isPublic,
-        "tags": tags.split(",") if tags else []
-    }
+    # Stream the files to storage in chunks rather than reading them into memory
+    try:
+        stored_video = await upload_to_storage(videoFile, f"videos/{video_id}{video_extension(videoFile.filename)}")
+        if thumbnailFile is not None:
+            stored_thumbnail = await upload_to_storage(thumbnailFile, f"previews/{video_id}.jpg")
+            thumbnail_url = stored_thumbnail["url"]
+        else:
+            thumbnail_url = f"/previews/{video_id}.jpg"
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     
-    # Add to database
-    fake_videos_db.append(new_video)
+    new_video = create_video_record(
+        video_id, title, description, category, isPublic, tags, stored_video, thumbnail_url
+    )
+    return await start_processing(new_video, generate_thumbnail=thumbnailFile is None)
+
+@router.post("/uploads")
+async def create_upload_session(upload: UploadSessionCreate):
+    """Start a resumable upload
+    
+    Send each chunk to PUT /uploads/{session_id}/chunks/{index}, in any order
+    and in parallel, then POST /uploads/{session_id}/complete.
+    """
+    metadata = upload.dict(exclude={"totalSize", "chunkSize", "sha256"})
+    try:
+        return await run_in_threadpool(
+            get_upload_store().create_session,
+            upload.totalSize, metadata, chunk_size=upload.chunkSize, sha256=upload.sha256
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/uploads/{session_id}")
+async def get_upload_session(session_id: str):
+    """Get which chunks of a resumable upload are still missing"""
+    try:
+        return await run_in_threadpool(get_upload_store().status, session_id)
+    except UploadSessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.put("/uploads/{session_id}/chunks/{index}")
+async def upload_chunk(session_id: str, index: int, request: Request):
+    """Store one chunk of a resumable upload from the raw request body"""
+    try:
+        return await get_upload_store().write_chunk(session_id, index, request.stream())
+    except UploadSessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/uploads/{session_id}/complete")
+async def complete_upload_session(session_id: str):
+    """Assemble a fully received upload and create its video"""
+    store = get_upload_store()
+    try:
+        session = await run_in_threadpool(store.get_session, session_id)
+    except UploadSessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    metadata = session["metadata"]
+    video_id = queries.next_video_id()
+    try:
+        stored_video = await store.finalize(
+            session_id,
+            get_storage_backend(),
+            f"videos/{video_id}{video_extension(metadata['filename'])}"
+        )
+    except UploadSessionNotFound as e:
+        # Another request finished or cancelled the session in the meantime
+        raise HTTPException(status_code=404, detail=str(e))
+    except UploadSessionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return new_video
+    new_video = create_video_record(
+        video_id,
+        metadata["title"],
+        metadata["description"],
+        metadata["category"],
+        metadata["isPublic"],
+        metadata["tags"],
+        stored_video,
+        f"/previews/{video_id}.jpg"
+    )
+    return await start_processing(new_video, generate_thumbnail=True)
+
+@router.delete("/uploads/{session_id}")
+async def cancel_upload_session(session_id: str):
+    """Abandon a resumable upload and delete its chunks"""
+    try:
+        await run_in_threadpool(get_upload_store().delete_session, session_id)
+    except UploadSessionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    return {"success": True}
+
+@router.get("/jobs/{job_id}")
+async def get_processing_job(job_id: str):
+    """Get the state of a media processing job"""
+    job = get_media_jobs().get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job
+
+@router.post("/{video_id}/view")
+async def record_view(video_id: str, request: Request, viewerId: Optional[str] = None):
+    """Record a view of a video"""
+    video = queries.add_views(video_id)
+    if video is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    viewer_id = viewerId or (request.client.host if request.client else None)
+    metadata = view_metadata(request.headers)
+    # Demographics first, so the dashboard refresh the view triggers includes its location
+    get_demographics().record(video_id, **metadata)
+    queries.record_video_activity(video_id, viewer_id, views=1)
+    log_activity("view", video_id, viewerId=viewer_id, **metadata)
+    return {"views": video["views"]}
 
 @router.post("/{video_id}/rate")
 async def rate_video(video_id: str, rating: float):
@@ -137,15 +388,21 @@ async def rate_video(video_id: str, rating: float):
     if rating < 0.5 or rating > 5 or rating % 0.5 != 0:
         raise HTTPException(status_code=400, detail="Rating must be between 0.5 and 5 in 0.5 increments")
     
-    for video in fake_videos_db:
-        if video["id"] == video_id:
-            # Update rating (simplified - a real app would store individual ratings)
-            current_total = video["averageRating"] * video["ratingCount"]
-            video["ratingCount"] += 1
-            video["averageRating"] = (current_total + rating) / video["ratingCount"]
-            return {
-                "averageRating": video["averageRating"],
-                "ratingCount": video["ratingCount"]
-            }
-    
-    raise HTTPException(status_code=404, detail="Video not found")
\ No newline at end of file
+    video = queries.get_video(video_id)
+    if video is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    # Update rating (simplified - a real app would store individual ratings)
+    current_total = video["averageRating"] * video["ratingCount"]
+    rating_count = video["ratingCount"] + 1
+    video = queries.update_video(
+        video_id,
+        ratingCount=rating_count,
+        averageRating=(current_total + rating) / rating_count
+    )
+    queries.record_video_activity(video_id, ratings=1, ratingPoints=int(rating * 2))
+    log_activity("rating", video_id, rating=rating)
+    return {
+        "averageRating": video["averageRating"],
+        "ratingCount": video["ratingCount"]
+    }
\ No newline at end of file
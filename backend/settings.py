@@ -0,0 +1,29 @@
+"""Settings read from the environment
+
+Numbers and flags may be followed by a ``# comment``, as they are in the
+config/*.env files. Text settings are used exactly as given, since
+passwords, URLs and paths may contain "#" themselves, so comments on them
+go on a line of their own.
+"""
+import os
+
+
+def env_str(name: str, default: str = "") -> str:
+    """Get a text setting, unchanged"""
+    return os.getenv(name, default)
+
+def _number_text(name: str, default) -> str:
+    value = os.getenv(name, "").split("#")[0].strip()
+    return value or str(default)
+
+def env_int(name: str, default: int) -> int:
+    """Get a whole number setting"""
+    return int(_number_text(name, default))
+
+def env_float(name: str, default: float) -> float:
+    """Get a number setting"""
+    return float(_number_text(name, default))
+
+def env_bool(name: str, default: bool) -> bool:
+    """Get a true/false setting"""
+    return _number_text(name, str(default).lower()).lower() == "true"
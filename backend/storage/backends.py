@@ -0,0 +1,209 @@
+import os
+import uuid
+from typing import List, Optional
+
+# Storage settings
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+MEDIA_BUCKET = os.getenv("MEDIA_BUCKET", "vidora-dev-media")
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL", "")
+
+# Object stores reject multipart parts smaller than this, except the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class StorageWriter:
+    """Incremental writer for one stored object
+
+    Call ``write`` for each chunk, then ``commit`` to make the object visible,
+    or ``abort`` to throw away whatever was written.
+    """
+
+    def write(self, chunk: bytes):
+        raise NotImplementedError
+
+    def commit(self) -> str:
+        """Finish the object and return its URL"""
+        raise NotImplementedError
+
+    def abort(self):
+        raise NotImplementedError
+
+
+class StorageBackend:
+    """Somewhere uploaded media can be streamed to"""
+
+    def open_writer(self, key: str) -> StorageWriter:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def url_for(self, key: str) -> str:
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> str:
+        """Get a filesystem path for a stored object, for media processing"""
+        raise NotImplementedError(f"{type(self).__name__} does not keep local files")
+
+
+class LocalFileWriter(StorageWriter):
+    """Writes to a temporary file that is renamed into place on commit"""
+
+    def __init__(self, path: str, url: str):
+        self.path = path
+        self.url = url
+        self.temp_path = f"{path}.{uuid.uuid4().hex}.part"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(self.temp_path, "wb")
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+
+    def commit(self) -> str:
+        self._file.close()
+        os.replace(self.temp_path, self.path)
+        return self.url
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class LocalStorageBackend(StorageBackend):
+    """Stores media as files under a local directory"""
+
+    def __init__(self, root: str = UPLOAD_DIR, base_url: str = MEDIA_BASE_URL):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+
+    def path_for(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key {key}")
+        return path
+
+    def url_for(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def local_path(self, key: str) -> str:
+        return self.path_for(key)
+
+    def open_writer(self, key: str) -> StorageWriter:
+        return LocalFileWriter(self.path_for(key), self.url_for(key))
+
+    def delete(self, key: str) -> bool:
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            return False
+        os.remove(path)
+        return True
+
+
+class ObjectStoreWriter(StorageWriter):
+    """Uploads an object as a multipart upload, one part at a time
+
+    Chunks are buffered until a full part is ready, so at most one part is
+    held in memory no matter how large the object is.
+    """
+
+    def __init__(self, backend: "ObjectStoreBackend", key: str):
+        self.backend = backend
+        self.key = key
+        self.parts: List[dict] = []
+        self._buffer = bytearray()
+        self._upload_id = backend.client.create_multipart_upload(
+            Bucket=backend.bucket, Key=key
+        )["UploadId"]
+
+    def write(self, chunk: bytes):
+        self._buffer += chunk
+        while len(self._buffer) >= self.backend.part_size:
+            part = bytes(self._buffer[:self.backend.part_size])
+            del self._buffer[:self.backend.part_size]
+            self._upload_part(part)
+
+    def commit(self) -> str:
+        if self._buffer or not self.parts:
+            self._upload_part(bytes(self._buffer))
+            self._buffer.clear()
+
+        self.backend.client.complete_multipart_upload(
+            Bucket=self.backend.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": self.parts}
+        )
+        return self.backend.url_for(self.key)
+
+    def abort(self):
+        self._buffer.clear()
+        self.backend.client.abort_multipart_upload(
+            Bucket=self.backend.bucket, Key=self.key, UploadId=self._upload_id
+        )
+
+    def _upload_part(self, body: bytes):
+        part_number = len(self.parts) + 1
+        response = self.backend.client.upload_part(
+            Bucket=self.backend.bucket,
+            Key=self.key,
+            PartNumber=part_number,
+            UploadId=self._upload_id,
+            Body=body
+        )
+        self.parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+
+
+class ObjectStoreBackend(StorageBackend):
+    """Stores media in an S3-compatible object store
+
+    ``client`` is anything with the boto3 S3 client multipart methods, e.g.
+    ``boto3.client("s3")`` or a GCS/R2 client speaking the same API.
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket: str = MEDIA_BUCKET,
+        base_url: Optional[str] = None,
+        part_size: int = 8 * 1024 * 1024
+    ):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"Part size must be at least {MIN_PART_SIZE} bytes")
+
+        self.client = client
+        self.bucket = bucket
+        self.base_url = (base_url or MEDIA_BASE_URL or f"https://{bucket}.s3.amazonaws.com").rstrip("/")
+        self.part_size = part_size
+
+    def url_for(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def open_writer(self, key: str) -> StorageWriter:
+        return ObjectStoreWriter(self, key)
+
+    def delete(self, key: str) -> bool:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        return True
+
+
+_default_backend: Optional[StorageBackend] = None
+
+def get_storage_backend() -> StorageBackend:
+    """Get the storage backend configured by STORAGE_BACKEND"""
+    global _default_backend
+    if _default_backend is None:
+        if STORAGE_BACKEND == "local":
+            _default_backend = LocalStorageBackend()
+        elif STORAGE_BACKEND == "s3":
+            import boto3
+            _default_backend = ObjectStoreBackend(boto3.client("s3"))
+        else:
+            raise ValueError(f"Unknown storage backend {STORAGE_BACKEND}")
+    return _default_backend
+
+def set_storage_backend(backend: Optional[StorageBackend]):
+    """Replace the default storage backend, e.g. in tests"""
+    global _default_backend
+    _default_backend = backend
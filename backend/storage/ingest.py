@@ -0,0 +1,68 @@
+import hashlib
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from settings import env_int
+from storage.backends import StorageBackend, get_storage_backend
+
+# Ingest settings
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+MAX_UPLOAD_SIZE = env_int("MAX_UPLOAD_SIZE", 500) * 1024 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload is bigger than the allowed maximum"""
+
+
+async def ingest_stream(
+    source,
+    backend: StorageBackend,
+    key: str,
+    chunk_size: int = CHUNK_SIZE,
+    max_size: Optional[int] = MAX_UPLOAD_SIZE
+) -> dict:
+    """Stream an upload into storage one chunk at a time
+
+    ``source`` is anything with an async ``read(size)``, such as a FastAPI
+    ``UploadFile``. Only one chunk is held in memory at a time while the
+    content is hashed and written, and blocking writes run in the threadpool
+    so they never stall the event loop. The stored object only becomes
+    visible once the whole stream has been written.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    writer = await run_in_threadpool(backend.open_writer, key)
+
+    try:
+        while True:
+            chunk = await source.read(chunk_size)
+            if not chunk:
+                break
+
+            size += len(chunk)
+            if max_size is not None and size > max_size:
+                raise UploadTooLargeError(f"Upload exceeds the {max_size} byte limit")
+
+            digest.update(chunk)
+            await run_in_threadpool(writer.write, chunk)
+
+        url = await run_in_threadpool(writer.commit)
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+
+    return {
+        "key": key,
+        "url": url,
+        "size": size,
+        "sha256": digest.hexdigest()
+    }
+
+async def upload_to_storage(upload, key: str, backend: Optional[StorageBackend] = None) -> dict:
+    """Stream an uploaded file to the configured storage backend"""
+    return await ingest_stream(upload, backend or get_storage_backend(), key)
+
+def delete_from_storage(key: str, backend: Optional[StorageBackend] = None) -> bool:
+    """Delete a stored file"""
+    return (backend or get_storage_backend()).delete(key)
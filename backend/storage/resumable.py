@@ -0,0 +1,288 @@
+import json
+import os
+import re
+import shutil
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from storage.backends import UPLOAD_DIR, StorageBackend
+from storage.ingest import CHUNK_SIZE, MAX_UPLOAD_SIZE, ingest_stream
+
+# Resumable upload settings
+SESSION_DIR = os.getenv("RESUMABLE_UPLOAD_DIR", os.path.join(UPLOAD_DIR, "sessions"))
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+SESSION_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadSessionNotFound(LookupError):
+    """Raised when an upload session does not exist"""
+
+
+class UploadSessionConflict(RuntimeError):
+    """Raised when a session is already being finalized"""
+
+
+class ChunkFileReader:
+    """Async reader that streams a session's chunk files back in order"""
+
+    def __init__(self, paths: List[str]):
+        self.paths = list(paths)
+        self._file = None
+
+    async def read(self, size: int = CHUNK_SIZE) -> bytes:
+        while True:
+            if self._file is None:
+                if not self.paths:
+                    return b""
+                self._file = await run_in_threadpool(open, self.paths.pop(0), "rb")
+
+            data = await run_in_threadpool(self._file.read, size)
+            if data:
+                return data
+
+            await run_in_threadpool(self._file.close)
+            self._file = None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ResumableUploadStore:
+    """Upload sessions whose chunks are kept on disk until finalized
+
+    Each session is a directory holding an immutable ``session.json`` and
+    one file per received chunk. Chunks are written to a temporary file and
+    renamed into place, so a chunk file either exists completely or not at
+    all. Which chunks have arrived is read back from the directory, so
+    sessions survive a worker restart and chunks can be PUT in parallel
+    from any worker that shares the directory.
+    """
+
+    def __init__(
+        self,
+        root: str = SESSION_DIR,
+        min_chunk_size: int = MIN_CHUNK_SIZE,
+        max_chunk_size: int = MAX_CHUNK_SIZE,
+        max_size: Optional[int] = MAX_UPLOAD_SIZE
+    ):
+        self.root = os.path.abspath(root)
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.max_size = max_size
+
+    # Session lifecycle
+    def create_session(
+        self,
+        total_size: int,
+        metadata: dict,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        sha256: Optional[str] = None
+    ) -> dict:
+        """Start a new upload session"""
+        if total_size <= 0:
+            raise ValueError("Upload size must be positive")
+        if self.max_size is not None and total_size > self.max_size:
+            raise ValueError(f"Upload exceeds the {self.max_size} byte limit")
+        if not self.min_chunk_size <= chunk_size <= self.max_chunk_size:
+            raise ValueError(
+                f"Chunk size must be between {self.min_chunk_size} and {self.max_chunk_size} bytes"
+            )
+
+        session = {
+            "id": uuid.uuid4().hex,
+            "totalSize": total_size,
+            "chunkSize": chunk_size,
+            "chunkCount": -(-total_size // chunk_size),
+            "sha256": sha256.lower() if sha256 else None,
+            "metadata": metadata,
+            "createdAt": datetime.utcnow().isoformat() + "Z"
+        }
+
+        session_dir = self._session_dir(session["id"])
+        os.makedirs(os.path.join(session_dir, "chunks"))
+        self._write_json(os.path.join(session_dir, "session.json"), session)
+
+        return session
+
+    def get_session(self, session_id: str) -> dict:
+        """Load a session's settings"""
+        path = os.path.join(self._session_dir(session_id), "session.json")
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadSessionNotFound(f"Upload session {session_id} not found")
+
+    def status(self, session_id: str) -> dict:
+        """Describe which chunks have arrived and which byte ranges are missing"""
+        session = self.get_session(session_id)
+        received = self.received_chunks(session_id)
+        missing = [i for i in range(session["chunkCount"]) if i not in received]
+
+        return {
+            "id": session["id"],
+            "totalSize": session["totalSize"],
+            "chunkSize": session["chunkSize"],
+            "chunkCount": session["chunkCount"],
+            "receivedChunks": len(received),
+            "missingChunks": missing,
+            "missingRanges": self._byte_ranges(session, missing),
+            "complete": not missing
+        }
+
+    def received_chunks(self, session_id: str) -> set:
+        """Get the indexes of the chunks stored so far"""
+        chunk_dir = os.path.join(self._session_dir(session_id), "chunks")
+        try:
+            names = os.listdir(chunk_dir)
+        except FileNotFoundError:
+            raise UploadSessionNotFound(f"Upload session {session_id} not found")
+        return {int(name) for name in names if name.isdigit()}
+
+    def delete_session(self, session_id: str):
+        """Throw away a session and all of its chunks"""
+        session_dir = self._session_dir(session_id)
+        if not os.path.isdir(session_dir):
+            raise UploadSessionNotFound(f"Upload session {session_id} not found")
+        shutil.rmtree(session_dir, ignore_errors=True)
+
+    # Chunks
+    def expected_chunk_size(self, session: dict, index: int) -> int:
+        """Get the exact size chunk ``index`` must have"""
+        if not 0 <= index < session["chunkCount"]:
+            raise ValueError(f"Chunk index must be between 0 and {session['chunkCount'] - 1}")
+        start = index * session["chunkSize"]
+        return min(session["chunkSize"], session["totalSize"] - start)
+
+    async def write_chunk(self, session_id: str, index: int, body: AsyncIterator[bytes]) -> dict:
+        """Store one chunk from a stream of request body pieces"""
+        session = await run_in_threadpool(self.get_session, session_id)
+        expected = self.expected_chunk_size(session, index)
+
+        chunk_path = self._chunk_path(session_id, index)
+        temp_path = f"{chunk_path}.{uuid.uuid4().hex}.part"
+        size = 0
+
+        f = await run_in_threadpool(open, temp_path, "wb")
+        try:
+            async for piece in body:
+                size += len(piece)
+                if size > expected:
+                    raise ValueError(f"Chunk {index} must be {expected} bytes")
+                await run_in_threadpool(f.write, piece)
+            await run_in_threadpool(f.close)
+
+            if size != expected:
+                raise ValueError(f"Chunk {index} must be {expected} bytes, got {size}")
+            await run_in_threadpool(os.replace, temp_path, chunk_path)
+        except BaseException:
+            f.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return {"index": index, "size": size}
+
+    # Finalizing
+    async def finalize(self, session_id: str, backend: StorageBackend, key: str) -> dict:
+        """Assemble the chunks into a stored object and remove the session
+
+        Chunks are streamed into the storage backend in order, so assembly
+        never holds more than one read buffer in memory.
+        """
+        session = await run_in_threadpool(self.get_session, session_id)
+        status = await run_in_threadpool(self.status, session_id)
+        if not status["complete"]:
+            raise ValueError(f"Upload is missing {len(status['missingChunks'])} chunks")
+
+        # Only one request may assemble a session
+        marker = os.path.join(self._session_dir(session_id), "finalizing")
+        try:
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            raise UploadSessionConflict(f"Upload session {session_id} is already being finalized")
+        except FileNotFoundError:
+            raise UploadSessionNotFound(f"Upload session {session_id} not found")
+
+        reader = ChunkFileReader(
+            self._chunk_path(session_id, i) for i in range(session["chunkCount"])
+        )
+        try:
+            stored = await ingest_stream(reader, backend, key, max_size=session["totalSize"])
+            if session["sha256"] and stored["sha256"] != session["sha256"]:
+                await run_in_threadpool(backend.delete, key)
+                raise ValueError("Assembled upload does not match the expected checksum")
+        except FileNotFoundError:
+            # The session was cancelled while its chunks were being read
+            self._remove_marker(marker)
+            raise UploadSessionNotFound(f"Upload session {session_id} not found")
+        except BaseException:
+            self._remove_marker(marker)
+            raise
+        finally:
+            reader.close()
+
+        await run_in_threadpool(shutil.rmtree, self._session_dir(session_id), True)
+        return stored
+
+    # Helpers
+    def _session_dir(self, session_id: str) -> str:
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise UploadSessionNotFound(f"Upload session {session_id} not found")
+        return os.path.join(self.root, session_id)
+
+    def _chunk_path(self, session_id: str, index: int) -> str:
+        return os.path.join(self._session_dir(session_id), "chunks", f"{index:06d}")
+
+    @staticmethod
+    def _byte_ranges(session: dict, missing: List[int]) -> List[List[int]]:
+        # Merge runs of missing chunks into [start, end) byte ranges
+        ranges = []
+        for index in missing:
+            start = index * session["chunkSize"]
+            end = min(start + session["chunkSize"], session["totalSize"])
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+        return ranges
+
+    @staticmethod
+    def _remove_marker(marker: str):
+        # The session directory is gone if the upload was cancelled meanwhile
+        try:
+            os.remove(marker)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _write_json(path: str, data: dict):
+        temp_path = f"{path}.part"
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+
+_default_store: Optional[ResumableUploadStore] = None
+
+def get_upload_store() -> ResumableUploadStore:
+    """Get the resumable upload store under RESUMABLE_UPLOAD_DIR"""
+    global _default_store
+    if _default_store is None:
+        _default_store = ResumableUploadStore()
+    return _default_store
+
+def set_upload_store(store: Optional[ResumableUploadStore]):
+    """Replace the default resumable upload store, e.g. in tests"""
+    global _default_store
+    _default_store = store
@@ -0,0 +1,196 @@
+import mimetypes
+import os
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Mapping, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# ASGI extension that lets the server send file bytes straight to the socket
+ZERO_COPY_EXTENSION = "http.response.zerocopysend"
+READ_SIZE = 256 * 1024
+
+
+class RangeNotSatisfiable(ValueError):
+    """Raised when a Range header does not overlap the file"""
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    """Build a strong ETag from a file's inode, size and modification time"""
+    return f"\"{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}\""
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into inclusive (start, end) offsets
+
+    Returns None when the header is missing, malformed or asks for several
+    ranges, in which case the whole file is sent. Servers may ignore Range,
+    and players only ever ask for one range at a time.
+    """
+    if not header:
+        return None
+
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiable(f"Range {header} is empty")
+            return max(0, size - length), size - 1
+
+        start = int(first)
+        end = int(last) if last else None
+    except ValueError:
+        return None
+
+    if start < 0 or (end is not None and end < start):
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(f"Range {header} starts beyond {size} bytes")
+    return start, size - 1 if end is None else min(end, size - 1)
+
+def if_range_matches(if_range: Optional[str], etag: str, last_modified: float) -> bool:
+    """Check If-Range against the current ETag or modification date"""
+    if if_range is None:
+        return True
+
+    if_range = if_range.strip()
+    if if_range.startswith("\"") or if_range.startswith("W/"):
+        # Weak validators never match If-Range
+        return if_range == etag
+
+    try:
+        return parsedate_to_datetime(if_range).timestamp() == int(last_modified)
+    except (TypeError, ValueError):
+        return False
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check If-None-Match, which compares weakly"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+class FileRangeResponse(Response):
+    """Sends all or one byte range of a local file
+
+    When the server supports the ASGI zero-copy send extension the open file
+    is handed over with an offset and count, so the kernel copies the bytes
+    to the socket with sendfile(). Otherwise the range is read with pread()
+    in the threadpool, which needs no shared file position and so keeps
+    concurrent requests for the same file independent.
+
+    Uvicorn does not offer the extension, and ASGI gives applications no
+    access to the socket for ``loop.sendfile``, so under uvicorn every file
+    is sent through the pread() loop. Zero-copy sends need a server that
+    implements the extension, or a proxy such as nginx serving the media
+    files itself.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        stat_result: os.stat_result,
+        byte_range: Optional[Tuple[int, int]] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+        method: str = "GET"
+    ):
+        self.path = path
+        self.send_body = method.upper() != "HEAD"
+        self.background = None
+        self.media_type = media_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+        size = stat_result.st_size
+        if byte_range is None:
+            self.status_code = 200
+            self.offset, self.count = 0, size
+        else:
+            self.status_code = 206
+            self.offset, self.count = byte_range[0], byte_range[1] - byte_range[0] + 1
+
+        self.init_headers(headers)
+        self.headers["content-length"] = str(self.count)
+        if byte_range is not None:
+            self.headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if not self.send_body or not self.count:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        f = await run_in_threadpool(open, self.path, "rb")
+        try:
+            if ZERO_COPY_EXTENSION in scope.get("extensions", {}):
+                await send({
+                    "type": ZERO_COPY_EXTENSION,
+                    "file": f,
+                    "offset": self.offset,
+                    "count": self.count,
+                    "more_body": False
+                })
+                return
+
+            fd = f.fileno()
+            offset, remaining = self.offset, self.count
+            while remaining:
+                chunk = await run_in_threadpool(os.pread, fd, min(READ_SIZE, remaining), offset)
+                if not chunk:
+                    raise RuntimeError(f"{self.path} was truncated while it was being sent")
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": bool(remaining)})
+        finally:
+            await run_in_threadpool(f.close)
+
+
+async def serve_file(
+    path: str,
+    request_headers: Mapping[str, str],
+    method: str = "GET",
+    media_type: Optional[str] = None
+) -> Response:
+    """Answer a GET or HEAD for a local file, honoring Range and conditional headers
+
+    The media type is guessed from the file name unless given. Raises
+    FileNotFoundError if the path is not a regular file.
+    """
+    stat_result = await run_in_threadpool(os.stat, path)
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise FileNotFoundError(path)
+
+    etag = file_etag(stat_result)
+    headers = {
+        "accept-ranges": "bytes",
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True)
+    }
+
+    if etag_matches(request_headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        byte_range = parse_range(request_headers.get("range"), stat_result.st_size)
+    except RangeNotSatisfiable:
+        headers["content-range"] = f"bytes */{stat_result.st_size}"
+        return Response(status_code=416, headers=headers)
+
+    if byte_range is not None and not if_range_matches(request_headers.get("if-range"), etag, stat_result.st_mtime):
+        # The client's copy is stale, so it needs the whole current file
+        byte_range = None
+
+    return FileRangeResponse(path, stat_result, byte_range, headers=headers, media_type=media_type, method=method)
@@ -0,0 +1,69 @@
+"""Benchmark video catalog lookups as the catalog grows
+
+Compares primary-key and indexed lookups in VideoCatalog with the linear
+scans the routes used to do over a plain list.
+
+    python benchmarks/bench_catalog.py [--max-rows 1000000]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from database.models import VideoCatalog
+
+CATEGORIES = ["short-film", "commercial", "documentary", "music-video", "animation"]
+VIDEOS_PER_USER = 10
+START = datetime(2020, 1, 1)
+
+def make_videos(count):
+    """Generate synthetic catalog rows"""
+    return [
+        {
+            "id": f"video{i}",
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "userId": f"user{i // VIDEOS_PER_USER}",
+            "isPublic": i % 10 != 0,
+            "uploadDate": (START + timedelta(minutes=i)).isoformat() + "Z",
+            "views": i
+        }
+        for i in range(count)
+    ]
+
+def linear_get(videos, video_id):
+    for video in videos:
+        if video["id"] == video_id:
+            return video
+    return None
+
+def per_call_us(stmt, number):
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    sizes = [size for size in (1_000, 10_000, 100_000, 1_000_000) if size <= args.max_rows]
+    print(f"{'rows':>10} {'catalog get':>14} {'catalog userId':>16} {'linear get':>14}")
+
+    for size in sizes:
+        videos = make_videos(size)
+        catalog = VideoCatalog(videos)
+        ids = [f"video{random.randrange(size)}" for _ in range(1000)]
+        users = [f"user{random.randrange(size // VIDEOS_PER_USER)}" for _ in range(1000)]
+
+        get_us = per_call_us(lambda: [catalog.get(video_id) for video_id in ids], 10) / len(ids)
+        find_us = per_call_us(lambda: [catalog.find(userId=user) for user in users], 10) / len(users)
+        # Linear scans get slow quickly, so only sample a few of them
+        middle_id = f"video{size // 2}"
+        scan_us = per_call_us(lambda: linear_get(videos, middle_id), max(1, 100_000 // size))
+
+        print(f"{size:>10} {get_us:>12.3f}us {find_us:>14.3f}us {scan_us:>12.1f}us")
+
+if __name__ == "__main__":
+    main()
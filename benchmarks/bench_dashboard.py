@@ -0,0 +1,89 @@
+"""Benchmark filmmaker dashboard loads, recomputed versus materialized
+
+Gives one filmmaker many videos with a year of daily rollups, then loads
+their dashboard over and over with a few new events recorded between loads.
+Recomputing aggregates every video on each load, the way the route used to;
+the materialized summary applies the events in place and re-renders. Reports
+p50 and p99 load latency for both.
+
+    python benchmarks/bench_dashboard.py [--videos 2000] [--days 365] [--loads 500] [--events 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+import numpy as np
+
+from database.dashboards import FilmmakerDashboards
+from database.rollups import AnalyticsRollups
+
+def make_videos(count):
+    return [
+        {
+            "id": f"video{i}", "userId": "maker", "title": f"Video {i}", "views": 0,
+            "averageRating": 4.0, "ratingCount": 0, "shares": 0
+        }
+        for i in range(count)
+    ]
+
+def make_rollups(videos, days, today, rng):
+    rollups = AnalyticsRollups()
+    start = today - timedelta(days=days - 1)
+    for video in videos:
+        views = rng.integers(0, 300, days)
+        rollups.counters.load(video["id"], start, {
+            "views": views,
+            "watchTimeSeconds": views * rng.integers(30, 90, days),
+            "completions": views // 3,
+            "shares": views // 20,
+            "ratings": views // 50,
+            "ratingPoints": views // 50 * 9
+        })
+        video["views"] = int(views.sum())
+    return rollups
+
+def run(dashboards, videos, rollups, today, loads, events, recompute):
+    picker = random.Random(7)
+    latencies = []
+    for _ in range(loads):
+        for _ in range(events):
+            video_id = videos[picker.randrange(len(videos))]["id"]
+            dashboards.record_activity(
+                "maker", today, lambda: rollups.record(video_id, today, views=1), views=1
+            )
+        if recompute:
+            dashboards.invalidate("maker")
+
+        started = time.perf_counter()
+        dashboards.get("maker", lambda: videos, rollups)
+        latencies.append(time.perf_counter() - started)
+    return np.percentile(latencies, [50, 99]) * 1e3
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--videos", type=int, default=2_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--loads", type=int, default=500)
+    parser.add_argument("--events", type=int, default=5, help="events recorded between loads")
+    args = parser.parse_args()
+
+    now = datetime(2024, 6, 30, 12, 0)
+    today = now.date()
+    videos = make_videos(args.videos)
+    rollups = make_rollups(videos, args.days, today, np.random.default_rng(42))
+
+    recomputed = run(FilmmakerDashboards(clock=lambda: now), videos, rollups, today, args.loads, args.events, True)
+    materialized = run(FilmmakerDashboards(clock=lambda: now), videos, rollups, today, args.loads, args.events, False)
+    print(f"{args.videos} videos x {args.days} days, {args.events} events between loads")
+    print(f"{'':>14} {'p50':>10} {'p99':>10}")
+    print(f"{'recomputed':>14} {recomputed[0]:>8.3f}ms {recomputed[1]:>8.3f}ms")
+    print(f"{'materialized':>14} {materialized[0]:>8.3f}ms {materialized[1]:>8.3f}ms")
+    print(f"{'p99 speedup':>14} {recomputed[1] / materialized[1]:>20.1f}x")
+
+if __name__ == "__main__":
+    main()
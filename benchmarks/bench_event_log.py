@@ -0,0 +1,68 @@
+"""Benchmark appends to and replay of the analytics event log
+
+Appends player events from one thread with group commit and fsync on, waits
+for the last one to be durable and reports events per second, then replays
+the whole log and re-applies it to fresh rollups the way startup does after
+a crash.
+
+    python benchmarks/bench_event_log.py [--events 1000000] [--segment-mb 64] [--dir PATH]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from analytics.event_log import EventLog, replay_log, segment_paths
+from analytics.events import rebuild_from_log
+from database import queries
+from database.rollups import AnalyticsRollups
+
+def make_events(count):
+    at = datetime.utcnow().isoformat() + "Z"
+    kinds = ("view", "share", "rating", "view")
+    # Rebuilds skip videos outside the catalog, so events use the catalog's IDs
+    video_ids = [video["id"] for video in queries.fake_videos_db]
+    return [
+        {"type": kinds[i % 4], "videoId": video_ids[i % len(video_ids)], "viewerId": f"viewer{i % 20000}", "at": at}
+        for i in range(count)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--segment-mb", type=int, default=64)
+    parser.add_argument("--dir", default=None, help="log directory (default: a temporary one)")
+    args = parser.parse_args()
+
+    events = make_events(args.events)
+    with tempfile.TemporaryDirectory(dir=args.dir) as root:
+        log = EventLog(root, segment_bytes=args.segment_mb * 1024 * 1024)
+        started = time.perf_counter()
+        for event in events:
+            last = log.append(event)
+        log.wait_for(last)
+        append_seconds = time.perf_counter() - started
+        log.close()
+
+        size = sum(os.path.getsize(path) for path in segment_paths(root))
+        print(f"{args.events} events, {size / 1e6:.1f} MB in {len(segment_paths(root))} segments")
+        print(f"{'append + fsync':>20} {args.events / append_seconds:>12,.0f} events/s")
+
+        started = time.perf_counter()
+        replayed = sum(1 for _ in replay_log(root))
+        replay_seconds = time.perf_counter() - started
+        assert replayed == args.events
+        print(f"{'replay':>20} {replayed / replay_seconds:>12,.0f} events/s")
+
+        queries.video_rollups = AnalyticsRollups()
+        started = time.perf_counter()
+        rebuild_from_log(root)
+        rebuild_seconds = time.perf_counter() - started
+        print(f"{'rebuild rollups':>20} {args.events / rebuild_seconds:>12,.0f} events/s")
+
+if __name__ == "__main__":
+    main()
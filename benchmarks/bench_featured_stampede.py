@@ -0,0 +1,117 @@
+"""Load test the featured videos route across cache expiries
+
+Serves the video routes with uvicorn on a local port, behind the response
+cache as in the app, with a short record cache TTL and a backend that takes
+a while to answer. Many keep-alive clients then request /api/videos/featured
+together, in waves, for several TTLs. Each expiry should cost one backend
+call however many requests arrive at it, since stale entries are served
+while a single background refresh reloads them.
+
+    python benchmarks/bench_featured_stampede.py [--clients 1000] [--ttl 1] [--duration 5] [--backend-ms 50]
+"""
+import argparse
+import asyncio
+import math
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+import uvicorn
+from fastapi import FastAPI
+
+from cache.responses import RESPONSE_CACHE_RULES, ResponseCache, ResponseCacheMiddleware, set_response_cache
+from cache.shared import TieredCache, set_shared_cache
+from database import queries
+from routes import videos
+
+REQUEST = b"GET /api/videos/featured HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n"
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def counting_backend(delay):
+    """Wrap the featured query to count calls and answer after a delay"""
+    get_top_videos = queries.get_top_videos
+    calls = []
+
+    def slow_top_videos(*args, **kwargs):
+        calls.append(time.perf_counter())
+        time.sleep(delay)
+        return get_top_videos(*args, **kwargs)
+
+    queries.get_top_videos = slow_top_videos
+    return calls
+
+async def fetch(reader, writer):
+    writer.write(REQUEST)
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = next(int(line.split(b":")[1]) for line in head.split(b"\r\n") if line.lower().startswith(b"content-length:"))
+    await reader.readexactly(length)
+    if status != 200:
+        raise AssertionError(f"/api/videos/featured answered {status}")
+
+async def run_client(port, deadline, latencies):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await fetch(reader, writer)
+        latencies.append(time.perf_counter() - started)
+    writer.close()
+    await writer.wait_closed()
+
+async def load_test(port, clients, duration):
+    latencies = []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(run_client(port, deadline, latencies) for _ in range(clients)))
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=1000, help="concurrent keep-alive connections")
+    parser.add_argument("--ttl", type=float, default=1.0, help="seconds before the featured list goes stale")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--backend-ms", type=float, default=50.0, help="time the featured query takes")
+    args = parser.parse_args()
+
+    calls = counting_backend(args.backend_ms / 1000)
+    set_shared_cache(TieredCache(ttl=args.ttl, stale_ttl=args.ttl * 10))
+    set_response_cache(ResponseCache(ttl=args.ttl / 4))
+
+    api = FastAPI()
+    api.include_router(videos.router, prefix="/api/videos")
+    app = ResponseCacheMiddleware(api, RESPONSE_CACHE_RULES)
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", backlog=args.clients * 2))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    started = time.perf_counter()
+    latencies = sorted(asyncio.run(load_test(port, args.clients, args.duration)))
+    elapsed = time.perf_counter() - started
+    server.should_exit = True
+    thread.join()
+
+    # The first call fills the cache, then one refresh per expiry at most
+    expiries = math.ceil(elapsed / args.ttl)
+    refreshes = len(calls) - 1
+    total = len(latencies)
+    p50, p99 = statistics.median(latencies) * 1e3, latencies[int(total * 0.99) - 1] * 1e3
+    print(f"{args.clients} clients for {elapsed:.1f}s, TTL {args.ttl:g}s, backend {args.backend_ms:g}ms")
+    print(f"{total} requests, {total / elapsed:.0f} requests/s, p50 {p50:.2f}ms, p99 {p99:.2f}ms")
+    print(f"{len(calls)} backend calls: 1 fill + {refreshes} refreshes over {expiries} expiries")
+    if refreshes > expiries:
+        raise SystemExit(f"More than one backend call per expiry: {refreshes} refreshes for {expiries} expiries")
+
+if __name__ == "__main__":
+    main()
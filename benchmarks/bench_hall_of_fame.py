@@ -0,0 +1,110 @@
+"""Benchmark hall of fame throughput: cold, snapshot and conditional requests
+
+Serves the awards routes with uvicorn on a local port, with the hall of fame
+padded out to many past years, and has several keep-alive clients fetch it.
+"Cold" is how the route used to answer, encoding the dict on every request;
+"snapshot" sends the pre-serialized bytes; "conditional" sends If-None-Match
+with the current ETag and gets 304s.
+
+    python benchmarks/bench_hall_of_fame.py [--past-years 40] [--clients 8] [--requests 2000]
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+import uvicorn
+from fastapi import FastAPI
+
+from awards.hall_of_fame import HallOfFame
+from database.queries import get_student_board_version
+from routes import awards
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def past_years(count):
+    winner = awards.mock_hall_of_fame["currentYear"]
+    return [
+        {
+            "year": 2022 - i,
+            "filmOfTheYear": dict(winner["filmOfTheYear"], id=f"past{i}a"),
+            "runnerUps": [dict(runner_up, id=f"past{i}b{j}") for j in range(3) for runner_up in winner["runnerUps"]],
+            "studentFilmmaker": dict(winner["studentFilmmaker"], id=f"past{i}c")
+        }
+        for i in range(count)
+    ]
+
+def run_client(port, path, requests, headers, status):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        connection.request("GET", path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+        if response.status != status:
+            raise AssertionError(f"{path} answered {response.status}, expected {status}")
+    connection.close()
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--past-years", type=int, default=40)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per client")
+    args = parser.parse_args()
+
+    awards.mock_hall_of_fame["pastYears"] = past_years(args.past_years)
+    awards.hall_of_fame = HallOfFame(awards.build_hall_of_fame, get_student_board_version)
+    snapshot = awards.hall_of_fame.current()
+
+    app = FastAPI()
+    app.include_router(awards.router, prefix="/api/awards")
+
+    @app.get("/cold")
+    async def cold():
+        return awards.build_hall_of_fame()
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    print(f"Hall of fame of {len(snapshot.body) / 1024:.1f}KB, {args.clients} clients x {args.requests} requests")
+    print(f"{'request':>12} {'requests/s':>12} {'p50':>10} {'p99':>10}")
+    for name, path, headers, status in [
+        ("cold", "/cold", {}, 200),
+        ("snapshot", "/api/awards/hall-of-fame", {}, 200),
+        ("conditional", "/api/awards/hall-of-fame", {"If-None-Match": snapshot.etag}, 304)
+    ]:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.clients) as pool:
+            results = list(pool.map(
+                lambda _: run_client(port, path, args.requests, headers, status),
+                range(args.clients)
+            ))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for client in results for latency in client)
+        total = len(latencies)
+        p50, p99 = statistics.median(latencies) * 1e3, latencies[int(total * 0.99) - 1] * 1e3
+        print(f"{name:>12} {total / elapsed:>12.0f} {p50:>8.2f}ms {p99:>8.2f}ms")
+
+    server.should_exit = True
+    thread.join()
+
+if __name__ == "__main__":
+    main()
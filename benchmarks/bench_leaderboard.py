@@ -0,0 +1,100 @@
+"""Benchmark the incremental leaderboard index against sorting on every request
+
+Ranks many public videos spread over a few categories and two years of
+uploads, then replays a steady stream of rating updates with a top-N and a
+rank query after every few updates. The old route filtered and sorted every
+video per request, which is timed on a handful of requests.
+
+    python benchmarks/bench_leaderboard.py [--videos 1000000] [--updates 100000] [--queries-every 10]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+import numpy as np
+
+from database.leaderboard import LeaderboardIndex
+from database.scoring import composite_score
+
+CATEGORIES = ("short-film", "commercial", "documentary", "music-video", "animation")
+
+def make_videos(count, now, rng):
+    videos = []
+    for i in range(count):
+        ratings = rng.randint(0, 500)
+        videos.append({
+            "id": f"video{i}",
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "isPublic": True,
+            "uploadDate": (now - timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))).isoformat() + "Z",
+            "views": rng.randint(0, 100_000),
+            "ratingCount": ratings,
+            "shares": rng.randint(0, 1_000),
+            "averageRating": round(rng.uniform(1, 5), 3) if ratings else 0.0
+        })
+        videos[-1]["score"] = composite_score(videos[-1])
+    return videos
+
+def sorted_leaderboard(videos, category, limit):
+    """How the route used to answer: filter and sort every video"""
+    filtered = [video for video in videos if category == "all" or video["category"] == category]
+    return sorted(filtered, key=lambda v: v["averageRating"], reverse=True)[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--videos", type=int, default=1_000_000)
+    parser.add_argument("--updates", type=int, default=100_000)
+    parser.add_argument("--queries-every", type=int, default=10, help="rating updates between queries")
+    args = parser.parse_args()
+
+    now = datetime(2024, 6, 1)
+    rng = random.Random(42)
+    videos = make_videos(args.videos, now, rng)
+
+    started = time.perf_counter()
+    index = LeaderboardIndex(clock=lambda: now)
+    index.add_many(videos)
+    print(f"Indexed {args.videos} videos in {time.perf_counter() - started:.1f}s")
+
+    update_times, top_times, rank_times = [], [], []
+    for step in range(args.updates):
+        video = videos[rng.randrange(len(videos))]
+        rating = rng.choice((0.5, 1, 2, 3, 4, 4.5, 5))
+        video["averageRating"] = (video["averageRating"] * video["ratingCount"] + rating) / (video["ratingCount"] + 1)
+        video["ratingCount"] += 1
+        video["score"] = composite_score(video)
+
+        started = time.perf_counter()
+        index.update(video)
+        update_times.append(time.perf_counter() - started)
+
+        if step % args.queries_every == 0:
+            category = rng.choice(("all",) + CATEGORIES)
+            timeframe = rng.choice(LeaderboardIndex.TIMEFRAMES)
+            started = time.perf_counter()
+            index.top(10, category, timeframe)
+            top_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            index.rank(video["id"], "all", "all")
+            rank_times.append(time.perf_counter() - started)
+
+    print(f"{args.updates} rating updates, a top-10 and a rank query every {args.queries_every}")
+    print(f"{'operation':>14} {'mean':>10} {'p99':>10}")
+    for name, times in (("rating update", update_times), ("top 10", top_times), ("rank", rank_times)):
+        mean, p99 = np.mean(times) * 1e6, np.percentile(times, 99) * 1e6
+        print(f"{name:>14} {mean:>8.1f}us {p99:>8.1f}us")
+
+    started = time.perf_counter()
+    for category in ("all", "short-film", "commercial"):
+        sorted_leaderboard(videos, category, 10)
+    sort_ms = (time.perf_counter() - started) / 3 * 1e3
+    print(f"{'sort per query':>14} {sort_ms:>8.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark deep pages of GET /api/videos with offset and cursor pagination
+
+Fills the catalog with enough public videos for 10,000 pages and times the
+route handler for early and deep pages, first with ``page`` numbers and then
+by resuming from the cursor of the previous page.
+
+    python benchmarks/bench_pagination.py [--limit 20]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from fastapi import Response
+
+from database import queries
+from database.models import VideoCatalog
+from routes.videos import get_videos, encode_cursor
+
+CATEGORIES = ["short-film", "commercial", "documentary", "music-video", "animation"]
+PAGES = (1, 10, 100, 1_000, 10_000)
+
+def make_videos(count):
+    """Generate synthetic catalog rows, one upload per minute"""
+    start = datetime(2020, 1, 1)
+    return [
+        {
+            "id": f"video{i}",
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "userId": f"user{i // 10}",
+            "isPublic": True,
+            "uploadDate": (start + timedelta(minutes=i)).isoformat() + "Z",
+            "views": i
+        }
+        for i in range(count)
+    ]
+
+def time_call(loop, number, **params):
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(number):
+            loop.run_until_complete(get_videos(Response(), **params))
+        best = min(best, (time.perf_counter() - started) / number)
+    return best * 1e3
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = (max(PAGES) + 1) * args.limit
+    queries.video_catalog = VideoCatalog(make_videos(rows))
+    loop = asyncio.new_event_loop()
+
+    # The cursor for page N is the last row of page N - 1 in newest-first order
+    newest_first = sorted(queries.video_catalog, key=VideoCatalog.order_key, reverse=True)
+
+    print(f"{rows} public videos, limit={args.limit}")
+    print(f"{'page':>8} {'offset':>12} {'cursor':>12}")
+    for page in PAGES:
+        offset_ms = time_call(loop, 5, limit=args.limit, page=page)
+        if page == 1:
+            cursor_ms = time_call(loop, 5, limit=args.limit)
+        else:
+            cursor = encode_cursor(newest_first[(page - 1) * args.limit - 1])
+            cursor_ms = time_call(loop, 5, limit=args.limit, after=cursor)
+        print(f"{page:>8} {offset_ms:>10.3f}ms {cursor_ms:>10.3f}ms")
+
+    loop.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark concurrent seek-heavy Range requests against /videos/{id}.mp4
+
+Writes a synthetic video file, serves it with uvicorn on a local port and
+has several keep-alive clients request random byte ranges at once, the way
+players do while scrubbing. Every response is checked against the file.
+
+    python benchmarks/bench_range.py [--size-mb 256] [--clients 32] [--requests 200] [--range-kb 512]
+"""
+import argparse
+import http.client
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+import uvicorn
+from fastapi import FastAPI
+
+from storage.backends import LocalStorageBackend, set_storage_backend
+from routes import streaming
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def write_video(path, size):
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for _ in range(size // len(block)):
+            f.write(block)
+    return block
+
+def run_client(port, size, requests, range_size, block, seed):
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    latencies = []
+    for _ in range(requests):
+        start = rng.randrange(0, size - range_size)
+        end = start + range_size - 1
+        started = time.perf_counter()
+        connection.request("GET", "/videos/video1.mp4", headers={"Range": f"bytes={start}-{end}"})
+        response = connection.getresponse()
+        body = response.read()
+        latencies.append(time.perf_counter() - started)
+
+        offset = start % len(block)
+        if response.status != 206 or body[:64] != (block + block)[offset:offset + 64] or len(body) != range_size:
+            raise AssertionError(f"Bad response for bytes={start}-{end}: {response.status}")
+    connection.close()
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=200, help="requests per client")
+    parser.add_argument("--range-kb", type=int, default=512)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        os.makedirs(os.path.join(root, "videos"))
+        size = args.size_mb * 1024 * 1024
+        block = write_video(os.path.join(root, "videos", "video1.mp4"), size)
+        set_storage_backend(LocalStorageBackend(root))
+
+        app = FastAPI()
+        app.include_router(streaming.router, prefix="/videos")
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+
+        range_size = args.range_kb * 1024
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.clients) as pool:
+            results = list(pool.map(
+                lambda seed: run_client(port, size, args.requests, range_size, block, seed),
+                range(args.clients)
+            ))
+        elapsed = time.perf_counter() - started
+
+        server.should_exit = True
+        thread.join()
+
+    latencies = sorted(latency for client in results for latency in client)
+    total = len(latencies)
+    print(f"{args.size_mb}MB file, {args.clients} clients x {args.requests} random {args.range_kb}KB ranges")
+    print(f"{total / elapsed:>10.0f} requests/s")
+    print(f"{total * range_size / elapsed / 1024 / 1024:>10.1f} MB/s")
+    print(f"{statistics.median(latencies) * 1e3:>10.2f} ms p50")
+    print(f"{latencies[int(total * 0.99) - 1] * 1e3:>10.2f} ms p99")
+
+if __name__ == "__main__":
+    main()
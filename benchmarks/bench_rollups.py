@@ -0,0 +1,91 @@
+"""Benchmark video analytics totals from rollups against recomputing daily rows
+
+Builds a year of daily analytics for every video, both as the per-day row
+lists the endpoint used to sum and as incrementally updated day, week and
+month rollups, then times week, month and year totals both ways.
+
+    python benchmarks/bench_rollups.py [--videos 10000] [--days 365] [--queries 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from database.rollups import METRICS, AnalyticsRollups, cover
+
+TIMEFRAMES = {"week": 7, "month": 30, "year": 365}
+
+def make_daily_rows(videos, days, end):
+    """Generate per-day analytics rows for every video"""
+    rng = random.Random(42)
+    rows = {}
+    for i in range(videos):
+        video_rows = []
+        for offset in range(days - 1, -1, -1):
+            views = rng.randint(0, 300)
+            video_rows.append({
+                "date": end - timedelta(days=offset),
+                "views": views,
+                "watchTimeSeconds": views * rng.randint(30, 90),
+                "completions": views // 3,
+                "shares": views // 20,
+                "ratings": views // 50,
+                "ratingPoints": views // 50 * 9
+            })
+        rows[f"video{i}"] = video_rows
+    return rows
+
+def recompute(rows, start, end):
+    totals = {metric: 0 for metric in METRICS}
+    for row in rows:
+        if start <= row["date"] <= end:
+            for metric in METRICS:
+                totals[metric] += row[metric]
+    return totals
+
+def time_queries(function, video_ids, start, end):
+    started = time.perf_counter()
+    for video_id in video_ids:
+        function(video_id, start, end)
+    return (time.perf_counter() - started) / len(video_ids) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--videos", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--queries", type=int, default=2_000)
+    args = parser.parse_args()
+
+    end = date(2024, 6, 30)
+    started = time.perf_counter()
+    daily = make_daily_rows(args.videos, args.days, end)
+    print(f"Generated {args.videos} videos x {args.days} days in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    rollups = AnalyticsRollups()
+    for video_id, rows in daily.items():
+        for row in rows:
+            rollups.record(video_id, row["date"], **{metric: row[metric] for metric in METRICS})
+    elapsed = time.perf_counter() - started
+    events = args.videos * args.days
+    print(f"Rolled up {events} daily events in {elapsed:.1f}s ({events / elapsed:,.0f} events/s)")
+
+    rng = random.Random(7)
+    video_ids = [f"video{rng.randrange(args.videos)}" for _ in range(args.queries)]
+    print(f"{'timeframe':>10} {'buckets':>8} {'recompute':>12} {'rollup':>12} {'speedup':>8}")
+    for timeframe, days in TIMEFRAMES.items():
+        start = end - timedelta(days=days - 1)
+        assert rollups.totals(video_ids[0], start, end)["views"] == recompute(daily[video_ids[0]], start, end)["views"]
+        recompute_us = time_queries(lambda video_id, s, e: recompute(daily[video_id], s, e), video_ids, start, end)
+        rollup_us = time_queries(rollups.totals, video_ids, start, end)
+        print(
+            f"{timeframe:>10} {len(cover(start, end)):>8} {recompute_us:>10.1f}us {rollup_us:>10.1f}us"
+            f" {recompute_us / rollup_us:>7.1f}x"
+        )
+
+if __name__ == "__main__":
+    main()
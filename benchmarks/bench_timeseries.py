@@ -0,0 +1,97 @@
+"""Benchmark columnar NumPy analytics against per-day dict lists
+
+Builds 365 days of counters for many videos, once as lists of per-day dicts
+summed with generator expressions (how the analytics routes used to work)
+and once in a ``TimeSeriesStore``. Times per-video year totals plus the
+daily series, and one sum across every video.
+
+    python benchmarks/bench_timeseries.py [--videos 10000] [--days 365] [--queries 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+import numpy as np
+
+from database.rollups import METRICS
+from database.timeseries import TimeSeriesStore
+
+def make_columns(days, rng):
+    views = rng.integers(0, 300, days)
+    return {
+        "views": views,
+        "watchTimeSeconds": views * rng.integers(30, 90, days),
+        "completions": views // 3,
+        "shares": views // 20,
+        "ratings": views // 50,
+        "ratingPoints": views // 50 * 9
+    }
+
+def dict_list_report(rows):
+    """Totals and daily series the way the routes computed them from dict lists"""
+    views = sum(day["views"] for day in rows)
+    totals = {
+        "views": views,
+        "shares": sum(day["shares"] for day in rows),
+        "ratings": sum(day["ratings"] for day in rows),
+        "averageWatchTime": sum(day["watchTimeSeconds"] for day in rows) / views if views else 0,
+        "averageCompletionRate": sum(day["completions"] for day in rows) / views * 100 if views else 0
+    }
+    daily = [{"date": day["date"], "views": day["views"], "shares": day["shares"]} for day in rows]
+    return totals, daily
+
+def columnar_report(store, video_id, start, end):
+    totals = store.totals(video_id, start, end)
+    columns = store.series([video_id], start, end)
+    daily = {"views": columns[0].tolist(), "shares": columns[3].tolist()}
+    return totals, daily
+
+def timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--videos", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--queries", type=int, default=2_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    end = date(2024, 6, 30)
+    start = end - timedelta(days=args.days - 1)
+    dates = [(start + timedelta(days=i)).isoformat() for i in range(args.days)]
+
+    store = TimeSeriesStore(METRICS)
+    dict_lists = {}
+    for i in range(args.videos):
+        columns = make_columns(args.days, rng)
+        store.load(f"video{i}", start, columns)
+        as_lists = {metric: column.tolist() for metric, column in columns.items()}
+        dict_lists[f"video{i}"] = [
+            dict({metric: as_lists[metric][d] for metric in METRICS}, date=dates[d]) for d in range(args.days)
+        ]
+
+    picker = random.Random(7)
+    video_ids = [f"video{picker.randrange(args.videos)}" for _ in range(args.queries)]
+    assert dict_list_report(dict_lists[video_ids[0]])[0]["views"] == store.totals(video_ids[0], start, end)["views"]
+
+    dict_us = timed(lambda: [dict_list_report(dict_lists[v]) for v in video_ids], 1) / args.queries * 1e6
+    columnar_us = timed(lambda: [columnar_report(store, v, start, end) for v in video_ids], 1) / args.queries * 1e6
+    print(f"{args.videos} videos x {args.days} days")
+    print(f"{'per-video report':>20} {dict_us:>10.1f}us dict lists {columnar_us:>10.1f}us columnar {dict_us / columnar_us:>6.1f}x")
+
+    all_ids = list(dict_lists)
+    dict_all_ms = timed(lambda: sum(day["views"] for v in all_ids for day in dict_lists[v]), 1) * 1e3
+    columnar_all_ms = timed(lambda: store.totals_many(all_ids, start, end), 1) * 1e3
+    print(f"{'all-video totals':>20} {dict_all_ms:>10.1f}ms dict lists {columnar_all_ms:>10.1f}ms columnar {dict_all_ms / columnar_all_ms:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
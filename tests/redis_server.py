@@ -0,0 +1,206 @@
+"""In-memory stand-in for a Redis server, for tests of the shared cache
+
+Speaks just enough of the Redis protocol (RESP2) for redis-py clients and
+the commands the cache sends, so tests can run several workers against one
+shared tier without a Redis server installed.
+"""
+import asyncio
+import fnmatch
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Set
+
+# Add the backend directory to the path so we can import its packages
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from cache.shared import RELEASE_LOCK_SCRIPT
+
+
+async def read_command(reader: asyncio.StreamReader) -> List[bytes]:
+    """Read one command, sent as a RESP array of bulk strings"""
+    line = await reader.readuntil(b"\r\n")
+    if line[:1] != b"*":
+        raise ConnectionError(f"Unexpected command {line!r}")
+    parts = []
+    for _ in range(int(line[1:-2])):
+        header = await reader.readuntil(b"\r\n")
+        if header[:1] != b"$":
+            raise ConnectionError(f"Unexpected argument {header!r}")
+        parts.append((await reader.readexactly(int(header[1:-2]) + 2))[:-2])
+    return parts
+
+
+class LocalRedisServer:
+    """In-memory stand-in for a Redis server with the commands the cache uses
+
+    Supports PING, AUTH, SELECT, CLIENT, GET, SET (EX, PX, NX), DEL, EXISTS,
+    SADD, SMEMBERS, EXPIRE, KEYS and FLUSHALL on a single keyspace, EVAL of
+    the cache's lock release script only, and SUBSCRIBE, UNSUBSCRIBE and
+    PUBLISH on channels. With a ``password``, AUTH checks it; commands are
+    not refused without it.
+    """
+
+    def __init__(self, clock=time.monotonic, password: Optional[str] = None):
+        self._clock = clock
+        self.password = password
+        self._data: Dict[bytes, Any] = {}
+        self._expires: Dict[bytes, float] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self._subscribers: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+        # The connection whose command is being run, for SUBSCRIBE
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self.commands = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"redis://{host}:{port}/0"
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start listening, returning the URL to connect to"""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self.url
+
+    async def close(self):
+        """Stop listening and drop open connections"""
+        self._server.close()
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*self._connections)
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                command = await read_command(reader)
+                self.commands += 1
+                self._writer = writer
+                writer.write(self._run([part if isinstance(part, bytes) else str(part).encode() for part in command]))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            del self._connections[task]
+            for subscribers in self._subscribers.values():
+                subscribers.discard(writer)
+            writer.close()
+
+    def _run(self, command: List[bytes]) -> bytes:
+        name, args = command[0].upper(), command[1:]
+        try:
+            handler = getattr(self, f"_command_{name.decode().lower()}")
+        except AttributeError:
+            return b"-ERR unknown command '%s'\r\n" % name
+        try:
+            return handler(*args)
+        except (TypeError, ValueError):
+            return b"-ERR wrong arguments for '%s'\r\n" % name
+
+    def _live(self, key: bytes) -> Any:
+        expires = self._expires.get(key)
+        if expires is not None and expires <= self._clock():
+            self._data.pop(key, None)
+            del self._expires[key]
+        return self._data.get(key)
+
+    def _command_ping(self) -> bytes:
+        return b"+PONG\r\n"
+
+    def _command_auth(self, *args) -> bytes:
+        if self.password is not None and args[-1:] != (self.password.encode(),):
+            return b"-WRONGPASS invalid password\r\n"
+        return b"+OK\r\n"
+
+    def _command_select(self, db) -> bytes:
+        return b"+OK\r\n"
+
+    def _command_client(self, *args) -> bytes:
+        return b"+OK\r\n"
+
+    def _command_get(self, key) -> bytes:
+        value = self._live(key)
+        if value is None:
+            return b"$-1\r\n"
+        if not isinstance(value, bytes):
+            return b"-WRONGTYPE Operation against a key holding the wrong kind of value\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _command_set(self, key, value, *options) -> bytes:
+        options = [option.upper() for option in options]
+        if b"NX" in options and self._live(key) is not None:
+            return b"$-1\r\n"
+        self._data[key] = value
+        self._expires.pop(key, None)
+        for unit, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+            if unit in options:
+                self._expires[key] = self._clock() + float(options[options.index(unit) + 1]) * scale
+        return b"+OK\r\n"
+
+    def _command_del(self, *keys) -> bytes:
+        removed = sum(1 for key in keys if self._live(key) is not None and self._data.pop(key, None) is not None)
+        for key in keys:
+            self._expires.pop(key, None)
+        return b":%d\r\n" % removed
+
+    def _command_exists(self, *keys) -> bytes:
+        return b":%d\r\n" % sum(1 for key in keys if self._live(key) is not None)
+
+    def _command_sadd(self, key, *members) -> bytes:
+        members_set = self._live(key)
+        if members_set is None:
+            members_set = self._data[key] = set()
+        added = len(set(members) - members_set)
+        members_set.update(members)
+        return b":%d\r\n" % added
+
+    def _command_smembers(self, key) -> bytes:
+        members = self._live(key) or set()
+        return b"*%d\r\n" % len(members) + b"".join(b"$%d\r\n%s\r\n" % (len(member), member) for member in members)
+
+    def _command_expire(self, key, seconds) -> bytes:
+        if self._live(key) is None:
+            return b":0\r\n"
+        self._expires[key] = self._clock() + float(seconds)
+        return b":1\r\n"
+
+    def _command_keys(self, pattern) -> bytes:
+        keys = [key for key in list(self._data) if self._live(key) is not None and fnmatch.fnmatchcase(key.decode(), pattern.decode())]
+        return b"*%d\r\n" % len(keys) + b"".join(b"$%d\r\n%s\r\n" % (len(key), key) for key in keys)
+
+    def _command_eval(self, script, numkeys, *args) -> bytes:
+        if script.decode() != RELEASE_LOCK_SCRIPT or int(numkeys) != 1:
+            return b"-ERR only the lock release script is supported\r\n"
+        key, token = args
+        if self._live(key) != token:
+            return b":0\r\n"
+        return self._command_del(key)
+
+    def _command_subscribe(self, *channels) -> bytes:
+        replies = []
+        for channel in channels:
+            self._subscribers.setdefault(channel, set()).add(self._writer)
+            replies.append(b"*3\r\n$9\r\nsubscribe\r\n$%d\r\n%s\r\n:1\r\n" % (len(channel), channel))
+        return b"".join(replies)
+
+    def _command_unsubscribe(self, *channels) -> bytes:
+        channels = channels or [channel for channel, writers in self._subscribers.items() if self._writer in writers]
+        replies = []
+        for channel in channels:
+            self._subscribers.get(channel, set()).discard(self._writer)
+            replies.append(b"*3\r\n$11\r\nunsubscribe\r\n$%d\r\n%s\r\n:0\r\n" % (len(channel), channel))
+        return b"".join(replies)
+
+    def _command_publish(self, channel, message) -> bytes:
+        subscribers = self._subscribers.get(channel, set())
+        for writer in subscribers:
+            writer.write(b"*3\r\n$7\r\nmessage\r\n$%d\r\n%s\r\n$%d\r\n%s\r\n" % (len(channel), channel, len(message), message))
+        return b":%d\r\n" % len(subscribers)
+
+    def _command_flushall(self) -> bytes:
+        self._data.clear()
+        self._expires.clear()
+        return b"+OK\r\n"
@@ -0,0 +1,983 @@
+import unittest
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+
+# Add the backend directory to the path so we can import its packages
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+import numpy as np
+from fastapi import HTTPException
+
+from analytics.engagment import (
+    DemographicStore,
+    SpaceSaving,
+    classify_device,
+    percentages,
+    referrer_host,
+    set_demographics,
+    view_metadata
+)
+from analytics.event_log import (
+    CorruptLogError,
+    EventLog,
+    EventLogLocked,
+    HEADER,
+    open_worker_log,
+    replay_log,
+    replay_worker_logs,
+    segment_paths,
+    set_event_log
+)
+from analytics.events import (
+    EventBatchTooLarge,
+    MAX_BATCH_EVENTS,
+    decode_events,
+    rebuild_from_log,
+    rebuild_from_worker_logs,
+    validate_events
+)
+from analytics.watch_time import WatchTimeBuffer, WatchTimeBufferFull, set_watch_time_buffer
+from database import queries
+from database.dashboards import FilmmakerDashboards
+from database.hyperloglog import HyperLogLog
+from database.rollups import AnalyticsRollups, bucket_end, cover
+from database.timeseries import TimeSeriesStore
+from routes.analytics import (
+    get_filmmaker_analytics,
+    get_video_analytics,
+    record_events,
+    record_share,
+    record_watch_time
+)
+from routes.users import update_watch_history
+from routes.videos import record_view
+
+class RecordingSink:
+    """Collects flushed batches, optionally failing or blocking"""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, rows):
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        self.batches.append([dict(row) for row in rows])
+
+    @property
+    def rows(self):
+        return [row for batch in self.batches for row in batch]
+
+
+class FakeClient:
+    host = "203.0.113.7"
+
+
+class FakeRequest:
+    client = FakeClient()
+
+
+class BodyRequest(FakeRequest):
+    """Request with a raw body for the batch events route"""
+
+    def __init__(self, body, content_type="application/json"):
+        self._body = body
+        self.headers = {"content-type": content_type}
+
+    async def body(self):
+        return self._body
+
+
+class WatchTimeBufferTestCase(unittest.TestCase):
+    """Test cases for write-behind watch time aggregation"""
+
+    def test_heartbeats_are_coalesced_per_viewer(self):
+        """Test that many heartbeats become one row per (video, viewer)"""
+        sink = RecordingSink()
+
+        async def run():
+            buffer = WatchTimeBuffer(sink, batch_size=100, flush_seconds=60)
+            for second in range(1, 201):
+                for viewer in ("alice", "bob"):
+                    await buffer.record("video1", viewer, second, second / 4)
+            await buffer.record("video2", "alice", 30, 50.0)
+            await buffer.shutdown()
+
+        asyncio.run(run())
+
+        self.assertEqual(len(sink.batches), 1)
+        rows = {(row["videoId"], row["viewerId"]): row for row in sink.rows}
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[("video1", "bob")]["heartbeats"], 200)
+        self.assertEqual(rows[("video1", "bob")]["watchTimeSeconds"], 200)
+        self.assertEqual(rows[("video1", "bob")]["percentageWatched"], 50.0)
+
+    def test_size_trigger_flushes_in_batches(self):
+        """Test that reaching the batch size flushes without waiting for the timer"""
+        sink = RecordingSink()
+
+        async def run():
+            buffer = WatchTimeBuffer(sink, batch_size=10, flush_seconds=60)
+            for viewer in range(25):
+                await buffer.record("video1", f"viewer{viewer}", 10, 5.0)
+                await asyncio.sleep(0)
+            for _ in range(50):
+                if len(sink.rows) >= 20:
+                    break
+                await asyncio.sleep(0.01)
+            flushed_before_shutdown = len(sink.rows)
+            await buffer.shutdown()
+            return flushed_before_shutdown
+
+        flushed_before_shutdown = asyncio.run(run())
+
+        self.assertGreaterEqual(flushed_before_shutdown, 20)
+        self.assertEqual(len(sink.rows), 25)
+        self.assertTrue(all(len(batch) <= 10 for batch in sink.batches))
+
+    def test_time_trigger_flushes(self):
+        """Test that a few pending rows are written once the interval passes"""
+        sink = RecordingSink()
+
+        async def run():
+            buffer = WatchTimeBuffer(sink, batch_size=100, flush_seconds=0.05)
+            await buffer.record("video1", "alice", 10, 5.0)
+            await asyncio.sleep(0.3)
+            flushed = len(sink.rows)
+            await buffer.shutdown()
+            return flushed
+
+        self.assertEqual(asyncio.run(run()), 1)
+
+    def test_backpressure_when_full(self):
+        """Test that new viewers wait for space and time out while the sink is stuck"""
+        sink = RecordingSink()
+        sink.release.clear()
+
+        async def run():
+            buffer = WatchTimeBuffer(sink, batch_size=2, flush_seconds=60, max_pending=2, enqueue_timeout=0.1)
+            await buffer.record("video1", "a", 1, 1.0)
+            await buffer.record("video1", "b", 1, 1.0)
+            # The flusher takes a and b and blocks in the sink
+            await asyncio.sleep(0.05)
+            await buffer.record("video1", "c", 1, 1.0)
+            await buffer.record("video1", "d", 1, 1.0)
+            # Known viewers are still accepted while full
+            await buffer.record("video1", "c", 2, 2.0)
+            with self.assertRaises(WatchTimeBufferFull):
+                await buffer.record("video1", "e", 1, 1.0)
+            sink.release.set()
+            await buffer.shutdown()
+
+        asyncio.run(run())
+
+        self.assertEqual(sorted(row["viewerId"] for row in sink.rows), ["a", "b", "c", "d"])
+
+    def test_failed_flush_keeps_rows(self):
+        """Test that rows from a failed flush are merged back for the next one"""
+        sink = RecordingSink(fail=True)
+
+        async def run():
+            buffer = WatchTimeBuffer(sink, batch_size=100, flush_seconds=60)
+            await buffer.record("video1", "alice", 10, 5.0)
+            with self.assertRaises(RuntimeError):
+                await buffer.flush()
+            await buffer.record("video1", "alice", 20, 10.0)
+            sink.fail = False
+            await buffer.shutdown()
+
+        asyncio.run(run())
+
+        self.assertEqual(len(sink.rows), 1)
+        self.assertEqual(sink.rows[0]["heartbeats"], 2)
+        self.assertEqual(sink.rows[0]["watchTimeSeconds"], 20)
+
+    def test_route_buffers_heartbeats(self):
+        """Test that the watch time route stores through the buffer"""
+        async def run():
+            buffer = WatchTimeBuffer(batch_size=100, flush_seconds=60)
+            set_watch_time_buffer(buffer)
+            try:
+                for second in (5, 10, 15):
+                    await record_watch_time("video1", second, second / 4.8, FakeRequest())
+                with self.assertRaises(HTTPException) as error:
+                    await record_watch_time("video1", -1, 0, FakeRequest())
+                self.assertEqual(error.exception.status_code, 400)
+                await buffer.shutdown()
+            finally:
+                set_watch_time_buffer(None)
+
+        asyncio.run(run())
+
+        row = queries.get_watch_time("video1", FakeClient.host)
+        self.assertEqual((row["heartbeats"], row["watchTimeSeconds"]), (3, 15))
+        del queries.fake_watch_time_db[("video1", FakeClient.host)]
+
+
+class EventBatchTestCase(unittest.TestCase):
+    """Test cases for batched player telemetry"""
+
+    EVENTS = [
+        {"type": "watch-time", "videoId": "video2", "watchTimeSeconds": 10, "percentageWatched": 16.7},
+        {"type": "watch-time", "videoId": "video2", "watchTimeSeconds": 20, "percentageWatched": 33.3},
+        {"type": "share", "videoId": "video2", "platform": "twitter", "url": "https://example.com/v2"},
+        {"type": "share", "videoId": "video2", "platform": "email"},
+        {"type": "history", "videoId": "video2", "progress": 20.0},
+        {"type": "history", "videoId": "video2", "progress": 33.3}
+    ]
+
+    def test_decode_array_and_ndjson(self):
+        """Test that both body formats decode to the same events"""
+        as_array = decode_events(json.dumps(self.EVENTS).encode())
+        as_lines = decode_events(
+            "\n".join(json.dumps(event) for event in self.EVENTS).encode() + b"\n",
+            "application/x-ndjson; charset=utf-8"
+        )
+
+        self.assertEqual(as_array, self.EVENTS)
+        self.assertEqual(as_lines, self.EVENTS)
+        with self.assertRaises(ValueError):
+            decode_events(b'{"type": "share"}')
+        with self.assertRaises(ValueError):
+            decode_events(b'{"type": "share"}\nnot json', "application/x-ndjson")
+        with self.assertRaises(EventBatchTooLarge):
+            decode_events(json.dumps([{}] * (MAX_BATCH_EVENTS + 1)).encode())
+
+    def test_validation_reports_each_bad_event(self):
+        """Test that invalid events are reported by index without dropping valid ones"""
+        events, errors = validate_events([
+            self.EVENTS[0],
+            {"type": "watch-time", "videoId": "video2", "watchTimeSeconds": -5, "percentageWatched": 10},
+            {"type": "unknown"},
+            self.EVENTS[2]
+        ])
+
+        self.assertEqual([event.type for event in events], ["watch-time", "share"])
+        self.assertEqual([error["index"] for error in errors], [1, 2])
+
+    def test_unknown_videos_rejected(self):
+        """Test that events for videos outside the catalog are reported and never reach the rollups"""
+        original = queries.video_rollups
+        queries.video_rollups = AnalyticsRollups()
+        try:
+            events, errors = validate_events([dict(self.EVENTS[2], videoId="missing"), self.EVENTS[2]])
+            for route in (
+                record_share("missing", "twitter", "https://example.com"),
+                record_watch_time("missing", 10, 50, FakeRequest())
+            ):
+                with self.assertRaises(HTTPException) as error:
+                    asyncio.run(route)
+                self.assertEqual(error.exception.status_code, 404)
+            queries.record_video_activity("missing", "viewer1", views=1)
+            rollups = queries.video_rollups
+        finally:
+            queries.video_rollups = original
+
+        self.assertEqual([event.videoId for event in events], ["video2"])
+        self.assertEqual(errors[0]["index"], 0)
+        self.assertEqual(errors[0]["errors"][0]["msg"], "Video not found")
+        self.assertNotIn("missing", rollups.counters)
+        self.assertTrue(all("missing" not in sketches for sketches in rollups._viewers.values()))
+
+    def test_route_fans_out_to_every_sink(self):
+        """Test that one batch reaches the watch time, share and history sinks"""
+        original = queries.video_rollups
+        queries.video_rollups = AnalyticsRollups()
+        shares = queries.get_video("video2")["shares"]
+
+        async def run():
+            buffer = WatchTimeBuffer(batch_size=100, flush_seconds=60)
+            set_watch_time_buffer(buffer)
+            try:
+                body = json.dumps(self.EVENTS + [{"type": "share"}]).encode()
+                response = await record_events(BodyRequest(body), viewerId="viewer9")
+                await buffer.shutdown()
+                return response
+            finally:
+                set_watch_time_buffer(None)
+
+        try:
+            response = asyncio.run(run())
+            today = datetime.utcnow().date()
+            totals = queries.get_video_activity_totals("video2", today, today)
+            catalog_shares = queries.get_video("video2")["shares"]
+        finally:
+            queries.video_rollups = original
+            queries.update_video("video2", shares=shares)
+
+        self.assertEqual((response["accepted"], response["rejected"]), (6, 1))
+        self.assertEqual(response["counts"], {"watch-time": 2, "share": 2, "history": 2})
+        self.assertEqual(totals["shares"], 2)
+        self.assertEqual(catalog_shares, shares + 2)
+        self.assertEqual(totals["watchTimeSeconds"], 20)
+        self.assertEqual(queries.get_watch_time("video2", "viewer9")["heartbeats"], 2)
+        self.assertEqual(queries.get_watch_history("user123")[0]["progress"], 33.3)
+        del queries.fake_watch_time_db[("video2", "viewer9")]
+        queries.fake_watch_history_db.clear()
+
+    def test_shares_change_score_and_rank(self):
+        """Test that shares reach the catalog, so the score and leaderboard rank follow them"""
+        original = queries.video_rollups
+        queries.video_rollups = AnalyticsRollups()
+        shares = queries.get_video("video2")["shares"]
+        score = queries.get_video("video2")["score"]
+        rank = queries.get_leaderboard_rank("video2")
+        try:
+            asyncio.run(record_share("video2", "twitter", "https://example.com"))
+            shared_once = dict(queries.get_video("video2"))
+            body = json.dumps([{"type": "share", "videoId": "video2", "platform": "email"}] * 999).encode()
+            asyncio.run(record_events(BodyRequest(body)))
+            shared_often = dict(queries.get_video("video2"))
+            new_rank = queries.get_leaderboard_rank("video2")
+        finally:
+            queries.video_rollups = original
+            queries.update_video("video2", shares=shares)
+
+        self.assertEqual(shared_once["shares"], shares + 1)
+        self.assertGreater(shared_once["score"], score)
+        self.assertEqual(shared_often["shares"], shares + 1000)
+        self.assertLess(new_rank, rank)
+        self.assertEqual(queries.get_leaderboard_rank("video2"), rank)
+
+    def test_route_rejects_unusable_batches(self):
+        """Test status codes for undecodable and entirely invalid batches"""
+        with self.assertRaises(HTTPException) as error:
+            asyncio.run(record_events(BodyRequest(b"not json")))
+        self.assertEqual(error.exception.status_code, 400)
+
+        with self.assertRaises(HTTPException) as error:
+            asyncio.run(record_events(BodyRequest(b'[{"type": "share"}]')))
+        self.assertEqual(error.exception.status_code, 422)
+
+
+class EventLogTestCase(unittest.TestCase):
+    """Test cases for the append-only analytics event log"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_events(self, count, **options):
+        log = EventLog(self.root, **options)
+        for i in range(count):
+            log.append({"type": "view", "videoId": f"video{i % 3}", "n": i})
+        log.close()
+
+    def test_replay_returns_events_in_order(self):
+        """Test that committed events replay in order and can resume after a sequence number"""
+        log = EventLog(self.root, fsync=False)
+        seqs = [log.append({"n": i}) for i in range(100)]
+        log.flush()
+        self.assertEqual(log.durable_seq, 100)
+
+        self.assertEqual(seqs, list(range(1, 101)))
+        self.assertEqual([event["n"] for _, event in log.replay()], list(range(100)))
+        self.assertEqual([seq for seq, _ in log.replay(after=90)], list(range(91, 101)))
+        log.close()
+
+        # Reopening continues the sequence
+        log = EventLog(self.root, fsync=False)
+        self.assertEqual(log.append({"n": 100}), 101)
+        log.close()
+        self.assertEqual(len(list(replay_log(self.root))), 101)
+
+    def test_segments_rotate(self):
+        """Test that the log rolls over to new segments and replays across them"""
+        log = EventLog(self.root, segment_bytes=512, commit_interval=0.001, fsync=False)
+        for i in range(200):
+            log.append({"type": "view", "videoId": "video1", "n": i})
+            if i % 10 == 9:
+                log.flush()
+        log.close()
+
+        segments = segment_paths(self.root)
+        self.assertGreater(len(segments), 5)
+        self.assertEqual([event["n"] for _, event in replay_log(self.root)], list(range(200)))
+        self.assertEqual([seq for seq, _ in replay_log(self.root, after=150)], list(range(151, 201)))
+
+    def test_torn_tail_is_truncated(self):
+        """Test that a half-written last record is dropped on replay and on reopen"""
+        self.write_events(10, fsync=False)
+        path = segment_paths(self.root)[-1]
+        with open(path, "ab") as f:
+            f.write(HEADER.pack(100, 0, 11) + b'{"type": "vi')
+
+        self.assertEqual(len(list(replay_log(self.root))), 10)
+        log = EventLog(self.root, fsync=False)
+        self.assertEqual(log.append({"type": "view", "videoId": "video1"}), 11)
+        log.close()
+        self.assertEqual([seq for seq, _ in replay_log(self.root)], list(range(1, 12)))
+
+    def test_corruption_before_the_end_raises(self):
+        """Test that a bad checksum in an earlier segment is reported, not skipped"""
+        self.write_events(50, segment_bytes=256, commit_interval=0, fsync=False)
+        first = segment_paths(self.root)[0]
+        with open(first, "r+b") as f:
+            f.seek(HEADER.size + 2)
+            f.write(b"X")
+
+        with self.assertRaises(CorruptLogError):
+            list(replay_log(self.root))
+
+    def test_rollups_rebuild_from_log(self):
+        """Test that replaying the log restores the rollups the routes recorded"""
+        original = queries.video_rollups
+        queries.video_rollups = AnalyticsRollups()
+        shares = queries.get_video("video2")["shares"]
+        log = EventLog(self.root, fsync=False)
+        set_event_log(log)
+
+        async def run():
+            buffer = WatchTimeBuffer(batch_size=100, flush_seconds=60)
+            set_watch_time_buffer(buffer)
+            try:
+                body = json.dumps(EventBatchTestCase.EVENTS).encode()
+                await record_events(BodyRequest(body), viewerId="viewer9")
+                await record_share("video2", "twitter", "https://example.com")
+                await update_watch_history("video1", 12.5)
+                await buffer.shutdown()
+            finally:
+                set_watch_time_buffer(None)
+
+        try:
+            asyncio.run(run())
+            log.close()
+            today = datetime.utcnow().date()
+            recorded = queries.get_video_activity_totals("video2", today, today)
+
+            # Simulate a restart with empty tables
+            queries.video_rollups = AnalyticsRollups()
+            queries.fake_watch_time_db.pop(("video2", "viewer9"), None)
+            queries.fake_watch_history_db.clear()
+            last = rebuild_from_log(self.root)
+            rebuilt = queries.get_video_activity_totals("video2", today, today)
+            history = queries.get_watch_history("user123")
+        finally:
+            set_event_log(None)
+            queries.video_rollups = original
+            queries.update_video("video2", shares=shares)
+            queries.fake_watch_time_db.pop(("video2", "viewer9"), None)
+            queries.fake_watch_history_db.clear()
+
+        self.assertEqual(last, 7)
+        self.assertEqual(rebuilt, recorded)
+        self.assertEqual((rebuilt["shares"], rebuilt["watchTimeSeconds"]), (3, 20))
+        self.assertEqual({entry["videoId"]: entry["progress"] for entry in history}, {"video2": 33.3, "video1": 12.5})
+
+    def test_directory_is_locked_while_open(self):
+        """Test that a second log cannot open a directory that is in use"""
+        log = EventLog(self.root, fsync=False)
+        with self.assertRaises(EventLogLocked):
+            EventLog(self.root, fsync=False)
+        log.close()
+        EventLog(self.root, fsync=False).close()
+
+    def test_workers_log_separately_and_replay_together(self):
+        """Test that each worker gets its own directory and replay merges them by time"""
+        first = open_worker_log(self.root, fsync=False)
+        second = open_worker_log(self.root, fsync=False)
+        self.assertEqual(
+            [os.path.basename(first.root), os.path.basename(second.root)], ["worker-0", "worker-1"]
+        )
+        for n, log in enumerate((first, second, first, second, second)):
+            log.append({"n": n, "at": f"2024-06-01T00:00:0{n}Z"})
+        first.close()
+        second.close()
+
+        self.assertEqual([event["n"] for event in replay_worker_logs(self.root)], [0, 1, 2, 3, 4])
+        reopened = open_worker_log(self.root, fsync=False)
+        self.assertEqual(os.path.basename(reopened.root), "worker-0")
+        reopened.close()
+
+    def test_worker_rebuild_resumes_from_checkpoint(self):
+        """Test that a restart restores the checkpoint, replays only newer events and prunes covered segments"""
+        original = queries.video_rollups
+        queries.video_rollups = AnalyticsRollups()
+        set_demographics(DemographicStore())
+        today = datetime.utcnow().date()
+        at = datetime.utcnow().isoformat() + "Z"
+
+        def log_shares(count):
+            log = open_worker_log(self.root, segment_bytes=256, fsync=False)
+            for _ in range(count):
+                log.append({"type": "share", "videoId": "video2", "at": at})
+                log.flush()
+            log.close()
+            return log.root
+
+        try:
+            worker = log_shares(20)
+            segments = segment_paths(worker)
+            first = rebuild_from_worker_logs(self.root)
+
+            # Restart with empty rollups after more events were logged
+            queries.video_rollups = AnalyticsRollups()
+            log_shares(5)
+            second = rebuild_from_worker_logs(self.root)
+            shares = queries.get_video_activity_totals("video2", today, today)["shares"]
+            queries.video_rollups = AnalyticsRollups()
+            third = rebuild_from_worker_logs(self.root)
+            restored = queries.get_video_activity_totals("video2", today, today)["shares"]
+        finally:
+            queries.video_rollups = original
+            set_demographics(None)
+
+        self.assertEqual((first, second, third), (20, 5, 0))
+        self.assertEqual((shares, restored), (25, 25))
+        self.assertGreater(len(segments), 1)
+        self.assertEqual(len(segment_paths(worker)), 1)
+        self.assertTrue(all(seq > 20 for seq, _ in replay_log(worker)))
+
+    def test_appends_fail_after_a_failed_commit(self):
+        """Test that appends are refused once a commit has failed"""
+        log = EventLog(self.root, fsync=False)
+
+        def fail(batch, last):
+            raise OSError("disk full")
+
+        log._commit = fail
+        log.append({"n": 1})
+        with self.assertRaises(RuntimeError):
+            log.flush()
+        with self.assertRaises(RuntimeError):
+            log.append({"n": 2})
+        log.close()
+
+
+class TimeSeriesTestCase(unittest.TestCase):
+    """Test cases for columnar daily counters"""
+
+    def setUp(self):
+        self.store = TimeSeriesStore(("views", "shares"))
+        self.rng = random.Random(3)
+        self.events = []
+        for _ in range(2000):
+            day = date(2023, 1, 1) + timedelta(days=self.rng.randrange(400))
+            views, shares = self.rng.randint(0, 5), self.rng.randint(0, 1)
+            self.store.add("video1", day, views=views, shares=shares)
+            self.events.append((day, views, shares))
+
+    def test_totals_match_python_sums(self):
+        """Test totals over ranges inside, around and outside the stored days"""
+        for start, end in [(date(2023, 2, 1), date(2024, 1, 31)), (date(2022, 1, 1), date(2025, 1, 1)), (date(2030, 1, 1), date(2030, 2, 1))]:
+            totals = self.store.totals("video1", start, end)
+            self.assertEqual(totals["views"], sum(v for d, v, _ in self.events if start <= d <= end))
+            self.assertEqual(totals["shares"], sum(s for d, _, s in self.events if start <= d <= end))
+
+    def test_window_is_a_view(self):
+        """Test that slicing a date range does not copy the counters"""
+        series = self.store._series["video1"]
+        window, offset = series.window(date(2023, 3, 1), date(2023, 3, 31))
+
+        self.assertTrue(np.shares_memory(window, series.values))
+        self.assertEqual((window.shape[1], offset), (31, 0))
+
+    def test_series_and_buckets(self):
+        """Test daily columns, reduceat buckets and sums across videos"""
+        self.store.add("video2", date(2023, 3, 6), views=10)
+        start, end = date(2023, 3, 1), date(2023, 3, 14)
+
+        daily = self.store.series(["video1", "video2"], start, end)
+        expected = [sum(v for d, v, _ in self.events if d == start + timedelta(days=i)) for i in range(14)]
+        expected[5] += 10
+        self.assertEqual(daily[0].tolist(), expected)
+
+        weekly = self.store.series(["video1", "video2"], start, end, [date(2023, 2, 27), date(2023, 3, 6), date(2023, 3, 13)])
+        self.assertEqual(weekly[0].tolist(), [sum(expected[:5]), sum(expected[5:12]), sum(expected[12:])])
+
+    def test_adding_before_the_first_day(self):
+        """Test that an early event grows the series backwards"""
+        store = TimeSeriesStore(("views",))
+        store.add("video1", date(2023, 6, 1), views=1)
+        store.add("video1", date(2023, 1, 1), views=2)
+        store.add("video1", date(2024, 6, 1), views=4)
+
+        self.assertEqual(store.totals("video1", date(2023, 1, 1), date(2024, 6, 1))["views"], 7)
+        self.assertEqual(store.totals("video1", date(2023, 1, 2), date(2024, 5, 31))["views"], 1)
+
+
+class HyperLogLogTestCase(unittest.TestCase):
+    """Test cases for unique viewer sketches"""
+
+    def test_error_within_documented_bounds(self):
+        """Test that estimates stay within three standard errors (4.9%) of the true count"""
+        for cardinality in (10, 1_000, 10_000, 100_000):
+            sketch = HyperLogLog()
+            sketch.update(f"viewer{i}" for i in range(cardinality))
+            self.assertAlmostEqual(sketch.count(), cardinality, delta=max(1, cardinality * 0.049))
+
+    def test_small_sketches_are_exact(self):
+        """Test that a sketch with few viewers counts them exactly and stays sparse"""
+        sketch = HyperLogLog()
+        sketch.update(["a", "b", "a", "c"])
+
+        self.assertEqual(sketch.count(), 3)
+        self.assertFalse(sketch.is_dense)
+
+    def test_merge_is_the_sketch_of_the_union(self):
+        """Test that merging day sketches equals sketching the union directly"""
+        monday, tuesday, both = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        monday.update(f"viewer{i}" for i in range(0, 6000))
+        tuesday.update(f"viewer{i}" for i in range(4000, 12000))
+        both.update(f"viewer{i}" for i in range(0, 12000))
+
+        merged = monday.copy().merge(tuesday)
+        self.assertEqual(merged.to_bytes(), both.to_bytes())
+        self.assertAlmostEqual(merged.count(), 12000, delta=12000 * 0.049)
+
+    def test_sketches_merge_across_workers(self):
+        """Test that serialized sketches from two workers combine into one count"""
+        worker1, worker2 = HyperLogLog(), HyperLogLog()
+        worker1.update(f"viewer{i}" for i in range(20000))
+        worker2.update(f"viewer{i}" for i in range(10000, 30000))
+
+        combined = HyperLogLog.from_bytes(worker1.to_bytes()).merge(HyperLogLog.from_bytes(worker2.to_bytes()))
+
+        self.assertEqual(len(worker1.to_bytes()), 1 + 4096)
+        self.assertAlmostEqual(combined.count(), 30000, delta=30000 * 0.049)
+        with self.assertRaises(ValueError):
+            HyperLogLog(10).merge(HyperLogLog(12))
+
+
+class RollupTestCase(unittest.TestCase):
+    """Test cases for pre-aggregated analytics rollups"""
+
+    def test_cover_uses_few_buckets(self):
+        """Test that a range is covered exactly once by whole buckets"""
+        start, end = date(2023, 1, 18), date(2024, 1, 17)
+        buckets = cover(start, end)
+
+        days = []
+        for level, bucket_start in buckets:
+            day = bucket_start
+            while day <= bucket_end(bucket_start, level):
+                days.append(day)
+                day += timedelta(days=1)
+        self.assertEqual(days, [start + timedelta(days=i) for i in range(365)])
+        self.assertLessEqual(len(buckets), 30)
+        self.assertEqual(sum(1 for level, _ in buckets if level == "month"), 11)
+
+    def test_totals_match_recomputation(self):
+        """Test that rollup totals equal summing every event in the range"""
+        rng = random.Random(7)
+        rollups = AnalyticsRollups()
+        events = []
+        for _ in range(3000):
+            day = date(2023, 1, 1) + timedelta(days=rng.randrange(365))
+            event = {"views": rng.randint(0, 3), "shares": rng.randint(0, 1), "watchTimeSeconds": rng.randint(0, 600)}
+            viewer = f"viewer{rng.randrange(200)}"
+            rollups.record("video1", day, viewer, **event)
+            events.append((day, viewer, event))
+
+        for start, end in [(date(2023, 1, 1), date(2023, 12, 31)), (date(2023, 3, 15), date(2023, 4, 2)), (date(2023, 6, 6), date(2023, 6, 6))]:
+            in_range = [(viewer, event) for day, viewer, event in events if start <= day <= end]
+            totals = rollups.totals("video1", start, end)
+            self.assertEqual(totals["views"], sum(event["views"] for _, event in in_range))
+            self.assertEqual(totals["watchTimeSeconds"], sum(event["watchTimeSeconds"] for _, event in in_range))
+            unique = len({viewer for viewer, _ in in_range})
+            self.assertAlmostEqual(totals["uniqueViewers"], unique, delta=unique * 0.049)
+
+    def test_series_by_interval(self):
+        """Test daily, weekly and monthly rows with empty buckets filled in"""
+        rollups = AnalyticsRollups()
+        rollups.record("video1", date(2023, 5, 2), "a", views=2)
+        rollups.record("video1", date(2023, 5, 30), "b", views=1, shares=1)
+
+        self.assertEqual(len(rollups.series("video1", date(2023, 5, 1), date(2023, 5, 31))), 31)
+        monthly = rollups.series("video1", date(2023, 4, 15), date(2023, 5, 31), "month")
+        self.assertEqual([row["date"] for row in monthly], ["2023-04-01", "2023-05-01"])
+        self.assertEqual((monthly[1]["views"], monthly[1]["uniqueViewers"], monthly[1]["shares"]), (3, 2, 1))
+        weekly = rollups.series("video1", date(2023, 5, 1), date(2023, 5, 14), "week")
+        self.assertEqual([row["views"] for row in weekly], [2, 0])
+
+    def test_route_reads_rollups(self):
+        """Test that recorded activity shows up in the video analytics route"""
+        original = queries.video_rollups
+        queries.video_rollups = AnalyticsRollups()
+        shares = queries.get_video("video1")["shares"]
+        try:
+            today = datetime.utcnow().date()
+            queries.record_video_activity("video1", "a", today, views=3)
+            queries.record_video_activity("video1", "b", today - timedelta(days=40), views=5)
+            queries.save_watch_time([{
+                "videoId": "video1", "viewerId": "a", "heartbeats": 4,
+                "watchTimeSeconds": 450, "percentageWatched": 95.0,
+                "firstSeen": today.isoformat() + "T00:00:00Z", "lastSeen": today.isoformat() + "T00:01:00Z"
+            }])
+            asyncio.run(record_share("video1", "twitter", "https://example.com"))
+
+            queries.record_video_activity("video2", "c", today, views=2)
+            month = asyncio.run(get_video_analytics("video1"))
+            year = asyncio.run(get_video_analytics("video1", timeframe="year"))
+            monthly = asyncio.run(get_video_analytics("video1", timeframe="year", interval="month"))
+            filmmaker = asyncio.run(get_filmmaker_analytics())
+        finally:
+            queries.video_rollups = original
+            queries.fake_watch_time_db.pop(("video1", "a"), None)
+            queries.update_video("video1", shares=shares)
+
+        self.assertEqual(month["totals"]["views"], 3)
+        self.assertEqual(month["totals"]["averageWatchTime"], 150.0)
+        self.assertEqual(month["totals"]["averageCompletionRate"], 33.3)
+        self.assertEqual(month["totals"]["shares"], 1)
+        self.assertEqual(len(month["dailyData"]), 30)
+        self.assertEqual(year["totals"]["views"], 8)
+        self.assertEqual(year["totals"]["uniqueViewers"], 2)
+        self.assertEqual(len(year["dailyData"]), 365)
+        self.assertIn(len(monthly["monthlyData"]), (12, 13))
+        self.assertEqual(sum(row["views"] for row in monthly["monthlyData"]), 8)
+        self.assertEqual(filmmaker["viewsByDay"][-1]["views"], 5)
+        self.assertEqual(filmmaker["totalWatchTime"], 450)
+
+    def test_route_rejects_unknown_timeframes(self):
+        """Test that an unknown timeframe or interval is a 400 rather than a default"""
+        for arguments in ({"timeframe": "decade"}, {"interval": "hour"}):
+            with self.assertRaises(HTTPException) as raised:
+                asyncio.run(get_video_analytics("video1", **arguments))
+            self.assertEqual(raised.exception.status_code, 400)
+
+
+class FilmmakerDashboardTestCase(unittest.TestCase):
+    """Test cases for materialized filmmaker dashboards"""
+
+    def setUp(self):
+        self.now = datetime(2024, 6, 30, 12, 0)
+        self.dashboards = FilmmakerDashboards(days=7, clock=lambda: self.now)
+        self.rollups = AnalyticsRollups()
+        self.videos = {
+            f"film{i}": {
+                "id": f"film{i}", "userId": "maker", "title": f"Film {i}", "views": 100 * i,
+                "averageRating": 4.0, "ratingCount": 10, "shares": i
+            }
+            for i in range(1, 8)
+        }
+        self.loads = 0
+
+    def load_videos(self):
+        self.loads += 1
+        return list(self.videos.values())
+
+    def get(self):
+        return self.dashboards.get("maker", self.load_videos, self.rollups)
+
+    def record(self, video_id, day, **increments):
+        self.dashboards.record_activity(
+            "maker", day, lambda: self.rollups.record(video_id, day, **increments), **increments
+        )
+
+    def rebuilt(self):
+        fresh = FilmmakerDashboards(days=7, clock=lambda: self.now)
+        return fresh.get("maker", lambda: list(self.videos.values()), self.rollups)
+
+    def test_incremental_updates_match_a_rebuild(self):
+        """Test that events and catalog changes applied in place equal a fresh build"""
+        today = self.now.date()
+        self.record("film1", today - timedelta(days=9), views=4, shares=1)
+        self.get()
+
+        rng = random.Random(3)
+        for _ in range(300):
+            video_id = f"film{rng.randint(1, 7)}"
+            day = today - timedelta(days=rng.randrange(30))
+            self.record(video_id, day, views=1, watchTimeSeconds=rng.randint(1, 60))
+            if rng.random() < 0.2:
+                self.record(video_id, day, ratings=1, ratingPoints=rng.randint(1, 10))
+            if rng.random() < 0.1:
+                self.record(video_id, day, shares=1)
+            if rng.random() < 0.1:
+                self.videos[video_id] = dict(self.videos[video_id], views=self.videos[video_id]["views"] + 50)
+                self.dashboards.update_video(self.videos[video_id])
+        self.videos["film8"] = dict(self.videos["film1"], id="film8", title="Film 8", views=10_000)
+        self.dashboards.update_video(self.videos["film8"])
+
+        dashboard = self.get()
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(dashboard, self.rebuilt())
+        self.assertEqual(dashboard["totalVideos"], 8)
+        self.assertEqual(dashboard["topVideos"][0]["id"], "film8")
+        self.assertEqual(len(dashboard["viewsByDay"]), 7)
+
+    def test_cached_until_changed_or_invalidated(self):
+        """Test that loads reuse the rendered dashboard until something changes"""
+        first = self.get()
+        self.assertIs(self.get(), first)
+
+        self.record("film2", self.now.date(), views=3)
+        second = self.get()
+        self.assertIsNot(second, first)
+        self.assertEqual(second["viewsByDay"][-1]["views"], 3)
+        self.assertEqual(self.loads, 1)
+
+        # Events for other filmmakers and before the summary existed leave it alone
+        self.dashboards.record_activity("someone-else", self.now.date(), lambda: None, views=1)
+        self.assertIs(self.get(), second)
+
+        self.dashboards.invalidate("maker")
+        self.get()
+        self.assertEqual(self.loads, 2)
+
+        # A new day or new rollups rebuild the summary
+        self.now += timedelta(days=1)
+        self.get()
+        self.rollups = AnalyticsRollups()
+        self.get()
+        self.assertEqual(self.loads, 4)
+
+    def test_period_changes(self):
+        """Test views, shares and rating changes against the previous period"""
+        today = self.now.date()
+        self.record("film1", today - timedelta(days=10), views=40, shares=4, ratings=2, ratingPoints=14)
+        self.record("film2", today - timedelta(days=1), views=50, shares=2, ratings=1, ratingPoints=9)
+        dashboard = self.get()
+
+        self.assertEqual(dashboard["viewsChange"], 25.0)
+        self.assertEqual(dashboard["sharesChange"], -50.0)
+        self.assertEqual(dashboard["ratingChange"], 1.0)
+
+    def test_route_serves_catalog_changes(self):
+        """Test that the route reflects views and ratings recorded through the queries"""
+        original = queries.video_rollups
+        queries.video_rollups = AnalyticsRollups()
+        try:
+            before = asyncio.run(get_filmmaker_analytics())
+            video = queries.add_views("video2", 5)
+            queries.record_video_activity("video2", "viewer1", views=5)
+            after = asyncio.run(get_filmmaker_analytics())
+        finally:
+            queries.update_video("video2", views=video["views"] - 5)
+            queries.video_rollups = original
+
+        self.assertEqual(after["totalViews"], before["totalViews"] + 5)
+        self.assertEqual(after["viewsByDay"][-1]["views"], before["viewsByDay"][-1]["views"] + 5)
+        self.assertIn("geographicDistribution", after)
+
+    def test_route_aggregates_view_locations(self):
+        """Test that the dashboard's geography sums the filmmaker's videos and follows new views"""
+        class ViewRequest(FakeRequest):
+            def __init__(self, country):
+                self.headers = {"cf-ipcountry": country}
+
+        set_demographics(DemographicStore())
+        original = queries.video_rollups
+        queries.video_rollups = AnalyticsRollups()
+        views = {video_id: queries.get_video(video_id)["views"] for video_id in ("video1", "video2", "video3")}
+        try:
+            for video_id, country in (("video1", "US"), ("video2", "US"), ("video2", "FR"), ("video3", "JP")):
+                asyncio.run(record_view(video_id, ViewRequest(country)))
+            first = asyncio.run(get_filmmaker_analytics())["geographicDistribution"]
+            asyncio.run(record_view("video1", ViewRequest("FR")))
+            second = asyncio.run(get_filmmaker_analytics())["geographicDistribution"]
+        finally:
+            set_demographics(None)
+            queries.video_rollups = original
+            for video_id, count in views.items():
+                queries.update_video(video_id, views=count)
+
+        # video3 belongs to another filmmaker, so its views are not counted
+        self.assertEqual(first, [{"region": "US", "percentage": 66.7}, {"region": "FR", "percentage": 33.3}])
+        self.assertEqual(second, [{"region": "US", "percentage": 50.0}, {"region": "FR", "percentage": 50.0}])
+
+
+class DemographicsTestCase(unittest.TestCase):
+    """Test cases for demographic breakdowns"""
+
+    def test_space_saving_finds_heavy_hitters(self):
+        """Test that frequent items are kept with bounded overestimates in bounded memory"""
+        rng = random.Random(5)
+        exact = {}
+        sketch = SpaceSaving(capacity=20)
+        for _ in range(20_000):
+            # A few heavy countries and a long tail of rare ones
+            item = f"heavy{rng.randrange(4)}" if rng.random() < 0.6 else f"rare{rng.randrange(5_000)}"
+            exact[item] = exact.get(item, 0) + 1
+            sketch.add(item)
+
+        self.assertLessEqual(len(sketch.counts), 20)
+        self.assertEqual(sum(sketch.counts.values()), sketch.total)
+        self.assertEqual(sketch.total, 20_000)
+        top = sketch.top(4)
+        self.assertEqual(sorted(name for name, _ in top), [f"heavy{i}" for i in range(4)])
+        for name, count in top:
+            self.assertGreaterEqual(count, exact[name])
+            self.assertLessEqual(count - sketch.errors[name], exact[name])
+
+    def test_other_is_the_remainder(self):
+        """Test that "Other" holds everything outside the shown entries"""
+        self.assertEqual(
+            percentages([("US", 50), ("GB", 30)], 200),
+            [{"name": "US", "percentage": 25.0}, {"name": "GB", "percentage": 15.0}, {"name": "Other", "percentage": 60.0}]
+        )
+        self.assertEqual(percentages([("US", 2)], 2), [{"name": "US", "percentage": 100.0}])
+        self.assertEqual(percentages([], 0), [])
+
+        store = DemographicStore(capacity=8, shown=3)
+        for i in range(1_000):
+            store.record("video1", f"C{i % 40}" if i % 2 else "US", "Mobile", "Direct")
+        locations = store.breakdown("video1")["locations"]
+        self.assertEqual(locations[0], {"name": "US", "percentage": 50.0})
+        self.assertEqual(locations[-1]["name"], "Other")
+        self.assertAlmostEqual(sum(entry["percentage"] for entry in locations), 100.0, delta=0.2)
+        self.assertIs(store.breakdown("video1"), store.breakdown("video1"))
+
+    def test_view_metadata(self):
+        """Test device, referrer and location extraction from request headers"""
+        self.assertEqual(classify_device("Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148"), "Mobile")
+        self.assertEqual(classify_device("Mozilla/5.0 (iPad; CPU OS 17_0 like Mac OS X)"), "Tablet")
+        self.assertEqual(classify_device("Mozilla/5.0 (Linux; Android 13; SM-X700) Safari/537.36"), "Tablet")
+        self.assertEqual(classify_device("Mozilla/5.0 (Linux; Android 13; Pixel 7) Mobile Safari/537.36"), "Mobile")
+        self.assertEqual(classify_device("Roku/DVP-12.0 (12.0.0.4182-88)"), "TV")
+        self.assertEqual(classify_device("Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0"), "Desktop")
+        self.assertEqual(referrer_host("https://www.google.com/search?q=film"), "google.com")
+        self.assertEqual(referrer_host("https://vidorafilms.com/videos/video1"), "Direct")
+        self.assertEqual(referrer_host(""), "Direct")
+        self.assertEqual(
+            view_metadata({"cf-ipcountry": "gb", "user-agent": "Roku/DVP-12.0", "referer": "https://t.co/abc"}),
+            {"location": "GB", "device": "TV", "referrer": "t.co"}
+        )
+        self.assertEqual(view_metadata({})["location"], "Unknown")
+
+    def test_route_serves_recorded_views(self):
+        """Test that views recorded through the view route show up in video analytics"""
+        class ViewRequest(FakeRequest):
+            def __init__(self, headers):
+                self.headers = headers
+
+        set_demographics(DemographicStore())
+        original = queries.video_rollups
+        queries.video_rollups = AnalyticsRollups()
+        views = queries.get_video("video3")["views"]
+        try:
+            for i in range(4):
+                asyncio.run(record_view("video3", ViewRequest({
+                    "cf-ipcountry": "US" if i else "DE",
+                    "user-agent": "Mozilla/5.0 (iPhone) Mobile",
+                    "referer": "https://www.reddit.com/r/film"
+                }), viewerId=f"viewer{i}"))
+            demographics = asyncio.run(get_video_analytics("video3"))["demographics"]
+        finally:
+            set_demographics(None)
+            queries.video_rollups = original
+            queries.update_video("video3", views=views)
+
+        self.assertEqual(demographics["locations"], [
+            {"name": "US", "percentage": 75.0},
+            {"name": "DE", "percentage": 25.0}
+        ])
+        self.assertEqual(demographics["devices"], [{"name": "Mobile", "percentage": 100.0}])
+        self.assertEqual(demographics["referrers"], [{"name": "reddit.com", "percentage": 100.0}])
+
+
+if __name__ == '__main__':
+    unittest.main()
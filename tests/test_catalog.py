@@ -0,0 +1,220 @@
+import unittest
+import asyncio
+import sys
+import os
+from datetime import datetime, timedelta
+from fastapi import HTTPException, Response
+
+# Add the backend directory to the path so we can import its packages
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from database.models import VideoCatalog, TopViewsIndex
+from database import queries
+from routes.videos import get_video, get_videos, rate_video, decode_cursor, get_popular_videos
+
+class VideoCatalogTestCase(unittest.TestCase):
+    """Test cases for the indexed video catalog"""
+
+    def setUp(self):
+        """Set up a small catalog"""
+        self.catalog = VideoCatalog([
+            {"id": "a", "category": "short-film", "userId": "u1", "isPublic": True, "views": 0, "uploadDate": "2023-01-01"},
+            {"id": "b", "category": "commercial", "userId": "u1", "isPublic": True, "views": 0, "uploadDate": "2023-01-02"},
+            {"id": "c", "category": "short-film", "userId": "u2", "isPublic": False, "views": 0, "uploadDate": "2023-01-03"},
+            {"id": "d", "category": "short-film", "userId": "u2", "isPublic": True, "views": 0, "uploadDate": "2023-01-04"}
+        ])
+
+    def test_get_by_primary_key(self):
+        """Test looking up a video by ID"""
+        self.assertEqual(self.catalog.get("c")["userId"], "u2")
+        self.assertIsNone(self.catalog.get("missing"))
+        self.assertEqual(len(self.catalog), 4)
+
+    def test_find_intersects_indexes(self):
+        """Test filtering on several indexed fields"""
+        result = self.catalog.find(category="short-film", isPublic=True)
+        self.assertEqual([v["id"] for v in result], ["a", "d"])
+
+        result = self.catalog.find(userId="u2", isPublic=None)
+        self.assertEqual([v["id"] for v in result], ["c", "d"])
+
+    def test_update_reindexes_fields(self):
+        """Test that changing an indexed field moves the video between buckets"""
+        self.catalog.update("c", isPublic=True, title="Now public")
+
+        self.assertEqual(self.catalog.get("c")["title"], "Now public")
+        self.assertEqual(self.catalog.count("isPublic", False), 0)
+        self.assertIn("c", [v["id"] for v in self.catalog.find(isPublic=True)])
+
+    def test_remove_drops_from_indexes(self):
+        """Test removing a video"""
+        self.catalog.remove("a")
+
+        self.assertNotIn("a", self.catalog)
+        self.assertEqual([v["id"] for v in self.catalog.find(userId="u1")], ["b"])
+
+    def test_duplicate_id_rejected(self):
+        """Test that adding an existing ID fails"""
+        with self.assertRaises(ValueError):
+            self.catalog.add({"id": "a", "category": "other", "userId": "u3", "isPublic": True, "views": 0, "uploadDate": "2023-01-05"})
+
+    def test_iter_ordered_resumes_after_key(self):
+        """Test keyset iteration in (uploadDate, id) order"""
+        catalog = VideoCatalog([
+            {"id": f"v{i}", "category": "short-film" if i % 2 else "commercial",
+             "userId": "u1", "isPublic": True, "views": 0, "uploadDate": f"2023-01-{i + 1:02d}T00:00:00Z"}
+            for i in range(10)
+        ])
+
+        newest = [v["id"] for v in catalog.iter_ordered()]
+        self.assertEqual(newest, [f"v{i}" for i in range(9, -1, -1)])
+
+        after = VideoCatalog.order_key(catalog.get("v5"))
+        self.assertEqual([v["id"] for v in catalog.iter_ordered(after=after)], ["v4", "v3", "v2", "v1", "v0"])
+        self.assertEqual(
+            [v["id"] for v in catalog.iter_ordered(after=after, category="short-film")],
+            ["v3", "v1"]
+        )
+        self.assertEqual(
+            [v["id"] for v in catalog.iter_ordered(after=after, descending=False)],
+            ["v6", "v7", "v8", "v9"]
+        )
+
+    def test_update_upload_date_reorders(self):
+        """Test that changing uploadDate moves a video in the ordered index"""
+        catalog = VideoCatalog([
+            {"id": "old", "category": "c", "userId": "u", "isPublic": True, "views": 0, "uploadDate": "2023-01-01"},
+            {"id": "new", "category": "c", "userId": "u", "isPublic": True, "views": 0, "uploadDate": "2023-02-01"}
+        ])
+        catalog.update("old", uploadDate="2023-03-01")
+
+        self.assertEqual([v["id"] for v in catalog.iter_ordered(category="c")], ["old", "new"])
+
+    def test_unindexed_field_rejected(self):
+        """Test that filtering on an unindexed field fails"""
+        with self.assertRaises(ValueError):
+            self.catalog.find(title="Amazing Short Film")
+
+
+class TopViewsIndexTestCase(unittest.TestCase):
+    """Test cases for the view-count ranking"""
+
+    def setUp(self):
+        """Set up a catalog with videos of different ages"""
+        self.now = datetime(2024, 6, 1)
+        ages = {"fresh": 2, "recent": 20, "older": 200, "ancient": 900}
+        views = {"fresh": 10, "recent": 50, "older": 500, "ancient": 5000}
+        self.catalog = VideoCatalog(
+            [
+                {"id": video_id, "category": "short-film", "userId": "u1", "isPublic": True,
+                 "views": views[video_id], "uploadDate": (self.now - timedelta(days=age)).isoformat() + "Z"}
+                for video_id, age in ages.items()
+            ],
+            clock=lambda: self.now
+        )
+
+    def test_top_by_timeframe(self):
+        """Test that each window only ranks videos uploaded within it"""
+        top = self.catalog.top_views
+        self.assertEqual(top.top(10), ["ancient", "older", "recent", "fresh"])
+        self.assertEqual(top.top(2), ["ancient", "older"])
+        self.assertEqual(top.top(10, "year"), ["older", "recent", "fresh"])
+        self.assertEqual(top.top(10, "month"), ["recent", "fresh"])
+        self.assertEqual(top.top(10, "week"), ["fresh"])
+
+    def test_view_change_reranks(self):
+        """Test that a view-count update moves the video in every window"""
+        self.catalog.update("fresh", views=1000)
+
+        self.assertEqual(self.catalog.top_views.top(1, "month"), ["fresh"])
+        self.assertEqual(self.catalog.top_views.top(2), ["ancient", "fresh"])
+
+    def test_windows_expire_as_time_passes(self):
+        """Test that videos age out of a window"""
+        self.now += timedelta(days=6)
+
+        self.assertEqual(self.catalog.top_views.top(10, "week"), [])
+        self.assertEqual(self.catalog.top_views.top(10, "month"), ["recent", "fresh"])
+
+    def test_private_videos_not_ranked(self):
+        """Test that private videos are left out of the ranking"""
+        self.catalog.update("ancient", isPublic=False)
+        self.assertEqual(self.catalog.top_views.top(1), ["older"])
+
+        self.catalog.remove("older")
+        self.assertEqual(self.catalog.top_views.top(1), ["recent"])
+
+    def test_new_upload_is_ranked(self):
+        """Test that an added video enters the windows it belongs to"""
+        self.catalog.add({"id": "new", "category": "commercial", "userId": "u2", "isPublic": True,
+                          "views": 20, "uploadDate": self.now.isoformat()})
+
+        self.assertEqual(self.catalog.top_views.top(10, "week"), ["new", "fresh"])
+
+    def test_unknown_timeframe_rejected(self):
+        """Test that an unknown timeframe fails"""
+        with self.assertRaises(ValueError):
+            TopViewsIndex().top(5, "decade")
+
+
+class VideoRoutesCatalogTestCase(unittest.TestCase):
+    """Test cases for video routes reading through the catalog"""
+
+    def test_get_video(self):
+        """Test fetching a video with filmmaker info"""
+        video = asyncio.run(get_video("video3"))
+
+        self.assertEqual(video["title"], "Student Project")
+        self.assertEqual(video["filmmaker"]["name"], "Film Student")
+
+    def test_get_videos_by_category(self):
+        """Test listing public videos in a category"""
+        videos = asyncio.run(get_videos(Response(), category="commercial"))
+
+        self.assertTrue(videos)
+        self.assertTrue(all(v["category"] == "commercial" for v in videos))
+
+    def test_cursor_pages_match_offset_pages(self):
+        """Test that following cursors walks the same rows as page numbers"""
+        page_one = Response()
+        first = asyncio.run(get_videos(page_one, limit=1))
+        cursor = page_one.headers["X-Next-Cursor"]
+
+        second = asyncio.run(get_videos(Response(), limit=1, after=cursor))
+        self.assertEqual(second, asyncio.run(get_videos(Response(), limit=1, page=2)))
+        self.assertNotEqual(first[0]["id"], second[0]["id"])
+        self.assertEqual(decode_cursor(cursor), (first[0]["uploadDate"], first[0]["id"]))
+
+    def test_last_page_has_no_cursor(self):
+        """Test that the final page does not advertise a next cursor"""
+        response = Response()
+        asyncio.run(get_videos(response, limit=1000))
+
+        self.assertNotIn("X-Next-Cursor", response.headers)
+
+    def test_invalid_cursor_rejected(self):
+        """Test that a malformed cursor is a client error"""
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(get_videos(Response(), after="not-a-cursor"))
+
+        self.assertEqual(context.exception.status_code, 400)
+
+    def test_popular_rejects_unknown_timeframe(self):
+        """Test that the popular list validates its timeframe"""
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(get_popular_videos(timeframe="decade"))
+
+        self.assertEqual(context.exception.status_code, 400)
+
+    def test_rate_video_updates_catalog(self):
+        """Test that rating a video is visible through the catalog"""
+        before = queries.get_video("video2")["ratingCount"]
+
+        result = asyncio.run(rate_video("video2", 5.0))
+
+        self.assertEqual(result["ratingCount"], before + 1)
+        self.assertEqual(queries.get_video("video2")["ratingCount"], before + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
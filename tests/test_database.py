@@ -0,0 +1,227 @@
+import unittest
+import asyncio
+import json
+import shutil
+import sys
+import os
+import tempfile
+from unittest import mock
+
+# Add the backend directory to the path so we can import its packages
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from database import queries
+from database.pool import QueryTimeout, SQLiteDatabase, sqlite_sql
+from database.store import CatalogStore, CatalogWriter, set_catalog_writer
+from settings import env_float, env_int, env_str
+
+class SettingsTestCase(unittest.TestCase):
+    """Test cases for reading settings from the environment"""
+
+    def test_comments(self):
+        """Test that numbers drop a trailing comment while text settings are kept whole"""
+        environ = {"DB_POOL_SIZE": "20 # connections per worker", "DB_QUERY_TIMEOUT": "2.5", "DB_PASSWORD": "pa#ss word"}
+        with mock.patch.dict(os.environ, environ):
+            self.assertEqual(env_int("DB_POOL_SIZE", 10), 20)
+            self.assertEqual(env_float("DB_QUERY_TIMEOUT", 5), 2.5)
+            self.assertEqual(env_int("DB_MISSING", 10), 10)
+            self.assertEqual(env_str("DB_PASSWORD"), "pa#ss word")
+
+
+class SQLiteDatabaseTestCase(unittest.TestCase):
+    """Test cases for the pooled SQLite database"""
+
+    def setUp(self):
+        """Set up a database file in a temporary directory"""
+        self.directory = tempfile.mkdtemp()
+        self.database = SQLiteDatabase(os.path.join(self.directory, "test.db"), pool_size=2, timeout=0.2)
+
+    def tearDown(self):
+        asyncio.run(self.database.close())
+        shutil.rmtree(self.directory)
+
+    def test_parameters(self):
+        """Test that $n parameters are rewritten for SQLite"""
+        self.assertEqual(sqlite_sql("SELECT * FROM videos WHERE id = $1 AND user_id = $12"), "SELECT * FROM videos WHERE id = ?1 AND user_id = ?12")
+
+    def test_pool_is_bounded(self):
+        """Test that concurrent queries share at most pool_size connections"""
+        async def scenario():
+            await self.database.execute("CREATE TABLE numbers (n INTEGER)")
+            await self.database.execute_batch([("INSERT INTO numbers (n) VALUES ($1)", [(n,) for n in range(100)])])
+            return await asyncio.gather(*(self.database.fetch_one("SELECT SUM(n) AS total FROM numbers WHERE n < $1", limit) for limit in range(50)))
+
+        rows = asyncio.run(scenario())
+        self.assertEqual(rows[10]["total"], sum(range(10)))
+        self.assertLessEqual(len(self.database._idle), 2)
+
+    def test_timeout(self):
+        """Test that a slow query is interrupted and the pool keeps working"""
+        slow = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n"
+
+        async def scenario():
+            with self.assertRaises(QueryTimeout):
+                await self.database.fetch_all(slow)
+            return await asyncio.gather(*(self.database.fetch_one("SELECT $1 AS value", n) for n in range(4)))
+
+        self.assertEqual([row["value"] for row in asyncio.run(scenario())], [0, 1, 2, 3])
+
+    def test_failed_batches_roll_back(self):
+        """Test that a batch is written entirely or not at all"""
+        async def scenario():
+            await self.database.execute("CREATE TABLE numbers (n INTEGER PRIMARY KEY)")
+            with self.assertRaises(Exception):
+                await self.database.execute_batch([("INSERT INTO numbers (n) VALUES ($1)", [(1,), (2,), (1,)])])
+            return await self.database.fetch_one("SELECT COUNT(*) AS count FROM numbers")
+
+        self.assertEqual(asyncio.run(scenario())["count"], 0)
+
+
+class CatalogStoreTestCase(unittest.TestCase):
+    """Test cases for storing the catalog and writing changes behind"""
+
+    def setUp(self):
+        """Set up a store with the schema, and note the catalog to restore"""
+        self.directory = tempfile.mkdtemp()
+        self.store = CatalogStore(SQLiteDatabase(os.path.join(self.directory, "test.db")))
+        asyncio.run(self.store.create_schema())
+        self.writer = CatalogWriter(self.store)
+        self.original = (
+            queries.fake_videos_db, queries.video_catalog, queries.video_leaderboard,
+            queries.student_leaderboard, queries.filmmaker_dashboards,
+            {user_id: dict(user) for user_id, user in queries.fake_users_db.items()},
+            dict(queries.fake_monthly_awards_db)
+        )
+
+    def tearDown(self):
+        set_catalog_writer(None)
+        (
+            queries.fake_videos_db, queries.video_catalog, queries.video_leaderboard,
+            queries.student_leaderboard, queries.filmmaker_dashboards, users, awards
+        ) = self.original
+        queries.fake_users_db.clear()
+        queries.fake_users_db.update(users)
+        queries.fake_monthly_awards_db.clear()
+        queries.fake_monthly_awards_db.update(awards)
+        asyncio.run(self.store.database.close())
+        shutil.rmtree(self.directory)
+
+    def test_write_and_read(self):
+        """Test that saved records read back and monthly awards are never overwritten"""
+        video = dict(queries.get_video("video1"))
+
+        async def scenario():
+            await self.store.write(
+                created={"video1": video, "video2": dict(queries.get_video("video2"))},
+                users={"user123": queries.get_user_by_id("user123")},
+                awards={(2024, 5): '{"a":1}'}
+            )
+            await self.store.write(videos={"video2": None}, awards={(2024, 5): '{"b":2}'})
+            return (
+                await self.store.get_video("video1"),
+                await self.store.get_video("video2"),
+                await self.store.get_user_by_id("user123"),
+                (await self.store.load())[2]
+            )
+
+        stored, deleted, user, awards = asyncio.run(scenario())
+        self.assertEqual(stored["title"], video["title"])
+        self.assertEqual(stored["views"], video["views"])
+        self.assertAlmostEqual(stored["averageRating"], video["averageRating"])
+        self.assertIsNone(deleted)
+        self.assertEqual(user["name"], "Test Filmmaker")
+        self.assertEqual(awards, {(2024, 5): '{"a":1}'})
+
+    def test_workers_add_counts(self):
+        """Test that counts from several writers add up and edits leave them alone"""
+        video = dict(queries.get_video("video1"))
+        asyncio.run(self.store.write(created={"video1": video}))
+        writers = [CatalogWriter(self.store) for _ in range(3)]
+        for writer in writers:
+            writer.video_counted("video1", {"views": 10, "shares": 1})
+        writers[0].video_changed("video1", dict(video, title="Edited", views=0))
+
+        async def scenario():
+            for writer in writers:
+                await writer.flush()
+            return await self.store.get_video("video1")
+
+        stored = asyncio.run(scenario())
+        self.assertEqual(stored["title"], "Edited")
+        self.assertEqual(stored["views"], video["views"] + 30)
+        self.assertEqual(stored["shares"], video["shares"] + 3)
+
+    def test_created_videos_are_inserted(self):
+        """Test that a new video is inserted rather than overwriting a stored one"""
+        video = dict(queries.get_video("video1"))
+        asyncio.run(self.store.write(created={"video1": video}))
+        with self.assertRaises(Exception):
+            asyncio.run(self.store.write(created={"video1": dict(video, title="Clash")}))
+        self.assertEqual(asyncio.run(self.store.get_video("video1"))["title"], video["title"])
+
+    def test_changes_are_written_behind(self):
+        """Test that repeated changes to a record are written once, as they ended up"""
+        asyncio.run(self.store.write(created={"video1": dict(queries.get_video("video1"))}))
+        set_catalog_writer(self.writer)
+        views = queries.get_video("video1")["views"]
+        bio = queries.get_user_by_id("student1")["bio"]
+        try:
+            for _ in range(100):
+                queries.add_views("video1")
+            queries.update_user("student1", bio="Graduated")
+            self.assertEqual(self.writer.pending, 2)
+            self.assertEqual(asyncio.run(self.writer.flush()), 2)
+            self.assertEqual(self.writer.pending, 0)
+        finally:
+            queries.update_video("video1", views=views)
+            queries.update_user("student1", bio=bio)
+
+        stored = asyncio.run(self.store.get_video("video1"))
+        self.assertEqual(stored["views"], views + 100)
+        self.assertEqual(asyncio.run(self.store.get_user_by_id("student1"))["bio"], "Graduated")
+
+    def test_reads_add_unwritten_counts(self):
+        """Test that single videos come from the database plus counts not written yet"""
+        asyncio.run(queries.load_catalog(self.store))
+        set_catalog_writer(self.writer)
+        video_id = queries.video_catalog.get("video1")["id"]
+        views = queries.get_video(video_id)["views"]
+        # Another worker's views, already written
+        asyncio.run(CatalogStore(self.store.database).write(counts={video_id: {"views": 50}}))
+        try:
+            queries.add_views(video_id, 5)
+            self.assertEqual(asyncio.run(queries.load_video(video_id))["views"], views + 55)
+            asyncio.run(self.writer.flush())
+            self.assertEqual(asyncio.run(queries.load_video(video_id))["views"], views + 55)
+            self.assertIsNone(asyncio.run(queries.load_video("missing")))
+        finally:
+            queries.update_video(video_id, views=views)
+
+    def test_failed_writes_are_retried(self):
+        """Test that records from a failed flush stay pending"""
+        self.writer.video_changed("video1", queries.get_video("video1"))
+        self.writer.video_counted("video1", {"views": 3})
+        asyncio.run(self.store.database.close())
+        self.store.database = SQLiteDatabase(os.path.join(self.directory, "missing", "test.db"))
+        with self.assertRaises(Exception):
+            asyncio.run(self.writer.flush())
+        self.assertEqual(self.writer.pending, 2)
+        self.assertEqual(self.writer.unwritten_counts("video1")["views"], 3)
+
+    def test_load_catalog(self):
+        """Test that an empty database is seeded and a stored catalog replaces memory"""
+        asyncio.run(queries.load_catalog(self.store))
+        videos, users, _ = asyncio.run(self.store.load())
+        self.assertEqual(len(videos), len(queries.video_catalog))
+        self.assertEqual(set(users), set(queries.fake_users_db))
+
+        renamed = dict(videos[0], title="Stored Title")
+        asyncio.run(self.store.write(videos={renamed["id"]: renamed}, awards={(2024, 5): json.dumps({"winners": []})}))
+        asyncio.run(queries.load_catalog(self.store))
+        self.assertEqual(queries.get_video(renamed["id"])["title"], "Stored Title")
+        self.assertEqual(queries.get_leaderboard_size(), len(videos))
+        self.assertEqual(queries.get_latest_awards_month(), (2024, 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+from fastapi import HTTPException
+
+# Add the backend directory to the path so we can import its packages
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from awards.hall_of_fame import IMMUTABLE_CACHE_CONTROL, HallOfFame
+from routes import awards
+
+class HeaderRequest:
+    """Request with only headers for the hall of fame routes"""
+
+    def __init__(self, **headers):
+        self.headers = headers
+
+
+class HallOfFameTestCase(unittest.TestCase):
+    """Test cases for versioned hall of fame snapshots"""
+
+    def setUp(self):
+        """Set up a hall of fame whose data and source version the test controls"""
+        self.data = {"currentYear": {"year": 2023, "filmOfTheYear": {"id": "video1"}}, "pastYears": []}
+        self.source = 1
+        self.builds = 0
+        self.hall_of_fame = HallOfFame(self.build, lambda: self.source, kept=2)
+
+    def build(self):
+        self.builds += 1
+        return self.data
+
+    def test_built_once_per_source_version(self):
+        """Test that snapshots are encoded once and rebuilt only when the source changes"""
+        snapshot = self.hall_of_fame.current()
+        self.assertIs(self.hall_of_fame.current(), snapshot)
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(json.loads(snapshot.body), self.data)
+        self.assertEqual(snapshot.etag, f"\"{snapshot.version}\"")
+
+        # A new source version with the same content keeps the snapshot and its ETag
+        self.source = 2
+        self.assertIs(self.hall_of_fame.current(), snapshot)
+        self.assertEqual(self.builds, 2)
+
+    def test_versions_are_kept(self):
+        """Test that changed content gets a new version and recent ones stay reachable"""
+        first = self.hall_of_fame.current()
+        versions = [first.version]
+        for year in (2024, 2025):
+            self.data = dict(self.data, currentYear={"year": year})
+            self.source += 1
+            versions.append(self.hall_of_fame.current().version)
+
+        self.assertEqual(len(set(versions)), 3)
+        self.assertIsNone(self.hall_of_fame.get(first.version))
+        self.assertEqual(json.loads(self.hall_of_fame.get(versions[1]).body)["currentYear"]["year"], 2024)
+
+
+class HallOfFameRoutesTestCase(unittest.TestCase):
+    """Test cases for the hall of fame routes"""
+
+    def setUp(self):
+        """Set up the routes with a fresh hall of fame that counts builds"""
+        self.original = awards.hall_of_fame
+        self.builds = 0
+        awards.hall_of_fame = HallOfFame(self.build, lambda: 1)
+
+    def tearDown(self):
+        awards.hall_of_fame = self.original
+
+    def build(self):
+        self.builds += 1
+        return awards.build_hall_of_fame()
+
+    def test_full_and_conditional_responses(self):
+        """Test ETag and Cache-Control headers, and 304 for a matching If-None-Match"""
+        response = asyncio.run(awards.get_hall_of_fame(HeaderRequest()))
+        etag = response.headers["etag"]
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(etag.startswith("\"") and not etag.startswith("W/"))
+        self.assertIn("max-age=", response.headers["cache-control"])
+        self.assertEqual(json.loads(response.body)["currentYear"]["studentFilmmaker"]["id"], "video3")
+
+        for if_none_match in (etag, f"W/{etag}", f"\"other\", {etag}", "*"):
+            response = asyncio.run(awards.get_hall_of_fame(HeaderRequest(**{"if-none-match": if_none_match})))
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.body, b"")
+            self.assertEqual(response.headers["etag"], etag)
+
+        response = asyncio.run(awards.get_hall_of_fame(HeaderRequest(**{"if-none-match": "\"stale\""})))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.builds, 1)
+
+    def test_versioned_urls(self):
+        """Test that a version is served as immutable and unknown versions are 404"""
+        version = awards.hall_of_fame.current().version
+        response = asyncio.run(awards.get_hall_of_fame_version(version, HeaderRequest()))
+        self.assertEqual(response.headers["cache-control"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response.body, awards.hall_of_fame.current().body)
+
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(awards.get_hall_of_fame_version("0000", HeaderRequest()))
+        self.assertEqual(context.exception.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,231 @@
+import unittest
+import asyncio
+import random
+import sys
+import os
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+
+# Add the backend directory to the path so we can import its packages
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from database import queries
+from database.leaderboard import LeaderboardIndex, RankedIndex
+from database.scoring import composite_score
+from routes.awards import get_leaderboard, get_leaderboard_position
+
+class SmallRankedIndex(RankedIndex):
+    """Tiny blocks so a few hundred keys split and merge many times"""
+    LOAD = 4
+
+
+class RankedIndexTestCase(unittest.TestCase):
+    """Test cases for the order-statistic index"""
+
+    def test_matches_a_sorted_list(self):
+        """Test rank, slices and membership against a plain sorted list through many updates"""
+        rng = random.Random(11)
+        expected = sorted({(rng.random(), str(i)) for i in range(200)})
+        index = SmallRankedIndex(expected)
+
+        for step in range(2_000):
+            if expected and rng.random() < 0.5:
+                key = expected.pop(rng.randrange(len(expected)))
+                self.assertTrue(index.discard(key))
+                self.assertFalse(index.discard(key))
+            else:
+                key = (rng.random(), f"new{step}")
+                expected.append(key)
+                expected.sort()
+                index.add(key)
+
+            if step % 50 == 0:
+                self.assertEqual(len(index), len(expected))
+                self.assertEqual(index.slice(0, len(index)), expected)
+                for position in rng.sample(range(len(expected)), 10):
+                    self.assertEqual(index.rank(expected[position]), position)
+                    self.assertEqual(index.slice(position, position + 3), expected[position:position + 3])
+
+        self.assertIsNone(index.rank((2.0, "missing")))
+        self.assertEqual(index.top(5), expected[:5])
+
+    def test_empty_index(self):
+        """Test that an empty index answers every query"""
+        index = RankedIndex()
+        self.assertEqual(index.top(5), [])
+        self.assertIsNone(index.rank((1,)))
+        self.assertFalse(index.discard((1,)))
+        index.add((1,))
+        index.discard((1,))
+        self.assertEqual(len(index), 0)
+
+
+class LeaderboardIndexTestCase(unittest.TestCase):
+    """Test cases for per-category, per-timeframe leaderboards"""
+
+    def setUp(self):
+        """Set up videos of different ages, ratings and categories"""
+        self.now = datetime(2024, 6, 1)
+        self.videos = {
+            video_id: {
+                "id": video_id, "category": category, "isPublic": True, "score": score,
+                "uploadDate": (self.now - timedelta(days=age)).isoformat() + "Z"
+            }
+            for video_id, category, age, score in [
+                ("fresh", "short-film", 2, 4.2),
+                ("recent", "commercial", 20, 4.9),
+                ("older", "short-film", 200, 4.5),
+                ("ancient", "short-film", 900, 5.0),
+                ("tied", "commercial", 25, 4.9)
+            ]
+        }
+        self.index = LeaderboardIndex(clock=lambda: self.now)
+        self.index.add_many(self.videos.values())
+
+    def test_boards_by_category_and_timeframe(self):
+        """Test that each board holds the matching videos in score order"""
+        self.assertEqual(self.index.top(10), ["ancient", "recent", "tied", "older", "fresh"])
+        self.assertEqual(self.index.top(10, "short-film"), ["ancient", "older", "fresh"])
+        self.assertEqual(self.index.top(10, timeframe="month"), ["recent", "tied", "fresh"])
+        self.assertEqual(self.index.top(10, "commercial", "week"), [])
+        self.assertEqual(self.index.top(2, "all", "year"), ["recent", "tied"])
+        self.assertEqual(self.index.top(10, "documentary"), [])
+
+    def test_rank(self):
+        """Test one-based ranks per board"""
+        self.assertEqual(self.index.rank("tied"), 3)
+        self.assertEqual(self.index.rank("tied", "commercial", "month"), 2)
+        self.assertEqual(self.index.rank("fresh", "short-film", "week"), 1)
+        self.assertIsNone(self.index.rank("ancient", timeframe="year"))
+        self.assertIsNone(self.index.rank("recent", "short-film"))
+        self.assertEqual(self.index.size("all", "month"), 3)
+
+    def test_updates_rerank(self):
+        """Test that score changes move a video on every board it is on"""
+        self.videos["fresh"]["score"] = 5.0
+        self.index.update(self.videos["fresh"])
+        self.assertEqual(self.index.top(1, "short-film", "month"), ["fresh"])
+        self.assertEqual(self.index.rank("fresh"), 2)
+
+        self.videos["tied"]["score"] = 4.95
+        self.index.update(self.videos["tied"])
+        self.assertEqual(self.index.top(3, timeframe="month"), ["fresh", "tied", "recent"])
+
+    def test_refiled_and_removed_videos(self):
+        """Test that visibility and category changes re-file a video"""
+        self.videos["recent"]["category"] = "short-film"
+        self.index.update(self.videos["recent"])
+        self.assertEqual(self.index.top(10, "commercial"), ["tied"])
+        self.assertEqual(self.index.rank("recent", "short-film"), 2)
+
+        self.videos["ancient"]["isPublic"] = False
+        self.index.update(self.videos["ancient"])
+        self.assertNotIn("ancient", self.index)
+        self.assertEqual(self.index.top(1), ["recent"])
+
+        self.index.remove("recent")
+        self.assertEqual(self.index.top(10, "all", "month"), ["tied", "fresh"])
+
+    def test_windows_expire_as_time_passes(self):
+        """Test that videos age out of timeframe boards"""
+        self.now += timedelta(days=8)
+        self.assertEqual(self.index.top(10, timeframe="week"), [])
+        self.assertEqual(self.index.top(10, timeframe="month"), ["recent", "fresh"])
+        self.assertIsNone(self.index.rank("tied", timeframe="month"))
+
+    def test_unknown_timeframe_rejected(self):
+        """Test that an unknown timeframe fails"""
+        with self.assertRaises(ValueError):
+            self.index.top(5, "all", "decade")
+
+
+class ScoringTestCase(unittest.TestCase):
+    """Test cases for the composite ranking score"""
+
+    def video(self, rating, ratings, views=0, shares=0):
+        return {"averageRating": rating, "ratingCount": ratings, "views": views, "shares": shares}
+
+    def test_few_votes_stay_near_the_prior(self):
+        """Test that one 5-star vote does not outrank a long record of high ratings"""
+        self.assertLess(composite_score(self.video(5.0, 1)), composite_score(self.video(4.7, 300)))
+        self.assertAlmostEqual(composite_score(self.video(0, 0), prior_rating=3.0), 3.0)
+
+    def test_without_a_prior(self):
+        """Test that a zero prior scores unrated videos at the prior rating and rated ones at their average"""
+        self.assertAlmostEqual(composite_score(self.video(0, 0), prior_votes=0, prior_rating=3.0), 3.0)
+        self.assertAlmostEqual(composite_score(self.video(4.5, 2), prior_votes=0), 4.5)
+
+    def test_new_ratings_move_established_videos_less(self):
+        """Test that each extra rating shifts the score less as ratings accumulate"""
+        young = composite_score(self.video(5.0, 6)) - composite_score(self.video(5.0, 5))
+        established = composite_score(self.video(5.0, 501)) - composite_score(self.video(5.0, 500))
+        self.assertGreater(young, 10 * established)
+
+    def test_reach_and_weights(self):
+        """Test that views and shares add to the score by their configured weights"""
+        base = composite_score(self.video(4.0, 50))
+        self.assertGreater(composite_score(self.video(4.0, 50, views=9999, shares=99)), base)
+        self.assertEqual(composite_score(self.video(4.0, 50, views=9999), view_weight=0), base)
+        self.assertAlmostEqual(composite_score(self.video(4.0, 50, views=999), view_weight=1, share_weight=0) - base, 3.0, places=3)
+
+    def test_score_is_stored_on_update(self):
+        """Test that the catalog recomputes the stored score only when its inputs change"""
+        video = queries.get_video("video1")
+        self.assertEqual(video["score"], composite_score(video))
+
+        before = video["score"]
+        queries.update_video("video1", description=video["description"])
+        self.assertEqual(video["score"], before)
+
+        views = video["views"]
+        try:
+            queries.add_views("video1", 1_000_000)
+            self.assertGreater(video["score"], before)
+        finally:
+            queries.update_video("video1", views=views)
+        self.assertEqual(video["score"], before)
+
+
+class LeaderboardRoutesTestCase(unittest.TestCase):
+    """Test cases for the leaderboard routes"""
+
+    def test_leaderboard_uses_the_index(self):
+        """Test that the route serves the ranked index with filmmaker info"""
+        result = asyncio.run(get_leaderboard(category="short-film", timeframe="all", limit=5))
+
+        self.assertEqual([video["id"] for video in result], ["video1", "video3"])
+        self.assertEqual(result[0]["filmmaker"]["name"], "Test Filmmaker")
+        self.assertEqual(result[0]["score"], queries.get_video("video1")["score"])
+        self.assertEqual(asyncio.run(get_leaderboard(timeframe="yearly")), asyncio.run(get_leaderboard(timeframe="year")))
+
+    def test_rating_moves_a_video(self):
+        """Test that a rating through the catalog re-ranks the video"""
+        video = queries.get_video("video2")
+        original = (video["averageRating"], video["ratingCount"])
+        try:
+            queries.update_video("video2", averageRating=5.0, ratingCount=500)
+            position = asyncio.run(get_leaderboard_position("video2", timeframe="all"))
+        finally:
+            queries.update_video("video2", averageRating=original[0], ratingCount=original[1])
+
+        self.assertEqual(position["rank"], 1)
+        self.assertEqual(position["total"], 3)
+        self.assertEqual(queries.get_leaderboard_rank("video2"), 3)
+
+    def test_bad_requests(self):
+        """Test status codes for unknown timeframes, videos and boards"""
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(get_leaderboard(timeframe="decade"))
+        self.assertEqual(context.exception.status_code, 400)
+
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(get_leaderboard_position("missing", timeframe="all"))
+        self.assertEqual(context.exception.status_code, 404)
+
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(get_leaderboard_position("video2", category="short-film", timeframe="all"))
+        self.assertEqual(context.exception.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,335 @@
+import unittest
+import asyncio
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+
+# Add the backend directory to the path so we can import its packages
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from starlette.datastructures import UploadFile
+
+from database import queries
+from media.hls import HlsPackager, build_master_playlist, select_ladder
+from media.processing import MediaJobQueue, probe_mp4, set_media_jobs
+from storage.backends import LocalStorageBackend, set_storage_backend
+from routes.videos import upload_video, get_processing_job, get_master_playlist
+
+def box(box_type, payload=b""):
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+def make_mp4(duration_ms=12400, width=1920, height=1080, version=0, media_bytes=1024):
+    """Build a minimal MP4 with ftyp, moov (mvhd, audio and video tkhd) and mdat boxes"""
+    if version == 1:
+        mvhd = bytes([1, 0, 0, 0]) + struct.pack(">QQIQ", 0, 0, 1000, duration_ms) + bytes(80)
+        tkhd_prefix = bytes([1, 0, 0, 0]) + bytes(32)
+    else:
+        mvhd = bytes(4) + struct.pack(">IIII", 0, 0, 1000, duration_ms) + bytes(80)
+        tkhd_prefix = bytes(4) + bytes(20)
+
+    def tkhd(w, h):
+        return box(b"tkhd", tkhd_prefix + bytes(16) + bytes(36) + struct.pack(">II", w << 16, h << 16))
+
+    audio = box(b"trak", tkhd(0, 0))
+    video = box(b"trak", tkhd(width, height))
+    return (
+        box(b"ftyp", b"isom" + bytes(4) + b"isomavc1")
+        + box(b"moov", box(b"mvhd", mvhd) + audio + video)
+        + box(b"mdat", bytes(media_bytes))
+    )
+
+
+class ProbeTestCase(unittest.TestCase):
+    """Test cases for reading metadata from MP4 headers"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, content):
+        path = os.path.join(self.temp_dir.name, "clip.mp4")
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_probe_version_0_headers(self):
+        """Test reading duration, brand and video frame size"""
+        metadata = probe_mp4(self.write(make_mp4()))
+
+        self.assertEqual(metadata, {"container": "isom", "duration": 12.4, "width": 1920, "height": 1080})
+
+    def test_probe_version_1_headers(self):
+        """Test reading the 64-bit header variants"""
+        metadata = probe_mp4(self.write(make_mp4(duration_ms=90_000, width=1280, height=720, version=1)))
+
+        self.assertEqual(metadata["duration"], 90.0)
+        self.assertEqual((metadata["width"], metadata["height"]), (1280, 720))
+
+    def test_probe_skips_large_boxes(self):
+        """Test that a 64-bit sized mdat before moov is skipped without reading it"""
+        mp4 = make_mp4()
+        ftyp_end = struct.unpack(">I", mp4[:4])[0]
+        large_mdat = struct.pack(">I4sQ", 1, b"mdat", 16 + 4096) + bytes(4096)
+        metadata = probe_mp4(self.write(mp4[:ftyp_end] + large_mdat + mp4[ftyp_end:]))
+
+        self.assertEqual(metadata["duration"], 12.4)
+
+    def test_probe_rejects_other_files(self):
+        """Test that a file without a movie header is an error"""
+        with self.assertRaises(ValueError):
+            probe_mp4(self.write(b"definitely not a video file"))
+
+
+class MediaJobQueueTestCase(unittest.TestCase):
+    """Test cases for the background processing queue"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "clip.mp4")
+        with open(self.path, "wb") as f:
+            f.write(make_mp4())
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_jobs_run_on_process_pool(self):
+        """Test that jobs are queued, processed in a worker process and queryable"""
+        completed = []
+
+        async def run():
+            queue = MediaJobQueue(workers=2, executor=ProcessPoolExecutor(2))
+            try:
+                async def on_complete(job):
+                    completed.append(job["id"])
+
+                jobs = [await queue.submit(f"v{i}", self.path, on_complete=on_complete) for i in range(3)]
+                self.assertTrue(all(job["status"] == "queued" for job in jobs))
+                await queue.join()
+                return [queue.get_job(job["id"]) for job in jobs]
+            finally:
+                await queue.shutdown()
+
+        jobs = asyncio.run(run())
+
+        self.assertTrue(all(job["status"] == "ready" for job in jobs))
+        self.assertEqual(jobs[0]["result"]["duration"], 12.4)
+        self.assertEqual(sorted(completed), sorted(job["id"] for job in jobs))
+
+    def test_failed_job_records_error(self):
+        """Test that a file that cannot be probed fails its job"""
+        bad_path = os.path.join(self.temp_dir.name, "bad.mp4")
+        with open(bad_path, "wb") as f:
+            f.write(b"garbage")
+
+        async def run():
+            queue = MediaJobQueue(workers=1, executor=ThreadPoolExecutor(1))
+            try:
+                job = await queue.submit("bad", bad_path)
+                await queue.join()
+                return job
+            finally:
+                await queue.shutdown()
+
+        job = asyncio.run(run())
+
+        self.assertEqual(job["status"], "failed")
+        self.assertIn("movie header", job["error"])
+
+    def test_shutdown_does_not_block_the_event_loop(self):
+        """Test that the event loop keeps running while shutdown waits for running work"""
+        release = threading.Event()
+
+        async def run():
+            executor = ThreadPoolExecutor(1)
+            queue = MediaJobQueue(workers=1, executor=executor)
+            queue.start()
+            executor.submit(release.wait, 2)
+            asyncio.get_running_loop().call_later(0.05, release.set)
+            started = time.perf_counter()
+            await queue.shutdown()
+            return time.perf_counter() - started
+
+        # Had shutdown blocked the loop, release would only come at the wait's timeout
+        self.assertLess(asyncio.run(run()), 1)
+
+
+class UploadProcessingTestCase(unittest.TestCase):
+    """Test cases for processing videos after upload"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        set_storage_backend(LocalStorageBackend(self.temp_dir.name))
+
+    def tearDown(self):
+        set_storage_backend(None)
+        self.temp_dir.cleanup()
+
+    def test_upload_returns_processing_then_becomes_ready(self):
+        """Test that upload returns at once and the job fills in the metadata"""
+        async def run():
+            queue = MediaJobQueue(workers=1, executor=ProcessPoolExecutor(1))
+            set_media_jobs(queue)
+            try:
+                video = await upload_video(
+                    title="Probed",
+                    description="Has real headers",
+                    category="short-film",
+                    isPublic=True,
+                    tags="",
+                    videoFile=UploadFile(filename="clip.mp4", file=BytesIO(make_mp4())),
+                    thumbnailFile=None
+                )
+                returned_status = video["status"]
+                await queue.join()
+                job = await get_processing_job(video["processingJobId"])
+                return returned_status, job, video["id"]
+            finally:
+                await queue.shutdown()
+                set_media_jobs(None)
+
+        returned_status, job, video_id = asyncio.run(run())
+        video = queries.get_video(video_id)
+
+        self.assertEqual(returned_status, "processing")
+        self.assertEqual(job["status"], "ready")
+        self.assertEqual(video["status"], "ready")
+        self.assertEqual(video["duration"], 12)
+        self.assertEqual(video["media"]["width"], 1920)
+        queries.delete_video_from_db(video_id)
+
+
+class FakeTranscoder:
+    """Writes a two-segment media playlist instead of running ffmpeg"""
+
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.fail_on = fail_on
+
+    def __call__(self, source, rendition, output_dir):
+        self.calls.append(rendition["name"])
+        if rendition["name"] == self.fail_on:
+            with open(os.path.join(output_dir, "seg_00000.ts"), "wb") as f:
+                f.write(b"partial")
+            raise RuntimeError("encoder crashed")
+
+        segment_bytes = rendition["videoBitrate"] * 1000 // 8 * 6
+        lines = ["#EXTM3U", "#EXT-X-TARGETDURATION:6"]
+        for i, duration in enumerate((6.0, 3.0)):
+            name = f"seg_{i:05d}.ts"
+            with open(os.path.join(output_dir, name), "wb") as f:
+                f.write(bytes(int(segment_bytes * duration / 6)))
+            lines += [f"#EXTINF:{duration},", name]
+        with open(os.path.join(output_dir, "index.m3u8"), "w") as f:
+            f.write("\n".join(lines + ["#EXT-X-ENDLIST"]) + "\n")
+
+
+class HlsPackagingTestCase(unittest.TestCase):
+    """Test cases for the rendition ladder and HLS packaging"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.temp_dir.name, "hls")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_ladder_never_upscales(self):
+        """Test that renditions above the source height are skipped"""
+        self.assertEqual([r["name"] for r in select_ladder(720)], ["720p", "480p", "360p", "240p"])
+        self.assertEqual([r["name"] for r in select_ladder(200)], ["240p"])
+        self.assertEqual(len(select_ladder(None)), 5)
+
+    def test_master_playlist_lists_renditions(self):
+        """Test the master playlist attributes and ordering"""
+        playlist = build_master_playlist([
+            {"name": "360p", "width": 640, "height": 360, "codecs": "avc1.42e01e,mp4a.40.2",
+             "bandwidth": 900000, "averageBandwidth": 800000, "playlist": "360p/index.m3u8"},
+            {"name": "720p", "width": 1280, "height": 720, "codecs": "avc1.4d401f,mp4a.40.2",
+             "bandwidth": 3000000, "averageBandwidth": 2800000, "playlist": "720p/index.m3u8"}
+        ])
+
+        lines = playlist.splitlines()
+        self.assertEqual(lines[0], "#EXTM3U")
+        self.assertEqual(
+            lines[3],
+            '#EXT-X-STREAM-INF:BANDWIDTH=3000000,AVERAGE-BANDWIDTH=2800000,RESOLUTION=1280x720,CODECS="avc1.4d401f,mp4a.40.2"'
+        )
+        self.assertEqual(lines[4], "720p/index.m3u8")
+        self.assertEqual(lines[6], "360p/index.m3u8")
+
+    def test_packaging_is_incremental(self):
+        """Test that packaged renditions are never encoded again"""
+        transcoder = FakeTranscoder()
+        packager = HlsPackager(self.root, transcode=transcoder)
+
+        renditions = packager.package("video1", "source.mp4", 1280, 720, ladder=select_ladder(720)[1:3])
+        self.assertEqual(transcoder.calls, ["480p", "360p"])
+        self.assertEqual(renditions[0]["width"], 854)
+        self.assertEqual(renditions[0]["bandwidth"], 1400000)
+
+        packager.add_rendition("video1", "source.mp4", 1280, 720, "720p")
+        packager.package("video1", "source.mp4", 1280, 720, ladder=select_ladder(720)[:3])
+        self.assertEqual(transcoder.calls, ["480p", "360p", "720p"])
+
+        with open(os.path.join(self.root, "video1", "master.m3u8")) as f:
+            master = f.read()
+        self.assertEqual(master.count("#EXT-X-STREAM-INF"), 3)
+        self.assertTrue(os.path.exists(os.path.join(self.root, "video1", "720p", "seg_00001.ts")))
+
+    def test_failed_rendition_leaves_no_partial_output(self):
+        """Test that a crashed encode keeps what was packaged before it"""
+        packager = HlsPackager(self.root, transcode=FakeTranscoder(fail_on="360p"))
+
+        with self.assertRaises(RuntimeError):
+            packager.package("video1", "source.mp4", 1280, 720, ladder=select_ladder(480))
+
+        self.assertEqual([r["name"] for r in packager.renditions("video1")], ["480p"])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.root, "video1"))), ["480p", "master.m3u8", "renditions.json"])
+
+    def test_master_playlist_route(self):
+        """Test that the route serves storage URLs for each rendition"""
+        backend = LocalStorageBackend(self.temp_dir.name, base_url="https://media.example.com")
+        HlsPackager(backend.local_path("hls"), transcode=FakeTranscoder()).package(
+            "video1", "source.mp4", 1920, 1080, ladder=select_ladder(360)
+        )
+        set_storage_backend(backend)
+        try:
+            response = asyncio.run(get_master_playlist("video1"))
+        finally:
+            set_storage_backend(None)
+
+        self.assertEqual(response.media_type, "application/vnd.apple.mpegurl")
+        self.assertIn(b"https://media.example.com/hls/video1/360p/index.m3u8", response.body)
+
+    @unittest.skipIf(shutil.which("ffmpeg") is None, "ffmpeg is not installed")
+    def test_package_generated_clip(self):
+        """Test packaging a locally generated clip with ffmpeg"""
+        clip = os.path.join(self.temp_dir.name, "clip.mp4")
+        subprocess.run(
+            ["ffmpeg", "-v", "error", "-y",
+             "-f", "lavfi", "-i", "testsrc=size=640x360:rate=24",
+             "-f", "lavfi", "-i", "sine=frequency=440",
+             "-t", "8", "-c:v", "libx264", "-c:a", "aac", "-shortest", clip],
+            check=True
+        )
+        packager = HlsPackager(self.root)
+
+        renditions = packager.package("clip", clip, 640, 360)
+
+        self.assertEqual([r["name"] for r in renditions], ["360p", "240p"])
+        self.assertIn("360p/index.m3u8", packager.master_playlist("clip"))
+        with open(os.path.join(self.root, "clip", "240p", "index.m3u8")) as f:
+            self.assertIn("#EXT-X-ENDLIST", f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
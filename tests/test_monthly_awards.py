@@ -0,0 +1,157 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+import tempfile
+from datetime import date, datetime
+from unittest import mock
+from fastapi import HTTPException
+
+# Add the backend directory to the path so we can import its packages
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from analytics.event_log import open_worker_log
+from awards.film_of_the_month import (
+    NoMonthlyActivity,
+    award_month,
+    calculate_monthly_winners,
+    previous_month,
+    rank_videos,
+    run_monthly_awards
+)
+from database import queries
+from database.pool import SQLiteDatabase, set_database
+from database.rollups import AnalyticsRollups
+from database.store import CatalogStore
+from routes.awards import get_monthly_winners
+
+class MonthlyAwardsTestCase(unittest.TestCase):
+    """Test cases for the monthly winners batch job"""
+
+    def setUp(self):
+        """Set up rollups with activity in May 2024 and a little in June"""
+        self.original = queries.video_rollups
+        queries.video_rollups = AnalyticsRollups()
+        for day, video_id, ratings, stars, views in [
+            (date(2024, 5, 3), "video2", 40, 5, 900),
+            (date(2024, 5, 20), "video1", 30, 4, 400),
+            (date(2024, 5, 31), "video3", 2, 5, 50),
+            (date(2024, 6, 1), "video3", 500, 5, 9000),
+            (date(2024, 4, 30), "video1", 500, 5, 9000)
+        ]:
+            queries.record_video_activity(video_id, day=day, views=views, ratings=ratings, ratingPoints=ratings * stars * 2)
+        self.clock = lambda: datetime(2024, 6, 15)
+
+    def tearDown(self):
+        queries.video_rollups = self.original
+        queries.fake_monthly_awards_db.clear()
+
+    def test_month_counters_only(self):
+        """Test that videos are ranked on the month's own activity"""
+        videos = {video["id"]: video for video in queries.get_monthly_top_videos(2024, 5)}
+        self.assertEqual(videos["video1"]["views"], 400)
+        self.assertEqual(videos["video1"]["averageRating"], 4.0)
+        self.assertEqual(videos["video3"]["ratingCount"], 2)
+        self.assertEqual(queries.get_video("video1")["views"], 5000)
+
+        winners = calculate_monthly_winners(2024, 5)
+        self.assertEqual([winner["id"] for winner in winners], ["video2", "video1", "video3"])
+        self.assertEqual([winner["rank"] for winner in winners], [1, 2, 3])
+        self.assertEqual(winners[0]["filmmaker"]["name"], "Test Filmmaker")
+        self.assertNotIn("rank", queries.get_video("video2"))
+
+    def test_boards_per_category(self):
+        """Test that each category keeps its own bounded top list"""
+        videos = [
+            {"id": f"v{i}", "category": "short-film" if i % 2 else "commercial", "userId": "user123",
+             "title": "", "thumbnailUrl": "", "views": i, "averageRating": 4.0, "ratingCount": 10, "shares": 0}
+            for i in range(20)
+        ]
+        boards = rank_videos(iter(videos), limit=3)
+        self.assertEqual([winner["id"] for winner in boards["all"]], ["v19", "v18", "v17"])
+        self.assertEqual([winner["id"] for winner in boards["commercial"]], ["v18", "v16", "v14"])
+        self.assertEqual([winner["rank"] for winner in boards["short-film"]], [1, 2, 3])
+
+    def test_results_are_stored_once(self):
+        """Test that a month's winners are computed once and never change"""
+        stored = run_monthly_awards(2024, 5, clock=self.clock)
+        awards = json.loads(stored)
+        self.assertEqual((awards["year"], awards["month"]), (2024, 5))
+        self.assertEqual(awards["winners"][0]["id"], "video2")
+        self.assertIn("short-film", awards["categories"])
+
+        queries.record_video_activity("video3", day=date(2024, 5, 10), views=10 ** 6, ratings=900, ratingPoints=9000)
+        self.assertEqual(run_monthly_awards(2024, 5, clock=self.clock), stored)
+
+        with self.assertRaises(ValueError):
+            run_monthly_awards(2024, 6, clock=self.clock)
+        self.assertEqual(previous_month(date(2024, 1, 15)), (2023, 12))
+
+    def test_month_without_activity_is_not_stored(self):
+        """Test that a month with no recorded activity is refused rather than stored empty"""
+        with self.assertRaises(NoMonthlyActivity):
+            run_monthly_awards(2024, 3, clock=self.clock)
+        self.assertIsNone(queries.get_monthly_awards(2024, 3))
+
+        queries.video_rollups = AnalyticsRollups()
+        with self.assertRaises(NoMonthlyActivity):
+            run_monthly_awards(2024, 5, clock=self.clock)
+        self.assertIsNone(queries.get_monthly_awards(2024, 5))
+
+    def test_job_replays_logs_and_stores_in_database(self):
+        """Test that the cron job ranks the logged activity and writes the awards to the database"""
+        queries.video_rollups = AnalyticsRollups()
+        with tempfile.TemporaryDirectory() as directory:
+            root = os.path.join(directory, "eventlog")
+            log = open_worker_log(root, fsync=False)
+            for video_id, rating in [("video1", 4.0), ("video1", 5.0), ("video3", 3.0)]:
+                log.append({"type": "view", "videoId": video_id, "viewerId": "viewer1", "at": "2024-05-10T12:00:00Z"})
+                log.append({"type": "rating", "videoId": video_id, "rating": rating, "at": "2024-05-10T12:00:01Z"})
+            log.append({"type": "view", "videoId": "video3", "at": "2024-06-02T12:00:00Z"})
+            log.close()
+
+            database = SQLiteDatabase(os.path.join(directory, "test.db"))
+            set_database(database)
+            try:
+                with mock.patch("awards.film_of_the_month.EVENT_LOG_DIR", root):
+                    stored = asyncio.run(award_month(2024, 5))
+                saved = asyncio.run(self.read_saved_awards(os.path.join(directory, "test.db")))
+            finally:
+                set_database(None)
+
+        awards = json.loads(stored)
+        self.assertEqual([winner["id"] for winner in awards["winners"]], ["video1", "video3"])
+        self.assertEqual([winner["views"] for winner in awards["winners"]], [2, 1])
+        self.assertEqual(saved, stored)
+
+    @staticmethod
+    async def read_saved_awards(path):
+        database = SQLiteDatabase(path)
+        try:
+            return await CatalogStore(database).get_monthly_awards(2024, 5)
+        finally:
+            await database.close()
+
+    def test_route_is_a_lookup(self):
+        """Test that the endpoint serves stored winners and 404s for other months"""
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(get_monthly_winners(month=None))
+        self.assertEqual(context.exception.status_code, 404)
+
+        stored = run_monthly_awards(2024, 5, clock=self.clock)
+        run_monthly_awards(2024, 4, clock=self.clock)
+
+        response = asyncio.run(get_monthly_winners(month=5, year=2024))
+        self.assertEqual(response.body, stored.encode())
+        self.assertEqual(response.media_type, "application/json")
+        self.assertEqual(json.loads(asyncio.run(get_monthly_winners(month=None)).body)["month"], 5)
+        self.assertEqual(json.loads(asyncio.run(get_monthly_winners(month=4, year=2024)).body)["winners"][0]["id"], "video1")
+
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(get_monthly_winners(month=3, year=2024))
+        self.assertEqual(context.exception.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+from fastapi import FastAPI
+
+# Add the backend directory to the path so we can import its packages
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from cache.responses import RESPONSE_CACHE_RULES, ResponseCache, ResponseCacheMiddleware, cache_key, set_response_cache
+from database import queries
+from routes import awards, users, videos
+from routes.videos import rate_video
+
+def call(app, path, query=b"", method="GET"):
+    """Send one request through an ASGI app, returning (status, headers, body)"""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "method": method, "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query, "headers": [], "scheme": "http", "server": ("testserver", 80),
+        "client": ("203.0.113.7", 1234), "http_version": "1.1", "asgi": {"version": "3.0"}
+    }
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return start["status"], dict(start["headers"]), body
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    """Test cases for the encoded response cache"""
+
+    def setUp(self):
+        """Set up a cache with a clock the test controls"""
+        self.now = 0.0
+        self.cache = ResponseCache(ttl=30, max_entries=3, clock=lambda: self.now)
+
+    def test_ttl_and_lru(self):
+        """Test that entries expire and the least recently used is evicted"""
+        for key in ("a", "b", "c"):
+            self.cache.put(key, key.encode())
+        self.cache.get("a")
+        self.cache.put("d", b"d")
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), b"a")
+
+        self.now = 30
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(len(self.cache), 2)
+
+    def test_tags(self):
+        """Test that invalidating a tag drops exactly the responses carrying it"""
+        self.cache.put("list", b"[]", ["videos", "video:1", "video:2"])
+        self.cache.put("detail", b"{}", ["video:2"])
+        self.cache.put("other", b"{}", ["video:3"])
+
+        self.assertEqual(self.cache.invalidate("video:2"), 2)
+        self.assertIsNone(self.cache.get("list"))
+        self.assertIsNotNone(self.cache.get("other"))
+        self.assertEqual(self.cache.invalidate("video:1", "missing"), 0)
+
+    def test_stale_renders_are_not_stored(self):
+        """Test that a response rendered across an invalidation is refused"""
+        generation = self.cache.generation
+        self.cache.invalidate("video:1")
+        self.assertFalse(self.cache.put("list", b"[]", generation=generation))
+        self.assertTrue(self.cache.put("list", b"[]", generation=self.cache.generation))
+
+    def test_keys_are_normalized(self):
+        """Test that parameter order, encoding and trailing slashes share a key"""
+        self.assertEqual(cache_key("/api/videos/", b"limit=5&category=short-film"), cache_key("/api/videos", b"category=short%2Dfilm&limit=5"))
+        self.assertNotEqual(cache_key("/api/videos", b"limit=5"), cache_key("/api/videos", b"limit=6"))
+
+
+class ResponseCacheMiddlewareTestCase(unittest.TestCase):
+    """Test cases for serving routes from the response cache"""
+
+    def setUp(self):
+        """Set up the video, user and award routes behind the cache"""
+        self.cache = ResponseCache()
+        set_response_cache(self.cache)
+        api = FastAPI()
+        api.include_router(videos.router, prefix="/api/videos")
+        api.include_router(users.router, prefix="/api/users")
+        api.include_router(awards.router, prefix="/api/awards")
+        self.app = ResponseCacheMiddleware(api, RESPONSE_CACHE_RULES)
+
+    def tearDown(self):
+        set_response_cache(None)
+
+    def test_hits_serve_the_same_bytes(self):
+        """Test that a repeated request is answered from the cache with its headers"""
+        status, headers, body = call(self.app, "/api/videos/", b"limit=1&category=all")
+        self.assertEqual((status, headers[b"x-cache"]), (200, b"MISS"))
+        self.assertIn(b"x-next-cursor", headers)
+
+        status, headers, cached = call(self.app, "/api/videos/", b"category=all&limit=1")
+        self.assertEqual((status, headers[b"x-cache"]), (200, b"HIT"))
+        self.assertEqual(cached, body)
+        self.assertIn(b"x-next-cursor", headers)
+        self.assertEqual(json.loads(cached)[0]["id"], "video1")
+
+    def test_rating_invalidates_the_video(self):
+        """Test that rating a video drops every cached response showing it"""
+        call(self.app, "/api/videos/video2")
+        call(self.app, "/api/videos/featured")
+        call(self.app, "/api/awards/leaderboard", b"timeframe=all")
+        call(self.app, "/api/users/profile/user123")
+
+        video = queries.get_video("video2")
+        original = (video["averageRating"], video["ratingCount"])
+        try:
+            asyncio.run(rate_video("video2", 5.0))
+            for path, query in [("/api/videos/video2", b""), ("/api/videos/featured", b""), ("/api/awards/leaderboard", b"timeframe=all")]:
+                status, headers, body = call(self.app, path, query)
+                self.assertEqual(headers[b"x-cache"], b"MISS", path)
+            entry = next(entry for entry in json.loads(body) if entry["id"] == "video2")
+            self.assertEqual(entry["averageRating"], queries.get_video("video2")["averageRating"])
+            self.assertEqual(call(self.app, "/api/users/profile/user123")[1][b"x-cache"], b"HIT")
+        finally:
+            queries.update_video("video2", averageRating=original[0], ratingCount=original[1])
+
+    def test_views_do_not_invalidate(self):
+        """Test that view counts alone leave cached responses until they expire"""
+        call(self.app, "/api/videos/video1")
+        views = queries.get_video("video1")["views"]
+        try:
+            queries.add_views("video1")
+            self.assertEqual(call(self.app, "/api/videos/video1")[1][b"x-cache"], b"HIT")
+        finally:
+            queries.update_video("video1", views=views)
+
+    def test_profile_changes_invalidate_the_user(self):
+        """Test that a profile update drops the profile and the user's videos"""
+        call(self.app, "/api/users/profile/student1")
+        call(self.app, "/api/videos/video3")
+        try:
+            queries.update_user("student1", bio="Graduated")
+            self.assertEqual(json.loads(call(self.app, "/api/users/profile/student1")[2])["bio"], "Graduated")
+            self.assertEqual(call(self.app, "/api/videos/video3")[1][b"x-cache"], b"MISS")
+        finally:
+            queries.update_user("student1", bio="Film student at NYU")
+
+    def test_uncached_responses(self):
+        """Test that errors, versioned responses and other routes pass through"""
+        self.assertEqual(call(self.app, "/api/videos/missing")[0], 404)
+        self.assertEqual(call(self.app, "/api/videos/missing")[1].get(b"x-cache"), b"MISS")
+        self.assertEqual(len(self.cache), 0)
+
+        call(self.app, "/api/awards/hall-of-fame")
+        call(self.app, "/api/videos/uploads/some-session")
+        self.assertEqual(len(self.cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
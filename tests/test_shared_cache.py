@@ -0,0 +1,272 @@
+import unittest
+import asyncio
+import socket
+import sys
+import os
+from unittest.mock import patch
+
+# Add the backend directory to the path so we can import its packages
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from redis.exceptions import RedisError
+
+from cache.responses import ResponseCache
+from cache.shared import TieredCache, connect_shared, set_shared_cache
+from database import queries
+from routes.awards import get_leaderboard
+from routes.users import get_user_by_id
+from routes.videos import get_video
+from redis_server import LocalRedisServer
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TieredCacheTestCase(unittest.TestCase):
+    """Test cases for the two-tier cache"""
+
+    def test_local_tier(self):
+        """Test that hits skip the loader and hand out independent copies"""
+        cache = TieredCache()
+
+        async def scenario():
+            first = await cache.get_or_load("video:1", lambda: {"id": "1", "tags": ["a"]}, ["video:1"])
+            first["tags"].append("b")
+            second = await cache.get_or_load("video:1", lambda: {"id": "changed"}, ["video:1"])
+            missing = await cache.get_or_load("video:2", lambda: None)
+            return second, missing
+
+        second, missing = asyncio.run(scenario())
+        self.assertEqual(second, {"id": "1", "tags": ["a"]})
+        self.assertIsNone(missing)
+        self.assertEqual(cache.loads, 2)
+
+        cache.invalidate("video:1")
+        self.assertEqual(asyncio.run(cache.get_or_load("video:1", lambda: {"id": "changed"})), {"id": "changed"})
+
+    def test_concurrent_misses_share_one_load(self):
+        """Test that concurrent misses for a key call the loader once"""
+        cache = TieredCache()
+
+        async def load():
+            await asyncio.sleep(0.01)
+            return [1, 2, 3]
+
+        async def scenario():
+            return await asyncio.gather(*(cache.get_or_load("videos:featured", load) for _ in range(100)))
+
+        results = asyncio.run(scenario())
+        self.assertEqual(cache.loads, 1)
+        self.assertTrue(all(result == [1, 2, 3] for result in results))
+
+    def test_workers_share_the_server(self):
+        """Test that workers reuse each other's loads and see invalidations"""
+        server = LocalRedisServer()
+
+        async def scenario():
+            url = await server.start()
+            workers = [TieredCache(connect_shared(url)) for _ in range(3)]
+
+            async def load():
+                await asyncio.sleep(0.05)
+                return {"id": "1", "title": "Loaded"}
+
+            results = await asyncio.gather(*(
+                worker.get_or_load("video:1", load, lambda video: [f"video:{video['id']}"])
+                for worker in workers for _ in range(20)
+            ))
+            loads = sum(worker.loads for worker in workers)
+
+            workers[0].invalidate("video:1")
+            await workers[0].flush_invalidations()
+            workers[1].local.clear()
+            reloaded = await workers[1].get_or_load("video:1", lambda: {"id": "1", "title": "Renamed"})
+
+            for worker in workers:
+                await worker.shared.connection_pool.disconnect()
+            await server.close()
+            return results, loads, reloaded
+
+        results, loads, reloaded = asyncio.run(scenario())
+        self.assertEqual(loads, 1)
+        self.assertEqual(len(results), 60)
+        self.assertTrue(all(result["title"] == "Loaded" for result in results))
+        self.assertEqual(reloaded["title"], "Renamed")
+
+    def test_invalidations_reach_other_workers(self):
+        """Test that an invalidation in one worker drops the tag from other workers' local caches"""
+        server = LocalRedisServer()
+
+        async def scenario():
+            url = await server.start()
+            workers = [TieredCache(connect_shared(url)) for _ in range(2)]
+            responses = ResponseCache()
+            workers[1].listen(responses)
+            await asyncio.sleep(0.05)
+
+            for worker in workers:
+                await worker.get_or_load("user:1", lambda: {"id": "1", "name": "Old"}, ["user:1"])
+            responses.put("/api/users/profile/1", "cached response", ["user:1"])
+
+            workers[0].invalidate("user:1")
+            await workers[0].flush_invalidations()
+            await asyncio.sleep(0.05)
+            dropped = (workers[1].local.get("user:1") is None, responses.get("/api/users/profile/1") is None)
+
+            await workers[1].stop_listening()
+            for worker in workers:
+                await worker.shared.connection_pool.disconnect()
+            await server.close()
+            return dropped
+
+        self.assertEqual(asyncio.run(scenario()), (True, True))
+
+    def test_expired_lock_is_not_released(self):
+        """Test that a load outlasting its lock leaves the lock another worker took since"""
+        server = LocalRedisServer()
+
+        async def scenario():
+            cache = TieredCache(connect_shared(await server.start()))
+
+            async def load():
+                await asyncio.sleep(0.1)
+                await cache.shared.set("lock:video:1", "other")
+                return {"id": "1"}
+
+            with patch("cache.shared.LOAD_LOCK_SECONDS", 0.05):
+                await cache.get_or_load("video:1", load)
+            lock = await cache.shared.get("lock:video:1")
+            await cache.shared.connection_pool.disconnect()
+            await server.close()
+            return lock
+
+        self.assertEqual(asyncio.run(scenario()), b"other")
+
+    def test_failed_handshakes_close_the_connection(self):
+        """Test that a connection refused at AUTH is closed rather than leaked"""
+        server = LocalRedisServer(password="secret")
+
+        async def scenario():
+            client = connect_shared(f"redis://:wrong@{(await server.start())[len('redis://'):]}")
+            for _ in range(3):
+                with self.assertRaises(RedisError):
+                    await client.ping()
+            await asyncio.sleep(0.05)
+            open_connections = len(server._connections)
+            await server.close()
+            return open_connections
+
+        self.assertEqual(asyncio.run(scenario()), 0)
+
+    def test_unreachable_server(self):
+        """Test that a down shared tier falls back to the local tier"""
+        cache = TieredCache(connect_shared(f"redis://127.0.0.1:{closed_port()}/0"))
+
+        async def scenario():
+            first = await cache.get_or_load("user:1", lambda: {"id": "1"})
+            second = await cache.get_or_load("user:1", lambda: {"id": "2"})
+            return first, second
+
+        self.assertEqual(asyncio.run(scenario()), ({"id": "1"}, {"id": "1"}))
+        self.assertEqual(cache.loads, 1)
+
+
+class StampedeTestCase(unittest.TestCase):
+    """Test cases for soft and hard TTLs and background refreshes"""
+
+    def setUp(self):
+        """Set up a cache with a clock the test controls and a slow loader"""
+        self.now = 1000.0
+        self.cache = TieredCache(ttl=10, stale_ttl=20, beta=1.0, clock=lambda: self.now)
+        self.version = 0
+
+    async def load(self):
+        self.version += 1
+        await asyncio.sleep(0.01)
+        return {"version": self.version}
+
+    async def readers(self, count=1000):
+        return await asyncio.gather(*(self.cache.get_or_load("videos:featured", self.load) for _ in range(count)))
+
+    def test_stale_values_are_served_while_one_refresh_runs(self):
+        """Test that 1,000 readers of a stale key get it at once and cause one load"""
+        async def scenario():
+            await self.readers(1)
+            self.now += 15
+            stale = await self.readers()
+            await asyncio.sleep(0.05)
+            return stale, await self.readers()
+
+        stale, fresh = asyncio.run(scenario())
+        self.assertEqual(self.cache.loads, 2)
+        self.assertTrue(all(result == {"version": 1} for result in stale))
+        self.assertTrue(all(result == {"version": 2} for result in fresh))
+
+    def test_hard_expiry_loads_once(self):
+        """Test that 1,000 readers of an expired key wait for one load"""
+        async def scenario():
+            await self.readers(1)
+            self.now += 30
+            return await self.readers()
+
+        results = asyncio.run(scenario())
+        self.assertEqual(self.cache.loads, 2)
+        self.assertTrue(all(result == {"version": 2} for result in results))
+
+    def test_early_refresh(self):
+        """Test that slow loads are refreshed at random before going stale"""
+        async def slow_load():
+            self.now += 1
+            return await self.load()
+
+        asyncio.run(self.cache.get_or_load("videos:featured", slow_load))
+        self.now += 8
+        with patch("cache.shared.random.random", return_value=0.0):
+            asyncio.run(self.readers(10))
+        self.assertEqual(self.cache.loads, 1)
+        with patch("cache.shared.random.random", return_value=0.9):
+            asyncio.run(self.readers(10))
+        self.assertEqual(self.cache.loads, 2)
+
+    def test_invalidated_values_are_not_served_stale(self):
+        """Test that an invalidation drops the value instead of leaving it stale"""
+        asyncio.run(self.cache.get_or_load("videos:featured", self.load, ["videos"]))
+        self.cache.invalidate("videos")
+        self.assertEqual(asyncio.run(self.cache.get_or_load("videos:featured", self.load, ["videos"])), {"version": 2})
+
+
+class CachedRoutesTestCase(unittest.TestCase):
+    """Test cases for the video, profile and award routes reading through the cache"""
+
+    def setUp(self):
+        """Set up an empty cache"""
+        self.cache = TieredCache()
+        set_shared_cache(self.cache)
+
+    def tearDown(self):
+        set_shared_cache(None)
+
+    def test_routes_load_once(self):
+        """Test that repeated reads load each record once"""
+        for _ in range(3):
+            asyncio.run(get_video("video1"))
+            asyncio.run(get_user_by_id("user123"))
+            asyncio.run(get_leaderboard(category="all", timeframe="all", limit=5))
+        self.assertEqual(self.cache.loads, 3)
+
+    def test_writes_invalidate(self):
+        """Test that a profile update reloads the profile and the user's videos"""
+        asyncio.run(get_user_by_id("student1"))
+        self.assertEqual(asyncio.run(get_video("video3"))["filmmaker"]["name"], "Film Student")
+        try:
+            queries.update_user("student1", name="Graduate")
+            self.assertEqual(asyncio.run(get_user_by_id("student1"))["name"], "Graduate")
+            self.assertEqual(asyncio.run(get_video("video3"))["filmmaker"]["name"], "Graduate")
+        finally:
+            queries.update_user("student1", name="Film Student")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,564 @@
+import unittest
+import asyncio
+import hashlib
+import os
+import resource
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest import mock
+from urllib.parse import urljoin
+
+# Add the backend directory to the path so we can import its packages
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from fastapi import FastAPI, HTTPException
+from starlette.datastructures import UploadFile
+
+from database import queries
+from media.processing import MediaJobQueue, set_media_jobs
+from storage.backends import LocalStorageBackend, ObjectStoreBackend, MIN_PART_SIZE, set_storage_backend
+from storage.ingest import ingest_stream, UploadTooLargeError
+from storage.resumable import ChunkFileReader, ResumableUploadStore, UploadSessionNotFound, set_upload_store
+from storage.serving import ZERO_COPY_EXTENSION, parse_range, RangeNotSatisfiable
+from media.hls import HlsPackager, select_ladder
+from routes import streaming
+from routes.videos import (
+    upload_video,
+    create_upload_session,
+    upload_chunk,
+    get_upload_session,
+    complete_upload_session,
+    UploadSessionCreate,
+    router as videos_router
+)
+
+class SyntheticUpload:
+    """Async readable that produces a large upload without holding it in memory"""
+
+    def __init__(self, size, block=b"vidora" * 10923):
+        self.remaining = size
+        self.block = block
+
+    async def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        chunk = (self.block * (size // len(self.block) + 1))[:size]
+        self.remaining -= size
+        return chunk
+
+
+class BytesIOReader:
+    """Async reader over an in-memory buffer"""
+
+    def __init__(self, content):
+        self.buffer = BytesIO(content)
+
+    async def read(self, size=-1):
+        return self.buffer.read(size)
+
+
+class CountingObjectStore:
+    """Stand-in S3 client that only counts the bytes it receives"""
+
+    def __init__(self):
+        self.part_sizes = []
+        self.completed = None
+        self.aborted = False
+
+    def create_multipart_upload(self, Bucket, Key):
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, Bucket, Key, PartNumber, UploadId, Body):
+        self.part_sizes.append(len(Body))
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.completed = MultipartUpload["Parts"]
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted = True
+
+
+async def body_pieces(data, piece_size=1000):
+    """Yield a chunk body in pieces, like Request.stream()"""
+    for start in range(0, len(data), piece_size):
+        yield data[start:start + piece_size]
+
+
+class FakeRequest:
+    """Just enough of a Request for the chunk upload route"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def stream(self):
+        return body_pieces(self.data)
+
+
+async def run_with_jobs(coroutine):
+    """Run a route that queues processing jobs and wait for them to finish"""
+    queue = MediaJobQueue(workers=1, executor=ThreadPoolExecutor(1))
+    set_media_jobs(queue)
+    try:
+        result = await coroutine
+        await queue.join()
+        return result
+    finally:
+        await queue.shutdown()
+        set_media_jobs(None)
+
+
+async def asgi_request(app, path, headers=None, method="GET", extensions=None):
+    """Send one request straight to an ASGI app and collect the response"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 1234),
+        "extensions": extensions or {}
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == ZERO_COPY_EXTENSION:
+            message = dict(message, body=os.pread(message["file"].fileno(), message["count"], message["offset"]))
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    response_headers = {k.decode(): v.decode() for k, v in start["headers"]}
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return start["status"], response_headers, body, messages
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class IngestTestCase(unittest.TestCase):
+    """Test cases for streaming upload ingest"""
+
+    def setUp(self):
+        """Set up a temporary local storage directory"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.backend = LocalStorageBackend(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_local_ingest_hashes_and_stores(self):
+        """Test that a streamed upload lands on disk with the right checksum"""
+        content = os.urandom(300_000)
+
+        result = asyncio.run(ingest_stream(BytesIOReader(content), self.backend, "videos/v1.mp4", chunk_size=4096))
+
+        self.assertEqual(result["size"], len(content))
+        self.assertEqual(result["sha256"], hashlib.sha256(content).hexdigest())
+        self.assertEqual(result["url"], "/videos/v1.mp4")
+        with open(os.path.join(self.temp_dir.name, "videos", "v1.mp4"), "rb") as stored:
+            self.assertEqual(stored.read(), content)
+
+    def test_oversized_upload_leaves_nothing_behind(self):
+        """Test that an upload over the limit is rejected and cleaned up"""
+        with self.assertRaises(UploadTooLargeError):
+            asyncio.run(ingest_stream(SyntheticUpload(10_000), self.backend, "videos/big.mp4",
+                                      chunk_size=1024, max_size=5_000))
+
+        self.assertEqual(os.listdir(os.path.join(self.temp_dir.name, "videos")), [])
+
+    def test_invalid_key_rejected(self):
+        """Test that keys cannot escape the storage directory"""
+        with self.assertRaises(ValueError):
+            self.backend.path_for("../outside.mp4")
+
+    def test_object_store_uploads_fixed_size_parts(self):
+        """Test that the object store writer sends full parts plus a final short one"""
+        client = CountingObjectStore()
+        backend = ObjectStoreBackend(client, bucket="media", base_url="https://cdn.example.com")
+        size = backend.part_size * 2 + 12345
+
+        result = asyncio.run(ingest_stream(SyntheticUpload(size), backend, "videos/v2.mp4", max_size=None))
+
+        self.assertEqual(client.part_sizes, [backend.part_size, backend.part_size, 12345])
+        self.assertEqual([part["PartNumber"] for part in client.completed], [1, 2, 3])
+        self.assertEqual(result["url"], "https://cdn.example.com/videos/v2.mp4")
+
+    def test_object_store_rejects_small_parts(self):
+        """Test that parts below the object store minimum are refused"""
+        with self.assertRaises(ValueError):
+            ObjectStoreBackend(CountingObjectStore(), part_size=MIN_PART_SIZE - 1)
+
+    def test_two_gigabyte_upload_keeps_memory_flat(self):
+        """Test that peak RSS does not grow with a 2 GB upload"""
+        client = CountingObjectStore()
+        backend = ObjectStoreBackend(client, bucket="media")
+        size = 2 * 1024 ** 3
+        before = peak_rss_mb()
+
+        result = asyncio.run(ingest_stream(SyntheticUpload(size), backend, "videos/huge.mp4", max_size=None))
+
+        self.assertEqual(result["size"], size)
+        self.assertEqual(sum(client.part_sizes), size)
+        # Bounded by one part plus one chunk, nowhere near the upload size
+        self.assertLess(peak_rss_mb() - before, 64)
+
+
+class UploadRouteTestCase(unittest.TestCase):
+    """Test cases for the upload route"""
+
+    def setUp(self):
+        """Point the default backend at a temporary directory"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        set_storage_backend(LocalStorageBackend(self.temp_dir.name))
+
+    def tearDown(self):
+        set_storage_backend(None)
+        self.temp_dir.cleanup()
+
+    def test_upload_video_stores_file_and_creates_record(self):
+        """Test that an upload is stored and added to the catalog"""
+        content = b"mock video content" * 1000
+        video = asyncio.run(run_with_jobs(upload_video(
+            title="Streamed",
+            description="Uploaded in chunks",
+            category="short-film",
+            isPublic=True,
+            tags="test",
+            videoFile=UploadFile(filename="film.mov", file=BytesIO(content)),
+            thumbnailFile=None
+        )))
+
+        self.assertEqual(video["videoUrl"], f"/videos/{video['id']}.mov")
+        self.assertEqual(video["checksum"], hashlib.sha256(content).hexdigest())
+        self.assertEqual(queries.get_video(video["id"])["fileSize"], len(content))
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir.name, "videos", f"{video['id']}.mov")))
+        queries.delete_video_from_db(video["id"])
+
+
+class ResumableUploadTestCase(unittest.TestCase):
+    """Test cases for resumable chunked uploads"""
+
+    def setUp(self):
+        """Set up temporary session and storage directories"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.session_dir = os.path.join(self.temp_dir.name, "sessions")
+        self.store = ResumableUploadStore(self.session_dir, min_chunk_size=1024, max_size=None)
+        self.backend = LocalStorageBackend(os.path.join(self.temp_dir.name, "media"))
+        self.content = os.urandom(10 * 1024 + 100)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, session_id, index, store=None):
+        start = index * 1024
+        return (store or self.store).write_chunk(session_id, index, body_pieces(self.content[start:start + 1024]))
+
+    def test_status_reports_missing_ranges(self):
+        """Test that missing chunks are merged into byte ranges"""
+        session = self.store.create_session(len(self.content), {}, chunk_size=1024)
+        self.assertEqual(session["chunkCount"], 11)
+
+        for index in (0, 3, 4, 10):
+            asyncio.run(self.write(session["id"], index))
+
+        status = self.store.status(session["id"])
+        self.assertEqual(status["missingChunks"], [1, 2, 5, 6, 7, 8, 9])
+        self.assertEqual(status["missingRanges"], [[1024, 3072], [5120, 10240]])
+        self.assertFalse(status["complete"])
+
+    def test_parallel_chunks_survive_restart_and_assemble(self):
+        """Test chunks sent concurrently, picked up by a new store, then finalized"""
+        session = self.store.create_session(
+            len(self.content), {}, chunk_size=1024, sha256=hashlib.sha256(self.content).hexdigest()
+        )
+
+        async def send_all():
+            await asyncio.gather(*(self.write(session["id"], i) for i in reversed(range(11))))
+        asyncio.run(send_all())
+
+        # A fresh store over the same directory sees the same progress
+        restarted = ResumableUploadStore(self.session_dir, min_chunk_size=1024, max_size=None)
+        self.assertTrue(restarted.status(session["id"])["complete"])
+
+        stored = asyncio.run(restarted.finalize(session["id"], self.backend, "videos/v1.mp4"))
+        self.assertEqual(stored["size"], len(self.content))
+        with open(self.backend.path_for("videos/v1.mp4"), "rb") as f:
+            self.assertEqual(f.read(), self.content)
+        with self.assertRaises(UploadSessionNotFound):
+            restarted.status(session["id"])
+
+    def test_wrong_chunk_size_rejected(self):
+        """Test that a chunk of the wrong length is not stored"""
+        session = self.store.create_session(len(self.content), {}, chunk_size=1024)
+
+        with self.assertRaises(ValueError):
+            asyncio.run(self.store.write_chunk(session["id"], 0, body_pieces(b"short")))
+        with self.assertRaises(ValueError):
+            asyncio.run(self.write(session["id"], 11))
+
+        self.assertEqual(self.store.received_chunks(session["id"]), set())
+
+    def test_incomplete_or_corrupt_upload_not_finalized(self):
+        """Test that finalize needs every chunk and a matching checksum"""
+        session = self.store.create_session(len(self.content), {}, chunk_size=1024, sha256="0" * 64)
+        asyncio.run(self.write(session["id"], 0))
+
+        with self.assertRaises(ValueError):
+            asyncio.run(self.store.finalize(session["id"], self.backend, "videos/v2.mp4"))
+
+        for index in range(1, 11):
+            asyncio.run(self.write(session["id"], index))
+        with self.assertRaises(ValueError):
+            asyncio.run(self.store.finalize(session["id"], self.backend, "videos/v2.mp4"))
+        self.assertFalse(os.path.exists(self.backend.path_for("videos/v2.mp4")))
+
+    def test_unknown_session_id_rejected(self):
+        """Test that malformed or unknown session IDs are not found"""
+        with self.assertRaises(UploadSessionNotFound):
+            self.store.status("../../etc")
+        with self.assertRaises(UploadSessionNotFound):
+            self.store.status("0" * 32)
+
+    def test_routes_create_catalog_record(self):
+        """Test the resumable upload routes end to end"""
+        set_upload_store(self.store)
+        set_storage_backend(self.backend)
+        try:
+            session = asyncio.run(create_upload_session(UploadSessionCreate(
+                title="Resumed",
+                description="Sent in chunks",
+                category="documentary",
+                filename="resumed.webm",
+                totalSize=len(self.content),
+                chunkSize=1024
+            )))
+            for index in range(11):
+                start = index * 1024
+                asyncio.run(upload_chunk(session["id"], index, FakeRequest(self.content[start:start + 1024])))
+            self.assertTrue(asyncio.run(get_upload_session(session["id"]))["complete"])
+
+            video = asyncio.run(run_with_jobs(complete_upload_session(session["id"])))
+        finally:
+            set_upload_store(None)
+            set_storage_backend(None)
+
+        self.assertEqual(video["title"], "Resumed")
+        self.assertEqual(video["videoUrl"], f"/videos/{video['id']}.webm")
+        self.assertEqual(queries.get_video(video["id"])["checksum"], hashlib.sha256(self.content).hexdigest())
+        queries.delete_video_from_db(video["id"])
+
+    def test_session_cancelled_while_completing_is_not_found(self):
+        """Test that completing a session that disappears during finalize answers 404"""
+        session = self.store.create_session(len(self.content), {"filename": "gone.mp4"}, chunk_size=1024)
+        finalize = self.store.finalize
+
+        async def cancelled_finalize(session_id, *args):
+            self.store.delete_session(session_id)
+            return await finalize(session_id, *args)
+
+        self.store.finalize = cancelled_finalize
+        set_upload_store(self.store)
+        set_storage_backend(self.backend)
+        try:
+            with self.assertRaises(HTTPException) as raised:
+                asyncio.run(complete_upload_session(session["id"]))
+        finally:
+            set_upload_store(None)
+            set_storage_backend(None)
+        self.assertEqual(raised.exception.status_code, 404)
+
+    def test_session_cancelled_while_assembling_is_not_found(self):
+        """Test that cancelling a session mid-assembly is not found rather than a crash"""
+        session = self.store.create_session(len(self.content), {}, chunk_size=1024)
+        for index in range(11):
+            asyncio.run(self.write(session["id"], index))
+        store = self.store
+
+        class CancellingReader(ChunkFileReader):
+            async def read(self, size=1024):
+                if len(self.paths) == 5:
+                    store.delete_session(session["id"])
+                return await super().read(size)
+
+        with mock.patch("storage.resumable.ChunkFileReader", CancellingReader):
+            with self.assertRaises(UploadSessionNotFound):
+                asyncio.run(self.store.finalize(session["id"], self.backend, "videos/v3.mp4"))
+        self.assertFalse(os.path.exists(self.backend.path_for("videos/v3.mp4")))
+
+
+class RangeServingTestCase(unittest.TestCase):
+    """Test cases for serving video files with Range requests"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        set_storage_backend(LocalStorageBackend(self.temp_dir.name))
+        os.makedirs(os.path.join(self.temp_dir.name, "videos"))
+        self.content = bytes(range(256)) * 4096
+        self.path = os.path.join(self.temp_dir.name, "videos", "video1.mp4")
+        with open(self.path, "wb") as f:
+            f.write(self.content)
+
+        self.app = FastAPI()
+        self.app.include_router(streaming.router, prefix="/videos")
+
+    def tearDown(self):
+        set_storage_backend(None)
+        self.temp_dir.cleanup()
+
+    def request(self, headers=None, path="/videos/video1.mp4", **kwargs):
+        return asyncio.run(asgi_request(self.app, path, headers, **kwargs))
+
+    def test_parse_range(self):
+        """Test open-ended, suffix, clamped and ignored ranges"""
+        self.assertEqual(parse_range("bytes=0-99", 1000), (0, 99))
+        self.assertEqual(parse_range("bytes=900-", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=-100", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=500-5000", 1000), (500, 999))
+        self.assertIsNone(parse_range("bytes=0-1,5-9", 1000))
+        self.assertIsNone(parse_range("items=0-1", 1000))
+        self.assertIsNone(parse_range("bytes=abc", 1000))
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range("bytes=1000-", 1000)
+
+    def test_full_file(self):
+        """Test that a request without Range gets the whole file"""
+        status, headers, body, _ = self.request()
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(headers["accept-ranges"], "bytes")
+        self.assertEqual(headers["content-type"], "video/mp4")
+        self.assertEqual(int(headers["content-length"]), len(self.content))
+
+    def test_partial_content(self):
+        """Test that a Range request gets exactly that slice"""
+        status, headers, body, _ = self.request({"Range": "bytes=1000-400999"})
+
+        self.assertEqual(status, 206)
+        self.assertEqual(body, self.content[1000:401000])
+        self.assertEqual(headers["content-range"], f"bytes 1000-400999/{len(self.content)}")
+        self.assertEqual(headers["content-length"], "400000")
+
+    def test_unsatisfiable_range(self):
+        """Test that a range past the end is a 416"""
+        status, headers, _, _ = self.request({"Range": f"bytes={len(self.content)}-"})
+
+        self.assertEqual(status, 416)
+        self.assertEqual(headers["content-range"], f"bytes */{len(self.content)}")
+
+    def test_if_range_and_if_none_match(self):
+        """Test that a stale If-Range gets the full file and a matching ETag a 304"""
+        etag = self.request(method="HEAD")[1]["etag"]
+
+        status, _, body, _ = self.request({"Range": "bytes=0-9", "If-Range": etag})
+        self.assertEqual((status, body), (206, self.content[:10]))
+
+        status, _, body, _ = self.request({"Range": "bytes=0-9", "If-Range": "\"stale\""})
+        self.assertEqual((status, len(body)), (200, len(self.content)))
+
+        status, _, body, _ = self.request({"If-None-Match": etag})
+        self.assertEqual((status, body), (304, b""))
+
+    def test_head_sends_no_body(self):
+        """Test that HEAD gets the headers only"""
+        status, headers, body, _ = self.request(method="HEAD")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b"")
+        self.assertEqual(int(headers["content-length"]), len(self.content))
+
+    def test_zero_copy_send(self):
+        """Test that servers with the zero-copy extension get the file handed over"""
+        status, _, body, messages = self.request(
+            {"Range": "bytes=-4096"}, extensions={ZERO_COPY_EXTENSION: {}}
+        )
+
+        self.assertEqual(status, 206)
+        self.assertEqual(body, self.content[-4096:])
+        self.assertEqual(messages[1]["type"], ZERO_COPY_EXTENSION)
+        self.assertEqual((messages[1]["offset"], messages[1]["count"]), (len(self.content) - 4096, 4096))
+
+    def test_unknown_video(self):
+        """Test that files not in the catalog are not served"""
+        self.assertEqual(self.request(path="/videos/missing.mp4")[0], 404)
+        self.assertEqual(self.request(path="/videos/video1.mov")[0], 404)
+
+
+
+def write_rendition(source, rendition, output_dir):
+    """Stand in for ffmpeg with a two-segment media playlist"""
+    lines = ["#EXTM3U", "#EXT-X-TARGETDURATION:6"]
+    for i in range(2):
+        with open(os.path.join(output_dir, f"seg_{i:05d}.ts"), "wb") as f:
+            f.write(bytes([i]) * 188 * 100)
+        lines += ["#EXTINF:6.0,", f"seg_{i:05d}.ts"]
+    with open(os.path.join(output_dir, "index.m3u8"), "w") as f:
+        f.write("\n".join(lines + ["#EXT-X-ENDLIST"]) + "\n")
+
+
+class HlsServingTestCase(unittest.TestCase):
+    """Test cases for serving HLS playlists and segments"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.backend = LocalStorageBackend(self.temp_dir.name, base_url="")
+        HlsPackager(self.backend.local_path("hls"), transcode=write_rendition).package(
+            "video1", "source.mp4", 1280, 720, ladder=select_ladder(360)
+        )
+        set_storage_backend(self.backend)
+
+        self.app = FastAPI()
+        self.app.include_router(videos_router, prefix="/api/videos")
+        self.app.include_router(streaming.hls_router, prefix="/hls")
+
+    def tearDown(self):
+        set_storage_backend(None)
+        self.temp_dir.cleanup()
+
+    def request(self, path, **kwargs):
+        return asyncio.run(asgi_request(self.app, path, **kwargs))
+
+    def test_master_playlist_leads_to_segments(self):
+        """Test following the master playlist into a variant playlist and a segment"""
+        status, headers, master, _ = self.request("/api/videos/video1/master.m3u8")
+        self.assertEqual(status, 200)
+        variant_uri = urljoin("/api/videos/video1/master.m3u8", master.decode().splitlines()[-1])
+        self.assertEqual(variant_uri, "/hls/video1/240p/index.m3u8")
+
+        status, headers, variant, _ = self.request(variant_uri)
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["content-type"], "application/vnd.apple.mpegurl")
+        segment_uri = urljoin(variant_uri, variant.decode().splitlines()[3])
+
+        status, headers, segment, _ = self.request(segment_uri, headers={"Range": "bytes=0-187"})
+        self.assertEqual(status, 206)
+        self.assertEqual(headers["content-type"], "video/mp2t")
+        self.assertEqual(segment, bytes(188))
+
+        status, _, body, _ = self.request(segment_uri, method="HEAD")
+        self.assertEqual((status, body), (200, b""))
+
+    def test_unknown_files_not_served(self):
+        """Test that other files, unknown videos and unfinished renditions are not served"""
+        self.assertEqual(self.request("/hls/video1/360p/missing.ts")[0], 404)
+        self.assertEqual(self.request("/hls/missing/360p/index.m3u8")[0], 404)
+        self.assertEqual(self.request("/hls/video1/360p/renditions.json")[0], 404)
+        self.assertEqual(self.request("/hls/video1/.360p/index.m3u8")[0], 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
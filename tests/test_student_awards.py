@@ -0,0 +1,96 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+
+# Add the backend directory to the path so we can import its packages
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from awards.student_awards import (
+    StudentAwardsSnapshot,
+    calculate_student_filmmaker_awards,
+    set_student_awards_snapshot
+)
+from database import queries
+from routes.awards import get_hall_of_fame
+
+class HeaderRequest:
+    """Request with only headers for the hall of fame routes"""
+
+    def __init__(self, **headers):
+        self.headers = headers
+
+
+class StudentAwardsTestCase(unittest.TestCase):
+    """Test cases for the student filmmaker award"""
+
+    def setUp(self):
+        """Set up a fresh snapshot"""
+        self.snapshot = StudentAwardsSnapshot()
+        set_student_awards_snapshot(self.snapshot)
+
+    def tearDown(self):
+        set_student_awards_snapshot(None)
+
+    def test_only_verified_students_are_ranked(self):
+        """Test that the student board holds verified students' videos only"""
+        self.assertEqual([video["id"] for video in queries.get_student_videos()], ["video3"])
+
+        result = calculate_student_filmmaker_awards()
+        self.assertEqual(result["winner"]["id"], "video3")
+        self.assertEqual(result["winner"]["filmmaker"]["school"], "NYU Tisch School of the Arts")
+        self.assertTrue(result["winner"]["filmmaker"]["isStudent"])
+        self.assertEqual(result["runnerUps"], [])
+
+    def test_verification_changes_refile_videos(self):
+        """Test that losing and regaining verification moves a student's videos"""
+        try:
+            queries.update_user("student1", isVerified=False)
+            self.assertEqual(queries.get_student_videos(), [])
+            self.assertIsNone(self.snapshot.get()["winner"])
+
+            queries.update_user("user123", isStudent=True)
+            self.assertEqual([video["id"] for video in queries.get_student_videos()], ["video1", "video2"])
+        finally:
+            queries.update_user("user123", isStudent=False)
+            queries.update_user("student1", isVerified=True)
+
+        self.assertEqual(self.snapshot.get()["winner"]["id"], "video3")
+        self.assertIsNone(queries.update_user("missing", isVerified=True))
+
+    def test_snapshot_rebuilt_only_on_change(self):
+        """Test that the snapshot is reused until a student video or profile changes"""
+        first = self.snapshot.get()
+        self.assertIs(self.snapshot.get(), first)
+
+        queries.update_video("video1", description=queries.get_video("video1")["description"])
+        self.assertIs(self.snapshot.get(), first)
+
+        video = queries.get_video("video3")
+        original = (video["averageRating"], video["ratingCount"])
+        try:
+            queries.update_video("video3", averageRating=5.0, ratingCount=200)
+            rebuilt = self.snapshot.get()
+            self.assertIsNot(rebuilt, first)
+            self.assertEqual(rebuilt["winner"]["score"], queries.get_video("video3")["score"])
+        finally:
+            queries.update_video("video3", averageRating=original[0], ratingCount=original[1])
+
+        try:
+            queries.update_user("student1", name="Renamed Student")
+            self.assertEqual(self.snapshot.get()["winner"]["filmmaker"]["name"], "Renamed Student")
+        finally:
+            queries.update_user("student1", name="Film Student")
+
+    def test_hall_of_fame_serves_the_snapshot(self):
+        """Test that the hall of fame shows the snapshot's student winner"""
+        result = json.loads(asyncio.run(get_hall_of_fame(HeaderRequest())).body)
+
+        self.assertEqual(result["currentYear"]["studentFilmmaker"], self.snapshot.get()["winner"])
+        self.assertEqual(result["currentYear"]["filmOfTheYear"]["id"], "video1")
+        self.assertEqual(result["pastYears"][0]["year"], 2022)
+
+
+if __name__ == '__main__':
+    unittest.main()